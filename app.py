@@ -1,4 +1,5 @@
 import os
+import atexit
 import logging
 import secrets
 from flask import Flask, request, render_template, jsonify, send_from_directory, abort
@@ -21,6 +22,7 @@ from src.services.openai_service import OpenAIService
 from src.services.conversation_factory import create_conversation_service
 from src.config.settings import Settings
 from src.utils.security import setup_cors, validate_webhook_ip
+from src.exceptions import BaseBotException
 
 # Import admin routes
 from src.routes.admin_routes import admin_bp
@@ -31,6 +33,9 @@ from src.utils.memory_monitor import get_memory_monitor
 # Import connection pool monitoring
 from src.utils.connection_pool import connection_pool_manager
 
+# Import async webhook ingress
+from src.utils.webhook_ingress import get_webhook_ingress
+
 # Create Flask app
 app = Flask(__name__)
 
@@ -83,6 +88,20 @@ rich_message_service = RichMessageService(
 
 line_service = LineService(settings, openai_service, conversation_service, rich_message_service)
 
+# Initialize async webhook ingress (acknowledge LINE immediately, process off-request)
+webhook_ingress = None
+if settings.WEBHOOK_INGRESS_MODE == 'async':
+    # Queue items are per-user partitions; each takes its user's turn when enqueued
+    # so a user's events stay ordered across batches
+    webhook_ingress = get_webhook_ingress(
+        event_handler=line_service.event_executor.run_partition,
+        max_queue_size=settings.WEBHOOK_QUEUE_MAX_SIZE,
+        consumer_count=settings.WEBHOOK_CONSUMER_COUNT,
+        sequencer=line_service.event_executor.reserve
+    )
+    webhook_ingress.start()
+    atexit.register(webhook_ingress.stop)
+
 # Initialize memory monitor
 memory_monitor = get_memory_monitor()
 memory_monitor.start_monitoring()
@@ -92,7 +111,7 @@ def index():
     """Main dashboard page"""
     return render_template('index.html', 
                          webhook_url=f"{request.url_root}webhook",
-                         total_users=len(conversation_service.conversations))
+                         total_users=conversation_service.get_stats_snapshot()['total_users'])
 
 @app.route('/webhook', methods=['POST'])
 @limiter.limit("30 per minute")  # Allow 30 webhook calls per minute per IP
@@ -103,11 +122,24 @@ def webhook():
         # Get request signature for verification
         signature = request.headers.get('X-Line-Signature', '')
         
-        # Get request body
-        body = request.get_data(as_text=True)
+        # Get raw request body; signature verification and parsing work on the bytes
+        body = request.get_data()
         
         logger.info(f"Received webhook request. Signature: {signature}")
-        logger.debug(f"Request body: {body}")
+        logger.debug(f"Request body: {len(body)} bytes")
+        
+        # Async ingress: verify, parse and enqueue, then acknowledge immediately
+        if webhook_ingress is not None:
+            try:
+                events = line_service.parse_webhook_events(signature, body)
+            except BaseBotException as e:
+                logger.error(f"Webhook rejected: {e.message}")
+                return 'Bad Request', 400
+            
+            if not webhook_ingress.submit(line_service.event_executor.partition(events)):
+                # Non-2xx lets LINE redeliver once we have capacity again
+                return 'Service Unavailable', 503
+            return 'OK', 200
         
         # Verify and handle the webhook
         result = line_service.handle_webhook(signature, body)
@@ -131,9 +163,13 @@ def webhook_verification():
 @limiter.limit("60 per minute")  # Health checks can be more frequent
 def health_check():
     """Health check endpoint"""
+    # Cached counter snapshot: O(1) regardless of the number of conversations
+    stats = conversation_service.get_stats_snapshot()
     return jsonify({
         'status': 'healthy',
-        'total_conversations': len(conversation_service.conversations),
+        'total_conversations': stats['total_users'],
+        'active_users_today': stats['active_users_today'],
+        'stats_timestamp': stats['timestamp'],
         'services': {
             'line_service': 'active',
             'openai_service': 'active',
@@ -144,17 +180,25 @@ def health_check():
 @app.route('/conversations')
 @limiter.limit("10 per minute")  # Limit conversation status checks
 def conversations_status():
-    """Get conversation statistics"""
+    """Get conversation statistics and one cursor-paginated page of conversations"""
+    cursor = request.args.get('cursor', 0, type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    stats = conversation_service.get_stats_snapshot()
+    page = conversation_service.list_conversations(cursor=cursor, count=limit)
     return jsonify({
-        'total_users': len(conversation_service.conversations),
+        'total_users': stats['total_users'],
+        'active_users': stats['active_users'],
+        'active_users_today': stats['active_users_today'],
+        'total_messages': stats['total_messages'],
         'active_conversations': [
             {
-                'user_id': user_id[:8] + '...',  # Hide full user ID for privacy
-                'message_count': len(conv['messages']),
-                'last_activity': conv.get('last_activity', 'Unknown')
+                'user_id': conv['user_id'][:8] + '...',  # Hide full user ID for privacy
+                'message_count': conv['message_count'],
+                'last_activity': conv['last_activity']
             }
-            for user_id, conv in conversation_service.conversations.items()
-        ]
+            for conv in page['conversations']
+        ],
+        'next_cursor': page['next_cursor']
     })
 
 @app.route('/memory')
@@ -228,6 +272,20 @@ def connection_pools_status():
             'message': str(e)
         }), 500
 
+@app.route('/webhook-ingress')
+@limiter.limit("30 per minute")  # Moderate rate limit for ingress queue monitoring
+def webhook_ingress_status():
+    """Get async webhook ingress queue depth and event age metrics"""
+    if webhook_ingress is None:
+        return jsonify({
+            'mode': settings.WEBHOOK_INGRESS_MODE,
+            'running': False
+        })
+    
+    metrics = webhook_ingress.get_metrics()
+    metrics['mode'] = settings.WEBHOOK_INGRESS_MODE
+    return jsonify(metrics)
+
 @app.route('/static/backgrounds/<filename>')
 @limiter.limit("100 per minute")  # Allow frequent access to background images
 def serve_template_image(filename):
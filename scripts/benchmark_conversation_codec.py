@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Encode/decode throughput of stored conversation messages.
+
+Compares the previous encoding (a JSON object per message with an ISO
+timestamp, parsed back into a dict holding a ``datetime``) with each
+installed codec of ``src.utils.conversation_codec`` (versioned positional
+records with epoch timestamps, decoded into ``StoredMessage``) for
+conversations of 10, 100 and 1000 messages. Reports conversations and
+messages per second for a full encode and a full decode, as done when a
+history is written and when it is loaded.
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from src.utils.compact_message import StoredMessage
+from src.utils.conversation_codec import available_codecs, decode_message, encode_message, get_codec
+
+CONVERSATION_SIZES = [10, 100, 1000]
+MIN_SECONDS = 0.5
+
+
+def build_conversation(size: int) -> List[StoredMessage]:
+    """Alternating user/assistant messages of typical length."""
+    start = datetime(2025, 1, 1)
+    return [
+        StoredMessage(
+            "user" if i % 2 == 0 else "assistant",
+            f"Message {i}: สวัสดีครับ could you summarise the attached report for me?",
+            "text",
+            {"image_id": f"img_{i}"} if i % 10 == 0 else None,
+            (start + timedelta(seconds=i)).timestamp(),
+            24
+        )
+        for i in range(size)
+    ]
+
+
+def legacy_encode(message: StoredMessage) -> str:
+    """Previous encoding: JSON object with an ISO timestamp."""
+    encoded = message.to_dict()
+    encoded['timestamp'] = encoded['timestamp'].isoformat()
+    return json.dumps(encoded)
+
+
+def legacy_decode(raw: str) -> Dict[str, Any]:
+    """Previous decoding: JSON object with the timestamp parsed to datetime."""
+    message = json.loads(raw)
+    message['timestamp'] = datetime.fromisoformat(message['timestamp'])
+    return message
+
+
+def throughput(func: Callable[[], Any]) -> float:
+    """Calls per second, running for at least MIN_SECONDS."""
+    func()  # warm up
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SECONDS:
+            return calls / elapsed
+
+
+def run_benchmark() -> Dict[int, Dict[str, Dict[str, float]]]:
+    """Measure every variant at every conversation size and print a summary table."""
+    codecs = [get_codec(name) for name in available_codecs()]
+
+    results = {}
+    print(f"{'messages':>9} {'variant':>14} {'encode msg/s':>13} {'decode msg/s':>13} {'bytes/msg':>10}")
+    for size in CONVERSATION_SIZES:
+        conversation = build_conversation(size)
+        variants = {'legacy json': (
+            lambda: [legacy_encode(m) for m in conversation],
+            legacy_decode,
+            [legacy_encode(m).encode() for m in conversation]
+        )}
+        for codec in codecs:
+            variants[f"{codec.name} v1"] = (
+                lambda codec=codec: [encode_message(m, codec) for m in conversation],
+                decode_message,
+                [encode_message(m, codec) for m in conversation]
+            )
+
+        results[size] = {}
+        for variant, (encode_all, decode_one, encoded) in variants.items():
+            stats = {
+                'encode_messages_per_second': throughput(encode_all) * size,
+                'decode_messages_per_second': throughput(lambda: [decode_one(raw) for raw in encoded]) * size,
+                'bytes_per_message': sum(len(raw) for raw in encoded) / size
+            }
+            results[size][variant] = stats
+            print(f"{size:>9} {variant:>14} {stats['encode_messages_per_second']:>13,.0f} "
+                  f"{stats['decode_messages_per_second']:>13,.0f} {stats['bytes_per_message']:>10.0f}")
+    return results
+
+
+def main():
+    """Run the conversation codec benchmark."""
+    return run_benchmark()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the in-memory conversation store.
+
+Builds the ``ConversationService.conversations`` structure for 10k and 100k
+users with the previous message dicts (``datetime`` timestamp, own metadata
+dict) and with ``StoredMessage`` records, and reports the bytes allocated
+per message and per user as measured by tracemalloc. Message contents are
+created before measuring and shared by both layouts, so the figures are the
+per-message overhead the representation adds on top of the text itself.
+
+``BENCHMARK_MESSAGES_PER_USER`` sets the history length (default 10).
+"""
+
+import gc
+import os
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from src.utils.compact_message import StoredMessage
+
+USER_COUNTS = [10_000, 100_000]
+MESSAGES_PER_USER = 10
+ROLES = ["user", "assistant"]
+
+
+def build_contents(count: int) -> List[str]:
+    """Distinct message texts, allocated outside the measured region."""
+    return [f"Message {i}: สวัสดีครับ how can I help you today?" for i in range(count)]
+
+
+def dict_message(role: str, content: str, timestamp: datetime, tokens: int) -> Dict[str, Any]:
+    """Message as ConversationService stored it before StoredMessage."""
+    return {
+        "role": role,
+        "content": content,
+        "message_type": "text",
+        "metadata": {},
+        "timestamp": timestamp,
+        "tokens": tokens
+    }
+
+
+def compact_message(role: str, content: str, timestamp: datetime, tokens: int) -> StoredMessage:
+    """Message as ConversationService stores it now."""
+    return StoredMessage(role, content, "text", None, timestamp.timestamp(), tokens)
+
+
+def build_store(users: int, per_user: int, contents: List[str],
+                make_message: Callable[[str, str, datetime, int], Any]) -> Dict[str, Dict]:
+    """Conversations dict in the ConversationService layout."""
+    start = datetime(2025, 1, 1)
+    store = {}
+    for u in range(users):
+        messages = []
+        for m in range(per_user):
+            timestamp = start + timedelta(seconds=u * per_user + m)
+            messages.append(make_message(ROLES[m % 2], contents[u * per_user + m], timestamp, 12))
+        store[f"U{u:032x}"] = {
+            "messages": messages,
+            "created_at": start,
+            "last_activity": start,
+            "last_response_id": None
+        }
+    return store
+
+
+def measure(users: int, per_user: int, contents: List[str],
+            make_message: Callable[[str, str, datetime, int], Any]) -> int:
+    """Bytes allocated while building the store."""
+    gc.collect()
+    tracemalloc.start()
+    store = build_store(users, per_user, contents, make_message)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    gc.collect()
+    return allocated
+
+
+def run_benchmark(per_user: int = MESSAGES_PER_USER) -> Dict[int, Dict[str, Dict[str, float]]]:
+    """Measure both layouts at each user count and print a summary table."""
+    results = {}
+    print(f"{per_user} messages per user (message text excluded)")
+    print(f"{'users':>8} {'layout':>8} {'total MB':>10} {'B/message':>10} {'B/user':>10}")
+    for users in USER_COUNTS:
+        contents = build_contents(users * per_user)
+        results[users] = {}
+        for layout, make_message in (('dict', dict_message), ('compact', compact_message)):
+            allocated = measure(users, per_user, contents, make_message)
+            # Bytes per message isolates the message records from the per-user overhead
+            per_message = (allocated - measure(users, 0, contents, make_message)) / (users * per_user)
+            results[users][layout] = {
+                'total_mb': allocated / (1024 * 1024),
+                'bytes_per_message': per_message,
+                'bytes_per_user': allocated / users
+            }
+            stats = results[users][layout]
+            print(f"{users:>8} {layout:>8} {stats['total_mb']:>10.1f} "
+                  f"{stats['bytes_per_message']:>10.0f} {stats['bytes_per_user']:>10.0f}")
+        saved = 1 - results[users]['compact']['total_mb'] / results[users]['dict']['total_mb']
+        print(f"{users:>8} {'saved':>8} {saved:>10.0%}")
+        del contents
+    return results
+
+
+def main():
+    """Run the conversation memory benchmark."""
+    return run_benchmark(int(os.environ.get('BENCHMARK_MESSAGES_PER_USER', MESSAGES_PER_USER)))
+
+
+if __name__ == "__main__":
+    main()
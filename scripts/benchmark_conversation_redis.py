@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark for RedisConversationService writes and history reads.
+
+Compares the previous command-per-call ``add_message`` (RPUSH, LTRIM, four
+HINCRBYs, LLEN, HSET and two EXPIREs, each its own round trip) with the
+current one (a single append script call), and
+per-element JSON decoding of the history with the single bulk decode.
+
+Runs against fakeredis by default, or against a local Redis when
+``BENCHMARK_REDIS_URL`` is set. fakeredis answers in-process, so
+``BENCHMARK_RTT_MS`` can add a simulated network round trip to every
+command, pipeline or script call sent.
+"""
+
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import redis
+
+from src.services.redis_conversation_service import RedisConversationService
+from src.utils.conversation_stats import ConversationStatistics
+from src.utils.context_digest import message_digest
+from src.utils.token_counter import count_message_tokens
+
+MAX_MESSAGES = 100
+OPERATIONS = 2000
+
+
+class RoundTripCounter:
+    """Counts (and optionally delays) every command or pipeline sent to Redis."""
+
+    def __init__(self, client: redis.Redis, rtt_seconds: float = 0.0):
+        self.count = 0
+        self.rtt_seconds = rtt_seconds
+        connection_class = client.connection_pool.connection_class
+        original = connection_class.send_packed_command
+        counter = self
+
+        def send_packed_command(connection, *args, **kwargs):
+            counter.count += 1
+            if counter.rtt_seconds:
+                time.sleep(counter.rtt_seconds)
+            return original(connection, *args, **kwargs)
+
+        connection_class.send_packed_command = send_packed_command
+
+
+def create_client() -> redis.Redis:
+    """Local Redis from BENCHMARK_REDIS_URL, or fakeredis."""
+    redis_url = os.environ.get('BENCHMARK_REDIS_URL')
+    if redis_url:
+        return redis.from_url(redis_url, decode_responses=True)
+    import fakeredis
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def create_service(client: redis.Redis) -> RedisConversationService:
+    """RedisConversationService bound to an existing client."""
+    service = RedisConversationService.__new__(RedisConversationService)
+    service.redis_url = "benchmark"
+    service.ttl_seconds = 3600
+    service.max_messages_per_user = MAX_MESSAGES
+    service.statistics = ConversationStatistics(user_ttl_seconds=service.ttl_seconds)
+    service.redis_client = client
+    return service
+
+
+def legacy_add_message(service: RedisConversationService, user_id: str, role: str, content: str):
+    """Previous add_message: one round trip per command."""
+    client = service.redis_client
+    conv_key = service._get_conversation_key(user_id)
+    meta_key = service._get_metadata_key(user_id)
+    message = {
+        "role": role,
+        "content": content,
+        "message_type": "text",
+        "metadata": {},
+        "timestamp": datetime.now().isoformat(),
+        "tokens": count_message_tokens({"content": content})
+    }
+    length = client.rpush(conv_key, json.dumps(message))
+    dropped_tokens = 0
+    if length > service.max_messages_per_user:
+        dropped = client.lrange(conv_key, 0, length - service.max_messages_per_user - 1)
+        dropped_tokens = sum(service._stored_tokens(raw) for raw in dropped)
+    client.ltrim(conv_key, -service.max_messages_per_user, -1)
+    total = client.hincrby(meta_key, "total_messages", 1)
+    client.hincrby(meta_key, "context_digest", message_digest(total - 1, role, content))
+    client.hincrby(meta_key, "token_total", message["tokens"] - dropped_tokens)
+    client.hincrby(meta_key, "lifetime_tokens", message["tokens"])
+    client.hset(meta_key, mapping={
+        "last_activity": datetime.now().isoformat(),
+        "message_count": client.llen(conv_key)
+    })
+    client.expire(conv_key, service.ttl_seconds)
+    client.expire(meta_key, service.ttl_seconds)
+
+
+def legacy_get_history(service: RedisConversationService, user_id: str) -> List[Dict]:
+    """Previous history read: one JSON decode per message."""
+    messages = service.redis_client.lrange(service._get_conversation_key(user_id), 0, -1)
+    return [json.loads(msg) for msg in messages]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of latency samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def measure(func: Callable[[int], Any], counter: RoundTripCounter, operations: int) -> Dict[str, float]:
+    """Per-call latency percentiles (microseconds) and round trips per call."""
+    func(0)  # warm up
+    samples = []
+    counter.count = 0
+    for i in range(operations):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return {
+        'round_trips': counter.count / operations,
+        'p50_us': statistics.median(samples),
+        'p99_us': percentile(samples, 99),
+        'mean_us': statistics.fmean(samples)
+    }
+
+
+def run_benchmark(operations: int = OPERATIONS) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Run the write and read benchmarks and print a summary table."""
+    client = create_client()
+    counter = RoundTripCounter(client, float(os.environ.get('BENCHMARK_RTT_MS', '0')) / 1000)
+    service = create_service(client)
+    content = "สวัสดีครับ this is a benchmark message of typical length " * 2
+
+    # Prefill so every write also trims
+    for prefix in ("legacy_", "current_"):
+        for i in range(MAX_MESSAGES):
+            service.add_message(f"{prefix}reader", "user", f"{content} {i}")
+
+    cases = {
+        'add_message': (
+            lambda i: legacy_add_message(service, f"legacy_{i % 50}", "user", content),
+            lambda i: service.add_message(f"current_{i % 50}", "user", content)
+        ),
+        'get_history': (
+            lambda i: legacy_get_history(service, "legacy_reader"),
+            lambda i: service.get_conversation_history("current_reader")
+        )
+    }
+
+    results = {}
+    print(f"Backend: {'redis ' + os.environ['BENCHMARK_REDIS_URL'] if os.environ.get('BENCHMARK_REDIS_URL') else 'fakeredis'}"
+          f", simulated RTT {counter.rtt_seconds * 1000:.1f} ms, {operations} operations")
+    print(f"{'operation':>12} {'variant':>10} {'trips/op':>9} {'p50 us':>9} {'p99 us':>9}")
+    for operation, (legacy_func, current_func) in cases.items():
+        results[operation] = {
+            'before': measure(legacy_func, counter, operations),
+            'after': measure(current_func, counter, operations)
+        }
+        for variant, stats in results[operation].items():
+            print(f"{operation:>12} {variant:>10} {stats['round_trips']:>9.1f} "
+                  f"{stats['p50_us']:>9.1f} {stats['p99_us']:>9.1f}")
+
+    client.flushdb()
+    return results
+
+
+def main():
+    """Run the conversation storage benchmark."""
+    return run_benchmark(int(os.environ.get('BENCHMARK_OPERATIONS', OPERATIONS)))
+
+
+if __name__ == "__main__":
+    main()
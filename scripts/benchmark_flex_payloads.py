@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Build time per Rich Message: full build versus the pre-rendered payload cache.
+
+For each message variant (plain, with a hero image, with conversation
+trigger buttons), compares building the Flex Message with
+``create_flex_message`` and serializing it as the LINE client does before a
+push, with rendering it from a compiled template via
+``render_flex_message`` and serializing that. Every message gets a new
+content ID, as every batch does. Reports microseconds per message and the
+speedup.
+"""
+
+import json
+import time
+import uuid
+from typing import Any, Callable, Dict
+from unittest.mock import Mock
+
+from src.services.rich_message_service import RichMessageService
+
+MIN_SECONDS = 0.5
+
+VARIANTS = {
+    'plain': dict(include_interactions=False),
+    'hero image': dict(include_interactions=False, image_path="/static/backgrounds/coffee_morning.png"),
+    'interactive': dict(include_interactions=True, image_path="/static/backgrounds/coffee_morning.png",
+                        theme="productivity")
+}
+
+
+def seconds_per_call(func: Callable[[], Any]) -> float:
+    """Average seconds per call, running for at least MIN_SECONDS."""
+    func()  # warm up (and compile the template)
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SECONDS:
+            return elapsed / calls
+
+
+def run_benchmark() -> Dict[str, Dict[str, float]]:
+    """Measure both build paths for every variant and print a summary table."""
+    service = RichMessageService(line_bot_api=Mock(), enable_redis=False, base_url="https://bot.example.com")
+    content = dict(
+        title="☕ Monday Fuel",
+        content="Start slow, finish strong. สู้ๆ นะครับ — one good cup and one hard task before noon.",
+    )
+
+    results = {}
+    print(f"{'variant':>12} {'build us/msg':>13} {'cached us/msg':>14} {'speedup':>8}")
+    for name, options in VARIANTS.items():
+        def build():
+            message = service.create_flex_message(content_id=str(uuid.uuid4()), **content, **options)
+            return json.dumps(message.as_json_dict())
+
+        def cached():
+            message = service.render_flex_message(content_id=str(uuid.uuid4()), **content, **options)
+            return json.dumps(message.as_json_dict())
+
+        stats = {
+            'build_us_per_message': seconds_per_call(build) * 1e6,
+            'cached_us_per_message': seconds_per_call(cached) * 1e6
+        }
+        stats['speedup'] = stats['build_us_per_message'] / stats['cached_us_per_message']
+        results[name] = stats
+        print(f"{name:>12} {stats['build_us_per_message']:>13,.1f} {stats['cached_us_per_message']:>14,.1f} "
+              f"{stats['speedup']:>7.1f}x")
+
+    print(f"payload cache: {service.flex_payload_cache.get_statistics()['compiles']} templates compiled")
+    return results
+
+
+def main():
+    """Run the Flex payload benchmark."""
+    return run_benchmark()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for webhook signature verification and event parsing.
+
+Compares the legacy ingress path (decode the body to text, re-encode it for
+the HMAC, then let ``WebhookHandler`` verify and ``json.loads`` it again)
+with the raw-bytes path (one HMAC over the original buffer and a single
+parse, using orjson when installed) for 1 KB, 10 KB and 100 KB multi-event
+batches. Reports per-request CPU time for the verify+parse stage on its own
+and end-to-end including construction of the LINE SDK event objects.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from linebot import WebhookHandler
+
+from src.services.line_service import LineService, orjson, _loads_webhook_body
+
+CHANNEL_SECRET = "benchmark_channel_secret"
+TARGET_SIZES = {'1KB': 1024, '10KB': 10 * 1024, '100KB': 100 * 1024}
+
+
+def build_webhook_body(target_size: int) -> bytes:
+    """Build a multi-event text message webhook body of roughly target_size bytes."""
+    events = []
+    body = b''
+    index = 0
+    while len(body) < target_size:
+        events.append({
+            'type': 'message',
+            'mode': 'active',
+            'timestamp': 1700000000000 + index,
+            'webhookEventId': f'01HBENCH{index:018d}',
+            'deliveryContext': {'isRedelivery': False},
+            'replyToken': f'reply_token_{index:08d}',
+            'source': {'type': 'user', 'userId': f'U{index:032x}'},
+            'message': {'id': str(100000 + index), 'type': 'text', 'text': 'สวัสดีครับ hello there ' * 2}
+        })
+        index += 1
+        body = json.dumps({'destination': 'Ubenchmark', 'events': events}, ensure_ascii=False).encode('utf-8')
+    return body
+
+
+def sign(body: bytes) -> str:
+    """Compute the X-Line-Signature value for a body."""
+    digest = hmac.new(CHANNEL_SECRET.encode('utf-8'), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('utf-8')
+
+
+def legacy_verify_parse(service: LineService, handler: WebhookHandler, raw: bytes, signature: str) -> Dict[str, Any]:
+    """Previous verify+parse stage: decode, HMAC twice over re-encoded text, stdlib parse."""
+    body = raw.decode('utf-8')
+    if not service._verify_signature(signature, body):
+        raise ValueError("signature mismatch")
+    if not handler.parser.signature_validator.validate(body, signature):
+        raise ValueError("signature mismatch")
+    return json.loads(body)
+
+
+def raw_bytes_verify_parse(service: LineService, raw: bytes, signature: str) -> Dict[str, Any]:
+    """Current verify+parse stage: one HMAC over the raw buffer and a single parse."""
+    if not service._verify_signature(signature, raw):
+        raise ValueError("signature mismatch")
+    return _loads_webhook_body(raw)
+
+
+def legacy_path(service: LineService, handler: WebhookHandler, raw: bytes, signature: str) -> List[Any]:
+    """Previous ingress: text body, re-encoded HMAC, then verify and parse again in the SDK."""
+    body = raw.decode('utf-8')  # request.get_data(as_text=True)
+    if not service._verify_signature(signature, body):
+        raise ValueError("signature mismatch")
+    return handler.parser.parse(body, signature)
+
+
+def raw_bytes_path(service: LineService, raw: bytes, signature: str) -> List[Any]:
+    """Current ingress: HMAC over the raw buffer and a single parse."""
+    return service.parse_webhook_events(signature, raw)
+
+
+def measure(func, iterations: int) -> float:
+    """Return mean CPU time per call in microseconds."""
+    func()  # warm up
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations * 1_000_000
+
+
+def run_benchmark(iterations: int = 200) -> Dict[str, Dict[str, Any]]:
+    """Run the benchmark for every payload size and print a summary table."""
+    service = LineService.__new__(LineService)
+    service.settings = SimpleNamespace(LINE_CHANNEL_SECRET=CHANNEL_SECRET)
+    service.connection_metrics = {'webhook_requests': 0}
+    handler = WebhookHandler(CHANNEL_SECRET)
+
+    results = {}
+    print(f"JSON parser: {'orjson' if orjson is not None else 'json (stdlib)'}")
+    print(f"{'size':>6} {'events':>7} {'stage':>14} {'legacy us':>11} {'raw us':>9} {'saved us':>9} {'saved %':>8}")
+
+    for label, target in TARGET_SIZES.items():
+        raw = build_webhook_body(target)
+        signature = sign(raw)
+        event_count = len(json.loads(raw)['events'])
+        count = max(10, iterations * 1024 // target)
+
+        stages = {
+            'verify+parse': (
+                lambda: legacy_verify_parse(service, handler, raw, signature),
+                lambda: raw_bytes_verify_parse(service, raw, signature)
+            ),
+            'end-to-end': (
+                lambda: legacy_path(service, handler, raw, signature),
+                lambda: raw_bytes_path(service, raw, signature)
+            )
+        }
+
+        results[label] = {'bytes': len(raw), 'events': event_count}
+        for stage, (legacy_func, current_func) in stages.items():
+            legacy = measure(legacy_func, count)
+            current = measure(current_func, count)
+            saved = legacy - current
+            saved_percent = saved / legacy * 100 if legacy else 0.0
+
+            results[label][stage] = {
+                'legacy_cpu_us': legacy,
+                'raw_bytes_cpu_us': current,
+                'saved_cpu_us': saved,
+                'saved_percent': saved_percent
+            }
+            print(f"{label:>6} {event_count:>7} {stage:>14} {legacy:>11.1f} {current:>9.1f} "
+                  f"{saved:>9.1f} {saved_percent:>7.1f}%")
+
+    return results
+
+
+def main():
+    """Run the webhook parsing benchmark."""
+    return run_benchmark()
+
+
+if __name__ == "__main__":
+    main()
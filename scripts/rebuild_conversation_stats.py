@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Rebuild the conversation statistics counters from the stored conversations.
+
+The counters only grow as messages are written, so conversations stored
+before they existed (or counters lost with a Redis restore) are counted by
+walking the per-user metadata with SCAN. Run it once after deploying onto
+existing data; it is safe to run while the bot is serving traffic, and only
+one rebuild runs at a time.
+
+Uses the same ``REDIS_URL``/``USE_REDIS`` environment as the application.
+"""
+
+import sys
+
+from src.services.conversation_factory import create_conversation_service
+
+
+def main() -> int:
+    service = create_conversation_service()
+    users = service.rebuild_statistics()
+    if users is None:
+        print("Rebuild skipped: Redis unavailable or another rebuild is running")
+        return 1
+
+    snapshot = service.get_stats_snapshot(max_age=0)
+    print(f"Counted {users} users; {snapshot['total_messages']} messages in total")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
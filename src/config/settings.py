@@ -32,6 +32,72 @@ class Settings:
         self.MAX_MESSAGES_PER_USER = int(os.environ.get("MAX_MESSAGES_PER_USER", "100"))
         self.MAX_TOTAL_CONVERSATIONS = int(os.environ.get("MAX_TOTAL_CONVERSATIONS", "1000"))
         
+        # Prompt token budget for Chat Completions context (history beyond it is
+        # folded into a rolling summary); CONTEXT_TOKEN_BUDGETS overrides per
+        # deployment as "deployment:tokens,deployment:tokens"
+        self.CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "4000"))
+        self.CONTEXT_TOKEN_BUDGETS = self._parse_token_budgets(os.environ.get("CONTEXT_TOKEN_BUDGETS", ""))
+        self.CONTEXT_SUMMARY_MAX_TOKENS = int(os.environ.get("CONTEXT_SUMMARY_MAX_TOKENS", "300"))
+        # Cross-user semantic cache for stateless intents (greetings, thanks, FAQ)
+        self.SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+        self.SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+        self.SEMANTIC_CACHE_TTL = int(os.environ.get("SEMANTIC_CACHE_TTL", "86400"))
+        self.SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+        
+        # Identical concurrent prompts share one upstream call (followers wait up to the timeout)
+        self.OPENAI_COALESCING_ENABLED = os.environ.get("OPENAI_COALESCING_ENABLED", "true").lower() == "true"
+        self.OPENAI_COALESCE_TIMEOUT = float(os.environ.get("OPENAI_COALESCE_TIMEOUT", "30"))
+        
+        # Client-side Azure OpenAI quota governor (0 = learn limits from response headers)
+        self.OPENAI_RATE_LIMIT_RPM = int(os.environ.get("OPENAI_RATE_LIMIT_RPM", "0"))
+        self.OPENAI_RATE_LIMIT_TPM = int(os.environ.get("OPENAI_RATE_LIMIT_TPM", "0"))
+        self.OPENAI_RATE_LIMIT_MAX_WAIT = float(os.environ.get("OPENAI_RATE_LIMIT_MAX_WAIT", "30"))
+        
+        # Hedged requests: duplicate a slow Responses API request to Chat Completions
+        # after the given percentile of recent first-token latencies, within a budget
+        self.OPENAI_HEDGING_ENABLED = os.environ.get("OPENAI_HEDGING_ENABLED", "false").lower() == "true"
+        self.OPENAI_HEDGE_PERCENTILE = float(os.environ.get("OPENAI_HEDGE_PERCENTILE", "95"))
+        self.OPENAI_HEDGE_BUDGET_PERCENT = float(os.environ.get("OPENAI_HEDGE_BUDGET_PERCENT", "10"))
+        self.OPENAI_HEDGE_MIN_SAMPLES = int(os.environ.get("OPENAI_HEDGE_MIN_SAMPLES", "20"))
+        
+        # Content-addressed cache of uploaded file IDs and prepared image payloads
+        # (file IDs are reused for at most OPENAI_FILE_CACHE_TTL; keep it within file retention)
+        self.OPENAI_UPLOAD_CACHE_ENABLED = os.environ.get("OPENAI_UPLOAD_CACHE_ENABLED", "true").lower() == "true"
+        self.OPENAI_FILE_CACHE_TTL = int(os.environ.get("OPENAI_FILE_CACHE_TTL", str(30 * 86400)))
+        self.OPENAI_IMAGE_CACHE_TTL = int(os.environ.get("OPENAI_IMAGE_CACHE_TTL", "3600"))
+        self.OPENAI_UPLOAD_CACHE_MAX_MB = float(os.environ.get("OPENAI_UPLOAD_CACHE_MAX_MB", "64"))
+        self.OPENAI_UPLOAD_CACHE_USE_REDIS = os.environ.get("OPENAI_UPLOAD_CACHE_USE_REDIS", "false").lower() == "true"
+        
+        # Async client path: one shared keep-alive pool, bounded in-flight requests
+        self.OPENAI_ASYNC_HTTP2 = os.environ.get("OPENAI_ASYNC_HTTP2", "true").lower() == "true"
+        self.OPENAI_ASYNC_MAX_CONNECTIONS = int(os.environ.get("OPENAI_ASYNC_MAX_CONNECTIONS", "50"))
+        self.OPENAI_ASYNC_MAX_IN_FLIGHT = int(os.environ.get("OPENAI_ASYNC_MAX_IN_FLIGHT", "50"))
+        self.OPENAI_ASYNC_MAX_PER_DEPLOYMENT = int(os.environ.get("OPENAI_ASYNC_MAX_PER_DEPLOYMENT", "20"))
+        
+        # Largest single user message accepted (tokens counted offline)
+        self.MAX_USER_MESSAGE_TOKENS = int(os.environ.get("MAX_USER_MESSAGE_TOKENS", "4000"))
+        
+        # Webhook ingress configuration ("sync" processes events in the request,
+        # "async" acknowledges immediately and processes events off-request)
+        self.WEBHOOK_INGRESS_MODE = os.environ.get("WEBHOOK_INGRESS_MODE", "sync").lower()
+        self.WEBHOOK_QUEUE_MAX_SIZE = int(os.environ.get("WEBHOOK_QUEUE_MAX_SIZE", "1000"))
+        self.WEBHOOK_CONSUMER_COUNT = int(os.environ.get("WEBHOOK_CONSUMER_COUNT", "8"))
+        # Max users whose events of one webhook batch are processed concurrently
+        self.WEBHOOK_EVENT_CONCURRENCY = int(os.environ.get("WEBHOOK_EVENT_CONCURRENCY", "8"))
+        
+        # Webhook event deduplication (keyed on LINE webhookEventId)
+        self.WEBHOOK_DEDUP_TTL_SECONDS = int(os.environ.get("WEBHOOK_DEDUP_TTL_SECONDS", "86400"))
+        self.WEBHOOK_DEDUP_MAX_ENTRIES = int(os.environ.get("WEBHOOK_DEDUP_MAX_ENTRIES", "50000"))
+        self.WEBHOOK_DEDUP_USE_REDIS = os.environ.get("WEBHOOK_DEDUP_USE_REDIS", "false").lower() == "true"
+        
+        # Streamed replies: first sentence via reply token, remainder via coalesced pushes
+        self.LINE_STREAMING_REPLIES = os.environ.get("LINE_STREAMING_REPLIES", "false").lower() == "true"
+        self.LINE_STREAM_FIRST_CHUNK_MIN_CHARS = int(os.environ.get("LINE_STREAM_FIRST_CHUNK_MIN_CHARS", "40"))
+        self.LINE_STREAM_FIRST_CHUNK_MAX_CHARS = int(os.environ.get("LINE_STREAM_FIRST_CHUNK_MAX_CHARS", "200"))
+        self.LINE_STREAM_MAX_CHUNK_CHARS = int(os.environ.get("LINE_STREAM_MAX_CHUNK_CHARS", "1000"))
+        self.LINE_STREAM_PUSH_INTERVAL = float(os.environ.get("LINE_STREAM_PUSH_INTERVAL", "1.5"))
+        self.LINE_STREAM_MAX_PUSH_CALLS = int(os.environ.get("LINE_STREAM_MAX_PUSH_CALLS", "3"))
+        
         # Rich Message Configuration
         self.RICH_MESSAGE_ENABLED = os.environ.get("RICH_MESSAGE_ENABLED", "false").lower() == "true"
         self.RICH_MESSAGE_DEFAULT_SEND_HOUR = int(os.environ.get("RICH_MESSAGE_DEFAULT_SEND_HOUR", "9"))
@@ -41,10 +107,22 @@ class Settings:
         self.RICH_MESSAGE_CONTENT_CACHE_HOURS = int(os.environ.get("RICH_MESSAGE_CONTENT_CACHE_HOURS", "6"))
         self.RICH_MESSAGE_MAX_RETRIES = int(os.environ.get("RICH_MESSAGE_MAX_RETRIES", "3"))
         self.RICH_MESSAGE_BATCH_SIZE = int(os.environ.get("RICH_MESSAGE_BATCH_SIZE", "100"))
+        self.RICH_MESSAGE_MULTICAST_CHUNK_SIZE = int(os.environ.get("RICH_MESSAGE_MULTICAST_CHUNK_SIZE", "500"))
+        self.RICH_MESSAGE_MULTICAST_CONCURRENCY = int(os.environ.get("RICH_MESSAGE_MULTICAST_CONCURRENCY", "8"))
         
         # Validate required settings
         self._validate_settings()
     
+    @staticmethod
+    def _parse_token_budgets(value):
+        """Parse "deployment:tokens" pairs into a dict"""
+        budgets = {}
+        for item in value.split(","):
+            name, _, tokens = item.strip().rpartition(":")
+            if name and tokens.isdigit():
+                budgets[name] = int(tokens)
+        return budgets
+    
     def _validate_settings(self):
         """Validate that all required settings are present"""
         required_settings = [
@@ -76,6 +154,19 @@ class Settings:
             "deployment_name": self.AZURE_OPENAI_DEPLOYMENT_NAME,
             "max_messages_per_user": self.MAX_MESSAGES_PER_USER,
             "max_total_conversations": self.MAX_TOTAL_CONVERSATIONS,
+            "context_token_budget": self.CONTEXT_TOKEN_BUDGET,
+            "semantic_cache_enabled": self.SEMANTIC_CACHE_ENABLED,
+            "openai_coalescing_enabled": self.OPENAI_COALESCING_ENABLED,
+            "openai_rate_limit_rpm": self.OPENAI_RATE_LIMIT_RPM,
+            "openai_rate_limit_tpm": self.OPENAI_RATE_LIMIT_TPM,
+            "openai_hedging_enabled": self.OPENAI_HEDGING_ENABLED,
+            "openai_upload_cache_enabled": self.OPENAI_UPLOAD_CACHE_ENABLED,
+            "openai_async_max_in_flight": self.OPENAI_ASYNC_MAX_IN_FLIGHT,
+            "webhook_ingress_mode": self.WEBHOOK_INGRESS_MODE,
+            "webhook_consumer_count": self.WEBHOOK_CONSUMER_COUNT,
+            "webhook_event_concurrency": self.WEBHOOK_EVENT_CONCURRENCY,
+            "webhook_dedup_redis": self.WEBHOOK_DEDUP_USE_REDIS,
+            "line_streaming_replies": self.LINE_STREAMING_REPLIES,
             "line_channel_configured": bool(self.LINE_CHANNEL_ACCESS_TOKEN),
             "azure_openai_configured": bool(self.AZURE_OPENAI_API_KEY),
             "api_type": "Azure OpenAI Responses API",  # Updated to reflect new API usage
@@ -84,5 +175,7 @@ class Settings:
             "rich_message_timezone_aware": self.RICH_MESSAGE_TIMEZONE_AWARE,
             "rich_message_analytics": self.RICH_MESSAGE_ANALYTICS_ENABLED,
             "rich_message_max_retries": self.RICH_MESSAGE_MAX_RETRIES,
-            "rich_message_batch_size": self.RICH_MESSAGE_BATCH_SIZE
+            "rich_message_batch_size": self.RICH_MESSAGE_BATCH_SIZE,
+            "rich_message_multicast_chunk_size": self.RICH_MESSAGE_MULTICAST_CHUNK_SIZE,
+            "rich_message_multicast_concurrency": self.RICH_MESSAGE_MULTICAST_CONCURRENCY
         }
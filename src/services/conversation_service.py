@@ -1,11 +1,19 @@
 import logging
+import os
 import threading
 import json
 import pickle
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, List, Optional
+from redis.exceptions import WatchError
 from src.utils.redis_manager import get_redis_manager, RedisConnectionManager
 from src.utils.memory_monitor import get_memory_monitor, MemoryStats
+from src.utils.token_counter import count_message_tokens
+from src.utils.context_digest import EMPTY_CONTEXT_DIGEST, advance_context_digest, format_context_digest
+from src.utils.conversation_append import append_message
+from src.utils.conversation_stats import ConversationStatistics, scan_page
+from src.utils.compact_message import StoredMessage
+from src.utils.conversation_codec import decode_message, encode_message, get_codec
 
 logger = logging.getLogger(__name__)
 
@@ -16,14 +24,17 @@ class ConversationService:
     Features:
     - Automatic fallback to in-memory storage when Redis is unavailable
     - Seamless Redis integration with circuit breaker pattern
-    - Thread-safe operations with RLock for re-entrant calls
+    - Append-only Redis storage: a message list trimmed with LTRIM plus a metadata hash,
+      written in pipelined round trips whose cost does not grow with history length
+    - Thread-safe operations with striped per-user locks
     - Consistent API regardless of storage backend
     - Conversation expiration and cleanup
     - Statistics and health monitoring
     """
     
     def __init__(self, redis_url: str = None, enable_redis: bool = True, 
-                 conversation_ttl_hours: int = 24, enable_memory_monitoring: bool = True):
+                 conversation_ttl_hours: int = 24, enable_memory_monitoring: bool = True,
+                 lock_stripes: int = 64, codec: str = None):
         """
         Initialize conversation service with Redis fallback capability.
         
@@ -32,13 +43,20 @@ class ConversationService:
             enable_redis: Whether to attempt Redis connection
             conversation_ttl_hours: Hours after which conversations expire
             enable_memory_monitoring: Whether to enable memory-based cleanup
+            lock_stripes: Number of per-user lock stripes
+            codec: Message codec ("msgpack", "orjson", "json" or "auto"; defaults to CONVERSATION_CODEC)
         """
         # In-memory storage for conversations (fallback + primary for non-Redis mode)
-        # Format: {user_id: {"messages": [...], "created_at": datetime, "last_activity": datetime, "last_response_id": str}}
+        # Format: {user_id: {"messages": [StoredMessage, ...], "created_at": datetime, "last_activity": datetime, "last_response_id": str,
+        #                    "total_messages": int, "context_summary": dict,
+        #                    "token_total": int, "lifetime_tokens": int, "context_digest": int}}
         self.conversations: Dict[str, Dict] = {}
         
-        # Thread safety: RLock allows the same thread to acquire the lock multiple times
-        # This is important for methods that call other methods that also need the lock
+        # Thread safety: per-user operations take one of a fixed set of striped locks, so
+        # different users don't serialize each other; the global lock guards the
+        # conversations dict itself (inserts, deletes, iteration) and is taken after a
+        # user lock, never before. RLocks allow re-entrant calls from the same thread.
+        self._user_locks = [threading.RLock() for _ in range(max(1, lock_stripes))]
         self._lock = threading.RLock()
         
         # Configuration
@@ -47,6 +65,7 @@ class ConversationService:
         self.conversation_ttl_hours = conversation_ttl_hours
         self.enable_redis = enable_redis
         self.enable_memory_monitoring = enable_memory_monitoring
+        self.codec = get_codec(codec or os.environ.get('CONVERSATION_CODEC', 'auto'))
         
         # Redis integration
         self.redis_manager: Optional[RedisConnectionManager] = None
@@ -64,6 +83,13 @@ class ConversationService:
             'storage_mode': 'in_memory'  # 'redis', 'in_memory', 'hybrid'
         }
         
+        # User and message totals: Redis counters updated with each append, or local
+        # counters while in fallback, read through a cached snapshot
+        self.statistics = ConversationStatistics(user_ttl_seconds=conversation_ttl_hours * 3600)
+        self._local_message_total = 0
+        self._local_active_day = None
+        self._local_active_today = set()
+        
         # Initialize Redis if enabled
         if self.enable_redis:
             self._initialize_redis(redis_url)
@@ -137,27 +163,34 @@ class ConversationService:
             
         return self._redis_available
     
+    def _user_lock(self, user_id: str) -> threading.RLock:
+        """Striped lock guarding one user's conversation (users on other stripes proceed in parallel)."""
+        return self._user_locks[hash(user_id) % len(self._user_locks)]
+    
     def _get_conversation_key(self, user_id: str) -> str:
-        """Generate Redis key for conversation."""
+        """Generate Redis key of a legacy whole-document conversation (migrated on first read)."""
         return f"conversation:{user_id}"
     
-    def _serialize_conversation(self, conversation: Dict) -> str:
-        """Serialize conversation data for Redis storage."""
-        # Convert datetime objects to ISO format for JSON serialization
-        serializable_conv = conversation.copy()
-        for key in ['created_at', 'last_activity']:
-            if key in serializable_conv and isinstance(serializable_conv[key], datetime):
-                serializable_conv[key] = serializable_conv[key].isoformat()
-        
-        # Convert message timestamps
-        for message in serializable_conv.get('messages', []):
-            if 'timestamp' in message and isinstance(message['timestamp'], datetime):
-                message['timestamp'] = message['timestamp'].isoformat()
-        
-        return json.dumps(serializable_conv)
+    def _get_messages_key(self, user_id: str) -> str:
+        """Generate Redis key of the append-only message list."""
+        return f"conversation_messages:{user_id}"
+    
+    def _get_metadata_key(self, user_id: str) -> str:
+        """Generate Redis key of the conversation metadata hash."""
+        return f"conversation_state:{user_id}"
+    
+    @staticmethod
+    def _encode_message(message, codec=None) -> bytes:
+        """Serialize one message (versioned header, numeric timestamp) for the Redis message list."""
+        return encode_message(message, codec)
+    
+    @staticmethod
+    def _decode_message(raw) -> StoredMessage:
+        """Deserialize one message from the Redis message list, whichever codec wrote it."""
+        return decode_message(raw)
     
     def _deserialize_conversation(self, data: str) -> Dict:
-        """Deserialize conversation data from Redis."""
+        """Deserialize a legacy whole-document conversation from Redis."""
         conversation = json.loads(data)
         
         # Convert ISO format back to datetime objects
@@ -172,17 +205,118 @@ class ConversationService:
         
         return conversation
     
+    def _conversation_from_redis(self, raw_messages: List, metadata: Dict) -> Optional[Dict]:
+        """Build the conversation dict from the message list and metadata hash."""
+        if not raw_messages and not metadata:
+            return None
+        
+        metadata = {
+            (k.decode('utf-8') if isinstance(k, bytes) else k): (v.decode('utf-8') if isinstance(v, bytes) else v)
+            for k, v in metadata.items()
+        }
+        messages = [self._decode_message(raw) for raw in raw_messages]
+        now = datetime.now()
+        conversation = {
+            "messages": messages,
+            "created_at": datetime.fromisoformat(metadata["created_at"]) if metadata.get("created_at") else now,
+            "last_activity": datetime.fromisoformat(metadata["last_activity"]) if metadata.get("last_activity") else now,
+            "last_response_id": metadata.get("last_response_id") or None,
+            "total_messages": int(metadata.get("total_messages", len(messages))),
+            "token_total": int(metadata["token_total"]) if "token_total" in metadata else self._sum_message_tokens(messages),
+            "context_digest": int(metadata.get("context_digest", EMPTY_CONTEXT_DIGEST))
+        }
+        conversation["lifetime_tokens"] = int(metadata.get("lifetime_tokens", conversation["token_total"]))
+        if metadata.get("context_summary"):
+            conversation["context_summary"] = json.loads(metadata["context_summary"])
+        return conversation
+    
+    def _metadata_fields(self, conversation: Dict) -> Dict[str, Any]:
+        """Metadata hash fields for a whole conversation (used when migrating legacy documents)."""
+        fields = {
+            "created_at": conversation.get("created_at", datetime.now()).isoformat(),
+            "last_activity": conversation.get("last_activity", datetime.now()).isoformat(),
+            "total_messages": conversation.get("total_messages", len(conversation["messages"])),
+            "token_total": conversation.get("token_total", self._sum_message_tokens(conversation["messages"])),
+            "context_digest": conversation.get("context_digest", EMPTY_CONTEXT_DIGEST)
+        }
+        fields["lifetime_tokens"] = conversation.get("lifetime_tokens", fields["token_total"])
+        if conversation.get("last_response_id"):
+            fields["last_response_id"] = conversation["last_response_id"]
+        if conversation.get("context_summary"):
+            fields["context_summary"] = json.dumps(conversation["context_summary"])
+        return fields
+    
+    def _migrate_legacy_conversation(self, client, user_id: str) -> bool:
+        """
+        Move a legacy whole-document conversation into the message list and metadata hash.
+        
+        The legacy key is watched, so concurrent migrations of the same user
+        apply once. If the new layout already holds data for the user (written
+        by an upgraded worker), it wins and the legacy document is dropped.
+        
+        Returns:
+            True if this call migrated the conversation
+        """
+        legacy_key = self._get_conversation_key(user_id)
+        messages_key = self._get_messages_key(user_id)
+        meta_key = self._get_metadata_key(user_id)
+        ttl_seconds = self.conversation_ttl_hours * 3600
+        
+        with client.pipeline() as pipe:
+            try:
+                pipe.watch(legacy_key)
+                if pipe.type(legacy_key) not in (b'string', 'string'):
+                    return False
+                data = pipe.get(legacy_key)
+                has_new_layout = pipe.exists(messages_key, meta_key) > 0
+                
+                pipe.multi()
+                if not has_new_layout:
+                    conversation = self._deserialize_conversation(
+                        data.decode('utf-8') if isinstance(data, bytes) else data
+                    )
+                    messages = conversation.get("messages", [])[-self.max_messages_per_user:]
+                    if messages:
+                        pipe.rpush(messages_key, *[self._encode_message(m, self.codec) for m in messages])
+                        pipe.expire(messages_key, ttl_seconds)
+                    fields = self._metadata_fields(conversation)
+                    pipe.hset(meta_key, mapping=fields)
+                    pipe.expire(meta_key, ttl_seconds)
+                    # The legacy document was never counted by the statistics
+                    self.statistics.record_user(
+                        pipe, user_id, conversation.get("last_activity", datetime.now()).timestamp(),
+                        fields["total_messages"]
+                    )
+                pipe.delete(legacy_key)
+                pipe.execute()
+            except WatchError:
+                # Another worker migrated it first
+                return False
+        
+        logger.info(f"Migrated legacy conversation document for user {user_id}")
+        return True
+    
     def _load_from_redis(self, user_id: str) -> Optional[Dict]:
-        """Load conversation from Redis with fallback."""
+        """Load conversation from Redis (one pipelined round trip) with fallback."""
         if not self._check_redis_health():
             return None
         
+        messages_key = self._get_messages_key(user_id)
+        meta_key = self._get_metadata_key(user_id)
+        legacy_key = self._get_conversation_key(user_id)
+        
         def redis_operation(client):
-            key = self._get_conversation_key(user_id)
-            data = client.get(key)
-            if data:
-                return self._deserialize_conversation(data.decode('utf-8'))
-            return None
+            for _ in range(2):
+                pipe = client.pipeline(transaction=False)
+                pipe.lrange(messages_key, 0, -1)
+                pipe.hgetall(meta_key)
+                pipe.exists(legacy_key)
+                raw_messages, metadata, legacy_exists = pipe.execute()
+                
+                # Conversations stored as one JSON document are converted on first read
+                if not legacy_exists or not self._migrate_legacy_conversation(client, user_id):
+                    break
+            return self._conversation_from_redis(raw_messages, metadata)
         
         def fallback():
             # Return None to indicate fallback to in-memory
@@ -199,24 +333,130 @@ class ConversationService:
         
         return result
     
-    def _save_to_redis(self, user_id: str, conversation: Dict) -> bool:
-        """Save conversation to Redis with fallback."""
+    def _load_redis_state(self, user_id: str, fields: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Read metadata fields and the stored message count in one pipelined round trip.
+        
+        Unlike ``_load_from_redis`` the history itself is never read.
+        
+        Returns:
+            Dict of the decoded fields (None when unset) plus ``stored_messages``;
+            empty when Redis holds nothing for the user; None on fallback
+        """
+        if not self._check_redis_health():
+            return None
+        
+        messages_key = self._get_messages_key(user_id)
+        meta_key = self._get_metadata_key(user_id)
+        legacy_key = self._get_conversation_key(user_id)
+        
+        def redis_operation(client):
+            for _ in range(2):
+                pipe = client.pipeline(transaction=False)
+                pipe.hmget(meta_key, *fields)
+                pipe.llen(messages_key)
+                pipe.exists(legacy_key)
+                values, stored, legacy_exists = pipe.execute()
+                
+                # Conversations stored as one JSON document are converted on first read
+                if not legacy_exists or not self._migrate_legacy_conversation(client, user_id):
+                    break
+            if not stored and all(value is None for value in values):
+                return {}
+            state = {
+                field: value.decode('utf-8') if isinstance(value, bytes) else value
+                for field, value in zip(fields, values)
+            }
+            state["stored_messages"] = stored
+            return state
+        
+        def fallback():
+            return None
+        
+        result = self.redis_manager.execute_with_fallback(
+            redis_operation, fallback, f"load_conversation_state_{user_id}"
+        )
+        
+        if result is not None:
+            self._stats['redis_operations'] += 1
+        else:
+            self._stats['fallback_operations'] += 1
+        
+        return result
+    
+    def _get_conversation_state(self, user_id: str, fields: List[str]) -> Dict[str, Any]:
+        """Get conversation metadata fields and ``stored_messages`` without reading the history."""
+        self._stats['total_operations'] += 1
+        
+        if self._redis_available:
+            state = self._load_redis_state(user_id, fields)
+            if state:
+                return state
+        
+        conversation = self._get_local_conversation(user_id)
+        if "token_total" not in conversation:
+            conversation["token_total"] = self._sum_message_tokens(conversation["messages"])
+        state = {field: conversation.get(field) for field in fields}
+        state["stored_messages"] = len(conversation["messages"])
+        return state
+    
+    def _append_to_redis(self, user_id: str, message: Dict) -> bool:
+        """
+        Append one message in one atomic script call, independent of history length.
+        
+        The script pushes and trims the list and advances the message and token
+        counters, the context digest and the statistics together, so a crash can
+        never leave them out of step with the list (see ``conversation_append``).
+        """
         if not self._check_redis_health():
             return False
         
+        messages_key = self._get_messages_key(user_id)
+        meta_key = self._get_metadata_key(user_id)
+        encoded = self._encode_message(message, self.codec)
+        
         def redis_operation(client):
-            key = self._get_conversation_key(user_id)
-            serialized_data = self._serialize_conversation(conversation)
-            
-            # Set with TTL
-            ttl_seconds = self.conversation_ttl_hours * 3600
-            return client.setex(key, ttl_seconds, serialized_data)
+            append_message(
+                client, self.statistics, messages_key, meta_key, user_id, encoded,
+                message["role"], message["content"], message["tokens"], message.created,
+                message["timestamp"].isoformat(), self.max_messages_per_user,
+                self.conversation_ttl_hours * 3600, self._stored_message_tokens
+            )
+            return True
+        
+        def fallback():
+            return False
+        
+        success = self.redis_manager.execute_with_fallback(
+            redis_operation, fallback, f"append_message_{user_id}", use_retry=False
+        )
+        
+        if success:
+            self._stats['redis_operations'] += 1
+            return True
+        else:
+            self._stats['fallback_operations'] += 1
+            return False
+    
+    def _update_redis_metadata(self, user_id: str, fields: Dict[str, Any]) -> bool:
+        """Set metadata fields and refresh the TTL in one pipelined round trip."""
+        if not self._check_redis_health():
+            return False
+        
+        meta_key = self._get_metadata_key(user_id)
+        
+        def redis_operation(client):
+            pipe = client.pipeline(transaction=False)
+            pipe.hset(meta_key, mapping=fields)
+            pipe.expire(meta_key, self.conversation_ttl_hours * 3600)
+            pipe.execute()
+            return True
         
         def fallback():
             return False
         
         success = self.redis_manager.execute_with_fallback(
-            redis_operation, fallback, f"save_conversation_{user_id}"
+            redis_operation, fallback, f"update_conversation_metadata_{user_id}"
         )
         
         if success:
@@ -232,8 +472,14 @@ class ConversationService:
             return False
         
         def redis_operation(client):
-            key = self._get_conversation_key(user_id)
-            return client.delete(key) > 0
+            pipe = client.pipeline(transaction=False)
+            pipe.delete(
+                self._get_messages_key(user_id),
+                self._get_metadata_key(user_id),
+                self._get_conversation_key(user_id)
+            )
+            self.statistics.record_removal(pipe, user_id)
+            return pipe.execute()[0] > 0
         
         def fallback():
             return False
@@ -249,6 +495,74 @@ class ConversationService:
         
         return success
     
+    def migrate_legacy_conversations(self, batch_size: int = 500) -> int:
+        """
+        Convert every legacy whole-document conversation in Redis to the append-only layout.
+        
+        Conversations are also converted lazily on first read; this drains the
+        rest ahead of time (e.g. right after a deploy) using SCAN, not KEYS, and
+        then rebuilds the statistics counters from every stored conversation.
+        
+        Returns:
+            Number of conversations migrated
+        """
+        if not self._check_redis_health():
+            return 0
+        
+        def redis_operation(client):
+            migrated = 0
+            for key in client.scan_iter(match=self._get_conversation_key("*"), count=batch_size):
+                key = key.decode('utf-8') if isinstance(key, bytes) else key
+                if self._migrate_legacy_conversation(client, key.split(":", 1)[1]):
+                    migrated += 1
+            return migrated
+        
+        migrated = self.redis_manager.execute_with_fallback(
+            redis_operation, lambda: 0, "migrate_legacy_conversations", use_retry=False
+        )
+        logger.info(f"Migrated {migrated} legacy conversation documents")
+        self.rebuild_statistics(batch_size)
+        return migrated
+    
+    def rebuild_statistics(self, batch_size: int = 500) -> Optional[int]:
+        """
+        Recount users and messages from the stored conversations with SCAN.
+        
+        A management step, never run on startup: run it once after deploying
+        the counters onto existing data, or to correct them, e.g. after
+        restoring Redis from a backup.
+        
+        Returns:
+            Number of users counted, or None without Redis or if another
+            process is rebuilding
+        """
+        if not self._check_redis_health():
+            return None
+        
+        users = self.redis_manager.execute_with_fallback(
+            lambda client: self.statistics.rebuild(client, self._get_metadata_key("*"), batch_size),
+            lambda: None, "rebuild_conversation_stats", use_retry=False
+        )
+        self.statistics.invalidate()
+        return users
+    
+    def _get_local_conversation(self, user_id: str) -> Dict:
+        """Get the in-memory conversation, creating it if needed."""
+        conversation = self.conversations.get(user_id)
+        if conversation is None:
+            with self._lock:
+                conversation = self.conversations.get(user_id)
+                if conversation is None:
+                    conversation = {
+                        "messages": [],
+                        "created_at": datetime.now(),
+                        "last_activity": datetime.now(),
+                        "last_response_id": None
+                    }
+                    self.conversations[user_id] = conversation
+                    logger.info(f"Created new conversation for user {user_id}")
+        return conversation
+    
     def _get_conversation(self, user_id: str) -> Dict:
         """Get conversation with Redis fallback to in-memory."""
         self._stats['total_operations'] += 1
@@ -258,82 +572,126 @@ class ConversationService:
             redis_conversation = self._load_from_redis(user_id)
             if redis_conversation is not None:
                 # Update in-memory cache for hybrid access
-                self.conversations[user_id] = redis_conversation
+                with self._lock:
+                    self.conversations[user_id] = redis_conversation
                 return redis_conversation
         
         # Fall back to in-memory storage
-        if user_id not in self.conversations:
-            # Create new conversation
-            conversation = {
-                "messages": [],
-                "created_at": datetime.now(),
-                "last_activity": datetime.now(),
-                "last_response_id": None
-            }
-            self.conversations[user_id] = conversation
-            
-            # Try to save to Redis if available
-            if self._redis_available:
-                self._save_to_redis(user_id, conversation)
-                
-            logger.info(f"Created new conversation for user {user_id}")
-        
-        return self.conversations[user_id]
+        return self._get_local_conversation(user_id)
     
-    def _update_conversation(self, user_id: str, conversation: Dict):
-        """Update conversation in both storage backends."""
-        # Update in-memory storage
-        self.conversations[user_id] = conversation
+    def _append_locally(self, conversation: Dict, message: Dict):
+        """Append a message to an in-memory conversation, keeping its counters in step."""
+        # Absolute message count survives trimming; it anchors the context summary
+        conversation["total_messages"] = conversation.get("total_messages", len(conversation["messages"])) + 1
+        if "token_total" not in conversation:
+            conversation["token_total"] = self._sum_message_tokens(conversation["messages"])
+        conversation["messages"].append(message)
+        conversation["token_total"] += message["tokens"]
+        conversation["lifetime_tokens"] = conversation.get("lifetime_tokens", 0) + message["tokens"]
+        # Rolling digest of the whole conversation, advanced without re-reading history
+        conversation["context_digest"] = advance_context_digest(
+            conversation.get("context_digest", EMPTY_CONTEXT_DIGEST),
+            conversation["total_messages"] - 1, message["role"], message["content"]
+        )
+        conversation["last_activity"] = message["timestamp"]
         
-        # Try to save to Redis
-        if self._redis_available:
-            self._save_to_redis(user_id, conversation)
+        # Trim old messages if necessary
+        if len(conversation["messages"]) > self.max_messages_per_user:
+            # Keep the most recent messages
+            dropped = conversation["messages"][:-self.max_messages_per_user]
+            conversation["messages"] = conversation["messages"][-self.max_messages_per_user:]
+            conversation["token_total"] -= self._sum_message_tokens(dropped)
     
     def add_message(self, user_id: str, role: str, content: str, message_type: str = "text", metadata: dict = None):
         """Add a message to user's conversation history with optional metadata"""
-        with self._lock:
+        with self._user_lock(user_id):
             try:
-                # Get conversation with Redis fallback
-                conversation = self._get_conversation(user_id)
-                
-                # Add message with optional metadata
-                message = {
-                    "role": role,  # "user" or "assistant"
-                    "content": content,
-                    "message_type": message_type,  # "text", "image", "file", "mixed"
-                    "metadata": metadata or {},
-                    "timestamp": datetime.now()
-                }
-                
-                conversation["messages"].append(message)
-                conversation["last_activity"] = datetime.now()
-                
-                # Trim old messages if necessary
-                if len(conversation["messages"]) > self.max_messages_per_user:
-                    # Keep the most recent messages
-                    conversation["messages"] = conversation["messages"][-self.max_messages_per_user:]
-                    logger.debug(f"Trimmed conversation history for user {user_id}")
+                # Add message with optional metadata; tokens are counted once, here
+                message = StoredMessage(
+                    role=role,  # "user" or "assistant"
+                    content=content,
+                    message_type=message_type,  # "text", "image", "file", "mixed"
+                    metadata=metadata,
+                    tokens=count_message_tokens({"content": content})
+                )
+                self._stats['total_operations'] += 1
                 
-                # Update conversation in both storage backends
-                self._update_conversation(user_id, conversation)
+                # Redis gets an append, never a rewrite of the history; the in-memory
+                # copy is kept in step when present and is the store during fallback
+                stored_in_redis = self._redis_available and self._append_to_redis(user_id, message)
+                conversation = self.conversations.get(user_id)
+                if conversation is None and not stored_in_redis:
+                    conversation = self._get_local_conversation(user_id)
+                if conversation is not None:
+                    self._append_locally(conversation, message)
+                if not stored_in_redis:
+                    self._record_local_activity(user_id, message["timestamp"])
                 
                 # Global conversation limit management (only for in-memory)
                 self._manage_global_limits()
                 
-                logger.debug(f"Added {message_type} {role} message for user {user_id} (total: {len(conversation['messages'])})")
+                logger.debug(f"Added {message_type} {role} message for user {user_id}")
                 
             except Exception as e:
                 logger.error(f"Error adding message for user {user_id}: {str(e)}")
                 # Lock is automatically released by the context manager even on exception
     
+    @classmethod
+    def _stored_message_tokens(cls, raw) -> int:
+        """Token count of one entry from the Redis message list (0 if it cannot be decoded)"""
+        try:
+            return count_message_tokens(cls._decode_message(raw))
+        except ValueError:
+            return 0
+    
+    @staticmethod
+    def _sum_message_tokens(messages: List[Dict]) -> int:
+        """Sum stored per-message token counts (older messages are counted on demand)"""
+        return sum(count_message_tokens(msg) for msg in messages)
+    
+    def get_token_usage(self, user_id: str) -> Dict[str, int]:
+        """
+        Get a user's running token totals in O(1) from the stored counters.
+        
+        Returns:
+            Dict with ``stored_tokens`` (messages currently kept), ``lifetime_tokens``
+            (every message ever added) and ``message_count``
+        """
+        with self._user_lock(user_id):
+            try:
+                state = self._get_conversation_state(user_id, ["token_total", "lifetime_tokens"])
+                stored_tokens = int(state["token_total"] or 0)
+                lifetime_tokens = state["lifetime_tokens"]
+                
+                return {
+                    "stored_tokens": stored_tokens,
+                    "lifetime_tokens": stored_tokens if lifetime_tokens is None else int(lifetime_tokens),
+                    "message_count": state["stored_messages"]
+                }
+                
+            except Exception as e:
+                logger.error(f"Error getting token usage for user {user_id}: {str(e)}")
+                return {"stored_tokens": 0, "lifetime_tokens": 0, "message_count": 0}
+    
+    def get_context_digest(self, user_id: str) -> str:
+        """Get the rolling digest of a user's conversation for cache keys"""
+        with self._user_lock(user_id):
+            try:
+                digest = self._get_conversation_state(user_id, ["context_digest"])["context_digest"]
+                return format_context_digest(EMPTY_CONTEXT_DIGEST if digest is None else int(digest))
+                
+            except Exception as e:
+                logger.error(f"Error getting context digest for user {user_id}: {str(e)}")
+                return ""
+    
     def get_last_response_id(self, user_id: str) -> Optional[str]:
         """Get the last response ID for Responses API conversation continuity"""
-        with self._lock:
+        with self._user_lock(user_id):
             try:
-                conversation = self._get_conversation(user_id)
-                if not conversation["messages"]:  # Empty conversation
+                state = self._get_conversation_state(user_id, ["last_response_id"])
+                if not state["stored_messages"]:  # Empty conversation
                     return None
-                return conversation.get("last_response_id")
+                return state["last_response_id"] or None
                 
             except Exception as e:
                 logger.error(f"Error getting last response ID for user {user_id}: {str(e)}")
@@ -341,17 +699,20 @@ class ConversationService:
     
     def set_last_response_id(self, user_id: str, response_id: str):
         """Set the last response ID for Responses API conversation continuity"""
-        with self._lock:
+        with self._user_lock(user_id):
             try:
-                # Get conversation with Redis fallback
-                conversation = self._get_conversation(user_id)
+                now = datetime.now()
+                stored_in_redis = self._redis_available and self._update_redis_metadata(
+                    user_id, {"last_response_id": response_id, "last_activity": now.isoformat()}
+                )
+                conversation = self.conversations.get(user_id)
+                if conversation is None and not stored_in_redis:
+                    conversation = self._get_local_conversation(user_id)
                 
                 # Update the response ID and last activity
-                conversation["last_response_id"] = response_id
-                conversation["last_activity"] = datetime.now()
-                
-                # Update conversation in both storage backends
-                self._update_conversation(user_id, conversation)
+                if conversation is not None:
+                    conversation["last_response_id"] = response_id
+                    conversation["last_activity"] = now
                 
                 logger.debug(f"Set last_response_id for user {user_id}: {response_id}")
                 
@@ -361,7 +722,7 @@ class ConversationService:
     
     def get_conversation_history(self, user_id: str) -> List[Dict]:
         """Get conversation history for a user (legacy support - less needed with Responses API)"""
-        with self._lock:
+        with self._user_lock(user_id):
             try:
                 conversation = self._get_conversation(user_id)
                 
@@ -379,9 +740,52 @@ class ConversationService:
                 logger.error(f"Error getting conversation history for user {user_id}: {str(e)}")
                 return []
     
+    def get_context_state(self, user_id: str) -> Dict[str, Any]:
+        """
+        Get history plus rolling-summary state for building a token-budgeted context.
+        
+        Returns:
+            Dict with ``messages`` (role/content/tokens), ``first_index`` (absolute index
+            of the first stored message) and ``summary`` (or None)
+        """
+        with self._user_lock(user_id):
+            try:
+                conversation = self._get_conversation(user_id)
+                messages = [
+                    {"role": msg["role"], "content": msg["content"], "tokens": count_message_tokens(msg)}
+                    for msg in conversation["messages"]
+                ]
+                total = conversation.get("total_messages", len(messages))
+                
+                return {
+                    "messages": messages,
+                    "first_index": total - len(messages),
+                    "summary": conversation.get("context_summary")
+                }
+                
+            except Exception as e:
+                logger.error(f"Error getting context state for user {user_id}: {str(e)}")
+                return {"messages": [], "first_index": 0, "summary": None}
+    
+    def set_context_summary(self, user_id: str, summary: Dict[str, Any]):
+        """Cache the rolling context summary alongside the conversation"""
+        with self._user_lock(user_id):
+            try:
+                stored_in_redis = self._redis_available and self._update_redis_metadata(
+                    user_id, {"context_summary": json.dumps(summary)}
+                )
+                conversation = self.conversations.get(user_id)
+                if conversation is None and not stored_in_redis:
+                    conversation = self._get_local_conversation(user_id)
+                if conversation is not None:
+                    conversation["context_summary"] = summary
+                
+            except Exception as e:
+                logger.error(f"Error setting context summary for user {user_id}: {str(e)}")
+    
     def get_conversation_stats(self, user_id: str) -> Dict:
         """Get conversation statistics for a user"""
-        with self._lock:
+        with self._user_lock(user_id):
             try:
                 # Try to get from Redis first, then fall back to in-memory
                 conversation = None
@@ -427,7 +831,7 @@ class ConversationService:
     
     def clear_conversation(self, user_id: str) -> bool:
         """Clear conversation history for a user"""
-        with self._lock:
+        with self._user_lock(user_id):
             try:
                 cleared = False
                 
@@ -438,9 +842,9 @@ class ConversationService:
                         cleared = True
                 
                 # Delete from in-memory storage
-                if user_id in self.conversations:
-                    del self.conversations[user_id]
-                    cleared = True
+                with self._lock:
+                    if self.conversations.pop(user_id, None) is not None:
+                        cleared = True
                 
                 if cleared:
                     logger.info(f"Cleared conversation for user {user_id}")
@@ -480,6 +884,104 @@ class ConversationService:
                     "error": str(e)
                 }
     
+    def _record_local_activity(self, user_id: str, timestamp: datetime):
+        """Advance the local message and daily active user counters (fallback mode)."""
+        day = timestamp.date()
+        with self._lock:
+            self._local_message_total += 1
+            if day != self._local_active_day:
+                self._local_active_day = day
+                self._local_active_today = set()
+            self._local_active_today.add(user_id)
+    
+    def _get_local_counters(self) -> Dict[str, int]:
+        """Counters of the in-memory store (bounded by max_total_conversations)."""
+        active_since = datetime.now() - timedelta(seconds=self.statistics.active_window_seconds)
+        with self._lock:
+            return {
+                "total_users": len(self.conversations),
+                "active_users": sum(
+                    1 for conv in self.conversations.values()
+                    if conv["last_activity"] >= active_since
+                ),
+                "active_users_today": len(self._local_active_today)
+                if self._local_active_day == datetime.now().date() else 0,
+                "total_messages": self._local_message_total
+            }
+    
+    def get_stats_snapshot(self, max_age: float = None) -> Dict:
+        """
+        Get user and message totals without walking conversations or the Redis keyspace.
+        
+        Served from a snapshot cached for a few seconds; Redis counters when Redis
+        is available, local counters otherwise.
+        
+        Returns:
+            Dict with total_users, active_users (last hour), active_users_today,
+            total_messages, storage_backend, stale and timestamp
+        """
+        def load():
+            if self._check_redis_health():
+                counters = self.redis_manager.execute_with_fallback(
+                    self.statistics.read, lambda: None, "conversation_stats", use_retry=False
+                )
+                if counters is not None:
+                    return {**counters, "storage_backend": "redis"}
+            return {**self._get_local_counters(), "storage_backend": "in_memory"}
+        
+        return self.statistics.snapshot(load, max_age)
+    
+    def list_conversations(self, cursor: int = 0, count: int = 100) -> Dict:
+        """
+        List one page of conversations.
+        
+        Redis conversations are listed with SCAN (pages are approximately ``count``
+        long); in-memory ones by offset. Neither blocks on the full set.
+        
+        Returns:
+            Dict with ``conversations`` (user_id, message_count, last_activity) and
+            ``next_cursor`` (0 once the listing is complete)
+        """
+        if self._check_redis_health():
+            def redis_operation(client):
+                next_cursor, keys = scan_page(client, self._get_metadata_key("*"), cursor, count)
+                user_ids = [key.split(":", 1)[1] for key in keys]
+                pipe = client.pipeline(transaction=False)
+                for user_id in user_ids:
+                    pipe.llen(self._get_messages_key(user_id))
+                    pipe.hget(self._get_metadata_key(user_id), "last_activity")
+                results = pipe.execute() if user_ids else []
+                
+                conversations = []
+                for i, user_id in enumerate(user_ids):
+                    last_activity = results[2 * i + 1]
+                    conversations.append({
+                        "user_id": user_id,
+                        "message_count": int(results[2 * i]),
+                        "last_activity": last_activity.decode('utf-8')
+                        if isinstance(last_activity, bytes) else last_activity or "Unknown"
+                    })
+                return {"conversations": conversations, "next_cursor": next_cursor}
+            
+            page = self.redis_manager.execute_with_fallback(
+                redis_operation, lambda: None, "list_conversations", use_retry=False
+            )
+            if page is not None:
+                return page
+        
+        with self._lock:
+            user_ids = list(self.conversations)[cursor:cursor + count]
+            conversations = [
+                {
+                    "user_id": user_id,
+                    "message_count": len(self.conversations[user_id]["messages"]),
+                    "last_activity": self.conversations[user_id]["last_activity"].isoformat()
+                }
+                for user_id in user_ids
+            ]
+            next_cursor = cursor + count if cursor + count < len(self.conversations) else 0
+        return {"conversations": conversations, "next_cursor": next_cursor}
+    
     def _get_in_memory_stats(self) -> Dict:
         """Get statistics for in-memory conversations."""
         total_messages = sum(
@@ -504,64 +1006,112 @@ class ConversationService:
     
     def _manage_global_limits(self):
         """Manage global conversation limits for in-memory storage (Redis handles its own TTL)"""
-        # Note: This method is called from add_message which already holds the lock
-        # Using RLock allows re-entrant locking from the same thread
+        # Note: This method is called from add_message which already holds the user's lock,
+        # so other users' stripe locks are only tried: waiting for one could deadlock with
+        # a writer on that stripe, and a busy user is skipped for the next oldest
         # Only apply to in-memory storage since Redis has TTL-based expiration
-        if len(self.conversations) > self.max_total_conversations:
+        if len(self.conversations) <= self.max_total_conversations:
+            return
+        with self._lock:
             # Remove oldest conversations (by last activity)
             conversations_by_activity = [
                 (user_id, conv["last_activity"])
                 for user_id, conv in self.conversations.items()
             ]
-            
-            # Sort by last activity (oldest first)
-            conversations_by_activity.sort(key=lambda x: x[1])
-            
-            # Remove oldest 10% of conversations
-            num_to_remove = max(1, len(conversations_by_activity) // 10)
-            
-            for i in range(num_to_remove):
-                user_id_to_remove = conversations_by_activity[i][0]
-                
-                # Remove from both in-memory and Redis if available
-                del self.conversations[user_id_to_remove]
-                if self._redis_available:
-                    self._delete_from_redis(user_id_to_remove)
-                
+        
+        # Sort by last activity (oldest first)
+        conversations_by_activity.sort(key=lambda x: x[1])
+        
+        # Remove oldest 10% of conversations
+        num_to_remove = max(1, len(conversations_by_activity) // 10)
+        removed = 0
+        
+        for user_id_to_remove, _ in conversations_by_activity:
+            if removed >= num_to_remove:
+                break
+            # Remove from both in-memory and Redis if available
+            if self._remove_conversation(user_id_to_remove, blocking=False):
+                removed += 1
                 logger.info(f"Removed old conversation for user {user_id_to_remove} (global limit management)")
     
+    def _remove_conversation(self, user_id: str, should_remove: Optional[Callable[[Dict], bool]] = None,
+                             blocking: bool = True) -> bool:
+        """
+        Remove one in-memory conversation, and its Redis copy, under the user's stripe lock.
+        
+        Locks are taken in the order add_message takes them (the user's stripe, then the
+        global lock), so a cleanup never races a write to the same conversation.
+        
+        Args:
+            user_id: User whose conversation is removed
+            should_remove: Re-checked under the locks; the conversation is kept if it returns False
+            blocking: Wait for the stripe lock; if False, a busy user is skipped
+            
+        Returns:
+            True if the conversation was removed
+        """
+        user_lock = self._user_lock(user_id)
+        if not user_lock.acquire(blocking=blocking):
+            return False
+        try:
+            with self._lock:
+                conv = self.conversations.get(user_id)
+                if conv is None or (should_remove is not None and not should_remove(conv)):
+                    return False
+                del self.conversations[user_id]
+            if self._redis_available:
+                self._delete_from_redis(user_id)
+            return True
+        finally:
+            user_lock.release()
+    
+    def _trim_conversation(self, user_id: str, keep: int) -> int:
+        """
+        Trim one in-memory conversation to its last ``keep`` messages under the user's stripe lock.
+        
+        Returns:
+            Number of messages removed
+        """
+        with self._user_lock(user_id):
+            conv = self.conversations.get(user_id)
+            if conv is None or len(conv["messages"]) <= keep:
+                return 0
+            removed = len(conv["messages"]) - keep
+            conv["messages"] = conv["messages"][-keep:]
+            conv["token_total"] = self._sum_message_tokens(conv["messages"])
+            return removed
+    
+    def _users_matching(self, predicate: Callable[[Dict], bool]) -> List[str]:
+        """Snapshot of the users whose in-memory conversation matches ``predicate``."""
+        with self._lock:
+            return [user_id for user_id, conv in self.conversations.items() if predicate(conv)]
+    
     def cleanup_old_conversations(self, max_age_hours: int = None):
         """Clean up conversations older than specified hours (for maintenance)"""
-        with self._lock:
-            try:
-                if max_age_hours is None:
-                    max_age_hours = self.conversation_ttl_hours
-                
-                current_time = datetime.now()
-                users_to_remove = []
-                
-                # First pass: identify conversations to remove from in-memory storage
-                for user_id, conv in self.conversations.items():
-                    age_hours = (current_time - conv["last_activity"]).total_seconds() / 3600
-                    if age_hours > max_age_hours:
-                        users_to_remove.append((user_id, age_hours))
-                
-                # Second pass: remove identified conversations atomically
-                for user_id, age_hours in users_to_remove:
-                    # Remove from in-memory
-                    del self.conversations[user_id]
-                    
-                    # Remove from Redis if available
-                    if self._redis_available:
-                        self._delete_from_redis(user_id)
-                    
-                    logger.info(f"Cleaned up old conversation for user {user_id} (age: {age_hours:.1f} hours)")
-                
-                return len(users_to_remove)
-                
-            except Exception as e:
-                logger.error(f"Error during conversation cleanup: {str(e)}")
-                return 0
+        try:
+            if max_age_hours is None:
+                max_age_hours = self.conversation_ttl_hours
+            
+            current_time = datetime.now()
+            
+            def is_old(conv: Dict) -> bool:
+                return (current_time - conv["last_activity"]).total_seconds() / 3600 > max_age_hours
+            
+            # First pass: identify conversations to remove from in-memory storage
+            users_to_remove = self._users_matching(is_old)
+            
+            # Second pass: remove each under its user's lock if it is still old
+            removed = 0
+            for user_id in users_to_remove:
+                if self._remove_conversation(user_id, is_old):
+                    removed += 1
+                    logger.info(f"Cleaned up old conversation for user {user_id}")
+            
+            return removed
+            
+        except Exception as e:
+            logger.error(f"Error during conversation cleanup: {str(e)}")
+            return 0
     
     def get_health_status(self) -> Dict[str, Any]:
         """Get comprehensive health status including Redis connectivity."""
@@ -651,115 +1201,87 @@ class ConversationService:
     
     def _perform_light_memory_cleanup(self, memory_stats: MemoryStats):
         """Perform light memory cleanup by removing old and inactive conversations."""
-        with self._lock:
-            try:
-                cleanup_count = 0
-                cutoff_time = datetime.now() - timedelta(hours=self.conversation_ttl_hours // 2)
-                users_to_remove = []
-                
-                # Identify old conversations for removal
-                for user_id, conv in self.conversations.items():
-                    if conv["last_activity"] < cutoff_time and len(conv["messages"]) < 5:
-                        users_to_remove.append(user_id)
-                
-                # Remove identified conversations
-                for user_id in users_to_remove:
-                    del self.conversations[user_id]
-                    if self._redis_available:
-                        self._delete_from_redis(user_id)
+        try:
+            cleanup_count = 0
+            cutoff_time = datetime.now() - timedelta(hours=self.conversation_ttl_hours // 2)
+            
+            def is_stale(conv: Dict) -> bool:
+                return conv["last_activity"] < cutoff_time and len(conv["messages"]) < 5
+            
+            # Identify old conversations for removal, then remove each under its user's lock
+            for user_id in self._users_matching(is_stale):
+                if self._remove_conversation(user_id, is_stale):
                     cleanup_count += 1
-                
-                logger.info(f"Light cleanup: removed {cleanup_count} old conversations")
-                
-            except Exception as e:
-                logger.error(f"Error during light memory cleanup: {e}")
+            
+            logger.info(f"Light cleanup: removed {cleanup_count} old conversations")
+            
+        except Exception as e:
+            logger.error(f"Error during light memory cleanup: {e}")
     
     def _perform_aggressive_memory_cleanup(self, memory_stats: MemoryStats):
         """Perform aggressive memory cleanup by removing conversations and trimming messages."""
-        with self._lock:
-            try:
-                cleanup_count = 0
-                
-                # First, perform light cleanup
-                self._perform_light_memory_cleanup(memory_stats)
-                
-                # Trim messages in remaining conversations
-                cutoff_time = datetime.now() - timedelta(hours=self.conversation_ttl_hours // 4)
-                
-                for user_id, conv in self.conversations.items():
-                    original_count = len(conv["messages"])
-                    
-                    # More aggressive message trimming
-                    if original_count > 20:
-                        conv["messages"] = conv["messages"][-20:]  # Keep only last 20
-                        
-                        # Update in Redis if available
-                        if self._redis_available:
-                            self._save_to_redis(user_id, conv)
-                        
-                        cleanup_count += original_count - len(conv["messages"])
-                
-                # Remove conversations with no recent activity
-                users_to_remove = []
-                for user_id, conv in self.conversations.items():
-                    if conv["last_activity"] < cutoff_time:
-                        users_to_remove.append(user_id)
-                
-                for user_id in users_to_remove:
-                    del self.conversations[user_id]
-                    if self._redis_available:
-                        self._delete_from_redis(user_id)
+        try:
+            cleanup_count = 0
+            
+            # First, perform light cleanup
+            self._perform_light_memory_cleanup(memory_stats)
+            
+            # Trim messages in remaining conversations
+            cutoff_time = datetime.now() - timedelta(hours=self.conversation_ttl_hours // 4)
+            
+            # More aggressive message trimming: keep only the last 20
+            for user_id in self._users_matching(lambda conv: len(conv["messages"]) > 20):
+                cleanup_count += self._trim_conversation(user_id, 20)
+            
+            # Remove conversations with no recent activity
+            def is_inactive(conv: Dict) -> bool:
+                return conv["last_activity"] < cutoff_time
+            
+            for user_id in self._users_matching(is_inactive):
+                if self._remove_conversation(user_id, is_inactive):
                     cleanup_count += 1
-                
-                logger.warning(f"Aggressive cleanup: trimmed {cleanup_count} messages/conversations")
-                
-            except Exception as e:
-                logger.error(f"Error during aggressive memory cleanup: {e}")
+            
+            logger.warning(f"Aggressive cleanup: trimmed {cleanup_count} messages/conversations")
+            
+        except Exception as e:
+            logger.error(f"Error during aggressive memory cleanup: {e}")
     
     def _perform_emergency_memory_cleanup(self, memory_stats: MemoryStats):
         """Perform emergency memory cleanup by drastically reducing conversation data."""
-        with self._lock:
-            try:
-                # First, perform aggressive cleanup
-                self._perform_aggressive_memory_cleanup(memory_stats)
-                
-                # Emergency measures: keep only the most recent and active conversations
-                if len(self.conversations) > 50:
-                    # Sort conversations by last activity and message count
+        try:
+            # First, perform aggressive cleanup
+            self._perform_aggressive_memory_cleanup(memory_stats)
+            
+            # Emergency measures: keep only the most recent and active conversations
+            if len(self.conversations) > 50:
+                # Sort conversations by last activity and message count
+                with self._lock:
                     conversations_by_priority = [
-                        (user_id, conv, conv["last_activity"], len(conv["messages"]))
+                        (user_id, conv["last_activity"], len(conv["messages"]))
                         for user_id, conv in self.conversations.items()
                     ]
-                    
-                    # Sort by activity (recent first), then by message count (more messages first)
-                    conversations_by_priority.sort(key=lambda x: (x[2], x[3]), reverse=True)
-                    
-                    # Keep only top 50 conversations
-                    conversations_to_keep = conversations_by_priority[:50]
-                    conversations_to_remove = conversations_by_priority[50:]
-                    
-                    # Remove excess conversations
-                    for user_id, conv, _, _ in conversations_to_remove:
-                        if user_id in self.conversations:
-                            del self.conversations[user_id]
-                            if self._redis_available:
-                                self._delete_from_redis(user_id)
-                    
-                    logger.critical(f"Emergency cleanup: removed {len(conversations_to_remove)} conversations, kept {len(conversations_to_keep)}")
                 
-                # Trim all remaining conversations to minimal messages
-                for user_id, conv in self.conversations.items():
-                    if len(conv["messages"]) > 5:
-                        conv["messages"] = conv["messages"][-5:]  # Keep only last 5 messages
-                        
-                        # Update in Redis if available
-                        if self._redis_available:
-                            self._save_to_redis(user_id, conv)
+                # Sort by activity (recent first), then by message count (more messages first)
+                conversations_by_priority.sort(key=lambda x: (x[1], x[2]), reverse=True)
                 
-                logger.critical("Emergency memory cleanup completed")
+                # Keep only top 50 conversations
+                conversations_to_keep = conversations_by_priority[:50]
+                conversations_to_remove = conversations_by_priority[50:]
                 
-            except Exception as e:
-                logger.critical(f"CRITICAL ERROR during emergency memory cleanup: {e}")
+                # Remove excess conversations
+                for user_id, _, _ in conversations_to_remove:
+                    self._remove_conversation(user_id)
+                
+                logger.critical(f"Emergency cleanup: removed {len(conversations_to_remove)} conversations, kept {len(conversations_to_keep)}")
+            
+            # Trim all remaining conversations to minimal messages (keep only last 5)
+            for user_id in self._users_matching(lambda conv: len(conv["messages"]) > 5):
+                self._trim_conversation(user_id, 5)
+            
+            logger.critical("Emergency memory cleanup completed")
+            
+        except Exception as e:
+            logger.critical(f"CRITICAL ERROR during emergency memory cleanup: {e}")
     
     def get_memory_usage_info(self) -> Dict[str, Any]:
         """Get detailed memory usage information for conversations."""
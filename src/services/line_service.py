@@ -10,9 +10,13 @@ from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError, LineBotApiError
 from linebot.models import (
     MessageEvent, TextMessage, ImageMessage, FileMessage, TextSendMessage,
-    PostbackEvent, FlexSendMessage
+    PostbackEvent, FlexSendMessage, FollowEvent, UnfollowEvent, JoinEvent,
+    LeaveEvent, BeaconEvent, UnknownEvent
 )
 from src.utils.connection_pool import OptimizedLineBotApi, connection_pool_manager
+from src.utils.event_deduplicator import WebhookEventDeduplicator
+from src.utils.partitioned_event_executor import PartitionedEventExecutor
+from src.utils.streaming_delivery import StreamingReplyDelivery
 from src.exceptions import (
     LineAPIException, ValidationException, AuthenticationException,
     NetworkException, TimeoutException, DataProcessingException,
@@ -21,8 +25,32 @@ from src.exceptions import (
 )
 from src.utils.error_handler import StructuredLogger, error_handler, retry_with_backoff
 
+# Optional faster JSON parser for webhook bodies
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = StructuredLogger(__name__)
 
+# Webhook event type -> SDK event class, used when parsing events ourselves
+WEBHOOK_EVENT_TYPES = {
+    'message': MessageEvent,
+    'postback': PostbackEvent,
+    'follow': FollowEvent,
+    'unfollow': UnfollowEvent,
+    'join': JoinEvent,
+    'leave': LeaveEvent,
+    'beacon': BeaconEvent
+}
+
+
+def _loads_webhook_body(body):
+    """Parse a webhook body (bytes or str) with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
 class LineService:
     """LINE Bot service for handling messages and webhook verification"""
     
@@ -39,6 +67,15 @@ class LineService:
         self.line_bot_api = self._create_optimized_line_bot_api(settings.LINE_CHANNEL_ACCESS_TOKEN)
         self.handler = WebhookHandler(settings.LINE_CHANNEL_SECRET)
         
+        # Idempotency layer so redelivered or retried events are processed once
+        self.event_deduplicator = self._create_event_deduplicator(settings)
+        
+        # Runs a webhook batch in parallel across users, in order per user
+        self.event_executor = PartitionedEventExecutor(
+            event_handler=lambda event: self.dispatch_event(event),
+            max_concurrency=getattr(settings, 'WEBHOOK_EVENT_CONCURRENCY', 8)
+        )
+        
         # Initialize connection metrics
         self.connection_metrics = {
             'webhook_requests': 0,
@@ -48,6 +85,17 @@ class LineService:
             'avg_response_time': 0.0
         }
         
+        # Progressive delivery of streamed AI responses (first chunk by reply,
+        # the rest by coalesced pushes)
+        self.streaming_replies_enabled = getattr(settings, 'LINE_STREAMING_REPLIES', False)
+        self.streaming_metrics = {
+            'streamed_responses': 0,
+            'avg_time_to_first_text': 0.0,
+            'avg_messages_per_response': 0.0,
+            'push_calls': 0,
+            'send_failures': 0
+        }
+        
         # Register message handlers
         @self.handler.add(MessageEvent, message=TextMessage)
         def handle_text_message(event):
@@ -101,6 +149,22 @@ class LineService:
         logger.info("Created optimized LINE Bot API client with connection pooling")
         return line_bot_api
     
+    def _create_event_deduplicator(self, settings) -> WebhookEventDeduplicator:
+        """Create the webhook event deduplicator, optionally backed by Redis."""
+        redis_manager = None
+        if getattr(settings, 'WEBHOOK_DEDUP_USE_REDIS', False):
+            try:
+                from src.utils.redis_manager import get_redis_manager
+                redis_manager = get_redis_manager()
+            except Exception as e:
+                logger.warning(f"Redis unavailable for webhook deduplication, using in-memory only: {e}")
+        
+        return WebhookEventDeduplicator(
+            ttl_seconds=getattr(settings, 'WEBHOOK_DEDUP_TTL_SECONDS', 86400),
+            max_entries=getattr(settings, 'WEBHOOK_DEDUP_MAX_ENTRIES', 50000),
+            redis_manager=redis_manager
+        )
+    
     def get_connection_metrics(self) -> dict:
         """Get LINE service connection metrics."""
         pool_metrics = connection_pool_manager.get_metrics()
@@ -112,12 +176,20 @@ class LineService:
             'service_metrics': self.connection_metrics,
             'line_connection_pools': line_pools,
             'total_line_pools': len(line_pools),
-            'pool_health': {k: v for k, v in pool_metrics.get('health', {}).items() if 'line' in k}
+            'pool_health': {k: v for k, v in pool_metrics.get('health', {}).items() if 'line' in k},
+            'event_deduplication': self.event_deduplicator.get_stats(),
+            'event_executor': self.event_executor.get_metrics(),
+            'streaming_delivery': self.streaming_metrics.copy()
         }
     
     @error_handler(reraise=False, default_return={'success': False, 'error': 'Webhook processing failed'})
     def handle_webhook(self, signature, body):
-        """Handle incoming webhook from LINE with comprehensive error handling and connection pooling."""
+        """
+        Handle incoming webhook from LINE with comprehensive error handling and connection pooling.
+        
+        The body may be the raw request bytes; it is verified and parsed once and
+        the resulting events are dispatched directly to the handlers.
+        """
         correlation_id = create_correlation_id()
         start_time = time.time()
         
@@ -127,37 +199,18 @@ class LineService:
             try:
                 # Track webhook request
                 self.connection_metrics['webhook_requests'] += 1
-                # Validate input parameters
-                if not signature:
-                    raise ValidationException(
-                        message="Missing webhook signature",
-                        field="signature",
-                        correlation_id=correlation_id,
-                        user_message="Invalid request signature"
-                    )
-                
-                if not body:
-                    raise ValidationException(
-                        message="Missing webhook body",
-                        field="body", 
-                        correlation_id=correlation_id,
-                        user_message="Invalid request body"
-                    )
-                
-                # Verify webhook signature
-                if not self._verify_signature(signature, body):
-                    raise AuthenticationException(
-                        message="Webhook signature verification failed",
-                        service="LINE_WEBHOOK",
-                        correlation_id=correlation_id,
-                        context={'signature_provided': bool(signature)}
-                    )
+                # Validate input parameters and verify webhook signature
+                self._validate_webhook_request(signature, body, correlation_id)
                 
                 # Handle the webhook event with timeout protection and connection pooling
                 try:
+                    # Parse once; the signature was verified above over the raw body
+                    events = self._parse_events(body)
+                    
                     # Use connection pool manager for webhook handling
                     def process_webhook():
-                        self.handler.handle(body, signature)
+                        # Parallel across users, strictly ordered per user
+                        self.event_executor.execute_batch(events)
                         return {'success': True, 'correlation_id': correlation_id}
                     
                     result = connection_pool_manager.execute_with_retry(
@@ -226,24 +279,116 @@ class LineService:
                     original_exception=e
                 )
     
+    def parse_webhook_events(self, signature, body):
+        """
+        Verify a webhook request and parse its events without dispatching them.
+
+        Used by the asynchronous ingress, which acknowledges LINE as soon as the
+        events are queued and dispatches them later via ``dispatch_event``.
+
+        Returns:
+            list: Parsed LINE SDK event objects
+        """
+        self._validate_webhook_request(signature, body)
+
+        self.connection_metrics['webhook_requests'] += 1
+        return self._parse_events(body)
+
+    def _validate_webhook_request(self, signature, body, correlation_id=None):
+        """Reject a webhook request with a missing signature or body, or an invalid signature."""
+        if not signature:
+            raise ValidationException(
+                message="Missing webhook signature",
+                field="signature",
+                correlation_id=correlation_id,
+                user_message="Invalid request signature"
+            )
+        
+        if not body:
+            raise ValidationException(
+                message="Missing webhook body",
+                field="body", 
+                correlation_id=correlation_id,
+                user_message="Invalid request body"
+            )
+        
+        if not self._verify_signature(signature, body):
+            raise AuthenticationException(
+                message="Webhook signature verification failed",
+                service="LINE_WEBHOOK",
+                correlation_id=correlation_id,
+                context={'signature_provided': bool(signature)}
+            )
+
+    def _parse_events(self, body):
+        """Parse a verified webhook body into LINE SDK event objects in a single pass."""
+        try:
+            payload = _loads_webhook_body(body)
+        except (TypeError, ValueError) as e:
+            raise ValidationException(
+                message=f"Invalid webhook body: {str(e)}",
+                field="body",
+                user_message="Invalid request body"
+            )
+
+        events = []
+        for event_data in payload.get('events', []):
+            event_class = WEBHOOK_EVENT_TYPES.get(event_data.get('type'), UnknownEvent)
+            events.append(event_class.new_from_json_dict(event_data))
+
+        return events
+
+    def dispatch_event(self, event):
+        """
+        Route a single parsed webhook event to its handler.
+
+        Mirrors the routing of the registered ``WebhookHandler`` callbacks so
+        events can be processed outside of ``WebhookHandler.handle``. Events
+        whose ``webhookEventId`` was already claimed (LINE redelivery or a
+        retried webhook) are skipped before any downstream work.
+
+        Returns:
+            bool: True if a handler was found and run for the event
+        """
+        if not self.event_deduplicator.claim_event(event):
+            return False
+        
+        if isinstance(event, MessageEvent):
+            if isinstance(event.message, TextMessage):
+                self._handle_text_message(event)
+            elif isinstance(event.message, ImageMessage):
+                self._handle_image_message(event)
+            elif isinstance(event.message, FileMessage):
+                self._handle_file_message(event)
+            else:
+                logger.info(f"No handler for message type: {type(event.message).__name__}")
+                return False
+        elif isinstance(event, PostbackEvent):
+            self._handle_postback_event(event)
+        else:
+            logger.info(f"No handler for event type: {type(event).__name__}")
+            return False
+
+        return True
+
     def _verify_signature(self, signature, body):
-        """Verify LINE webhook signature"""
+        """Verify LINE webhook signature over the raw request body (bytes or str)"""
         if not signature:
             return False
         
         try:
-            # Create signature hash
+            # HMAC over the original buffer; only text bodies need encoding
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+            
             hash_digest = hmac.new(
                 self.settings.LINE_CHANNEL_SECRET.encode('utf-8'),
-                body.encode('utf-8'),
+                body,
                 hashlib.sha256
             ).digest()
             
-            # Encode to base64
-            expected_signature = base64.b64encode(hash_digest).decode('utf-8')
-            
-            # Compare signatures
-            return hmac.compare_digest(signature, expected_signature)
+            # Compare signatures as bytes to avoid decoding the expected value
+            return hmac.compare_digest(signature.encode('utf-8'), base64.b64encode(hash_digest))
             
         except Exception as e:
             logger.error(f"Signature verification error: {str(e)}")
@@ -257,6 +402,10 @@ class LineService:
             
             logger.info(f"Received message from user {user_id}: {user_message}")
             
+            if self.streaming_replies_enabled:
+                self._handle_text_message_streaming(event, user_id, user_message)
+                return
+            
             # Get AI response (single complete message, no streaming)
             ai_response = self.openai_service.get_response(user_id, user_message, use_streaming=False)
             
@@ -283,6 +432,56 @@ class LineService:
             except:
                 pass  # If we can't even send error message, just log and continue
 
+    def _handle_text_message_streaming(self, event, user_id, user_message):
+        """Stream the AI response: first sentence by reply token, the rest by coalesced pushes"""
+        delivery = self._create_streaming_delivery(user_id, event.reply_token)
+        
+        ai_response = self.openai_service.get_response(
+            user_id, user_message, use_streaming=True, chunk_callback=delivery.on_delta
+        )
+        
+        if ai_response['success']:
+            stats = delivery.finish(ai_response['message'])
+            self._record_streaming_delivery(stats)
+            logger.info(
+                f"Streamed response to user {user_id}: {len(ai_response['message'])} chars "
+                f"in {stats['messages_sent']} messages [{ai_response.get('tokens_used', 0)} tokens]",
+                extra_context={'time_to_first_text': stats['time_to_first_text']}
+            )
+        else:
+            # Goes out by reply, or by push if a partial answer already used the token
+            error_msg = "抱歉，我現在無法回應您的訊息。請稍後再試。\nSorry, I'm unable to respond to your message right now. Please try again later."
+            delivery.finish(error_msg)
+            logger.error(f"Failed to get streamed AI response: {ai_response.get('error')}")
+    
+    def _create_streaming_delivery(self, user_id, reply_token):
+        """Create a progressive delivery configured from settings"""
+        return StreamingReplyDelivery(
+            self.line_bot_api,
+            user_id,
+            reply_token,
+            first_chunk_min_chars=getattr(self.settings, 'LINE_STREAM_FIRST_CHUNK_MIN_CHARS', 40),
+            first_chunk_max_chars=getattr(self.settings, 'LINE_STREAM_FIRST_CHUNK_MAX_CHARS', 200),
+            max_chunk_chars=getattr(self.settings, 'LINE_STREAM_MAX_CHUNK_CHARS', 1000),
+            push_interval=getattr(self.settings, 'LINE_STREAM_PUSH_INTERVAL', 1.5),
+            max_push_calls=getattr(self.settings, 'LINE_STREAM_MAX_PUSH_CALLS', 3)
+        )
+    
+    def _record_streaming_delivery(self, stats):
+        """Fold one delivery's stats into the running streaming metrics"""
+        metrics = self.streaming_metrics
+        metrics['streamed_responses'] += 1
+        count = metrics['streamed_responses']
+        first_text = stats['time_to_first_text'] or 0.0
+        metrics['avg_time_to_first_text'] = (
+            (metrics['avg_time_to_first_text'] * (count - 1) + first_text) / count
+        )
+        metrics['avg_messages_per_response'] = (
+            (metrics['avg_messages_per_response'] * (count - 1) + stats['messages_sent']) / count
+        )
+        metrics['push_calls'] += stats['push_calls']
+        metrics['send_failures'] += stats['send_failures']
+
     def _handle_image_message(self, event):
         """Handle incoming image message from LINE user"""
         try:
@@ -302,8 +501,14 @@ class LineService:
             
             # Use context manager for automatic cleanup
             with ImageProcessor() as image_processor:
-                # Download and process the image
-                download_result = image_processor.download_image_from_line(self.line_bot_api, message_id)
+                # A redelivered message reuses its prepared payload without downloading again
+                base64_image = self.openai_service.cached_image_payload(message_id)
+                if base64_image is not None:
+                    logger.info(f"Reusing prepared image payload for message {message_id}")
+                    download_result = {'success': True}
+                else:
+                    # Download and process the image
+                    download_result = image_processor.download_image_from_line(self.line_bot_api, message_id)
                 
                 if not download_result or not download_result.get('success', False):
                     # Handle download/validation errors
@@ -324,16 +529,16 @@ class LineService:
                     self._send_message(event.reply_token, error_msg)
                     return
                 
-                # Preprocess image if needed
-                image_data = download_result.get('image_data', b'')
-                image_format = download_result.get('format', 'JPEG')
-                logger.info(f"Processing {image_format} image ({len(image_data)} bytes) for user {user_id[:8]}...")
-                
-                processed_image_data = image_processor.preprocess_image_if_needed(image_data)
-                
-                # Convert to base64 for OpenAI API
-                base64_image = image_processor.image_to_base64(processed_image_data, image_format)
-                logger.debug(f"Converted image to base64 format for OpenAI API")
+                if base64_image is None:
+                    image_data = download_result.get('image_data', b'')
+                    image_format = download_result.get('format', 'JPEG')
+                    logger.info(f"Processing {image_format} image ({len(image_data)} bytes) for user {user_id[:8]}...")
+                    
+                    # Preprocess and convert to base64 for OpenAI API (reused for identical images)
+                    base64_image = self.openai_service.prepare_image_payload(
+                        image_processor, image_data, image_format, message_id
+                    )
+                    logger.debug(f"Converted image to base64 format for OpenAI API")
                 
                 # Get accompanying text or default prompt
                 user_text = "What can you tell me about this image?"
@@ -1,13 +1,22 @@
+import asyncio
 import logging
 import time
-import hashlib
 import httpx
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
 from typing import Optional, Dict, Any
 from openai import AzureOpenAI
 from openai.types.chat import ChatCompletion
 from ..utils.prompt_manager import PromptManager
 from ..utils.cache_manager import get_cache_manager
 from ..utils.connection_pool import connection_pool_manager, ExponentialBackoff
+from ..utils.context_window import ContextWindowBuilder
+from ..utils.async_openai_client import AsyncOpenAIClientPool, AsyncResponseStream
+from ..utils.single_flight import SingleFlight, prompt_fingerprint
+from ..utils.rate_governor import RateLimitGovernor, parse_retry_after, request_priority
+from ..utils.request_hedger import HedgeCancelled, RequestHedger
+from ..utils.upload_cache import UploadCache, content_digest
+from ..utils.token_counter import count_message_tokens, count_tokens, MESSAGE_OVERHEAD_TOKENS
 from ..exceptions import (
     OpenAIAPIException, NetworkException, TimeoutException,
     RateLimitException, ValidationException, BaseBotException,
@@ -17,6 +26,40 @@ from ..utils.error_handler import StructuredLogger, error_handler, retry_with_ba
 
 logger = StructuredLogger(__name__)
 
+# Returned when the model produced no text; never reused from caches
+EMPTY_RESPONSE_MESSAGE = "I apologize, but I couldn't generate a response. Please try again."
+
+# Output cap of a request; batch jobs that ask for several items at once raise it
+DEFAULT_MAX_OUTPUT_TOKENS = 800
+_max_output_tokens: ContextVar[int] = ContextVar('max_output_tokens', default=DEFAULT_MAX_OUTPUT_TOKENS)
+
+
+@contextmanager
+def _output_token_limit(limit):
+    """Run the enclosed OpenAI calls with ``limit`` output tokens (the default when None)"""
+    token = _max_output_tokens.set(limit or DEFAULT_MAX_OUTPUT_TOKENS)
+    try:
+        yield
+    finally:
+        _max_output_tokens.reset(token)
+
+
+class StreamInterruptedError(Exception):
+    """A stream failed after some of its text reached the caller, so it is not restarted"""
+
+
+class _EmitTracker:
+    """Chunk callback that remembers whether any text has been emitted"""
+    
+    def __init__(self, chunk_callback):
+        self.chunk_callback = chunk_callback
+        self.emitted = False
+    
+    def __call__(self, chunk):
+        self.emitted = True
+        self.chunk_callback(chunk)
+
+
 class OpenAIService:
     """Azure OpenAI service with hybrid Responses API + Chat Completions support"""
     
@@ -35,6 +78,14 @@ class OpenAIService:
         # Try next generation v1 API first, fall back to standard if needed
         self.base_url = f"{settings.AZURE_OPENAI_ENDPOINT.rstrip('/')}/openai/v1/"
         
+        # Client-side requests/min and tokens/min governor shared by both clients;
+        # it adapts to the rate limit headers of every response
+        self.rate_governor = RateLimitGovernor(
+            requests_per_minute=getattr(settings, 'OPENAI_RATE_LIMIT_RPM', 0),
+            tokens_per_minute=getattr(settings, 'OPENAI_RATE_LIMIT_TPM', 0),
+            max_wait=getattr(settings, 'OPENAI_RATE_LIMIT_MAX_WAIT', 30.0)
+        )
+        
         # Initialize connection pool for Azure OpenAI
         self._setup_connection_pools()
         
@@ -79,6 +130,51 @@ class OpenAIService:
         self.enable_caching = True
         self.cache_ttl = 3600  # 1 hour default cache TTL
         
+        # Opt-in cross-user semantic cache for stateless intents (greetings, FAQ)
+        self.semantic_cache_enabled = getattr(settings, 'SEMANTIC_CACHE_ENABLED', False)
+        if self.semantic_cache_enabled:
+            self.cache_manager.enable_semantic_cache(
+                similarity_threshold=getattr(settings, 'SEMANTIC_CACHE_THRESHOLD', 0.8),
+                default_ttl=getattr(settings, 'SEMANTIC_CACHE_TTL', 86400),
+                max_entries=getattr(settings, 'SEMANTIC_CACHE_MAX_ENTRIES', 1000)
+            )
+        
+        # Token-budgeted context window for Chat Completions requests
+        self.context_builder = ContextWindowBuilder(
+            token_budget=self._get_context_token_budget(),
+            summary_max_tokens=getattr(settings, 'CONTEXT_SUMMARY_MAX_TOKENS', 300)
+        )
+        self.max_user_message_tokens = getattr(settings, 'MAX_USER_MESSAGE_TOKENS', 4000)
+        self._system_prompt_tokens = (None, 0)
+        self.context_metrics = {
+            'requests': 0,
+            'oversized_rejected': 0,
+            'prompt_tokens': 0,
+            'prompt_tokens_saved': 0,
+            'avg_prompt_tokens': 0.0,
+            'avg_prompt_tokens_saved': 0.0,
+            'summary_updates': 0
+        }
+        
+        # Single-flight coalescing of identical concurrent prompts
+        self.coalescing_enabled = getattr(settings, 'OPENAI_COALESCING_ENABLED', True)
+        self.coalesce_timeout = getattr(settings, 'OPENAI_COALESCE_TIMEOUT', 30.0)
+        self.single_flight = SingleFlight(timeout=self.coalesce_timeout)
+        
+        # Optional hedging: a slow Responses API request is duplicated to Chat Completions
+        self.hedging_enabled = getattr(settings, 'OPENAI_HEDGING_ENABLED', False)
+        self.request_hedger = RequestHedger(
+            percentile=getattr(settings, 'OPENAI_HEDGE_PERCENTILE', 95.0),
+            budget_percent=getattr(settings, 'OPENAI_HEDGE_BUDGET_PERCENT', 10.0),
+            min_samples=getattr(settings, 'OPENAI_HEDGE_MIN_SAMPLES', 20)
+        ) if self.hedging_enabled else None
+        
+        # Content-addressed cache: identical files reuse their file ID, identical images their payload
+        self.upload_cache = self._create_upload_cache() if getattr(settings, 'OPENAI_UPLOAD_CACHE_ENABLED', True) else None
+        
+        # Async client path; the shared pool is created lazily in the running event loop
+        self._async_pool = None
+        
         # Connection pool monitoring
         self.connection_metrics = {
             'total_requests': 0,
@@ -88,6 +184,30 @@ class OpenAIService:
             'connection_reuse_count': 0
         }
     
+    def _create_upload_cache(self) -> UploadCache:
+        """Upload cache scoped to this Azure OpenAI resource, optionally shared through Redis."""
+        redis_manager = None
+        if getattr(self.settings, 'OPENAI_UPLOAD_CACHE_USE_REDIS', False):
+            try:
+                from ..utils.redis_manager import get_redis_manager
+                redis_manager = get_redis_manager()
+            except Exception as e:
+                logger.warning(f"Redis unavailable for upload cache, using local cache only: {e}")
+        
+        return UploadCache(
+            namespace=self.settings.AZURE_OPENAI_ENDPOINT.split("://")[-1].rstrip('/'),
+            file_ttl_seconds=getattr(self.settings, 'OPENAI_FILE_CACHE_TTL', 30 * 86400),
+            payload_ttl_seconds=getattr(self.settings, 'OPENAI_IMAGE_CACHE_TTL', 3600),
+            max_memory_mb=getattr(self.settings, 'OPENAI_UPLOAD_CACHE_MAX_MB', 64.0),
+            redis_manager=redis_manager
+        )
+    
+    def _get_context_token_budget(self) -> int:
+        """Prompt token budget for the configured deployment (per-deployment override or default)."""
+        deployment = self.settings.AZURE_OPENAI_DEPLOYMENT_NAME
+        budgets = getattr(self.settings, 'CONTEXT_TOKEN_BUDGETS', None) or {}
+        return budgets.get(deployment, getattr(self.settings, 'CONTEXT_TOKEN_BUDGET', 4000))
+    
     def _setup_connection_pools(self):
         """Set up connection pools for Azure OpenAI API calls."""
         # Create dedicated session for Azure OpenAI primary endpoint
@@ -132,7 +252,8 @@ class OpenAIService:
                 pool=5.0
             ),
             http2=True,  # Enable HTTP/2 for better performance
-            follow_redirects=True
+            follow_redirects=True,
+            event_hooks={'response': [self.rate_governor.observe_response]}
         )
         
         # Create Azure OpenAI client with custom HTTP client
@@ -177,6 +298,12 @@ class OpenAIService:
         
         return {
             'service_metrics': self.connection_metrics,
+            'context_window': self.context_metrics.copy(),
+            'async_client': self._async_pool.get_stats() if self._async_pool else None,
+            'coalescing': self.single_flight.get_stats(),
+            'rate_governor': self.rate_governor.get_stats(),
+            'hedging': self.request_hedger.get_stats() if self.request_hedger else {'enabled': False},
+            'upload_cache': self.upload_cache.get_stats() if self.upload_cache else {'enabled': False},
             'connection_pool_metrics': pool_metrics,
             'total_pools': len([p for p in pool_metrics.get('pools', {}) if 'azure_openai' in p])
         }
@@ -237,8 +364,18 @@ class OpenAIService:
         max_delay=30.0,
         handle_types=(OpenAIAPIException, NetworkException, TimeoutException)
     )
-    def get_response(self, user_id, user_message, use_streaming=True, image_data=None, file_data=None, file_name=None):
-        """Get AI response using Responses API with Chat Completions fallback, caching, and comprehensive error handling."""
+    def get_response(self, user_id, user_message, use_streaming=True, image_data=None, file_data=None, file_name=None, chunk_callback=None, shared_prompt=False, priority=None, stateless=False, max_output_tokens=None):
+        """Get AI response using Responses API with Chat Completions fallback, caching, and comprehensive error handling.
+
+        When streaming, ``chunk_callback`` is called with each text delta as it arrives.
+        Identical concurrent requests share one upstream call; with ``shared_prompt``
+        the prompt is treated as independent of the user's conversation, so identical
+        prompts are coalesced across users whatever their history. ``priority``
+        ("interactive" or "batch") orders the request in the rate governor's queue.
+        A ``stateless`` request is sent without the user's stored context and does not
+        become the context of later requests; ``max_output_tokens`` overrides the
+        default output cap.
+        """
         correlation_id = create_correlation_id()
         
         with logger.context(
@@ -254,74 +391,128 @@ class OpenAIService:
                 self.connection_metrics['total_requests'] += 1
                 
                 # Validate inputs
-                if not user_id:
-                    raise ValidationException(
-                        message="User ID is required",
-                        field="user_id",
-                        correlation_id=correlation_id
-                    )
+                self._validate_request(user_id, user_message, image_data, correlation_id)
                 
-                if not user_message and not image_data:
-                    raise ValidationException(
-                        message="Either user message or image data is required",
-                        field="user_message",
-                        correlation_id=correlation_id
-                    )
-                
-                # Check cache for non-streaming requests without image data
-                if not use_streaming and not image_data and self.enable_caching:
+                # Check cache for non-streaming requests without image data; the key uses
+                # the context before this turn, read once for both lookup and store
+                use_response_cache = not use_streaming and not image_data and self.enable_caching
+                context_hash = self._generate_context_hash(user_id) if use_response_cache else ""
+                if use_response_cache:
                     cached_response = self._get_cached_response(
                         user_id=user_id,
                         user_message=user_message,
-                        correlation_id=correlation_id
+                        correlation_id=correlation_id,
+                        context_hash=context_hash
                     )
                     if cached_response:
                         logger.info("Returning cached OpenAI response", correlation_id=correlation_id)
                         return cached_response
                 
+                # Cross-user answers to stateless queries, streaming or not; on a miss the
+                # answer is generated without this user's context so it can be shared
+                semantic_eligible = self._is_semantic_eligible(user_message, image_data, file_data)
+                stateless = stateless or semantic_eligible
+                if semantic_eligible:
+                    semantic_response = self._get_semantic_response(user_id, user_message, correlation_id)
+                    if semantic_response:
+                        logger.info("Returning semantic cache response", correlation_id=correlation_id)
+                        return semantic_response
+                
                 # Use connection pool with retry logic and circuit breaker pattern
                 response = None
                 client_name = "azure_openai_primary" if self._should_use_responses_api() else "azure_openai_fallback"
                 
                 # Execute with connection pooling and retry logic
-                def execute_openai_request():
-                    if self._should_use_responses_api():
-                        return self._get_response_with_responses_api(
-                            user_id, user_message, use_streaming, image_data, 
-                            file_data, file_name, correlation_id
-                        )
-                    else:
-                        return self._get_response_with_chat_completions(
-                            user_id, user_message, use_streaming, image_data, 
-                            file_data, file_name, correlation_id
+                def execute_with_pool(emit_chunk):
+                    # Text already delivered cannot be taken back, so once a delta is out
+                    # neither the retry below nor the API fallback may restart the stream
+                    if emit_chunk is not None:
+                        emit_chunk = _EmitTracker(emit_chunk)
+                    
+                    def execute_openai_request():
+                        try:
+                            return send_openai_request()
+                        except (RateLimitException, StreamInterruptedError):
+                            raise
+                        except Exception as e:
+                            if emit_chunk is not None and emit_chunk.emitted:
+                                raise StreamInterruptedError(f"Stream interrupted after partial output: {e}") from e
+                            raise
+                    
+                    def send_openai_request():
+                        use_responses_api = self._should_use_responses_api()
+                        if use_responses_api and self.hedging_enabled and not image_data and not file_data:
+                            return self._get_hedged_response(
+                                user_id, user_message, use_streaming, emit_chunk, stateless=stateless
+                            )
+                        elif use_responses_api:
+                            return self._get_response_with_responses_api(
+                                user_id, user_message, use_streaming, image_data, 
+                                file_data, file_name, correlation_id, emit_chunk, stateless=stateless
+                            )
+                        else:
+                            return self._get_response_with_chat_completions(
+                                user_id, user_message, use_streaming, image_data, 
+                                file_data, file_name, correlation_id, emit_chunk, stateless=stateless
+                            )
+                    
+                    # Use connection pool manager with retry logic; throttling is paced by
+                    # the rate governor instead of being retried blindly
+                    backoff = ExponentialBackoff(base_delay=1.0, max_delay=30.0, multiplier=2.0)
+                    with request_priority(priority) if priority else nullcontext(), \
+                            _output_token_limit(max_output_tokens):
+                        return connection_pool_manager.execute_with_retry(
+                            client_name, 
+                            execute_openai_request, 
+                            max_attempts=3, 
+                            backoff=backoff,
+                            non_retryable=(RateLimitException, StreamInterruptedError)
                         )
                 
-                # Use connection pool manager with retry logic
-                backoff = ExponentialBackoff(base_delay=1.0, max_delay=30.0, multiplier=2.0)
-                response = connection_pool_manager.execute_with_retry(
-                    client_name, 
-                    execute_openai_request, 
-                    max_attempts=3, 
-                    backoff=backoff
-                )
+                # Identical concurrent prompts in the same context share one upstream call
+                coalesce_key = None
+                if self.coalescing_enabled and not image_data and not file_data:
+                    coalesce_key = self._coalescing_key(
+                        user_id, user_message, shared_prompt, context_hash,
+                        stateless=stateless, max_output_tokens=max_output_tokens
+                    )
+                
+                if coalesce_key:
+                    response, coalesced = self.single_flight.do(
+                        coalesce_key,
+                        execute_with_pool,
+                        chunk_callback=(lambda chunk: self._emit_chunk(chunk_callback, chunk)) if chunk_callback else None,
+                        timeout=self.coalesce_timeout
+                    )
+                    if coalesced:
+                        logger.info("Returning coalesced OpenAI response", correlation_id=correlation_id)
+                        response = self._record_coalesced_exchange(
+                            user_id, user_message, response, shared_prompt, stateless=stateless
+                        )
+                else:
+                    response = execute_with_pool(chunk_callback)
                 
                 # Cache successful non-streaming responses
-                if (response.get('success') and not use_streaming and 
-                    not image_data and self.enable_caching):
+                if response.get('success') and use_response_cache:
                     self._cache_response(
                         user_id=user_id,
                         user_message=user_message,
                         response=response,
-                        correlation_id=correlation_id
+                        correlation_id=correlation_id,
+                        context_hash=context_hash
+                    )
+                
+                if (semantic_eligible and response.get('success') and
+                        response.get('message') != EMPTY_RESPONSE_MESSAGE):
+                    self.cache_manager.cache_semantic_response(
+                        message=user_message,
+                        response=response['message'],
+                        model=self.settings.AZURE_OPENAI_DEPLOYMENT_NAME
                     )
                 
                 # Update connection metrics
                 response_time = time.time() - start_time
-                self.connection_metrics['successful_requests'] += 1
-                self.connection_metrics['avg_response_time'] = (
-                    (self.connection_metrics['avg_response_time'] * (self.connection_metrics['successful_requests'] - 1) + response_time) /
-                    self.connection_metrics['successful_requests']
-                )
+                self._record_request_success(response_time)
                 
                 logger.info(
                     f"OpenAI request completed successfully with connection pooling",
@@ -336,8 +527,8 @@ class OpenAIService:
                 
                 return response
                 
-            except ValidationException:
-                # Re-raise validation errors
+            except (ValidationException, RateLimitException, StreamInterruptedError):
+                # Re-raise validation, throttling and partly streamed errors without retrying
                 self.connection_metrics['failed_requests'] += 1
                 raise
                 
@@ -354,7 +545,7 @@ class OpenAIService:
                     if e.status_code == 429:
                         raise RateLimitException(
                             message=f"OpenAI API rate limit exceeded: {str(e)}",
-                            retry_after=60,
+                            retry_after=self._throttled_retry_after(e),
                             service="Azure_OpenAI",
                             correlation_id=correlation_id,
                             original_exception=e
@@ -375,127 +566,82 @@ class OpenAIService:
                         correlation_id=correlation_id
                     )
 
-    def _get_response_with_responses_api(self, user_id, user_message, use_streaming=True, image_data=None, file_data=None, file_name=None, correlation_id=None):
-        """Get response using Responses API with server-side conversation state"""
+    def _validate_request(self, user_id, user_message, image_data, correlation_id):
+        """Validate request inputs, rejecting oversized messages before any API call is made"""
+        if not user_id:
+            raise ValidationException(
+                message="User ID is required",
+                field="user_id",
+                correlation_id=correlation_id
+            )
+        
+        if not user_message and not image_data:
+            raise ValidationException(
+                message="Either user message or image data is required",
+                field="user_message",
+                correlation_id=correlation_id
+            )
+        
+        if user_message and count_tokens(user_message) > self.max_user_message_tokens:
+            self.context_metrics['oversized_rejected'] += 1
+            raise ValidationException(
+                message=f"User message exceeds {self.max_user_message_tokens} tokens",
+                field="user_message",
+                correlation_id=correlation_id
+            )
+
+    def _get_response_with_responses_api(self, user_id, user_message, use_streaming=True, image_data=None, file_data=None, file_name=None, correlation_id=None, chunk_callback=None, stateless=False):
+        """Get response using Responses API with server-side conversation state (none when ``stateless``)"""
         try:
             # Track successful API usage
             self._record_api_success()
             # Get the last response ID for this user to maintain conversation context
-            previous_response_id = self.conversation_service.get_last_response_id(user_id)
+            previous_response_id = self._previous_response_id(user_id, stateless)
             
             # Add user message to conversation history with media metadata
-            if image_data:
-                message_type = "image"
-            elif file_data:
-                message_type = "file"
-            else:
-                message_type = "text"
-
-            metadata = {"api_used": "responses"}
-            if image_data:
-                metadata["has_image"] = True
-                metadata["image_processed"] = True
-            if file_data:
-                metadata["has_file"] = True
-            
-            self.conversation_service.add_message(
-                user_id, 
-                "user", 
-                user_message,
-                message_type=message_type,
-                metadata=metadata
-            )
+            self._add_user_message(user_id, user_message, "responses", image_data, file_data)
             
             # Create the user input with optional media using Responses API format
-            if image_data:
-                user_input = [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "input_text", "text": user_message},
-                            {
-                                "type": "input_image",
-                                "image_url": {
-                                    "url": image_data,
-                                    "detail": "high"
-                                }
-                            }
-                        ]
-                    }
-                ]
-            elif file_data:
-                file_id = self._upload_file(file_data, file_name)
-                user_input = [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "input_text", "text": user_message},
-                            {"type": "input_file", "file_id": file_id},
-                        ],
-                    }
-                ]
-            else:
-                user_input = user_message
+            file_id = self._upload_file(file_data, file_name) if file_data else None
+            user_input = self._create_responses_input(user_message, image_data, file_id)
             
             if use_streaming:
-                return self._get_streaming_response_api(user_id, user_input, previous_response_id)
+                return self._get_streaming_response_api(
+                    user_id, user_input, previous_response_id, chunk_callback, stateless=stateless
+                )
             else:
-                return self._get_standard_response_api(user_id, user_input, previous_response_id)
+                return self._get_standard_response_api(user_id, user_input, previous_response_id, stateless=stateless)
                 
+        except RateLimitException:
+            # Both APIs share the deployment quota; falling back would only add load
+            raise
         except Exception as e:
             logger.error(f"Responses API error for user {user_id}: {str(e)}")
             # Record API failure and fall back to Chat Completions
             self._record_api_failure(e)
+            if getattr(chunk_callback, 'emitted', False):
+                # Part of this answer was already streamed; a new one would repeat it
+                raise
             logger.info(f"Falling back to Chat Completions for user {user_id}")
-            return self._get_response_with_chat_completions(user_id, user_message, use_streaming, image_data)
+            return self._get_response_with_chat_completions(
+                user_id, user_message, use_streaming, image_data, chunk_callback=chunk_callback, stateless=stateless
+            )
 
-    def _get_response_with_chat_completions(self, user_id, user_message, use_streaming=True, image_data=None, file_data=None, file_name=None, correlation_id=None):
-        """Get response using traditional Chat Completions API"""
+    def _get_response_with_chat_completions(self, user_id, user_message, use_streaming=True, image_data=None, file_data=None, file_name=None, correlation_id=None, chunk_callback=None, stateless=False):
+        """Get response using traditional Chat Completions API (without stored history when ``stateless``)"""
         try:
             # Add user message to conversation history
-            if image_data:
-                message_type = "image"
-            elif file_data:
-                message_type = "file"
-            else:
-                message_type = "text"
-
-            metadata = {"api_used": "chat_completions"}
-            if image_data:
-                metadata["has_image"] = True
-                metadata["image_processed"] = True
-            if file_data:
-                metadata["has_file"] = True
-            
-            self.conversation_service.add_message(
-                user_id, 
-                "user", 
-                user_message,
-                message_type=message_type,
-                metadata=metadata
-            )
-            
-            # Get conversation history
-            conversation_history = self.conversation_service.get_conversation_history(user_id)
-            
-            # Prepare messages for OpenAI Chat Completions
-            messages = [{"role": "system", "content": self.system_prompt}]
-            
-            # Add conversation history (limit to last 500 messages to maintain context)
-            recent_messages = conversation_history[-500:]
-            for msg in recent_messages:
-                messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
+            self._add_user_message(user_id, user_message, "chat_completions", image_data, file_data)
             
             # Create the current user message with optional media
             file_id = self._upload_file(file_data, file_name) if file_data else None
             current_message = self._create_message_with_image_chat_completions(user_message, image_data, file_id)
-            messages.append(current_message)
+            
+            # Fit history into the token budget; older turns fold into the rolling summary
+            messages = self._context_messages(user_id, current_message, stateless)
             
             if use_streaming:
-                return self._get_streaming_response_chat_completions(user_id, messages, file_id)
+                return self._get_streaming_response_chat_completions(user_id, messages, file_id, chunk_callback)
             else:
                 return self._get_standard_response_chat_completions(user_id, messages, file_id)
                 
@@ -503,48 +649,364 @@ class OpenAIService:
             logger.error(f"Chat Completions API error for user {user_id}: {str(e)}")
             raise e
 
-    def _get_standard_response_api(self, user_id, user_input, previous_response_id=None):
-        """Get standard response from Responses API"""
-        try:
-            response = self.client.responses.create(
-                model=self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-                input=user_input,
-                instructions=self.system_prompt,
-                previous_response_id=previous_response_id,
-                max_output_tokens=800,
-                temperature=0.7,
-                top_p=0.9,
-                store=True,
-                stream=False
+    def _get_hedged_response(self, user_id, user_message, use_streaming=True, chunk_callback=None, stateless=False):
+        """
+        Race the Responses API against a delayed Chat Completions duplicate.
+        
+        Both attempts stream internally so the first token decides the race and
+        the loser can be abandoned; only the winner emits chunks and writes the
+        assistant turn.
+        """
+        self._record_api_success()
+        previous_response_id = self._previous_response_id(user_id, stateless)
+        self._add_user_message(user_id, user_message, "responses")
+        user_input = self._create_responses_input(user_message)
+        emit = chunk_callback if use_streaming else None
+        
+        def primary(attempt):
+            try:
+                return self._hedge_attempt_responses(user_id, user_input, previous_response_id, attempt, emit)
+            except (RateLimitException, HedgeCancelled):
+                raise
+            except Exception as e:
+                logger.error(f"Responses API hedged attempt error for user {user_id}: {str(e)}")
+                self._record_api_failure(e)
+                raise
+        
+        def hedge(attempt):
+            messages = self._context_messages(
+                user_id, self._create_message_with_image_chat_completions(user_message), stateless
             )
+            return self._hedge_attempt_chat_completions(user_id, messages, attempt, emit)
+        
+        (api_used, ai_message, total_tokens, response_id), winner = self.request_hedger.run(
+            self.settings.AZURE_OPENAI_DEPLOYMENT_NAME, primary, hedge
+        )
+        logger.info(f"Hedged request for user {user_id} won by {winner} ({api_used})")
+        
+        return self._complete_response(
+            user_id, ai_message, total_tokens,
+            streaming=use_streaming, api_used=api_used, response_id=response_id, stateless=stateless
+        )
+    
+    def _hedge_attempt_responses(self, user_id, user_input, previous_response_id, attempt, chunk_callback=None):
+        """Stream one Responses API attempt of a hedged request"""
+        stream = self._governed_create(
+            self.client.responses.create, self._estimate_request_tokens(user_id),
+            **self._responses_request_kwargs(user_input, previous_response_id, stream=True)
+        )
+        try:
+            parts = []
+            total_tokens = 0
+            response_id = None
             
-            ai_message = response.output_text
-            if ai_message:
-                ai_message = ai_message.strip()
-            else:
-                ai_message = "I apologize, but I couldn't generate a response. Please try again."
-
-            total_tokens = response.usage.total_tokens if response.usage else 0
-            response_id = response.id
+            for event in stream:
+                if attempt.cancelled:
+                    raise HedgeCancelled()
+                event_type = getattr(event, 'type', None)
+                event_response = getattr(event, 'response', None)
+                if event_response and not response_id:
+                    response_id = event_response.id
+                
+                if event_type == 'response.output_text.delta' and event.delta:
+                    if not attempt.claim():
+                        raise HedgeCancelled()
+                    parts.append(event.delta)
+                    self._emit_chunk(chunk_callback, event.delta)
+                elif event_type in ('response.done', 'response.completed') and event_response:
+                    if getattr(event_response, 'usage', None):
+                        total_tokens = event_response.usage.total_tokens
             
-            # Store the response ID for future conversation context
-            if response_id:
-                self.conversation_service.set_last_response_id(user_id, response_id)
+            return 'responses', "".join(parts), total_tokens, response_id
+        finally:
+            self._close_stream(stream)
+    
+    def _hedge_attempt_chat_completions(self, user_id, messages, attempt, chunk_callback=None):
+        """Stream one Chat Completions attempt of a hedged request"""
+        stream = self._governed_create(
+            self.fallback_client.chat.completions.create, self._estimate_request_tokens(user_id, messages),
+            **self._chat_completions_request_kwargs(messages, stream=True)
+        )
+        try:
+            parts = []
+            total_tokens = 0
             
-            # Add AI response to conversation history
-            self.conversation_service.add_message(user_id, "assistant", ai_message)
+            for chunk in stream:
+                if attempt.cancelled:
+                    raise HedgeCancelled()
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    if not attempt.claim():
+                        raise HedgeCancelled()
+                    content = chunk.choices[0].delta.content
+                    parts.append(content)
+                    self._emit_chunk(chunk_callback, content)
+                if getattr(chunk, 'usage', None):
+                    total_tokens = chunk.usage.total_tokens
             
-            logger.info(f"Generated Responses API response for user {user_id} (length: {len(ai_message)})")
+            return 'chat_completions', "".join(parts), total_tokens, None
+        finally:
+            self._close_stream(stream)
+    
+    def _close_stream(self, stream):
+        """Release a stream's connection; abandoning a losing attempt closes it mid-response"""
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                logger.debug(f"Error closing stream: {e}")
+    
+    def _add_user_message(self, user_id, user_message, api_used, image_data=None, file_data=None):
+        """Store the user turn with its media metadata"""
+        if image_data:
+            message_type = "image"
+        elif file_data:
+            message_type = "file"
+        else:
+            message_type = "text"
+
+        metadata = {"api_used": api_used}
+        if image_data:
+            metadata["has_image"] = True
+            metadata["image_processed"] = True
+        if file_data:
+            metadata["has_file"] = True
+        
+        self.conversation_service.add_message(
+            user_id, 
+            "user", 
+            user_message,
+            message_type=message_type,
+            metadata=metadata
+        )
+
+    def _create_responses_input(self, user_message, image_data=None, file_id=None):
+        """Create the Responses API input with optional image or uploaded file"""
+        if image_data:
+            return [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "input_text", "text": user_message},
+                        {
+                            "type": "input_image",
+                            "image_url": {
+                                "url": image_data,
+                                "detail": "high"
+                            }
+                        }
+                    ]
+                }
+            ]
+        if file_id:
+            return [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "input_text", "text": user_message},
+                        {"type": "input_file", "file_id": file_id},
+                    ],
+                }
+            ]
+        return user_message
+
+    def _responses_request_kwargs(self, user_input, previous_response_id=None, stream=False):
+        """Request parameters for a Responses API call"""
+        return {
+            "model": self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+            "input": user_input,
+            "instructions": self.system_prompt,
+            "previous_response_id": previous_response_id,
+            "max_output_tokens": _max_output_tokens.get(),
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "store": True,
+            "stream": stream
+        }
+
+    def _chat_completions_request_kwargs(self, messages, file_id=None, stream=False):
+        """Request parameters for a Chat Completions call"""
+        from typing import cast
+        from openai.types.chat import ChatCompletionMessageParam
+        
+        kwargs = {
+            "model": self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+            "messages": cast(list[ChatCompletionMessageParam], messages),
+            "max_tokens": _max_output_tokens.get(),
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "frequency_penalty": 0.1,
+            "presence_penalty": 0.1,
+            "stream": stream,
+        }
+        if file_id:
+            kwargs["file_ids"] = [file_id]
+        return kwargs
+
+    def _complete_response(self, user_id, ai_message, total_tokens, streaming, api_used, response_id=None,
+                           stateless=False):
+        """Store the assistant turn (and response ID) and build the result dict"""
+        ai_message = ai_message.strip() if ai_message else EMPTY_RESPONSE_MESSAGE
+        
+        # Store the response ID for future conversation context; a stateless response
+        # does not continue the user's server-side conversation
+        if response_id and not stateless:
+            self.conversation_service.set_last_response_id(user_id, response_id)
+        
+        # Add AI response to conversation history
+        self.conversation_service.add_message(user_id, "assistant", ai_message)
+        
+        result = {
+            'success': True,
+            'message': ai_message,
+            'tokens_used': total_tokens,
+            'streaming': streaming,
+            'api_used': api_used
+        }
+        if api_used == 'responses':
+            result['response_id'] = response_id
+        return result
+
+    def _is_semantic_eligible(self, user_message, image_data=None, file_data=None):
+        """Check whether the answer to a request may come from, and go to, the cross-user semantic cache"""
+        return (self.semantic_cache_enabled and not image_data and not file_data and
+                self.cache_manager.is_semantic_cacheable(user_message))
+    
+    def _previous_response_id(self, user_id, stateless=False):
+        """Server-side conversation a Responses API request continues; stateless requests start fresh"""
+        return None if stateless else self.conversation_service.get_last_response_id(user_id)
+    
+    def _context_messages(self, user_id, current_message, stateless=False):
+        """Chat Completions messages for a request; stateless requests carry no stored history"""
+        if stateless:
+            return [{"role": "system", "content": self.system_prompt}, current_message]
+        return self._build_context_messages(user_id, current_message)
+    
+    def estimate_prompt_tokens(self, user_id, user_message=""):
+        """
+        Estimate the prompt size of a request without building it.
+        
+        O(1) in the conversation length: uses the per-user running token total
+        kept by the conversation service, capped at the context budget.
+        """
+        prompt, tokens = self._system_prompt_tokens
+        if prompt is not self.system_prompt:
+            tokens = count_tokens(self.system_prompt) + MESSAGE_OVERHEAD_TOKENS
+            self._system_prompt_tokens = (self.system_prompt, tokens)
+        
+        stored = self.conversation_service.get_token_usage(user_id)['stored_tokens']
+        message_tokens = count_tokens(user_message) + MESSAGE_OVERHEAD_TOKENS if user_message else 0
+        history_allowance = max(0, self.context_builder.token_budget - tokens - message_tokens)
+        return tokens + message_tokens + min(stored, history_allowance)
+    
+    def _build_context_messages(self, user_id, current_message):
+        """Build token-budgeted Chat Completions messages and persist the updated summary"""
+        state = self.conversation_service.get_context_state(user_id)
+        
+        # The new user message was just stored; it is sent once, as current_message
+        history = state['messages'][:-1] if state['messages'] else []
+        
+        context = self.context_builder.build(
+            self.system_prompt,
+            history,
+            current_message,
+            first_index=state['first_index'],
+            summary=state['summary']
+        )
+        
+        if context['summary_updated']:
+            self.conversation_service.set_context_summary(user_id, context['summary'])
+        self._record_context_metrics(context)
+        
+        return context['messages']
+    
+    def _record_context_metrics(self, context):
+        """Track prompt size and tokens saved versus sending the full history"""
+        metrics = self.context_metrics
+        metrics['requests'] += 1
+        metrics['prompt_tokens'] += context['prompt_tokens']
+        metrics['prompt_tokens_saved'] += context['tokens_saved']
+        metrics['avg_prompt_tokens'] = metrics['prompt_tokens'] / metrics['requests']
+        metrics['avg_prompt_tokens_saved'] = metrics['prompt_tokens_saved'] / metrics['requests']
+        if context['summary_updated']:
+            metrics['summary_updates'] += 1
+    
+    def _estimate_request_tokens(self, user_id, messages=None):
+        """Tokens a request may consume (prompt plus maximum output) for the rate governor"""
+        if messages is not None:
+            prompt_tokens = sum(count_message_tokens(message) for message in messages)
+        else:
+            # Responses API context is server-side; the stored history approximates it
+            prompt_tokens = self.estimate_prompt_tokens(user_id)
+        return prompt_tokens + _max_output_tokens.get()
+    
+    def _throttled_retry_after(self, error) -> int:
+        """Seconds a caller should wait after a 429; 60 when the server gave no hint"""
+        response = getattr(error, 'response', None)
+        if parse_retry_after(getattr(response, 'headers', None) or {}) is None:
+            return 60
+        return round(self.rate_governor.retry_after_remaining()) or 60
+    
+    def _governed_create(self, create, estimated_tokens, **kwargs):
+        """Call ``create`` once the rate governor admits it; a 429 becomes RateLimitException"""
+        try:
+            with self.rate_governor.acquire(estimated_tokens) as permit:
+                response = create(**kwargs)
+        except Exception as e:
+            if getattr(e, 'status_code', None) == 429:
+                raise RateLimitException(
+                    message=f"OpenAI API rate limit exceeded: {str(e)}",
+                    retry_after=self._throttled_retry_after(e),
+                    service="Azure_OpenAI",
+                    original_exception=e
+                )
+            raise
+        
+        # Non-streamed responses report their usage; correct the estimate
+        usage = None if kwargs.get('stream') else getattr(response, 'usage', None)
+        if isinstance(getattr(usage, 'total_tokens', None), int):
+            permit.settle(usage.total_tokens)
+        return response
+    
+    async def _governed_create_async(self, create, estimated_tokens, **kwargs):
+        """Async ``_governed_create``: await ``create`` once the rate governor admits it"""
+        try:
+            async with self.rate_governor.acquire_async(estimated_tokens) as permit:
+                response = await create(**kwargs)
+        except Exception as e:
+            if getattr(e, 'status_code', None) == 429:
+                raise RateLimitException(
+                    message=f"OpenAI API rate limit exceeded: {str(e)}",
+                    retry_after=self._throttled_retry_after(e),
+                    service="Azure_OpenAI",
+                    original_exception=e
+                )
+            raise
+        
+        usage = None if kwargs.get('stream') else getattr(response, 'usage', None)
+        if isinstance(getattr(usage, 'total_tokens', None), int):
+            permit.settle(usage.total_tokens)
+        return response
+    
+    def _get_standard_response_api(self, user_id, user_input, previous_response_id=None, stateless=False):
+        """Get standard response from Responses API"""
+        try:
+            response = self._governed_create(
+                self.client.responses.create, self._estimate_request_tokens(user_id),
+                **self._responses_request_kwargs(user_input, previous_response_id, stream=False)
+            )
             
-            return {
-                'success': True,
-                'message': ai_message,
-                'tokens_used': total_tokens,
-                'streaming': False,
-                'response_id': response_id,
-                'api_used': 'responses'
-            }
+            result = self._complete_response(
+                user_id, response.output_text, response.usage.total_tokens if response.usage else 0,
+                streaming=False, api_used='responses', response_id=response.id, stateless=stateless
+            )
+            
+            logger.info(f"Generated Responses API response for user {user_id} (length: {len(result['message'])})")
+            
+            return result
             
+        except RateLimitException:
+            raise
         except Exception as e:
             logger.error(f"Responses API standard error for user {user_id}: {str(e)}")
             self._record_api_failure(e)
@@ -553,65 +1015,32 @@ class OpenAIService:
     def _get_standard_response_chat_completions(self, user_id, messages, file_id=None):
         """Get standard response from Chat Completions API"""
         try:
-            from typing import cast
-            from openai.types.chat import ChatCompletionMessageParam
-            
-            formatted_messages = cast(list[ChatCompletionMessageParam], messages)
-            
-            kwargs = {
-                "model": self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-                "messages": formatted_messages,
-                "max_tokens": 800,
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "frequency_penalty": 0.1,
-                "presence_penalty": 0.1,
-                "stream": False,
-            }
-            if file_id:
-                kwargs["file_ids"] = [file_id]
-
-            response = self.fallback_client.chat.completions.create(**kwargs)
+            response = self._governed_create(
+                self.fallback_client.chat.completions.create, self._estimate_request_tokens(user_id, messages),
+                **self._chat_completions_request_kwargs(messages, file_id, stream=False)
+            )
             
-            message = response.choices[0].message
-            ai_message = message.content
-            if ai_message:
-                ai_message = ai_message.strip()
-            else:
-                ai_message = "I apologize, but I couldn't generate a response. Please try again."
-
-            total_tokens = response.usage.total_tokens if response.usage else 0
+            result = self._complete_response(
+                user_id, response.choices[0].message.content,
+                response.usage.total_tokens if response.usage else 0,
+                streaming=False, api_used='chat_completions'
+            )
             
-            # Add AI response to conversation history
-            self.conversation_service.add_message(user_id, "assistant", ai_message)
+            logger.info(f"Generated Chat Completions response for user {user_id} (length: {len(result['message'])})")
             
-            logger.info(f"Generated Chat Completions response for user {user_id} (length: {len(ai_message)})")
-            
-            return {
-                'success': True,
-                'message': ai_message,
-                'tokens_used': total_tokens,
-                'streaming': False,
-                'api_used': 'chat_completions'
-            }
+            return result
             
         except Exception as e:
             logger.error(f"Chat Completions standard error for user {user_id}: {str(e)}")
             raise e
 
-    def _get_streaming_response_api(self, user_id, user_input, previous_response_id=None):
-        """Get streaming response from Responses API"""
+    def _get_streaming_response_api(self, user_id, user_input, previous_response_id=None, chunk_callback=None,
+                                    stateless=False):
+        """Get streaming response from Responses API, forwarding deltas to chunk_callback"""
         try:
-            stream = self.client.responses.create(
-                model=self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-                input=user_input,
-                instructions=self.system_prompt,
-                previous_response_id=previous_response_id,
-                max_output_tokens=800,
-                temperature=0.7,
-                top_p=0.9,
-                store=True,
-                stream=True
+            stream = self._governed_create(
+                self.client.responses.create, self._estimate_request_tokens(user_id),
+                **self._responses_request_kwargs(user_input, previous_response_id, stream=True)
             )
             
             full_response = ""
@@ -626,6 +1055,7 @@ class OpenAIService:
                     content = event.delta
                     if content:
                         full_response += content
+                        self._emit_chunk(chunk_callback, content)
                 
                 elif hasattr(event, 'type') and event.type == 'response.done':
                     if hasattr(event, 'response') and event.response:
@@ -634,54 +1064,25 @@ class OpenAIService:
                         if not response_id:
                             response_id = event.response.id
             
-            if full_response:
-                full_response = full_response.strip()
-            else:
-                full_response = "I apologize, but I couldn't generate a response. Please try again."
-            
-            # Store the response ID for future conversation context
-            if response_id:
-                self.conversation_service.set_last_response_id(user_id, response_id)
-            
-            # Add AI response to conversation history
-            self.conversation_service.add_message(user_id, "assistant", full_response)
-            
-            return {
-                'success': True,
-                'message': full_response,
-                'tokens_used': total_tokens,
-                'streaming': True,
-                'response_id': response_id,
-                'api_used': 'responses'
-            }
+            return self._complete_response(
+                user_id, full_response, total_tokens,
+                streaming=True, api_used='responses', response_id=response_id, stateless=stateless
+            )
             
+        except RateLimitException:
+            raise
         except Exception as e:
             logger.error(f"Responses API streaming error for user {user_id}: {str(e)}")
             self._record_api_failure(e)
             raise e
 
-    def _get_streaming_response_chat_completions(self, user_id, messages, file_id=None):
-        """Get streaming response from Chat Completions API"""
+    def _get_streaming_response_chat_completions(self, user_id, messages, file_id=None, chunk_callback=None):
+        """Get streaming response from Chat Completions API, forwarding deltas to chunk_callback"""
         try:
-            from typing import cast
-            from openai.types.chat import ChatCompletionMessageParam
-            
-            formatted_messages = cast(list[ChatCompletionMessageParam], messages)
-            
-            kwargs = {
-                "model": self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-                "messages": formatted_messages,
-                "max_tokens": 800,
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "frequency_penalty": 0.1,
-                "presence_penalty": 0.1,
-                "stream": True,
-            }
-            if file_id:
-                kwargs["file_ids"] = [file_id]
-
-            stream = self.fallback_client.chat.completions.create(**kwargs)
+            stream = self._governed_create(
+                self.fallback_client.chat.completions.create, self._estimate_request_tokens(user_id, messages),
+                **self._chat_completions_request_kwargs(messages, file_id, stream=True)
+            )
             
             full_response = ""
             total_tokens = 0
@@ -690,25 +1091,15 @@ class OpenAIService:
                 if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
                     full_response += content
+                    self._emit_chunk(chunk_callback, content)
                 
                 if hasattr(chunk, 'usage') and chunk.usage:
                     total_tokens = chunk.usage.total_tokens
             
-            if full_response:
-                full_response = full_response.strip()
-            else:
-                full_response = "I apologize, but I couldn't generate a response. Please try again."
-            
-            # Add AI response to conversation history
-            self.conversation_service.add_message(user_id, "assistant", full_response)
-            
-            return {
-                'success': True,
-                'message': full_response,
-                'tokens_used': total_tokens,
-                'streaming': True,
-                'api_used': 'chat_completions'
-            }
+            return self._complete_response(
+                user_id, full_response, total_tokens,
+                streaming=True, api_used='chat_completions'
+            )
             
         except Exception as e:
             logger.error(f"Chat Completions streaming error for user {user_id}: {str(e)}")
@@ -719,34 +1110,38 @@ class OpenAIService:
         try:
             from ..utils.image_utils import ImageProcessor
             
-            # Use context manager for automatic cleanup
-            with ImageProcessor() as processor:
-                # Download and process the image
-                download_result = processor.download_image_from_line(line_bot_api, message_id)
-                
-                if not download_result['success']:
-                    logger.error(f"Failed to download image: {download_result['error']}")
-                    return {
-                        'success': False,
-                        'error': download_result['error'],
-                        'message': None
-                    }
-                
-                # Preprocess image if needed
-                processed_image_data = processor.preprocess_image_if_needed(download_result['image_data'])
-                
-                # Convert to base64 for OpenAI API
-                image_base64 = processor.image_to_base64(processed_image_data, download_result['format'])
-                
-                logger.info(f"Processing image for user {user_id}: {download_result['format']} ({download_result['size']} bytes)")
-                
-                # Use the main get_response method with image data
-                return self.get_response(
-                    user_id=user_id,
-                    user_message=accompanying_text if accompanying_text else "What do you see in this image? Please describe it and help me understand what it shows.",
-                    use_streaming=use_streaming,
-                    image_data=image_base64
-                )
+            # A redelivered message reuses its prepared payload without downloading again
+            image_base64 = self.cached_image_payload(message_id)
+            if image_base64 is not None:
+                logger.info(f"Reusing prepared image payload for message {message_id}")
+            else:
+                # Use context manager for automatic cleanup
+                with ImageProcessor() as processor:
+                    # Download and process the image
+                    download_result = processor.download_image_from_line(line_bot_api, message_id)
+                    
+                    if not download_result['success']:
+                        logger.error(f"Failed to download image: {download_result['error']}")
+                        return {
+                            'success': False,
+                            'error': download_result['error'],
+                            'message': None
+                        }
+                    
+                    # Preprocess and convert to base64 for OpenAI API (reused for identical images)
+                    image_base64 = self.prepare_image_payload(
+                        processor, download_result['image_data'], download_result['format'], message_id
+                    )
+                    
+                    logger.info(f"Processing image for user {user_id}: {download_result['format']} ({download_result['size']} bytes)")
+            
+            # Use the main get_response method with image data
+            return self.get_response(
+                user_id=user_id,
+                user_message=accompanying_text if accompanying_text else "What do you see in this image? Please describe it and help me understand what it shows.",
+                use_streaming=use_streaming,
+                image_data=image_base64
+            )
                     
         except Exception as e:
             logger.error(f"Vision API error for user {user_id}: {str(e)}")
@@ -756,6 +1151,28 @@ class OpenAIService:
                 'message': None
             }
 
+    def prepare_image_payload(self, processor, image_data: bytes, image_format: str, message_id=None) -> str:
+        """Preprocess and base64-encode an image, reusing the payload prepared for identical bytes"""
+        if self.upload_cache is None:
+            return processor.image_to_base64(processor.preprocess_image_if_needed(image_data), image_format)
+        
+        digest = content_digest(image_data)
+        image_base64 = self.upload_cache.get_image_payload(digest)
+        if image_base64 is None:
+            processed_image_data = processor.preprocess_image_if_needed(image_data)
+            image_base64 = processor.image_to_base64(processed_image_data, image_format)
+            self.upload_cache.put_image_payload(digest, image_base64)
+        if message_id:
+            self.upload_cache.remember_message(message_id, digest)
+        return image_base64
+
+    def cached_image_payload(self, message_id) -> Optional[str]:
+        """Prepared payload of an image message seen before, or None"""
+        if self.upload_cache is None or not message_id:
+            return None
+        digest = self.upload_cache.digest_for_message(message_id)
+        return self.upload_cache.get_image_payload(digest) if digest else None
+
     def _create_message_with_image_chat_completions(self, text_content: str, image_data=None, file_id=None):
         """Create message structure with optional image or file for Chat Completions API"""
         if not image_data and not file_id:
@@ -780,12 +1197,11 @@ class OpenAIService:
         return {"role": "user", "content": content}
 
     def get_streaming_response_with_callback(self, user_id, user_input, previous_response_id=None, chunk_callback=None):
-        """Get streaming response with callback support (legacy method for compatibility)"""
-        # For now, delegate to the appropriate method based on circuit breaker
+        """Get streaming response, calling chunk_callback with each text delta as it arrives"""
+        # Delegate to the appropriate method based on circuit breaker
         if self._should_use_responses_api():
             logger.info("Using Responses API for streaming with callback")
-            # Note: Full callback support for Responses API streaming would need more implementation
-            return self._get_streaming_response_api(user_id, user_input, previous_response_id)
+            return self._get_streaming_response_api(user_id, user_input, previous_response_id, chunk_callback)
         else:
             logger.info("Using Chat Completions for streaming with callback")
             # Convert user_input back to messages format for chat completions
@@ -793,17 +1209,311 @@ class OpenAIService:
                 messages = [{"role": "system", "content": self.system_prompt}, {"role": "user", "content": user_input}]
             else:
                 messages = [{"role": "system", "content": self.system_prompt}] + user_input
-            return self._get_streaming_response_chat_completions(user_id, messages)
+            return self._get_streaming_response_chat_completions(user_id, messages, chunk_callback=chunk_callback)
+
+    def _emit_chunk(self, chunk_callback, content):
+        """Forward a streamed delta to the callback; callback errors never break the stream"""
+        if chunk_callback is None:
+            return
+        try:
+            chunk_callback(content)
+        except Exception as e:
+            logger.warning(f"Stream chunk callback failed: {e}")
 
     def _upload_file(self, file_data: bytes, file_name: str | None) -> str:
-        """Upload a file to OpenAI and return the file ID"""
+        """Upload a file to OpenAI and return the file ID (identical content reuses its earlier upload)"""
         import io
+        digest, file_id = self._cached_file_id(file_data)
+        if file_id:
+            return file_id
         upload_name = file_name or "upload.dat"
         file_obj = io.BytesIO(file_data)
         # Use 'assistants' purpose for general file analysis, 'vision' is specifically for images
         response = self.client.files.create(file=(upload_name, file_obj), purpose="assistants")
+        if digest:
+            self.upload_cache.put_file_id(digest, response.id)
         return response.id
 
+    def _cached_file_id(self, file_data: bytes):
+        """Return (digest, file ID of an earlier upload of the same bytes or None)"""
+        if self.upload_cache is None:
+            return None, None
+        digest = content_digest(file_data)
+        file_id = self.upload_cache.get_file_id(digest, size=len(file_data))
+        if file_id:
+            logger.info(f"Reusing uploaded file {file_id} for identical content ({len(file_data)} bytes)")
+        return digest, file_id
+
+    def _get_async_pool(self) -> AsyncOpenAIClientPool:
+        """Shared async clients for the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        if self._async_pool is None or self._async_pool.loop is not loop:
+            if self._async_pool is not None:
+                logger.debug("Event loop changed, creating a new async OpenAI client pool")
+            self._async_pool = AsyncOpenAIClientPool(
+                api_key=self.settings.AZURE_OPENAI_API_KEY,
+                endpoint=self.settings.AZURE_OPENAI_ENDPOINT,
+                api_version=self.settings.AZURE_OPENAI_API_VERSION,
+                http2=getattr(self.settings, 'OPENAI_ASYNC_HTTP2', True),
+                max_connections=getattr(self.settings, 'OPENAI_ASYNC_MAX_CONNECTIONS', 50),
+                max_in_flight=getattr(self.settings, 'OPENAI_ASYNC_MAX_IN_FLIGHT', 50),
+                max_per_deployment=getattr(self.settings, 'OPENAI_ASYNC_MAX_PER_DEPLOYMENT', 20)
+            )
+        return self._async_pool
+
+    async def close_async_clients(self):
+        """Close the shared async connection pool"""
+        if self._async_pool is not None:
+            await self._async_pool.aclose()
+            self._async_pool = None
+
+    async def get_response_async(self, user_id, user_message, image_data=None, file_data=None, file_name=None):
+        """Async counterpart of ``get_response`` (non-streaming) on the shared async client pool.
+
+        Uses the Responses API with Chat Completions fallback and the same caches,
+        without holding a thread while the request is in flight.
+        """
+        correlation_id = create_correlation_id()
+        start_time = time.time()
+        self.connection_metrics['total_requests'] += 1
+        
+        try:
+            self._validate_request(user_id, user_message, image_data, correlation_id)
+            
+            use_response_cache = not image_data and self.enable_caching
+            context_hash = self._generate_context_hash(user_id) if use_response_cache else ""
+            if use_response_cache:
+                cached_response = self._get_cached_response(user_id, user_message, correlation_id, context_hash)
+                if cached_response:
+                    return cached_response
+            
+            semantic_eligible = self._is_semantic_eligible(user_message, image_data, file_data)
+            if semantic_eligible:
+                semantic_response = self._get_semantic_response(user_id, user_message, correlation_id)
+                if semantic_response:
+                    return semantic_response
+            
+            pool = self._get_async_pool()
+            async with pool.limiter.acquire(self.settings.AZURE_OPENAI_DEPLOYMENT_NAME):
+                response = await self._get_response_async_with_fallback(
+                    pool, user_id, user_message, image_data, file_data, file_name, stateless=semantic_eligible
+                )
+            
+            if response.get('success') and use_response_cache:
+                self._cache_response(user_id, user_message, response, correlation_id, context_hash)
+            if (semantic_eligible and response.get('success') and
+                    response.get('message') != EMPTY_RESPONSE_MESSAGE):
+                self.cache_manager.cache_semantic_response(
+                    message=user_message,
+                    response=response['message'],
+                    model=self.settings.AZURE_OPENAI_DEPLOYMENT_NAME
+                )
+            
+            self._record_request_success(time.time() - start_time)
+            response['correlation_id'] = correlation_id
+            return response
+            
+        except RateLimitException as e:
+            # Throttled: the governor paces later requests; the caller learns when to retry
+            self.connection_metrics['failed_requests'] += 1
+            logger.warning(
+                f"Async OpenAI request throttled: {str(e)}",
+                correlation_id=correlation_id
+            )
+            return {
+                'success': False,
+                'error': str(e),
+                'message': None,
+                'retry_after': e.retry_after,
+                'correlation_id': correlation_id
+            }
+            
+        except Exception as e:
+            self.connection_metrics['failed_requests'] += 1
+            logger.error(
+                f"Async OpenAI request failed: {str(e)}",
+                correlation_id=correlation_id
+            )
+            return {
+                'success': False,
+                'error': str(e),
+                'message': None,
+                'correlation_id': correlation_id
+            }
+
+    async def _get_response_async_with_fallback(self, pool, user_id, user_message, image_data, file_data, file_name,
+                                                stateless=False):
+        """Responses API first (circuit breaker permitting), Chat Completions on failure"""
+        use_responses_api = self._should_use_responses_api()
+        self._add_user_message(
+            user_id, user_message, "responses" if use_responses_api else "chat_completions", image_data, file_data
+        )
+        file_id = await self._upload_file_async(pool, file_data, file_name) if file_data else None
+        
+        if use_responses_api:
+            try:
+                response = await self._governed_create_async(
+                    pool.client.responses.create, self._estimate_request_tokens(user_id),
+                    **self._responses_request_kwargs(
+                        self._create_responses_input(user_message, image_data, file_id),
+                        self._previous_response_id(user_id, stateless),
+                        stream=False
+                    )
+                )
+                self._record_api_success()
+                return self._complete_response(
+                    user_id, response.output_text, response.usage.total_tokens if response.usage else 0,
+                    streaming=False, api_used='responses', response_id=response.id, stateless=stateless
+                )
+            except RateLimitException:
+                # Both APIs share the deployment quota; falling back would only add load
+                raise
+            except Exception as e:
+                logger.error(f"Async Responses API error for user {user_id}: {str(e)}")
+                self._record_api_failure(e)
+                logger.info(f"Falling back to Chat Completions for user {user_id}")
+        
+        current_message = self._create_message_with_image_chat_completions(user_message, image_data, file_id)
+        messages = self._context_messages(user_id, current_message, stateless)
+        response = await self._governed_create_async(
+            pool.fallback_client.chat.completions.create, self._estimate_request_tokens(user_id, messages),
+            **self._chat_completions_request_kwargs(messages, file_id, stream=False)
+        )
+        return self._complete_response(
+            user_id, response.choices[0].message.content,
+            response.usage.total_tokens if response.usage else 0,
+            streaming=False, api_used='chat_completions'
+        )
+
+    def stream_response_async(self, user_id, user_message, image_data=None) -> AsyncResponseStream:
+        """Stream a response asynchronously.
+
+        Returns an async iterator of text deltas; its ``result`` holds the final
+        response dict once iteration completes. Falls back from the Responses API
+        to Chat Completions only if no text has been yielded yet.
+        """
+        correlation_id = create_correlation_id()
+        self._validate_request(user_id, user_message, image_data, correlation_id)
+        return AsyncResponseStream(
+            lambda stream: self._stream_response_async(stream, user_id, user_message, image_data, correlation_id)
+        )
+
+    async def _stream_response_async(self, stream, user_id, user_message, image_data, correlation_id):
+        """Async generator behind ``stream_response_async``"""
+        start_time = time.time()
+        self.connection_metrics['total_requests'] += 1
+        pool = self._get_async_pool()
+        
+        try:
+            async with pool.limiter.acquire(self.settings.AZURE_OPENAI_DEPLOYMENT_NAME):
+                use_responses_api = self._should_use_responses_api()
+                self._add_user_message(
+                    user_id, user_message, "responses" if use_responses_api else "chat_completions", image_data
+                )
+                yielded = False
+                
+                if use_responses_api:
+                    try:
+                        events = await self._governed_create_async(
+                            pool.client.responses.create, self._estimate_request_tokens(user_id),
+                            **self._responses_request_kwargs(
+                                self._create_responses_input(user_message, image_data),
+                                self.conversation_service.get_last_response_id(user_id),
+                                stream=True
+                            )
+                        )
+                        full_response = ""
+                        total_tokens = 0
+                        response_id = None
+                        
+                        async for event in events:
+                            if hasattr(event, 'response') and event.response and not response_id:
+                                response_id = event.response.id
+                            
+                            if getattr(event, 'type', None) == 'response.output_text.delta' and event.delta:
+                                full_response += event.delta
+                                yielded = True
+                                yield event.delta
+                            
+                            elif getattr(event, 'type', None) in ('response.done', 'response.completed') and \
+                                    getattr(event, 'response', None):
+                                if getattr(event.response, 'usage', None):
+                                    total_tokens = event.response.usage.total_tokens
+                                if not response_id:
+                                    response_id = event.response.id
+                        
+                        self._record_api_success()
+                        stream.result = self._complete_response(
+                            user_id, full_response, total_tokens,
+                            streaming=True, api_used='responses', response_id=response_id
+                        )
+                    except RateLimitException:
+                        # Both APIs share the deployment quota; falling back would only add load
+                        raise
+                    except Exception as e:
+                        logger.error(f"Async Responses API streaming error for user {user_id}: {str(e)}")
+                        self._record_api_failure(e)
+                        if yielded:
+                            raise
+                        logger.info(f"Falling back to Chat Completions for user {user_id}")
+                
+                if stream.result is None:
+                    current_message = self._create_message_with_image_chat_completions(user_message, image_data)
+                    messages = self._build_context_messages(user_id, current_message)
+                    chunks = await self._governed_create_async(
+                        pool.fallback_client.chat.completions.create,
+                        self._estimate_request_tokens(user_id, messages),
+                        **self._chat_completions_request_kwargs(messages, stream=True)
+                    )
+                    full_response = ""
+                    total_tokens = 0
+                    
+                    async for chunk in chunks:
+                        if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                            content = chunk.choices[0].delta.content
+                            full_response += content
+                            yield content
+                        
+                        if getattr(chunk, 'usage', None):
+                            total_tokens = chunk.usage.total_tokens
+                    
+                    stream.result = self._complete_response(
+                        user_id, full_response, total_tokens,
+                        streaming=True, api_used='chat_completions'
+                    )
+            
+            stream.result['correlation_id'] = correlation_id
+            self._record_request_success(time.time() - start_time)
+            
+        except Exception as e:
+            self.connection_metrics['failed_requests'] += 1
+            logger.error(
+                f"Async OpenAI stream failed: {str(e)}",
+                correlation_id=correlation_id
+            )
+            raise
+
+    async def _upload_file_async(self, pool, file_data: bytes, file_name: str | None) -> str:
+        """Upload a file with the async client and return the file ID"""
+        import io
+        digest, file_id = self._cached_file_id(file_data)
+        if file_id:
+            return file_id
+        response = await pool.client.files.create(
+            file=(file_name or "upload.dat", io.BytesIO(file_data)), purpose="assistants"
+        )
+        if digest:
+            self.upload_cache.put_file_id(digest, response.id)
+        return response.id
+
+    def _record_request_success(self, response_time):
+        """Update the running success count and average response time"""
+        self.connection_metrics['successful_requests'] += 1
+        self.connection_metrics['avg_response_time'] = (
+            (self.connection_metrics['avg_response_time'] * (self.connection_metrics['successful_requests'] - 1) + response_time) /
+            self.connection_metrics['successful_requests']
+        )
+
     def _record_api_success(self):
         """Record successful API usage and reset failure count"""
         if self.api_failure_count > 0:
@@ -886,11 +1596,51 @@ class OpenAIService:
                 'api_type': 'unknown'
             }
     
-    def _get_cached_response(self, user_id: str, user_message: str, correlation_id: str) -> Optional[Dict[str, Any]]:
+    def _coalescing_key(self, user_id: str, user_message: str, shared_prompt: bool,
+                        context_hash: str = "", stateless: bool = False,
+                        max_output_tokens: Optional[int] = None) -> Optional[str]:
+        """
+        Fingerprint of a request for single-flight coalescing, or None if it cannot be keyed safely.
+        
+        Statelessness and the output token limit change the upstream request, so
+        requests that differ in either never share an answer.
+        """
+        if shared_prompt:
+            context = "shared"
+        else:
+            # Answers depend on the stored conversation; only identical contexts may share one
+            context = context_hash or self._generate_context_hash(user_id)
+            if not context:
+                return None
+        return prompt_fingerprint(
+            user_message, self.settings.AZURE_OPENAI_DEPLOYMENT_NAME, self.system_prompt, context,
+            "stateless" if stateless else "stateful", str(max_output_tokens or DEFAULT_MAX_OUTPUT_TOKENS)
+        )
+    
+    def _record_coalesced_exchange(self, user_id: str, user_message: str, response: Dict[str, Any],
+                                   shared_prompt: bool = False, stateless: bool = False) -> Dict[str, Any]:
+        """Record a shared answer in the follower's own history and mark it as coalesced."""
+        if response.get('success') and response.get('message'):
+            self.conversation_service.add_message(
+                user_id, "user", user_message, metadata={"api_used": "coalesced"}
+            )
+            self.conversation_service.add_message(user_id, "assistant", response['message'])
+            # Same context as the leader, so its server-side response continues this conversation
+            # too, unless the leader ran stateless and did not continue its own either
+            if response.get('response_id') and not shared_prompt and not stateless:
+                self.conversation_service.set_last_response_id(user_id, response['response_id'])
+        
+        shared = dict(response)
+        shared.update({'coalesced': True, 'tokens_used': 0})
+        return shared
+    
+    def _get_cached_response(self, user_id: str, user_message: str, correlation_id: str,
+                             context_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Retrieve cached OpenAI response if available."""
         try:
             # Get conversation context hash for cache key
-            context_hash = self._generate_context_hash(user_id)
+            if context_hash is None:
+                context_hash = self._generate_context_hash(user_id)
             
             cached_response = self.cache_manager.get_cached_openai_response(
                 user_id=user_id,
@@ -917,14 +1667,49 @@ class OpenAIService:
         
         return None
     
-    def _cache_response(self, user_id: str, user_message: str, response: Dict[str, Any], correlation_id: str):
+    def _get_semantic_response(self, user_id: str, user_message: str, correlation_id: str) -> Optional[Dict[str, Any]]:
+        """Serve a cached answer to a similar stateless query, recording the exchange in history."""
+        try:
+            cached_message = self.cache_manager.get_semantic_response(
+                user_message,
+                model=self.settings.AZURE_OPENAI_DEPLOYMENT_NAME
+            )
+            if not cached_message:
+                return None
+            
+            # Keep the stored conversation complete for later turns
+            self.conversation_service.add_message(
+                user_id, "user", user_message, metadata={"api_used": "semantic_cache"}
+            )
+            self.conversation_service.add_message(user_id, "assistant", cached_message)
+            
+            return {
+                'success': True,
+                'message': cached_message,
+                'tokens_used': 0,
+                'streaming': False,
+                'cached': True,
+                'cache_type': 'semantic',
+                'correlation_id': correlation_id
+            }
+            
+        except Exception as e:
+            logger.warning(
+                f"Semantic cache retrieval failed: {str(e)}",
+                correlation_id=correlation_id
+            )
+            return None
+    
+    def _cache_response(self, user_id: str, user_message: str, response: Dict[str, Any], correlation_id: str,
+                        context_hash: Optional[str] = None):
         """Cache successful OpenAI response."""
         try:
             if not response.get('success') or not response.get('message'):
                 return
             
             # Get conversation context hash for cache key
-            context_hash = self._generate_context_hash(user_id)
+            if context_hash is None:
+                context_hash = self._generate_context_hash(user_id)
             
             success = self.cache_manager.cache_openai_response(
                 user_id=user_id,
@@ -949,22 +1734,9 @@ class OpenAIService:
             )
     
     def _generate_context_hash(self, user_id: str) -> str:
-        """Generate hash of conversation context for cache key."""
+        """Get the conversation's rolling context digest for the cache key (maintained on add_message)."""
         try:
-            # Get recent conversation history
-            messages = self.conversation_service.get_messages(user_id, limit=5)
-            
-            # Create context string from recent messages
-            context_parts = []
-            for msg in messages[-5:]:  # Last 5 messages for context
-                if msg.get('role') and msg.get('content'):
-                    context_parts.append(f"{msg['role']}:{msg['content'][:100]}")
-            
-            context_string = "|".join(context_parts)
-            
-            # Generate hash
-            return hashlib.sha256(context_string.encode()).hexdigest()[:16]
-            
+            return self.conversation_service.get_context_digest(user_id)
         except Exception:
-            # Return empty hash if context generation fails
+            # Return empty hash if the digest is unavailable
             return ""
@@ -5,10 +5,15 @@ Redis-based conversation service for persistent storage
 import json
 import logging
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import redis
 from redis.exceptions import RedisError
+from src.utils.token_counter import count_message_tokens
+from src.utils.context_digest import EMPTY_CONTEXT_DIGEST, format_context_digest
+from src.utils.conversation_append import append_message
+from src.utils.conversation_stats import ConversationStatistics, scan_page
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +31,10 @@ class RedisConversationService:
         self.redis_url = redis_url or os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
         self.ttl_seconds = ttl_days * 24 * 60 * 60
         self.max_messages_per_user = int(os.environ.get('MAX_MESSAGES_PER_USER', '100'))
+        self.statistics = ConversationStatistics(
+            user_ttl_seconds=self.ttl_seconds,
+            snapshot_ttl_seconds=float(os.environ.get('CONVERSATION_STATS_CACHE_SECONDS', '30'))
+        )
         self.redis_client = None
         self._connect()
     
@@ -67,30 +76,23 @@ class RedisConversationService:
             conv_key = self._get_conversation_key(user_id)
             meta_key = self._get_metadata_key(user_id)
             
-            # Create message
+            # Create message; tokens are counted once, here
             message = {
                 "role": role,
                 "content": content,
                 "message_type": message_type,
                 "metadata": metadata or {},
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                "tokens": count_message_tokens({"content": content})
             }
             
-            # Add message to conversation list
-            self.redis_client.rpush(conv_key, json.dumps(message))
-            
-            # Trim to max messages
-            self.redis_client.ltrim(conv_key, -self.max_messages_per_user, -1)
-            
-            # Update metadata
-            self.redis_client.hset(meta_key, mapping={
-                "last_activity": datetime.now().isoformat(),
-                "message_count": self.redis_client.llen(conv_key)
-            })
-            
-            # Set TTL
-            self.redis_client.expire(conv_key, self.ttl_seconds)
-            self.redis_client.expire(meta_key, self.ttl_seconds)
+            # One atomic script call appends, trims, and advances the counters and digest
+            append_message(
+                self.redis_client, self.statistics, conv_key, meta_key, user_id,
+                json.dumps(message), role, content, message["tokens"], time.time(),
+                message["timestamp"], self.max_messages_per_user, self.ttl_seconds,
+                self._stored_tokens
+            )
             
             logger.debug(f"Added {role} message for user {user_id}")
             
@@ -112,24 +114,115 @@ class RedisConversationService:
             else:
                 messages = self.redis_client.lrange(conv_key, 0, -1)
             
-            # Parse JSON messages
+            return self._decode_messages(messages)
+            
+        except RedisError as e:
+            logger.error(f"Redis error getting conversation: {e}")
+            return []
+    
+    @staticmethod
+    def _decode_messages(raw_messages: List[str]) -> List[Dict]:
+        """Decode stored messages with one JSON parse (element by element only if one is corrupt)"""
+        if not raw_messages:
+            return []
+        try:
+            return json.loads("[" + ",".join(raw_messages) + "]")
+        except json.JSONDecodeError:
             parsed_messages = []
-            for msg in messages:
+            for msg in raw_messages:
                 try:
                     parsed_messages.append(json.loads(msg))
                 except json.JSONDecodeError:
                     logger.error(f"Failed to parse message: {msg}")
-            
             return parsed_messages
-            
-        except RedisError as e:
-            logger.error(f"Redis error getting conversation: {e}")
-            return []
     
     def get_messages_for_context(self, user_id: str, max_messages: int = 10) -> List[Dict]:
         """Get recent messages for AI context"""
         return self.get_conversation_history(user_id, limit=max_messages)
     
+    @staticmethod
+    def _stored_tokens(raw_message: str) -> int:
+        """Token count of a stored message, counted on demand for older entries"""
+        try:
+            return count_message_tokens(json.loads(raw_message))
+        except (json.JSONDecodeError, AttributeError):
+            return 0
+    
+    def get_token_usage(self, user_id: str) -> Dict[str, int]:
+        """Get a user's running token totals from the metadata hash (one round trip)"""
+        empty_usage = {"stored_tokens": 0, "lifetime_tokens": 0, "message_count": 0}
+        if not self.redis_client:
+            return empty_usage
+        
+        try:
+            metadata = self.redis_client.hgetall(self._get_metadata_key(user_id))
+            stored = int(metadata.get("token_total", 0))
+            return {
+                "stored_tokens": stored,
+                "lifetime_tokens": int(metadata.get("lifetime_tokens", stored)),
+                "message_count": int(metadata.get("message_count", 0))
+            }
+        except (RedisError, ValueError) as e:
+            logger.error(f"Redis error getting token usage: {e}")
+            return empty_usage
+    
+    def get_context_digest(self, user_id: str) -> str:
+        """Get the rolling conversation digest for cache keys (one HGET)"""
+        if not self.redis_client:
+            return ""
+        
+        try:
+            value = self.redis_client.hget(self._get_metadata_key(user_id), "context_digest")
+            return format_context_digest(int(value) if value else EMPTY_CONTEXT_DIGEST)
+        except (RedisError, ValueError) as e:
+            logger.error(f"Redis error getting context digest: {e}")
+            return ""
+    
+    def get_context_state(self, user_id: str) -> Dict:
+        """Get history plus rolling-summary state for building a token-budgeted context"""
+        empty_state = {"messages": [], "first_index": 0, "summary": None}
+        if not self.redis_client:
+            logger.error("Redis client not connected")
+            return empty_state
+        
+        try:
+            # History and metadata in one round trip
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.lrange(self._get_conversation_key(user_id), 0, -1)
+            pipe.hgetall(self._get_metadata_key(user_id))
+            raw_messages, metadata = pipe.execute()
+            
+            messages = [
+                {"role": msg["role"], "content": msg["content"], "tokens": count_message_tokens(msg)}
+                for msg in self._decode_messages(raw_messages)
+            ]
+            total = int(metadata.get("total_messages", len(messages)))
+            summary = metadata.get("context_summary")
+            
+            return {
+                "messages": messages,
+                "first_index": max(0, total - len(messages)),
+                "summary": json.loads(summary) if summary else None
+            }
+            
+        except (RedisError, ValueError) as e:
+            logger.error(f"Redis error getting context state: {e}")
+            return empty_state
+    
+    def set_context_summary(self, user_id: str, summary: Dict):
+        """Cache the rolling context summary in the conversation metadata"""
+        if not self.redis_client:
+            return
+        
+        try:
+            meta_key = self._get_metadata_key(user_id)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(meta_key, "context_summary", json.dumps(summary))
+            pipe.expire(meta_key, self.ttl_seconds)
+            pipe.execute()
+        except RedisError as e:
+            logger.error(f"Redis error setting context summary: {e}")
+    
     def clear_conversation(self, user_id: str):
         """Clear a user's conversation history"""
         if not self.redis_client:
@@ -140,7 +233,10 @@ class RedisConversationService:
             conv_key = self._get_conversation_key(user_id)
             meta_key = self._get_metadata_key(user_id)
             
-            self.redis_client.delete(conv_key, meta_key)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.delete(conv_key, meta_key)
+            self.statistics.record_removal(pipe, user_id)
+            pipe.execute()
             logger.info(f"Cleared conversation for user {user_id}")
             
         except RedisError as e:
@@ -153,8 +249,10 @@ class RedisConversationService:
         
         try:
             meta_key = self._get_metadata_key(user_id)
-            self.redis_client.hset(meta_key, "last_response_id", response_id)
-            self.redis_client.expire(meta_key, self.ttl_seconds)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(meta_key, "last_response_id", response_id)
+            pipe.expire(meta_key, self.ttl_seconds)
+            pipe.execute()
         except RedisError as e:
             logger.error(f"Redis error setting response ID: {e}")
     
@@ -170,36 +268,99 @@ class RedisConversationService:
             logger.error(f"Redis error getting response ID: {e}")
             return None
     
-    @property
-    def conversations(self) -> Dict:
-        """Get all active conversations (for compatibility)"""
+    def get_stats_snapshot(self, max_age: float = None) -> Dict:
+        """
+        Get user and message totals from the incremental counters (cached, no keyspace walk)
+        
+        Returns:
+            Dict with total_users, active_users (last hour), active_users_today,
+            total_messages, stale and timestamp
+        """
+        def load():
+            if not self.redis_client:
+                raise RedisError("Redis client not connected")
+            return self.statistics.read(self.redis_client)
+        
+        try:
+            return self.statistics.snapshot(load, max_age)
+        except RedisError as e:
+            logger.error(f"Redis error getting conversation statistics: {e}")
+            return {"total_users": 0, "active_users": 0, "active_users_today": 0,
+                    "total_messages": 0, "stale": True, "timestamp": datetime.utcnow().isoformat()}
+    
+    def rebuild_statistics(self, batch_size: int = 500) -> Optional[int]:
+        """
+        Recount users and messages from the stored metadata with SCAN (management step, not run on startup)
+        
+        Returns:
+            Number of users counted, or None if not connected or another process is rebuilding
+        """
+        if not self.redis_client:
+            return None
+        
+        try:
+            users = self.statistics.rebuild(self.redis_client, self._get_metadata_key("*"), batch_size)
+            self.statistics.invalidate()
+            return users
+        except RedisError as e:
+            logger.error(f"Redis error rebuilding conversation statistics: {e}")
+            return None
+    
+    def list_conversations(self, cursor: int = 0, count: int = 100) -> Dict:
+        """
+        List one page of conversations using SCAN (pages are approximately ``count`` long)
+        
+        Returns:
+            Dict with ``conversations`` (user_id, message_count, last_activity) and
+            ``next_cursor`` (0 once the listing is complete)
+        """
         if not self.redis_client:
-            return {}
+            return {"conversations": [], "next_cursor": 0}
         
         try:
-            # Get all conversation keys
-            conv_keys = self.redis_client.keys("conversation:*")
-            conversations = {}
+            next_cursor, keys = scan_page(self.redis_client, self._get_conversation_key("*"), cursor, count)
             
-            for key in conv_keys:
-                user_id = key.split(":", 1)[1]
-                meta_key = self._get_metadata_key(user_id)
-                
-                # Get metadata
-                metadata = self.redis_client.hgetall(meta_key)
-                message_count = int(metadata.get("message_count", 0))
-                
-                conversations[user_id] = {
-                    "messages": [],  # Don't load all messages
-                    "message_count": message_count,
-                    "last_activity": metadata.get("last_activity", "Unknown")
-                }
+            # Metadata of the whole page in one round trip
+            user_ids = [key.split(":", 1)[1] for key in keys]
+            pipe = self.redis_client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.hmget(self._get_metadata_key(user_id), "message_count", "last_activity")
             
-            return conversations
+            conversations = [
+                {
+                    "user_id": user_id,
+                    "message_count": int(message_count or 0),
+                    "last_activity": last_activity or "Unknown"
+                }
+                for user_id, (message_count, last_activity) in zip(user_ids, pipe.execute() if user_ids else [])
+            ]
+            return {"conversations": conversations, "next_cursor": next_cursor}
             
         except RedisError as e:
-            logger.error(f"Redis error getting conversations: {e}")
-            return {}
+            logger.error(f"Redis error listing conversations: {e}")
+            return {"conversations": [], "next_cursor": 0}
+    
+    @property
+    def conversations(self) -> Dict:
+        """
+        Get all active conversations (for compatibility)
+        
+        Walks the whole keyspace page by page; use get_stats_snapshot for totals
+        and list_conversations for paginated listings.
+        """
+        conversations = {}
+        cursor = 0
+        while True:
+            page = self.list_conversations(cursor, count=500)
+            for conv in page["conversations"]:
+                conversations[conv["user_id"]] = {
+                    "messages": [],  # Don't load all messages
+                    "message_count": conv["message_count"],
+                    "last_activity": conv["last_activity"]
+                }
+            cursor = page["next_cursor"]
+            if not cursor:
+                return conversations
     
     def health_check(self) -> bool:
         """Check if Redis is healthy"""
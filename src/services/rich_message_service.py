@@ -14,6 +14,10 @@ from datetime import datetime, timedelta
 import hashlib
 import time
 from src.utils.redis_manager import get_redis_manager, RedisConnectionManager
+from src.utils.send_rate_limiter import SendRateLimiter, CHECK, ACQUIRE, RECORD
+from src.utils.flex_payload_cache import (
+    PLACEHOLDER_PREFIX, can_render, get_flex_payload_cache, placeholder, template_key
+)
 from src.utils.lru_cache_manager import get_lru_cache, CacheType
 from linebot.models import (
     RichMenu, RichMenuSize, RichMenuArea, RichMenuBounds,
@@ -107,11 +111,15 @@ class RichMessageService:
         self._mood_cache = {}     # For Redis fallback compatibility
         self._cache_ttl = 3600    # Keep for Redis operations
         
-        # Initialize send rate limiting system (in-memory fallback)
-        self._send_history = {}   # Track last send times per user
+        # Initialize send rate limiting system (atomic in Redis, locked in-memory fallback)
         self._send_cooldown = 300 # 5 minutes cooldown between Rich Messages per user
-        self._daily_send_limits = {} # Track daily send counts per user
         self._max_daily_sends = 10   # Maximum Rich Messages per user per day
+        self._rate_limiter = SendRateLimiter(self._send_cooldown, self._max_daily_sends)
+        self._send_history = self._rate_limiter.send_history        # Last send times per user
+        self._daily_send_limits = self._rate_limiter.daily_counts   # Daily send counts per user
+        
+        # Compiled Flex payloads, shared by every service in the process
+        self.flex_payload_cache = get_flex_payload_cache()
         
         # Initialize button context storage (in-memory fallback)
         self._button_context_storage = {}
@@ -307,6 +315,9 @@ class RichMessageService:
         """
         Check if user can receive a Rich Message based on rate limiting rules with Redis fallback.
         
+        The check does not reserve anything; use acquire_send_slot to check and
+        record in one atomic step before actually sending.
+        
         Args:
             user_id: User identifier
             bypass_limit: If True, bypasses rate limiting (for admin/testing)
@@ -318,32 +329,114 @@ class RichMessageService:
             logger.info(f"Rate limit bypassed for user {user_id[:8]}...")
             return {"allowed": True, "reason": "bypassed", "next_allowed": None}
         
-        current_time = time.time()
-        today = datetime.now().strftime('%Y-%m-%d')
+        decision = self._evaluate_send_limits([user_id], CHECK)[0]
+        return self._rate_limit_result(user_id, decision)
+    
+    def acquire_send_slot(self, user_id: str, bypass_limit: bool = False) -> Dict[str, Any]:
+        """
+        Check the rate limits and record the send in one atomic step.
         
-        # Get rate limit data with Redis fallback
-        send_history = self._get_rate_limit_data(user_id, "send_history")
-        daily_limits = self._get_rate_limit_data(user_id, "daily_limits", today)
+        Concurrent callers for the same user cannot both be allowed. If the
+        message then fails to go out, hand the slot back with release_send_slot.
         
-        # Check cooldown period
-        if send_history:
-            time_since_last = current_time - send_history
-            if time_since_last < self._send_cooldown:
-                remaining_cooldown = self._send_cooldown - time_since_last
-                next_allowed = datetime.fromtimestamp(current_time + remaining_cooldown)
-                
-                logger.warning(f"Rate limit hit for user {user_id[:8]}...: {remaining_cooldown:.0f}s remaining")
-                return {
-                    "allowed": False,
-                    "reason": "cooldown",
-                    "remaining_seconds": remaining_cooldown,
-                    "next_allowed": next_allowed.strftime('%H:%M:%S')
-                }
+        Args:
+            user_id: User identifier
+            bypass_limit: If True, records the send without checking the limits
+            
+        Returns:
+            Same dictionary as check_send_rate_limit, plus 'sent_at' when allowed
+        """
+        if bypass_limit:
+            logger.info(f"Rate limit bypassed for user {user_id[:8]}...")
+            decision = self._evaluate_send_limits([user_id], RECORD)[0]
+            return {"allowed": True, "reason": "bypassed", "next_allowed": None,
+                    "sent_at": decision["sent_at"]}
+        
+        decision = self._evaluate_send_limits([user_id], ACQUIRE)[0]
+        result = self._rate_limit_result(user_id, decision)
+        if result["allowed"]:
+            result["sent_at"] = decision["sent_at"]
+        return result
+    
+    def acquire_send_slots(self, user_ids: List[str]) -> Dict[str, Any]:
+        """
+        Check and record a send to a whole recipient list before a multicast.
+        
+        The list is evaluated in one round trip per 500 users. A user listed
+        more than once gets a single slot.
+        
+        Args:
+            user_ids: Recipients
+            
+        Returns:
+            Dictionary with 'allowed' (user IDs that may be sent to, in order),
+            'blocked' (user ID to 'cooldown' or 'daily_limit') and 'sent_at'
+        """
+        decisions = self._evaluate_send_limits(user_ids, ACQUIRE)
+        allowed, blocked, sent_at = [], {}, None
+        granted = set()
+        for user_id, decision in zip(user_ids, decisions):
+            if decision["allowed"]:
+                allowed.append(user_id)
+                granted.add(user_id)
+                sent_at = decision["sent_at"]
+            elif user_id not in granted:
+                blocked[user_id] = decision["reason"]
+        
+        if blocked:
+            logger.info(f"Rate limits blocked {len(blocked)} of {len(user_ids)} Rich Message recipients")
+        return {"allowed": allowed, "blocked": blocked, "sent_at": sent_at}
+    
+    def release_send_slot(self, user_id: str, sent_at: float) -> None:
+        """Give back a slot from acquire_send_slot for a message that was not delivered."""
+        try:
+            if self._check_redis_health():
+                released = self.redis_manager.execute_with_fallback(
+                    lambda client: self._rate_limiter.release(client, user_id, sent_at) or True,
+                    lambda: False, "release_send_slot", use_retry=False
+                )
+                if released is True:
+                    return
+            self._rate_limiter.release(None, user_id, sent_at)
+        except Exception as e:
+            logger.error(f"Error releasing send slot for {user_id}: {str(e)}")
+    
+    def record_message_sent(self, user_id: str) -> None:
+        """Record that a Rich Message was sent to user for rate limiting with Redis fallback."""
+        decision = self._evaluate_send_limits([user_id], RECORD)[0]
+        logger.info(f"Recorded Rich Message send for user {user_id[:8]}... "
+                    f"(daily: {decision['daily_count']}/{self._max_daily_sends})")
+    
+    def _evaluate_send_limits(self, user_ids: List[str], mode: str) -> List[Dict[str, Any]]:
+        """Evaluate send limits in one Redis round trip, falling back to the in-memory limiter."""
+        if self._check_redis_health():
+            try:
+                result = self.redis_manager.execute_with_fallback(
+                    lambda client: self._rate_limiter.evaluate(client, user_ids, mode),
+                    lambda: None, f"send_rate_limit_{mode}", use_retry=False
+                )
+                if isinstance(result, list):
+                    return result
+            except Exception as e:
+                logger.error(f"Error evaluating send rate limits in Redis: {str(e)}")
         
-        # Check daily limit
-        daily_count = daily_limits if daily_limits else 0
+        return self._rate_limiter.evaluate(None, user_ids, mode)
+    
+    def _rate_limit_result(self, user_id: str, decision: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a limiter decision into the check_send_rate_limit response."""
+        if decision["reason"] == "cooldown":
+            remaining_cooldown = decision["remaining_seconds"]
+            next_allowed = datetime.fromtimestamp(time.time() + remaining_cooldown)
+            logger.warning(f"Rate limit hit for user {user_id[:8]}...: {remaining_cooldown:.0f}s remaining")
+            return {
+                "allowed": False,
+                "reason": "cooldown",
+                "remaining_seconds": remaining_cooldown,
+                "next_allowed": next_allowed.strftime('%H:%M:%S')
+            }
         
-        if daily_count >= self._max_daily_sends:
+        daily_count = decision["daily_count"]
+        if decision["reason"] == "daily_limit":
             logger.warning(f"Daily limit reached for user {user_id[:8]}...: {daily_count}/{self._max_daily_sends}")
             return {
                 "allowed": False,
@@ -356,25 +449,6 @@ class RichMessageService:
         # Rate limit passed
         return {"allowed": True, "reason": "within_limits", "daily_count": daily_count}
     
-    def record_message_sent(self, user_id: str) -> None:
-        """Record that a Rich Message was sent to user for rate limiting with Redis fallback."""
-        current_time = time.time()
-        today = datetime.now().strftime('%Y-%m-%d')
-        
-        # Update send history with Redis fallback
-        self._set_rate_limit_data(user_id, "send_history", current_time)
-        
-        # Update daily count with Redis fallback
-        current_daily_count = self._get_rate_limit_data(user_id, "daily_limits", today) or 0
-        new_daily_count = current_daily_count + 1
-        self._set_rate_limit_data(user_id, "daily_limits", new_daily_count, today)
-        
-        # Cleanup old daily records from in-memory fallback (Redis TTL handles its own cleanup)
-        if not self._redis_available:
-            self._cleanup_old_daily_records()
-        
-        logger.info(f"Recorded Rich Message send for user {user_id[:8]}... (daily: {new_daily_count}/{self._max_daily_sends})")
-    
     def get_send_status(self, user_id: str) -> Dict[str, Any]:
         """Get current send status and history for a user."""
         current_time = time.time()
@@ -1326,7 +1400,6 @@ Create content that connects to this specific visual context. Make Bourdain's vo
         Returns:
             FlexSendMessage object
         """
-        from src.utils.interaction_handler import get_interaction_handler
         import uuid
         
         # Generate content ID if not provided
@@ -1344,17 +1417,71 @@ Create content that connects to this specific visual context. Make Bourdain's vo
             except Exception as e:
                 logger.warning(f"Smart selection failed, proceeding without image: {str(e)}")
         
-        # Prepare image component
-        hero_component = None
-        if image_url:
-            hero_component = ImageComponent(
-                url=image_url,
-                size="full",
-                aspect_ratio="20:13",
-                aspect_mode="cover"
+        return self._build_flex_message(
+            title, content, self._resolve_hero_url(image_url, image_path), image_path,
+            content_id, user_id, action_buttons, include_interactions, theme
+        )
+    
+    def render_flex_message(self,
+                            title: str,
+                            content: str,
+                            image_url: Optional[str] = None,
+                            image_path: Optional[str] = None,
+                            content_id: Optional[str] = None,
+                            user_id: Optional[str] = None,
+                            action_buttons: Optional[List[Dict[str, str]]] = None,
+                            include_interactions: bool = True,
+                            theme: Optional[str] = None) -> FlexSendMessage:
+        """
+        Create a Flex Message from the pre-rendered payload cache.
+        
+        The first call for some content builds the message once with a
+        placeholder content ID and keeps its serialized JSON; later calls
+        only splice in their content ID. The result sends like the message
+        create_flex_message would build. Content IDs that cannot be spliced
+        safely are built normally.
+        
+        Args:
+            Same as create_flex_message, without smart image selection
+            
+        Returns:
+            FlexSendMessage (a PrerenderedFlexMessage when served from the cache)
+        """
+        import uuid
+        
+        if not content_id:
+            content_id = str(uuid.uuid4())
+        
+        hero_url = self._resolve_hero_url(image_url, image_path)
+        static_text = json.dumps([title, content, hero_url, action_buttons], default=str)
+        if not can_render(content_id) or PLACEHOLDER_PREFIX in static_text:
+            return self._build_flex_message(title, content, hero_url, image_path, content_id,
+                                            user_id, action_buttons, include_interactions, theme)
+        
+        interactive = bool(include_interactions)
+        key = template_key(title, content, hero_url, action_buttons, interactive,
+                           theme if interactive else None,
+                           os.path.basename(image_path) if interactive and image_path else None)
+        
+        def build():
+            message = self._build_flex_message(
+                title, content, hero_url, image_path, placeholder('content_id'),
+                None, action_buttons, include_interactions, theme, store_context=False
             )
-        elif image_path:
-            # Convert local image path to public URL using our static route
+            context = self._button_context(title, content, theme, image_path) if interactive else None
+            return message, context
+        
+        template = self.flex_payload_cache.get_or_compile(key, build)
+        if template.context is not None:
+            # Conversation triggers look their context up by content ID
+            self.store_button_context(content_id, template.context)
+        return self.flex_payload_cache.render(template, content_id=content_id)
+    
+    def _resolve_hero_url(self, image_url: Optional[str], image_path: Optional[str]) -> Optional[str]:
+        """Public URL of the hero image, converting a local image path to our static route."""
+        if image_url:
+            return image_url
+        if image_path:
             try:
                 # Extract filename from path
                 filename = os.path.basename(image_path)
@@ -1362,18 +1489,46 @@ Create content that connects to this specific visual context. Make Bourdain's vo
                 # Generate public URL using the static route we added
                 base_url = self._get_base_url()
                 public_image_url = f"{base_url}/static/backgrounds/{filename}"
-                
-                hero_component = ImageComponent(
-                    url=public_image_url,
-                    size="full",
-                    aspect_ratio="20:13", 
-                    aspect_mode="cover"
-                )
                 logger.info(f"Generated image URL for {filename}: {public_image_url}")
+                return public_image_url
                 
             except Exception as e:
                 logger.error(f"Failed to generate image URL for {image_path}: {str(e)}")
-                hero_component = None
+        return None
+    
+    def _button_context(self, title: str, content: str, theme: Optional[str],
+                        image_path: Optional[str]) -> Dict[str, Any]:
+        """Rich message context stored server-side for conversation trigger buttons."""
+        return {
+            'title': title,
+            'content': content,
+            'theme': theme if theme else 'general',  # Use provided theme or default
+            'image_context': self._extract_image_context(os.path.basename(image_path)) if image_path else {}
+        }
+    
+    def _build_flex_message(self,
+                            title: str,
+                            content: str,
+                            hero_url: Optional[str],
+                            image_path: Optional[str],
+                            content_id: Optional[str],
+                            user_id: Optional[str],
+                            action_buttons: Optional[List[Dict[str, str]]],
+                            include_interactions: bool,
+                            theme: Optional[str],
+                            store_context: bool = True) -> FlexSendMessage:
+        """Build the Flex Message object tree."""
+        from src.utils.interaction_handler import get_interaction_handler
+        
+        # Prepare image component
+        hero_component = None
+        if hero_url:
+            hero_component = ImageComponent(
+                url=hero_url,
+                size="full",
+                aspect_ratio="20:13",
+                aspect_mode="cover"
+            )
         
         # Create body content
         body_contents = [
@@ -1400,19 +1555,14 @@ Create content that connects to this specific visual context. Make Bourdain's vo
                 interaction_handler = get_interaction_handler(self.openai_service)
                 
                 # Build rich message context for enhanced button responses
-                rich_message_context = {
-                    'title': title,
-                    'content': content,
-                    'theme': theme if theme else 'general',  # Use provided theme or default
-                    'image_context': self._extract_image_context(os.path.basename(image_path)) if image_path else {}
-                }
+                rich_message_context = self._button_context(title, content, theme, image_path)
                 
                 interactive_buttons = interaction_handler.create_interactive_buttons(
                     content_id=content_id,
                     current_user_id=user_id,
                     include_stats=True,
                     rich_message_context=rich_message_context,
-                    rich_message_service=self
+                    rich_message_service=self if store_context else None
                 )
                 
                 if interactive_buttons:
@@ -1537,8 +1687,11 @@ Create content that connects to this specific visual context. Make Bourdain's vo
             if not is_production and not bypass_rate_limit:
                 logger.info("Non-production environment detected - consider using dry_run=True for testing")
             
-            # Check rate limits
-            rate_check = self.check_send_rate_limit(user_id, bypass_rate_limit)
+            # Check rate limits; a real send also reserves its slot atomically
+            if dry_run:
+                rate_check = self.check_send_rate_limit(user_id, bypass_rate_limit)
+            else:
+                rate_check = self.acquire_send_slot(user_id, bypass_rate_limit)
             if not rate_check["allowed"]:
                 logger.warning(f"Rich Message send blocked for user {user_id[:8]}...: {rate_check['reason']}")
                 return {
@@ -1560,11 +1713,12 @@ Create content that connects to this specific visual context. Make Bourdain's vo
                     "timestamp": datetime.now().isoformat()
                 }
             
-            # Actually send the message
-            self.line_bot_api.push_message(user_id, flex_message)
-            
-            # Record the send for rate limiting
-            self.record_message_sent(user_id)
+            # Actually send the message, handing the slot back if it does not go out
+            try:
+                self.line_bot_api.push_message(user_id, flex_message)
+            except Exception:
+                self.release_send_slot(user_id, rate_check["sent_at"])
+                raise
             
             logger.info(f"Rich Message sent successfully to user {user_id[:8]}...")
             return {
@@ -1784,81 +1938,6 @@ Create content that connects to this specific visual context. Make Bourdain's vo
             logger.error(f"Error retrieving button context: {str(e)}")
             return None
     
-    def _get_rate_limit_data(self, user_id: str, data_type: str, date_key: Optional[str] = None) -> Optional[Any]:
-        """Get rate limit data with Redis fallback."""
-        try:
-            # Try Redis first if available
-            if self._check_redis_health():
-                def redis_operation(client):
-                    if data_type == "send_history":
-                        full_key = f"rate_limit_history:{user_id}"
-                        data = client.get(full_key)
-                        return float(data.decode('utf-8')) if data else None
-                    elif data_type == "daily_limits" and date_key:
-                        daily_key = f"{user_id}:{date_key}"
-                        full_key = f"rate_limit_daily:{daily_key}"
-                        data = client.get(full_key)
-                        return int(data.decode('utf-8')) if data else None
-                    return None
-                
-                def fallback():
-                    return None
-                
-                result = self.redis_manager.execute_with_fallback(
-                    redis_operation, fallback, f"get_rate_limit_{data_type}_{user_id}"
-                )
-                
-                if result is not None:
-                    return result
-            
-            # Fallback to in-memory storage
-            if data_type == "send_history":
-                return self._send_history.get(user_id)
-            elif data_type == "daily_limits" and date_key:
-                daily_key = f"{user_id}:{date_key}"
-                return self._daily_send_limits.get(daily_key)
-                
-        except Exception as e:
-            logger.error(f"Error getting rate limit data for {user_id}: {str(e)}")
-            return None
-    
-    def _set_rate_limit_data(self, user_id: str, data_type: str, value: Any, date_key: Optional[str] = None) -> None:
-        """Set rate limit data with Redis fallback."""
-        try:
-            # Try Redis first if available
-            if self._check_redis_health():
-                def redis_operation(client):
-                    if data_type == "send_history":
-                        full_key = f"rate_limit_history:{user_id}"
-                        ttl = self._send_cooldown + 60
-                        return client.setex(full_key, ttl, str(value))
-                    elif data_type == "daily_limits" and date_key:
-                        daily_key = f"{user_id}:{date_key}"
-                        full_key = f"rate_limit_daily:{daily_key}"
-                        ttl = 25 * 3600  # 25 hours for timezone differences
-                        return client.setex(full_key, ttl, str(value))
-                    return False
-                
-                def fallback():
-                    return False
-                
-                success = self.redis_manager.execute_with_fallback(
-                    redis_operation, fallback, f"set_rate_limit_{data_type}_{user_id}"
-                )
-                
-                if success:
-                    return
-            
-            # Fallback to in-memory storage
-            if data_type == "send_history":
-                self._send_history[user_id] = value
-            elif data_type == "daily_limits" and date_key:
-                daily_key = f"{user_id}:{date_key}"
-                self._daily_send_limits[daily_key] = value
-                
-        except Exception as e:
-            logger.error(f"Error setting rate limit data for {user_id}: {str(e)}")
-    
     def _get_mood_cache(self, template_name: str) -> Optional[str]:
         """Get mood cache with LRU -> Redis -> in-memory fallback hierarchy."""
         try:
@@ -1940,30 +2019,6 @@ Create content that connects to this specific visual context. Make Bourdain's vo
         except Exception as e:
             logger.error(f"Error setting mood cache for {template_name}: {str(e)}")
     
-    def _cleanup_old_daily_records(self) -> None:
-        """Cleanup old daily records from in-memory storage (only when Redis is not available)."""
-        try:
-            current_date = datetime.now()
-            keys_to_remove = []
-            for key in self._daily_send_limits.keys():
-                if ':' in key:
-                    date_str = key.split(':', 1)[1]
-                    try:
-                        record_date = datetime.strptime(date_str, '%Y-%m-%d')
-                        if (current_date - record_date).days > 7:
-                            keys_to_remove.append(key)
-                    except ValueError:
-                        keys_to_remove.append(key)  # Invalid format, remove it
-            
-            for key in keys_to_remove:
-                del self._daily_send_limits[key]
-                
-            if keys_to_remove:
-                logger.debug(f"Cleaned {len(keys_to_remove)} old daily limit records from memory")
-                
-        except Exception as e:
-            logger.error(f"Error cleaning old daily records: {str(e)}")
-    
     def _clean_old_button_contexts(self) -> None:
         """Clean button contexts older than 24 hours from in-memory storage"""
         try:
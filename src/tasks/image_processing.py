@@ -7,6 +7,7 @@ from celery import current_task
 from src.utils.celery_app import celery_app
 from src.utils.image_utils import ImageProcessor
 from src.utils.async_http import download_image_async
+from src.utils.worker_services import get_worker_services
 import asyncio
 
 logger = logging.getLogger(__name__)
@@ -33,13 +34,19 @@ def process_image_async(self, line_bot_api_token: str, message_id: str, user_id:
             meta={'status': 'Downloading image...', 'progress': 25}
         )
         
+        # Reuse the worker's pooled LINE client when the token is the configured one
+        services = get_worker_services()
+        with services.task_setup(self.name):
+            if line_bot_api_token == services.settings.LINE_CHANNEL_ACCESS_TOKEN:
+                line_bot_api = services.line_bot_api
+            else:
+                from linebot import LineBotApi
+                line_bot_api = LineBotApi(line_bot_api_token)
+        
         # Create image processor
         with ImageProcessor() as processor:
             # Download image (this would need to be adapted for async)
             # For now, we'll use the existing sync method
-            from linebot import LineBotApi
-            line_bot_api = LineBotApi(line_bot_api_token)
-            
             result = processor.download_image_from_line(line_bot_api, message_id)
             
             if not result['success']:
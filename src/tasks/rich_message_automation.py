@@ -6,30 +6,27 @@ content creation, template composition, and delivery coordination.
 """
 
 import logging
-from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime, time, timedelta
-from celery import Celery, Task
+from typing import Callable, Dict, List, Optional, Any, Tuple
+from datetime import datetime, time, timedelta, timezone
+from celery import Celery, Task, chain, chord
 from celery.schedules import crontab
 import os
+import uuid
 
-from src.services.rich_message_service import RichMessageService
-from src.services.line_service import LineService
-from src.services.openai_service import OpenAIService
-from src.services.conversation_service import ConversationService
-from src.utils.template_manager import TemplateManager
-from src.utils.content_generator import ContentGenerator, ContentRequest
-from src.utils.image_composer import ImageComposer
-from src.utils.template_selector import TemplateSelector, SelectionCriteria, SelectionStrategy
-from src.utils.content_validator import ContentValidator, ValidationLevel
+from src.utils.template_selector import SelectionCriteria, SelectionStrategy
 from src.utils.timezone_manager import get_timezone_manager, DeliverySchedule
 from src.utils.delivery_tracker import get_delivery_tracker, ErrorType
+from src.utils.bulk_delivery import BulkDeliveryEngine, MULTICAST_MAX_RECIPIENTS
+from src.utils.worker_services import get_worker_services
 from src.utils.analytics_tracker import get_analytics_tracker, InteractionType
 from src.models.rich_message_models import ContentCategory, ContentTheme, DeliveryRecord, DeliveryStatus
-from src.config.settings import Settings
 from src.config.rich_message_config import get_rich_message_config
 
 logger = logging.getLogger(__name__)
 
+# Users per send_rich_message_to_user_batch task: ten concurrent multicast chunks
+DELIVERY_BATCH_SIZE = 10 * MULTICAST_MAX_RECIPIENTS
+
 # Initialize Celery app
 celery_app = Celery('rich_message_automation')
 
@@ -102,6 +99,9 @@ def coordinate_timezone_deliveries(self, categories: Optional[List[str]] = None)
     """
     Coordinate Rich Message deliveries across multiple timezones.
     
+    Deliveries due now are started as campaigns (one per category and local
+    delivery time) and run on their own; this task does not wait for them.
+    
     Args:
         categories: Optional list of specific categories to coordinate
         
@@ -124,12 +124,13 @@ def coordinate_timezone_deliveries(self, categories: Optional[List[str]] = None)
             target_categories = config.get_enabled_categories()
         
         results = {
+            'success': True,
             'total_categories': len(target_categories),
             'timezone_deliveries_scheduled': 0,
-            'timezone_deliveries_executed': 0,
-            'failed_deliveries': 0,
+            'timezone_deliveries_dispatched': 0,
+            'campaigns_started': 0,
             'timezone_groups_processed': 0,
-            'delivery_results': {},
+            'campaigns': {},
             'errors': []
         }
         
@@ -157,32 +158,25 @@ def coordinate_timezone_deliveries(self, categories: Optional[List[str]] = None)
                     logger.debug(f"No deliveries due now for category {category.value}")
                     continue
                 
-                # Execute deliveries
-                category_results = []
+                # One campaign per local delivery time: the message is generated once
+                # and shared by every timezone delivering at that local time
+                deliveries_by_local_time: Dict[str, List[Dict[str, Any]]] = {}
                 for schedule in upcoming_deliveries:
-                    delivery_result = execute_timezone_delivery.delay(
-                        schedule.timezone,
-                        schedule.target_users,
-                        category.value,
-                        schedule.local_delivery_time.strftime("%H:%M")
-                    )
-                    
+                    deliveries_by_local_time.setdefault(
+                        schedule.local_delivery_time.strftime("%H:%M"), []
+                    ).append({'timezone': schedule.timezone, 'target_users': list(schedule.target_users)})
+                
+                category_campaigns = []
+                for local_time, deliveries in deliveries_by_local_time.items():
                     try:
-                        result = delivery_result.get(timeout=300)  # 5 minutes
-                        category_results.append(result)
-                        
-                        if result.get('success', False):
-                            results['timezone_deliveries_executed'] += 1
-                        else:
-                            results['failed_deliveries'] += 1
-                            results['errors'].append(f"Delivery to {schedule.timezone}: {result.get('error', 'Unknown error')}")
-                            
+                        category_campaigns.append(start_delivery_campaign(category.value, local_time, deliveries))
+                        results['timezone_deliveries_dispatched'] += len(deliveries)
                     except Exception as e:
-                        logger.error(f"Failed to execute delivery for {schedule.timezone}: {str(e)}")
-                        results['failed_deliveries'] += 1
-                        results['errors'].append(f"Execution failed for {schedule.timezone}: {str(e)}")
+                        logger.error(f"Failed to start {category.value} campaign for {local_time}: {str(e)}")
+                        results['errors'].append(f"Campaign {category.value} {local_time}: {str(e)}")
                 
-                results['delivery_results'][category.value] = category_results
+                results['campaigns'][category.value] = category_campaigns
+                results['campaigns_started'] += len(category_campaigns)
                 results['timezone_deliveries_scheduled'] += len(upcoming_deliveries)
                 results['timezone_groups_processed'] += len(set(s.timezone for s in upcoming_deliveries))
                 
@@ -193,7 +187,7 @@ def coordinate_timezone_deliveries(self, categories: Optional[List[str]] = None)
         # Calculate metrics
         execution_time = (datetime.now() - start_time).total_seconds()
         results['execution_time_seconds'] = execution_time
-        results['success_rate'] = (results['timezone_deliveries_executed'] / 
+        results['success_rate'] = (results['timezone_deliveries_dispatched'] / 
                                  max(1, results['timezone_deliveries_scheduled']))
         
         logger.info(f"Timezone delivery coordination completed in {execution_time:.2f}s", extra=results)
@@ -209,7 +203,10 @@ def coordinate_timezone_deliveries(self, categories: Optional[List[str]] = None)
 def execute_timezone_delivery(self, timezone_name: str, target_users: List[str],
                              category: str, local_time: str) -> Dict[str, Any]:
     """
-    Execute Rich Message delivery for specific timezone and users.
+    Start Rich Message delivery for specific timezone and users.
+    
+    The delivery runs as a campaign (see ``start_delivery_campaign``); the
+    outcome is the result of the campaign's ``aggregate_campaign_delivery``.
     
     Args:
         timezone_name: IANA timezone identifier
@@ -218,10 +215,9 @@ def execute_timezone_delivery(self, timezone_name: str, target_users: List[str],
         local_time: Local delivery time (HH:MM format)
         
     Returns:
-        Dictionary with delivery execution results
+        Dictionary describing the started campaign
     """
     try:
-        start_time = datetime.now()
         logger.info(f"Executing delivery for timezone {timezone_name}, {len(target_users)} users")
         
         if not target_users:
@@ -232,86 +228,243 @@ def execute_timezone_delivery(self, timezone_name: str, target_users: List[str],
                 'message': 'No users to deliver to'
             }
         
-        # Generate Rich Message for this timezone/category
-        generation_result = generate_rich_message_for_category.delay(
-            category, local_time
+        campaign = start_delivery_campaign(
+            category, local_time, [{'timezone': timezone_name, 'target_users': list(target_users)}]
         )
-        generated_message = generation_result.get(timeout=300)  # 5 minutes
+        return dict(campaign, success=True, timezone=timezone_name)
         
-        if not generated_message.get('success', False):
+    except Exception as e:
+        logger.error(f"Timezone delivery execution failed for {timezone_name}: {str(e)}")
+        self.retry(countdown=30 * (self.request.retries + 1))
+
+
+def start_delivery_campaign(category: str, local_time: str,
+                            deliveries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Start a delivery campaign without waiting for it.
+    
+    The campaign is a canvas: ``prepare_campaign_message`` generates the
+    message once, ``dispatch_campaign_batches`` fans the recipients out to a
+    group of parallel ``send_rich_message_to_user_batch`` tasks, and the
+    chord callback ``aggregate_campaign_delivery`` totals the batches and
+    reports the end-to-end latency. No task blocks on another's result.
+    
+    Args:
+        category: Content category
+        local_time: Local delivery time (HH:MM format)
+        deliveries: ``{'timezone': ..., 'target_users': [...]}`` per timezone
+        
+    Returns:
+        Dictionary with the campaign ID and the ID of its first task
+    """
+    campaign = {
+        'campaign_id': uuid.uuid4().hex,
+        'category': category,
+        'local_delivery_time': local_time,
+        'started_at': datetime.now(timezone.utc).timestamp(),
+        'deliveries': deliveries
+    }
+    workflow = chain(
+        prepare_campaign_message.si(category, local_time),
+        dispatch_campaign_batches.s(campaign)
+    )
+    async_result = workflow.apply_async()
+    
+    users_count = sum(len(d['target_users']) for d in deliveries)
+    logger.info(f"Started {category} campaign {campaign['campaign_id']} for {local_time}: "
+               f"{users_count} users in {len(deliveries)} timezones")
+    return {
+        'campaign_id': campaign['campaign_id'],
+        'task_id': async_result.id,
+        'category': category,
+        'local_delivery_time': local_time,
+        'timezones': [d['timezone'] for d in deliveries],
+        'users_count': users_count
+    }
+
+
+@celery_app.task(base=RichMessageTask, bind=True, max_retries=2)
+def prepare_campaign_message(self, category: str, target_time: str) -> Dict[str, Any]:
+    """
+    Generate content, select a template and compose the image for a campaign.
+    
+    The steps run in this worker (the task functions are called directly)
+    instead of as subtasks waited on with ``.get()``, so no worker slot sits
+    idle waiting for another one.
+    """
+    try:
+        start_time = datetime.now()
+        
+        generated_content = generate_content_for_delivery(category, target_time)
+        if not generated_content.get('success', False):
             return {
                 'success': False,
-                'timezone': timezone_name,
-                'users_count': len(target_users),
-                'error': f"Message generation failed: {generated_message.get('error', 'Unknown error')}",
-                'stage': 'message_generation'
+                'error': f"Content generation failed: {generated_content.get('error', 'Unknown error')}",
+                'stage': 'content_generation'
             }
         
-        # Send to targeted users
-        delivery_results = []
-        successful_deliveries = 0
-        failed_deliveries = 0
-        
-        # Send to users in batches for better performance
-        batch_size = 50
-        for i in range(0, len(target_users), batch_size):
-            batch_users = target_users[i:i + batch_size]
-            
-            batch_result = send_rich_message_to_user_batch.delay(
-                batch_users,
-                generated_message.get('image_path', ''),
-                generated_message.get('content_data', {}),
-                category,
-                timezone_name
-            )
-            
-            try:
-                batch_delivery = batch_result.get(timeout=120)  # 2 minutes
-                delivery_results.append(batch_delivery)
-                
-                successful_deliveries += batch_delivery.get('successful_deliveries', 0)
-                failed_deliveries += batch_delivery.get('failed_deliveries', 0)
-                
-            except Exception as e:
-                logger.error(f"Batch delivery failed for {len(batch_users)} users: {str(e)}")
-                failed_deliveries += len(batch_users)
-                delivery_results.append({
-                    'success': False,
-                    'error': str(e),
-                    'users_count': len(batch_users)
-                })
+        template_selection = select_template_for_content(
+            category, target_time, generated_content['content_metadata']
+        )
+        if not template_selection.get('success', False):
+            return {
+                'success': False,
+                'error': f"Template selection failed: {template_selection.get('error', 'Unknown error')}",
+                'stage': 'template_selection'
+            }
         
-        # Calculate metrics
-        execution_time = (datetime.now() - start_time).total_seconds()
-        total_users = successful_deliveries + failed_deliveries
-        success_rate = successful_deliveries / max(1, total_users)
+        image_composition = compose_rich_message_image(
+            template_selection['template_id'], generated_content['content_data']
+        )
+        if not image_composition.get('success', False):
+            return {
+                'success': False,
+                'error': f"Image composition failed: {image_composition.get('error', 'Unknown error')}",
+                'stage': 'image_composition'
+            }
         
-        result = {
-            'success': success_rate > 0.5,  # Consider successful if >50% delivered
-            'timezone': timezone_name,
-            'users_count': len(target_users),
-            'successful_deliveries': successful_deliveries,
-            'failed_deliveries': failed_deliveries,
-            'success_rate': success_rate,
-            'execution_time_seconds': execution_time,
-            'batch_results': delivery_results,
+        return {
+            'success': True,
             'category': category,
-            'local_delivery_time': local_time
+            'target_time': target_time,
+            'content_data': generated_content['content_data'],
+            'template_id': template_selection['template_id'],
+            'image_path': image_composition['image_path'],
+            'execution_time_seconds': (datetime.now() - start_time).total_seconds()
         }
         
-        if success_rate <= 0.5:
-            result['error'] = f"Low success rate: {success_rate:.2%}"
-        
-        logger.info(f"Timezone delivery for {timezone_name} completed: "
-                   f"{successful_deliveries}/{total_users} successful", extra=result)
-        
-        return result
-        
     except Exception as e:
-        logger.error(f"Timezone delivery execution failed for {timezone_name}: {str(e)}")
+        logger.error(f"Campaign message preparation for {category} failed: {str(e)}")
         self.retry(countdown=30 * (self.request.retries + 1))
 
 
+@celery_app.task(base=RichMessageTask, bind=True)
+def dispatch_campaign_batches(self, prepared: Dict[str, Any], campaign: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fan a campaign's recipients out to parallel batch sends, aggregated by a chord.
+    
+    Args:
+        prepared: ``prepare_campaign_message`` result
+        campaign: Campaign built by ``start_delivery_campaign``
+        
+    Returns:
+        Failure result if the message could not be prepared; otherwise this
+        task is replaced by the chord and its result is the aggregate
+    """
+    deliveries = campaign['deliveries']
+    batch_timezones = []
+    header = []
+    for delivery in deliveries:
+        target_users = delivery['target_users']
+        for i in range(0, len(target_users), DELIVERY_BATCH_SIZE):
+            header.append(send_rich_message_to_user_batch.s(
+                target_users[i:i + DELIVERY_BATCH_SIZE],
+                prepared.get('image_path', ''),
+                prepared.get('content_data', {}),
+                campaign['category'],
+                delivery['timezone']
+            ))
+            batch_timezones.append(delivery['timezone'])
+    
+    # Carry counts rather than the user lists through the rest of the canvas
+    summary = {key: value for key, value in campaign.items() if key != 'deliveries'}
+    summary.update(
+        dispatched_at=datetime.now(timezone.utc).timestamp(),
+        users_count=sum(len(d['target_users']) for d in deliveries),
+        batch_timezones=batch_timezones
+    )
+    
+    if not prepared.get('success', False):
+        return _campaign_failure(summary, prepared.get('error', 'Message preparation failed'),
+                                 prepared.get('stage', 'message_generation'))
+    if not header:
+        return _campaign_failure(summary, 'No users to deliver to', 'dispatch')
+    
+    logger.info(f"Dispatching campaign {campaign['campaign_id']}: {len(header)} batches "
+               f"for {summary['users_count']} users")
+    callback = aggregate_campaign_delivery.s(summary).on_error(campaign_delivery_failed.s(summary))
+    return self.replace(chord(header, callback))
+
+
+@celery_app.task(base=RichMessageTask)
+def aggregate_campaign_delivery(batch_results: List[Dict[str, Any]], campaign: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Chord callback: total a campaign's batch results and record its latency.
+    
+    Args:
+        batch_results: ``send_rich_message_to_user_batch`` results, in dispatch order
+        campaign: Campaign summary from ``dispatch_campaign_batches``
+        
+    Returns:
+        Dictionary with delivery totals per campaign and per timezone, and
+        the generation, delivery and end-to-end latency in seconds
+    """
+    timezones: Dict[str, Dict[str, int]] = {}
+    multicast_calls = 0
+    errors = []
+    for timezone_name, batch in zip(campaign['batch_timezones'], batch_results):
+        batch = batch or {}
+        totals = timezones.setdefault(timezone_name, {'users_count': 0, 'successful_deliveries': 0,
+                                                      'failed_deliveries': 0, 'batches': 0})
+        totals['batches'] += 1
+        totals['users_count'] += batch.get('users_count', 0)
+        totals['successful_deliveries'] += batch.get('successful_deliveries', 0)
+        totals['failed_deliveries'] += batch.get('failed_deliveries', 0)
+        multicast_calls += batch.get('multicast_calls', 0)
+        if batch.get('error'):
+            errors.append(f"{timezone_name}: {batch['error']}")
+    
+    successful = sum(t['successful_deliveries'] for t in timezones.values())
+    failed = sum(t['failed_deliveries'] for t in timezones.values())
+    success_rate = successful / max(1, successful + failed)
+    
+    result = dict(
+        _campaign_timing(campaign),
+        success=success_rate > 0.5,  # Consider successful if >50% delivered
+        successful_deliveries=successful,
+        failed_deliveries=failed,
+        success_rate=success_rate,
+        batches=len(batch_results),
+        multicast_calls=multicast_calls,
+        timezones=timezones,
+        errors=errors[:5]
+    )
+    if success_rate <= 0.5:
+        result['error'] = f"Low success rate: {success_rate:.2%}"
+    
+    logger.info(f"Campaign {campaign['campaign_id']} delivered {successful}/{successful + failed} "
+               f"in {result['campaign_latency_seconds']:.1f}s", extra=result)
+    return result
+
+
+@celery_app.task(base=RichMessageTask)
+def campaign_delivery_failed(request, exc, traceback, campaign: Dict[str, Any]) -> Dict[str, Any]:
+    """Chord error callback: record a campaign whose batches could not be aggregated."""
+    return _campaign_failure(campaign, str(exc), 'delivery')
+
+
+def _campaign_timing(campaign: Dict[str, Any]) -> Dict[str, Any]:
+    """Campaign identity and latency breakdown, measured up to now."""
+    finished_at = datetime.now(timezone.utc).timestamp()
+    dispatched_at = campaign.get('dispatched_at', finished_at)
+    return {
+        'campaign_id': campaign['campaign_id'],
+        'category': campaign['category'],
+        'local_delivery_time': campaign['local_delivery_time'],
+        'users_count': campaign.get('users_count', 0),
+        'generation_seconds': dispatched_at - campaign['started_at'],
+        'delivery_seconds': finished_at - dispatched_at,
+        'campaign_latency_seconds': finished_at - campaign['started_at']
+    }
+
+
+def _campaign_failure(campaign: Dict[str, Any], error: str, stage: str) -> Dict[str, Any]:
+    result = dict(_campaign_timing(campaign), success=False, error=error, stage=stage,
+                  successful_deliveries=0, failed_deliveries=campaign.get('users_count', 0))
+    logger.error(f"Campaign {campaign['campaign_id']} failed at {stage}: {error}", extra=result)
+    return result
+
+
 @celery_app.task(base=RichMessageTask)
 def process_delivery_retries(self) -> Dict[str, Any]:
     """
@@ -524,24 +677,15 @@ def send_rich_message_to_user_batch(self, user_ids: List[str], image_path: str,
         
         delivery_tracker = get_delivery_tracker()
         
-        # Initialize services
-        settings = Settings()
-        openai_service = OpenAIService(settings)
-        conversation_service = ConversationService(settings)
-        line_service = LineService(settings, openai_service, conversation_service)
-        
-        config = get_rich_message_config()
-        template_manager = TemplateManager(config)
-        content_generator = ContentGenerator(openai_service, config)
-        
-        rich_message_service = RichMessageService(
-            line_bot_api=line_service.line_bot_api,
-            template_manager=template_manager,
-            content_generator=content_generator
-        )
+        # Shared worker services
+        services = get_worker_services()
+        with services.task_setup(self.name):
+            settings = services.settings
+            line_bot_api = services.line_bot_api
+            rich_message_service = services.rich_message_service
         
-        # Create Flex Message
-        flex_message = rich_message_service.create_flex_message(
+        # Render the Flex Message from the payload cache shared by the worker's batches
+        flex_message = rich_message_service.render_flex_message(
             title=content_data.get('title', ''),
             content=content_data.get('content', ''),
             image_url=None,
@@ -565,82 +709,35 @@ def send_rich_message_to_user_batch(self, user_ids: List[str], image_path: str,
                 'failed_deliveries': len(user_ids)
             }
         
-        # Send to each user with individual tracking
-        successful_deliveries = 0
-        failed_deliveries = 0
-        delivery_errors = []
-        
-        for user_id in user_ids:
-            user_delivery_start = datetime.now()
-            
-            # Create delivery record if not tracking an existing delivery
-            user_delivery_id = delivery_id
-            user_attempt_id = attempt_id
-            
-            if not user_delivery_id:
-                # Create new delivery record for this user
-                delivery_record = delivery_tracker.create_delivery_record(
-                    user_id=user_id,
-                    content_category=category,
-                    timezone_name=timezone_name,
-                    scheduled_time=datetime.now(timezone.utc),
-                    content_title=content_data.get('title')
-                )
-                user_delivery_id = delivery_record.delivery_id
-                user_attempt_id = delivery_tracker.start_delivery_attempt(user_delivery_id)
-            
-            try:
-                # Send individual message
-                line_service.line_bot_api.push_message(user_id, flex_message)
-                
-                # Calculate delivery time
-                delivery_time_ms = int((datetime.now() - user_delivery_start).total_seconds() * 1000)
-                
-                # Record success
-                if user_delivery_id and user_attempt_id:
-                    delivery_tracker.record_delivery_success(
-                        user_delivery_id, user_attempt_id, delivery_time_ms
-                    )
-                
-                successful_deliveries += 1
-                
-            except Exception as e:
-                error_msg = str(e)
-                logger.warning(f"Failed to send message to user {user_id[:8]}...: {error_msg}")
-                
-                # Classify error type
-                error_type = ErrorType.NETWORK_ERROR
-                if "rate limit" in error_msg.lower():
-                    error_type = ErrorType.RATE_LIMIT
-                elif "forbidden" in error_msg.lower() or "user not found" in error_msg.lower():
-                    error_type = ErrorType.INVALID_USER
-                elif "timeout" in error_msg.lower():
-                    error_type = ErrorType.TIMEOUT_ERROR
-                
-                # Calculate delivery time
-                delivery_time_ms = int((datetime.now() - user_delivery_start).total_seconds() * 1000)
-                
-                # Record failure
-                if user_delivery_id and user_attempt_id:
-                    delivery_tracker.record_delivery_failure(
-                        user_delivery_id, user_attempt_id, error_msg, error_type, delivery_time_ms
-                    )
-                
-                failed_deliveries += 1
-                delivery_errors.append(f"User {user_id[:8]}...: {error_msg}")
+        # Multicast in concurrent chunks, with a delivery record per user
+        engine = BulkDeliveryEngine(
+            line_bot_api,
+            delivery_tracker,
+            chunk_size=getattr(settings, 'RICH_MESSAGE_MULTICAST_CHUNK_SIZE', MULTICAST_MAX_RECIPIENTS),
+            max_concurrency=getattr(settings, 'RICH_MESSAGE_MULTICAST_CONCURRENCY', 8)
+        )
+        delivery = engine.deliver(
+            user_ids, flex_message, category, timezone_name,
+            content_title=content_data.get('title'),
+            delivery_id=delivery_id,
+            attempt_id=attempt_id
+        )
+        successful_deliveries = delivery['successful_deliveries']
         
         # Calculate total processing time
         total_time_ms = int((datetime.now() - delivery_start).total_seconds() * 1000)
         
         result = {
-            'success': successful_deliveries > 0,
+            'success': delivery['success'],
             'users_count': len(user_ids),
             'successful_deliveries': successful_deliveries,
-            'failed_deliveries': failed_deliveries,
+            'failed_deliveries': delivery['failed_deliveries'],
             'success_rate': successful_deliveries / len(user_ids) if user_ids else 0,
             'timezone': timezone_name,
             'category': category,
-            'delivery_errors': delivery_errors[:5],  # Limit error list
+            'delivery_errors': delivery['delivery_errors'],
+            'multicast_calls': delivery['multicast_calls'],
+            'push_calls': delivery['push_calls'],
             'total_processing_time_ms': total_time_ms,
             'tracked_delivery': delivery_id is not None
         }
@@ -661,6 +758,17 @@ def send_rich_message_to_user_batch(self, user_ids: List[str], image_path: str,
                 delivery_id, attempt_id, error_msg, ErrorType.SYSTEM_ERROR
             )
         
+        if self.request.retries >= self.max_retries:
+            # Report the failed batch so a campaign chord can still aggregate
+            return {
+                'success': False,
+                'error': error_msg,
+                'users_count': len(user_ids),
+                'successful_deliveries': 0,
+                'failed_deliveries': len(user_ids),
+                'timezone': timezone_name,
+                'category': category
+            }
         self.retry(countdown=30 * (self.request.retries + 1))
 
 
@@ -762,9 +870,12 @@ def generate_daily_rich_messages(self, categories: Optional[List[str]] = None,
         start_time = datetime.now()
         logger.info("Starting daily Rich Message generation")
         
-        # Initialize services
-        config = get_rich_message_config()
-        settings = Settings()
+        # Shared worker services
+        services = get_worker_services()
+        with services.task_setup(self.name):
+            config = services.rich_message_config
+            content_generator = services.content_generator
+            content_validator = services.content_validator
         
         # Parse target time
         if target_time:
@@ -788,12 +899,29 @@ def generate_daily_rich_messages(self, categories: Optional[List[str]] = None,
             'errors': []
         }
         
+        # Generate content for all categories in batched calls, in this worker rather
+        # than a subtask waited on; categories missing from the batch fall back to
+        # per-category generation
+        batch_contents = {}
+        try:
+            batch_result = _generate_delivery_contents(
+                content_generator,
+                content_validator,
+                [category.value for category in target_categories],
+                delivery_time.strftime("%H:%M")
+            )
+            batch_contents = batch_result.get('contents', {})
+            results['content_batch'] = batch_result.get('batch_stats', {})
+        except Exception as e:
+            logger.warning(f"Batched content generation failed, generating per category: {str(e)}")
+        
         # Generate content for each category
         for category in target_categories:
             try:
                 generation_result = generate_rich_message_for_category.delay(
                     category.value,
-                    delivery_time.strftime("%H:%M")
+                    delivery_time.strftime("%H:%M"),
+                    batch_contents.get(category.value)
                 )
                 
                 # Get result (with timeout)
@@ -829,13 +957,16 @@ def generate_daily_rich_messages(self, categories: Optional[List[str]] = None,
 
 @celery_app.task(base=RichMessageTask, bind=True, max_retries=2)
 def generate_rich_message_for_category(self, category: str, 
-                                     target_time: str = "09:00") -> Dict[str, Any]:
+                                     target_time: str = "09:00",
+                                     pregenerated_content: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Generate and deliver Rich Message for a specific category.
     
     Args:
         category: Content category name
         target_time: Target delivery time (HH:MM format)
+        pregenerated_content: Content already generated by a batched run
+            (a ``generate_content_for_delivery`` result); generated here if omitted
         
     Returns:
         Dictionary with generation result
@@ -844,26 +975,6 @@ def generate_rich_message_for_category(self, category: str,
         start_time = datetime.now()
         logger.info(f"Generating Rich Message for category: {category}")
         
-        # Initialize services
-        settings = Settings()
-        config = get_rich_message_config()
-        
-        openai_service = OpenAIService(settings)
-        conversation_service = ConversationService(settings)
-        line_service = LineService(settings, openai_service, conversation_service)
-        
-        template_manager = TemplateManager(config)
-        content_generator = ContentGenerator(openai_service, config)
-        image_composer = ImageComposer(config)
-        template_selector = TemplateSelector(template_manager, config)
-        content_validator = ContentValidator(ValidationLevel.MODERATE)
-        
-        rich_message_service = RichMessageService(
-            line_bot_api=line_service.line_bot_api,
-            template_manager=template_manager,
-            content_generator=content_generator
-        )
-        
         # Parse delivery time
         hour, minute = map(int, target_time.split(':'))
         delivery_time = time(hour, minute)
@@ -871,11 +982,14 @@ def generate_rich_message_for_category(self, category: str,
         # Parse category
         content_category = ContentCategory(category)
         
-        # Step 1: Generate content
-        content_result = generate_content_for_delivery.delay(
-            category, target_time
-        )
-        generated_content = content_result.get(timeout=120)  # 2 minutes
+        # Step 1: Generate content (unless a batched run already did)
+        if pregenerated_content and pregenerated_content.get('success', False):
+            generated_content = pregenerated_content
+        else:
+            content_result = generate_content_for_delivery.delay(
+                category, target_time
+            )
+            generated_content = content_result.get(timeout=120)  # 2 minutes
         
         if not generated_content.get('success', False):
             return {
@@ -950,12 +1064,11 @@ def generate_rich_message_for_category(self, category: str,
 def generate_content_for_delivery(self, category: str, target_time: str) -> Dict[str, Any]:
     """Generate appropriate content for delivery."""
     try:
-        # Initialize services
-        settings = Settings()
-        config = get_rich_message_config()
-        openai_service = OpenAIService(settings)
-        content_generator = ContentGenerator(openai_service, config)
-        content_validator = ContentValidator(ValidationLevel.MODERATE)
+        # Shared worker services
+        services = get_worker_services()
+        with services.task_setup(self.name):
+            content_generator = services.content_generator
+            content_validator = services.content_validator
         
         # Parse parameters
         content_category = ContentCategory(category)
@@ -984,24 +1097,127 @@ def generate_content_for_delivery(self, category: str, target_time: str) -> Dict
                 'error': f'Content validation failed: {", ".join([issue.message for issue in validation_result.issues])}'
             }
         
-        return {
-            'success': True,
-            'content_data': {
-                'title': generated_content.title,
-                'content': generated_content.content,
-                'language': generated_content.language,
-                'category': generated_content.category.value,
-                'theme': generated_content.theme.value if generated_content.theme else None
-            },
-            'content_metadata': {
-                'generation_time': generated_content.generation_time.isoformat(),
-                'validation_score': validation_result.score,
-                'validation_result': validation_result.result.value
+        return _content_delivery_result(generated_content, validation_result)
+        
+    except Exception as e:
+        logger.error(f"Content generation failed: {str(e)}")
+        self.retry(countdown=30 * (self.request.retries + 1))
+
+
+def _content_delivery_result(generated_content, validation_result) -> Dict[str, Any]:
+    """Task result for validated content, as consumed by the delivery pipeline."""
+    return {
+        'success': True,
+        'content_data': {
+            'title': generated_content.title,
+            'content': generated_content.content,
+            'language': generated_content.language,
+            'category': generated_content.category.value,
+            'theme': generated_content.theme.value if generated_content.theme else None
+        },
+        'content_metadata': {
+            'generation_time': generated_content.generation_time.isoformat(),
+            'validation_score': validation_result.score if validation_result else None,
+            'validation_result': validation_result.result.value if validation_result else None
+        }
+    }
+
+
+def _generate_delivery_contents(content_generator, content_validator, categories: List[str],
+                                target_time: str, variations: int = 1,
+                                progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+                                ) -> Dict[str, Any]:
+    """Batched content for several categories, keeping the best-scoring valid variation of each."""
+    hour, minute = map(int, target_time.split(':'))
+    delivery_time = time(hour, minute)
+    
+    # One request per category variation
+    items = []
+    for category in categories:
+        for variation in range(variations):
+            request = content_generator.build_daily_request(
+                ContentCategory(category),
+                delivery_time,
+                language="en",
+                custom_context=f"variation_{variation + 1}" if variations > 1 else None
+            )
+            items.append((category, variation, request))
+    
+    batch = content_generator.generate_content_batch(
+        [request for _, _, request in items],
+        validator=content_validator,
+        progress_callback=progress_callback
+    )
+    
+    # Keep the best-scoring valid variation per category
+    contents = {}
+    for (category, _, _), content, validation in zip(items, batch.contents, batch.validations):
+        if content is None:
+            continue
+        score = validation.score if validation is not None else 0.0
+        current = contents.get(category)
+        if current is None or score > (current['content_metadata']['validation_score'] or 0.0):
+            contents[category] = _content_delivery_result(content, validation)
+    
+    return {
+        'success': bool(contents),
+        'contents': contents,
+        'missing_categories': [category for category in categories if category not in contents],
+        'batch_stats': {
+            'items': len(items),
+            'upstream_calls': batch.upstream_calls,
+            'cache_hits': batch.cache_hits,
+            'regenerated_items': batch.regenerated_items,
+            'failed_items': batch.failed_items,
+            'elapsed_seconds': batch.elapsed_seconds,
+            'item_latency_seconds': {
+                f"{category}:{variation + 1}": latency
+                for (category, variation, _), latency in zip(items, batch.item_latency)
             }
         }
+    }
+
+
+@celery_app.task(base=RichMessageTask, bind=True, max_retries=2)
+def generate_content_batch_for_delivery(self, categories: List[str], target_time: str,
+                                        variations: int = 1) -> Dict[str, Any]:
+    """
+    Generate delivery content for several categories with batched upstream calls.
+    
+    Each category gets ``variations`` candidate items; every item is validated
+    on its own, failed items are regenerated, and the best-scoring valid
+    variation is used for the category.
+    
+    Args:
+        categories: Content category names
+        target_time: Target delivery time (HH:MM format)
+        variations: Candidate items generated per category
+        
+    Returns:
+        Dictionary with per-category results in ``generate_content_for_delivery``
+        format and batch statistics
+    """
+    try:
+        # Shared worker services
+        services = get_worker_services()
+        with services.task_setup(self.name):
+            content_generator = services.content_generator
+            content_validator = services.content_validator
+        
+        def report_progress(progress):
+            logger.info(
+                f"Batched content generation: {progress['completed_items']}/{progress['total_items']} items, "
+                f"{progress['upstream_calls']} calls, "
+                f"{progress['last_call_seconds'] / max(1, progress['last_call_items']):.2f}s per item"
+            )
+            self.update_state(state='PROGRESS', meta=progress)
+        
+        return _generate_delivery_contents(
+            content_generator, content_validator, categories, target_time, variations, report_progress
+        )
         
     except Exception as e:
-        logger.error(f"Content generation failed: {str(e)}")
+        logger.error(f"Batched content generation failed: {str(e)}")
         self.retry(countdown=30 * (self.request.retries + 1))
 
 
@@ -1010,10 +1226,10 @@ def select_template_for_content(self, category: str, target_time: str,
                                content_metadata: Dict[str, Any]) -> Dict[str, Any]:
     """Select appropriate template for content."""
     try:
-        # Initialize services
-        config = get_rich_message_config()
-        template_manager = TemplateManager(config)
-        template_selector = TemplateSelector(template_manager, config)
+        # Shared worker services
+        services = get_worker_services()
+        with services.task_setup(self.name):
+            template_selector = services.template_selector
         
         # Parse parameters
         content_category = ContentCategory(category)
@@ -1057,10 +1273,11 @@ def select_template_for_content(self, category: str, target_time: str,
 def compose_rich_message_image(self, template_id: str, content_data: Dict[str, Any]) -> Dict[str, Any]:
     """Compose Rich Message image from template and content."""
     try:
-        # Initialize services
-        config = get_rich_message_config()
-        template_manager = TemplateManager(config)
-        image_composer = ImageComposer(config)
+        # Shared worker services
+        services = get_worker_services()
+        with services.task_setup(self.name):
+            template_manager = services.template_manager
+            image_composer = services.image_composer
         
         # Load template
         template = template_manager.load_template(template_id)
@@ -1120,22 +1337,13 @@ def broadcast_rich_message(self, image_path: str, content_data: Dict[str, Any],
                           category: str) -> Dict[str, Any]:
     """Broadcast Rich Message to users."""
     try:
-        # Initialize services
-        settings = Settings()
-        config = get_rich_message_config()
-        
-        openai_service = OpenAIService(settings)
-        conversation_service = ConversationService(settings)
-        line_service = LineService(settings, openai_service, conversation_service)
+        # Shared worker services
+        services = get_worker_services()
+        with services.task_setup(self.name):
+            rich_message_service = services.rich_message_service
         
-        rich_message_service = RichMessageService(
-            line_bot_api=line_service.line_bot_api,
-            template_manager=None,
-            content_generator=None
-        )
-        
-        # Create Flex Message
-        flex_message = rich_message_service.create_flex_message(
+        # Render the Flex Message from the payload cache
+        flex_message = rich_message_service.render_flex_message(
             title=content_data['title'],
             content=content_data['content'],
             image_url=None,  # Will use local image
@@ -1216,7 +1424,8 @@ def health_check_task() -> Dict[str, Any]:
         delivery_tracker = get_delivery_tracker()
         analytics_tracker = get_analytics_tracker()
         timezone_manager = get_timezone_manager()
-        config = get_rich_message_config()
+        services = get_worker_services()
+        config = services.rich_message_config
         
         # Basic health status
         health_status = {
@@ -1233,7 +1442,7 @@ def health_check_task() -> Dict[str, Any]:
         
         # Check individual services
         try:
-            settings = Settings()
+            services.settings
             health_status['services_status']['settings'] = 'healthy'
         except Exception as e:
             health_status['services_status']['settings'] = f'error: {str(e)}'
@@ -1241,7 +1450,7 @@ def health_check_task() -> Dict[str, Any]:
         
         try:
             # Check OpenAI service
-            openai_service = OpenAIService(settings)
+            services.openai_service
             health_status['services_status']['openai'] = 'healthy'
         except Exception as e:
             health_status['services_status']['openai'] = f'error: {str(e)}'
@@ -1249,8 +1458,7 @@ def health_check_task() -> Dict[str, Any]:
         
         try:
             # Check LINE service
-            conversation_service = ConversationService(settings)
-            line_service = LineService(settings, openai_service, conversation_service)
+            services.line_service
             health_status['services_status']['line'] = 'healthy'
         except Exception as e:
             health_status['services_status']['line'] = f'error: {str(e)}'
@@ -1326,7 +1534,7 @@ def health_check_task() -> Dict[str, Any]:
         
         # Template system health
         try:
-            template_manager = TemplateManager(config)
+            template_manager = services.template_manager
             available_templates = len(template_manager.templates)
             
             health_status['template_health'] = {
@@ -1346,6 +1554,7 @@ def health_check_task() -> Dict[str, Any]:
         # Performance metrics
         execution_time = (datetime.now() - start_time).total_seconds()
         health_status['health_check_execution_time_ms'] = int(execution_time * 1000)
+        health_status['worker_services'] = services.get_stats()
         
         # Determine overall status based on issues
         if any('critical' in issue.lower() or 'error' in issue.lower() for issue in health_status['issues']):
@@ -1394,6 +1603,10 @@ celery_app.conf.task_routes = {
     'src.tasks.rich_message_automation.generate_daily_rich_messages': {'queue': 'high_priority'},
     'src.tasks.rich_message_automation.coordinate_timezone_deliveries': {'queue': 'high_priority'},
     'src.tasks.rich_message_automation.execute_timezone_delivery': {'queue': 'timezone_delivery'},
+    'src.tasks.rich_message_automation.prepare_campaign_message': {'queue': 'content_generation'},
+    'src.tasks.rich_message_automation.dispatch_campaign_batches': {'queue': 'timezone_delivery'},
+    'src.tasks.rich_message_automation.aggregate_campaign_delivery': {'queue': 'timezone_delivery'},
+    'src.tasks.rich_message_automation.campaign_delivery_failed': {'queue': 'timezone_delivery'},
     'src.tasks.rich_message_automation.send_rich_message_to_user_batch': {'queue': 'batch_delivery'},
     'src.tasks.rich_message_automation.process_delivery_retries': {'queue': 'retry_processing'},
     'src.tasks.rich_message_automation.retry_failed_delivery': {'queue': 'retry_delivery'},
@@ -1401,6 +1614,7 @@ celery_app.conf.task_routes = {
     'src.tasks.rich_message_automation.cleanup_timezone_data': {'queue': 'maintenance'},
     'src.tasks.rich_message_automation.generate_rich_message_for_category': {'queue': 'default'},
     'src.tasks.rich_message_automation.generate_content_for_delivery': {'queue': 'content_generation'},
+    'src.tasks.rich_message_automation.generate_content_batch_for_delivery': {'queue': 'content_generation'},
     'src.tasks.rich_message_automation.select_template_for_content': {'queue': 'template_processing'},
     'src.tasks.rich_message_automation.compose_rich_message_image': {'queue': 'image_processing'},
     'src.tasks.rich_message_automation.broadcast_rich_message': {'queue': 'delivery'},
@@ -20,6 +20,7 @@ from src.exceptions import (
 )
 from src.utils.error_handler import StructuredLogger, error_handler
 from src.utils.connection_pool import connection_pool_manager
+from src.utils.worker_services import get_worker_services
 
 logger = StructuredLogger(__name__)
 
@@ -105,17 +106,11 @@ def process_text_message_async(self, user_id: str, message_text: str,
         logger.info("Processing text message in background")
         
         try:
-            # Import services here to avoid circular imports
-            from src.services.line_service import LineService
-            from src.services.openai_service import OpenAIService
-            from src.services.conversation_factory import create_conversation_service
-            from src.config.settings import Settings
-            
-            # Initialize services (these should be cached/singleton in production)
-            settings = Settings()
-            conversation_service = create_conversation_service(settings)
-            openai_service = OpenAIService(settings, conversation_service)
-            line_service = LineService(settings, openai_service, conversation_service)
+            # Shared worker services
+            services = get_worker_services()
+            with services.task_setup(self.name):
+                openai_service = services.openai_service
+                line_service = services.line_service
             
             # Get AI response
             logger.debug("Getting AI response for text message")
@@ -184,11 +179,7 @@ def process_text_message_async(self, user_id: str, message_text: str,
             
             # Attempt to send error message to user
             try:
-                from src.services.line_service import LineService
-                from src.config.settings import Settings
-                
-                settings = Settings()
-                line_service = LineService(settings, None, None)
+                line_service = get_worker_services().line_service
                 
                 error_message = "I'm sorry, I'm experiencing technical difficulties. Please try again later."
                 line_service.line_bot_api.reply_message(
@@ -233,18 +224,13 @@ def process_image_message_async(self, user_id: str, message_id: str,
         logger.info("Processing image message in background")
         
         try:
-            # Import services here to avoid circular imports
-            from src.services.line_service import LineService
-            from src.services.openai_service import OpenAIService
-            from src.services.conversation_factory import create_conversation_service
-            from src.config.settings import Settings
             from src.utils.image_utils import ImageProcessor
             
-            # Initialize services
-            settings = Settings()
-            conversation_service = create_conversation_service(settings)
-            openai_service = OpenAIService(settings, conversation_service)
-            line_service = LineService(settings, openai_service, conversation_service)
+            # Shared worker services
+            services = get_worker_services()
+            with services.task_setup(self.name):
+                openai_service = services.openai_service
+                line_service = services.line_service
             
             # Download and process image
             logger.debug("Downloading and processing image")
@@ -333,11 +319,7 @@ def process_image_message_async(self, user_id: str, message_id: str,
             
             # Attempt to send error message to user
             try:
-                from src.services.line_service import LineService
-                from src.config.settings import Settings
-                
-                settings = Settings()
-                line_service = LineService(settings, None, None)
+                line_service = get_worker_services().line_service
                 
                 error_message = "I'm sorry, I had trouble processing your image. Please try again later."
                 line_service.line_bot_api.reply_message(
@@ -382,17 +364,10 @@ def process_postback_async(self, user_id: str, postback_data: str,
         logger.info("Processing postback event in background")
         
         try:
-            # Import services here to avoid circular imports
-            from src.services.line_service import LineService
-            from src.services.openai_service import OpenAIService
-            from src.services.conversation_factory import create_conversation_service
-            from src.config.settings import Settings
-            
-            # Initialize services
-            settings = Settings()
-            conversation_service = create_conversation_service(settings)
-            openai_service = OpenAIService(settings, conversation_service)
-            line_service = LineService(settings, openai_service, conversation_service)
+            # Shared worker services
+            services = get_worker_services()
+            with services.task_setup(self.name):
+                line_service = services.line_service
             
             # Parse postback data
             try:
@@ -462,11 +437,7 @@ def process_postback_async(self, user_id: str, postback_data: str,
             
             # Attempt to send error message to user
             try:
-                from src.services.line_service import LineService
-                from src.config.settings import Settings
-                
-                settings = Settings()
-                line_service = LineService(settings, None, None)
+                line_service = get_worker_services().line_service
                 
                 error_message = "Thanks for the interaction! I'm processing your request."
                 line_service.line_bot_api.reply_message(
@@ -516,14 +487,10 @@ def batch_process_rich_messages(user_ids: List[str], message_template: str,
                 # Fallback to synchronous processing if async pipeline not available
                 logger.warning("Async pipeline not available, falling back to synchronous processing")
                 
-                # Import services for fallback
-                from src.services.rich_message_service import RichMessageService
-                from src.services.line_service import LineService
-                from src.config.settings import Settings
-                
-                settings = Settings()
-                line_service = LineService(settings, None, None)
-                rich_message_service = RichMessageService(line_service.line_bot_api)
+                # Shared worker services for fallback
+                services = get_worker_services()
+                with services.task_setup('webhook.batch_process_rich_messages'):
+                    line_service = services.line_service
                 
                 # Process synchronously
                 delivered_count = 0
@@ -641,7 +608,8 @@ def webhook_processing_health_check() -> Dict[str, Any]:
                 'total_pools': pool_metrics.get('total_pools', 0),
                 'healthy_connections': len([h for h in pool_metrics.get('health', {}).values() 
                                           if h.get('state') == 'healthy'])
-            }
+            },
+            'worker_services': get_worker_services().get_stats()
         }
         
     except Exception as e:
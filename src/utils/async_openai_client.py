@@ -0,0 +1,227 @@
+"""
+Shared async Azure OpenAI clients over one keep-alive connection pool.
+
+A single ``httpx.AsyncClient`` (HTTP/2 when enabled and ``h2`` is installed)
+backs both the Responses API client and the Chat Completions fallback client,
+so concurrent requests share a few long-lived connections instead of each
+holding a worker thread. ``ConcurrencyLimiter`` caps requests in flight,
+overall and per deployment.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import httpx
+from openai import AsyncAzureOpenAI
+
+from src.utils.error_handler import StructuredLogger
+
+# HTTP/2 needs the optional h2 package
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = StructuredLogger(__name__)
+
+
+class ConcurrencyLimiter:
+    """
+    Bound in-flight requests globally and per deployment.
+
+    The per-deployment slot is taken first, so a request waiting on a busy
+    deployment does not hold one of the global slots.
+    """
+
+    def __init__(self, max_in_flight: int = 50, max_per_deployment: int = 20):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_in_flight: Maximum concurrent requests across all deployments
+            max_per_deployment: Maximum concurrent requests to one deployment
+        """
+        self.max_in_flight = max_in_flight
+        self.max_per_deployment = max_per_deployment
+        self._global = asyncio.Semaphore(max_in_flight)
+        self._deployments: Dict[str, asyncio.Semaphore] = {}
+
+        self.in_flight = 0
+        self.deployment_in_flight: Dict[str, int] = {}
+        self.stats = {
+            'requests': 0,
+            'queued_requests': 0,
+            'total_wait_time': 0.0,
+            'avg_wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'peak_in_flight': 0
+        }
+
+    @asynccontextmanager
+    async def acquire(self, deployment: str) -> AsyncIterator[None]:
+        """Hold one global and one per-deployment slot for the duration of a request."""
+        semaphore = self._deployments.get(deployment)
+        if semaphore is None:
+            semaphore = self._deployments[deployment] = asyncio.Semaphore(self.max_per_deployment)
+
+        started = time.perf_counter()
+        queued = semaphore.locked() or self._global.locked()
+
+        async with semaphore:
+            async with self._global:
+                self._record_start(deployment, time.perf_counter() - started, queued)
+                try:
+                    yield
+                finally:
+                    self.in_flight -= 1
+                    self.deployment_in_flight[deployment] -= 1
+
+    def _record_start(self, deployment: str, wait_time: float, queued: bool):
+        """Update counters when a request gets its slots."""
+        stats = self.stats
+        stats['requests'] += 1
+        if queued:
+            stats['queued_requests'] += 1
+        stats['total_wait_time'] += wait_time
+        stats['avg_wait_time'] = stats['total_wait_time'] / stats['requests']
+        stats['max_wait_time'] = max(stats['max_wait_time'], wait_time)
+
+        self.in_flight += 1
+        self.deployment_in_flight[deployment] = self.deployment_in_flight.get(deployment, 0) + 1
+        stats['peak_in_flight'] = max(stats['peak_in_flight'], self.in_flight)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get limiter statistics."""
+        return {
+            **self.stats,
+            'in_flight': self.in_flight,
+            'deployment_in_flight': dict(self.deployment_in_flight),
+            'max_in_flight': self.max_in_flight,
+            'max_per_deployment': self.max_per_deployment
+        }
+
+
+class AsyncOpenAIClientPool:
+    """
+    Async Responses API and Chat Completions clients sharing one connection pool.
+
+    The pool belongs to the event loop it was created in; ``loop`` lets
+    callers detect when a new loop needs a pool of its own.
+    """
+
+    def __init__(self,
+                 api_key: str,
+                 endpoint: str,
+                 api_version: str,
+                 http2: bool = True,
+                 max_connections: int = 50,
+                 max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0,
+                 timeout: float = 30.0,
+                 max_in_flight: int = 50,
+                 max_per_deployment: int = 20):
+        """
+        Create the shared HTTP pool and both clients.
+
+        Args:
+            api_key: Azure OpenAI API key
+            endpoint: Azure OpenAI resource endpoint
+            api_version: API version for the Chat Completions client
+            http2: Use HTTP/2 when the ``h2`` package is installed
+            max_connections: Maximum open connections
+            max_keepalive_connections: Idle connections kept alive for reuse
+            keepalive_expiry: Seconds an idle connection is kept
+            timeout: Read timeout in seconds
+            max_in_flight: Global concurrent request limit
+            max_per_deployment: Per-deployment concurrent request limit
+        """
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 requested but h2 is not installed, using HTTP/1.1")
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.max_connections = max_connections
+        self.loop = asyncio.get_running_loop()
+
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_keepalive_connections=max_keepalive_connections,
+                max_connections=max_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                connect=10.0,
+                read=timeout,
+                write=10.0,
+                pool=5.0
+            ),
+            http2=self.http2,
+            follow_redirects=True
+        )
+
+        # Same endpoints as the synchronous clients
+        self.client = AsyncAzureOpenAI(
+            api_key=api_key,
+            api_version="preview",  # For Responses API support
+            base_url=f"{endpoint.rstrip('/')}/openai/v1/",
+            azure_endpoint=None,
+            http_client=self.http_client,
+            timeout=timeout
+        )
+        self.fallback_client = AsyncAzureOpenAI(
+            api_key=api_key,
+            api_version=api_version,
+            azure_endpoint=endpoint,
+            http_client=self.http_client,
+            timeout=timeout
+        )
+
+        self.limiter = ConcurrencyLimiter(max_in_flight=max_in_flight, max_per_deployment=max_per_deployment)
+        self.created_at = time.time()
+
+        logger.info(f"Created async Azure OpenAI client pool (http2={self.http2})")
+
+    async def aclose(self):
+        """Close the shared connection pool."""
+        await self.http_client.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool configuration and limiter statistics."""
+        return {
+            'http2': self.http2,
+            'max_connections': self.max_connections,
+            'closed': self.http_client.is_closed,
+            'uptime_seconds': time.time() - self.created_at,
+            'concurrency': self.limiter.get_stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        }
+
+
+class AsyncResponseStream:
+    """
+    Async iterator over the text deltas of a streamed response.
+
+    Once iteration completes, ``result`` holds the final response dict in the
+    same shape ``OpenAIService.get_response`` returns.
+    """
+
+    def __init__(self, producer: Callable[['AsyncResponseStream'], AsyncIterator[str]]):
+        """
+        Args:
+            producer: Called with this stream; returns the async generator of
+                deltas, which sets ``result`` before finishing
+        """
+        self.result: Optional[Dict[str, Any]] = None
+        self._iterator = producer(self)
+
+    def __aiter__(self) -> 'AsyncResponseStream':
+        return self
+
+    async def __anext__(self) -> str:
+        return await self._iterator.__anext__()
+
+    async def aclose(self):
+        """Stop the stream early and release its connection and limiter slots."""
+        await self._iterator.aclose()
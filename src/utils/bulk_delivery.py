@@ -0,0 +1,246 @@
+"""
+Bulk Rich Message delivery over LINE multicast.
+
+Recipients of the same payload are grouped into multicast calls of up to 500
+user IDs (the Messaging API limit per call), and the calls run concurrently
+on the LINE client's pooled session. Each chunk gets one retry key, and a
+multicast that times out or hits a 5xx is retried with that same key, so
+LINE delivers it at most once. Only a chunk that LINE definitely rejected
+(a 4xx) falls back to individual pushes for its recipients. A throttled
+multicast (HTTP 429), or one that still fails after its retries, is not
+fanned out into more calls; its recipients are recorded as failed and picked
+up by the retry processor. Each recipient keeps its own DeliveryTracker
+record and attempt, so success rates and retries stay per user.
+"""
+
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.utils.delivery_tracker import DeliveryTracker, ErrorType
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+MULTICAST_MAX_RECIPIENTS = 500
+MULTICAST_ATTEMPTS = 3
+
+
+def classify_delivery_error(error: Exception) -> ErrorType:
+    """Map a LINE send error to the delivery tracker's error type."""
+    error_msg = str(error).lower()
+    if getattr(error, 'status_code', None) == 429 or "rate limit" in error_msg:
+        return ErrorType.RATE_LIMIT
+    if "forbidden" in error_msg or "user not found" in error_msg:
+        return ErrorType.INVALID_USER
+    if "timeout" in error_msg:
+        return ErrorType.TIMEOUT_ERROR
+    return ErrorType.NETWORK_ERROR
+
+
+def is_definite_rejection(error: Exception) -> bool:
+    """Whether LINE refused the request outright, so nothing was delivered."""
+    status_code = getattr(error, 'status_code', None)
+    return isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in (409, 429)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether the request may be retried: a timeout, connection error or 5xx."""
+    status_code = getattr(error, 'status_code', None)
+    return status_code is None or status_code >= 500
+
+
+def payload_key(messages: Any) -> str:
+    """Stable key of a message payload, equal for identical payloads."""
+    items = messages if isinstance(messages, (list, tuple)) else [messages]
+    return json.dumps(
+        [item.as_json_dict() if hasattr(item, 'as_json_dict') else item for item in items],
+        sort_keys=True, ensure_ascii=False
+    )
+
+
+class BulkDeliveryEngine:
+    """Send payloads to many users with concurrent multicast chunks and per-user tracking."""
+
+    def __init__(self, line_bot_api, delivery_tracker: Optional[DeliveryTracker] = None,
+                 chunk_size: int = MULTICAST_MAX_RECIPIENTS, max_concurrency: int = 8,
+                 multicast_attempts: int = MULTICAST_ATTEMPTS, retry_backoff: float = 0.5):
+        """
+        Initialize the engine.
+
+        Args:
+            line_bot_api: LINE Bot API client (its pooled session carries the concurrent calls)
+            delivery_tracker: Tracker that receives one record per recipient (optional)
+            chunk_size: Recipients per multicast call (at most 500)
+            max_concurrency: Multicast or push calls in flight at once; keep within the client's pool size
+            multicast_attempts: Tries per chunk on timeouts and 5xx, all under the chunk's retry key
+            retry_backoff: Seconds before the first multicast retry, doubled on each further retry
+        """
+        self.line_bot_api = line_bot_api
+        self.delivery_tracker = delivery_tracker
+        self.chunk_size = max(1, min(chunk_size, MULTICAST_MAX_RECIPIENTS))
+        self.max_concurrency = max(1, max_concurrency)
+        self.multicast_attempts = max(1, multicast_attempts)
+        self.retry_backoff = retry_backoff
+
+    def deliver(self, user_ids: Sequence[str], messages: Any, category: str, timezone_name: str,
+                content_title: Optional[str] = None, delivery_id: Optional[str] = None,
+                attempt_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Send the same payload to every user.
+
+        Args:
+            user_ids: Recipients (duplicates are sent once)
+            messages: Message or list of messages
+            category: Content category for the delivery records
+            timezone_name: Target timezone for the delivery records
+            content_title: Optional content title for the delivery records
+            delivery_id: Existing delivery to record against instead of creating records (retries)
+            attempt_id: Attempt of ``delivery_id``
+
+        Returns:
+            Dictionary with delivery counts, call counts and errors
+        """
+        return self._deliver_groups([(messages, list(dict.fromkeys(user_ids)))], category, timezone_name,
+                                    content_title, delivery_id, attempt_id)
+
+    def deliver_personalized(self, messages_by_user: Dict[str, Any], category: str, timezone_name: str,
+                             content_title: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Send each user their own payload, multicasting to users whose payloads are identical.
+
+        Returns:
+            Dictionary with delivery counts, call counts and errors
+        """
+        groups: Dict[str, Tuple[Any, List[str]]] = {}
+        for user_id, messages in messages_by_user.items():
+            groups.setdefault(payload_key(messages), (messages, []))[1].append(user_id)
+        return self._deliver_groups(list(groups.values()), category, timezone_name, content_title)
+
+    def _deliver_groups(self, groups: List[Tuple[Any, List[str]]], category: str, timezone_name: str,
+                        content_title: Optional[str] = None, delivery_id: Optional[str] = None,
+                        attempt_id: Optional[str] = None) -> Dict[str, Any]:
+        started = time.monotonic()
+        tracking = self._start_tracking(groups, category, timezone_name, content_title, delivery_id, attempt_id)
+        chunks = [
+            (messages, user_ids[i:i + self.chunk_size])
+            for messages, user_ids in groups
+            for i in range(0, len(user_ids), self.chunk_size)
+        ]
+        outcomes: Dict[str, Tuple[Optional[Exception], int]] = {}
+        stats = {'multicast_calls': len(chunks), 'push_calls': 0, 'failed_chunks': 0}
+
+        if chunks:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(chunks)),
+                                    thread_name_prefix="line-multicast") as executor:
+                results = list(executor.map(lambda chunk: self._send_multicast(*chunk), chunks))
+
+                fallback = []
+                for (messages, user_ids), (error, elapsed_ms) in zip(chunks, results):
+                    if error is not None and is_definite_rejection(error):
+                        fallback.extend((messages, user_id) for user_id in user_ids)
+                    else:
+                        outcomes.update((user_id, (error, elapsed_ms)) for user_id in user_ids)
+                    if error is not None:
+                        stats['failed_chunks'] += 1
+                        logger.warning(f"Multicast to {len(user_ids)} users failed: {error}")
+
+                # Only the recipients of rejected chunks are pushed individually; a chunk
+                # that timed out or hit a 5xx may already have been delivered
+                stats['push_calls'] = len(fallback)
+                for (_, user_id), outcome in zip(fallback, executor.map(lambda item: self._send_push(*item), fallback)):
+                    outcomes[user_id] = outcome
+
+        return self._finish(outcomes, tracking, stats, started)
+
+    def _send_multicast(self, messages: Any, user_ids: List[str]) -> Tuple[Optional[Exception], int]:
+        start = time.monotonic()
+        # Every try of this chunk carries the same retry key, so LINE delivers it once
+        retry_key = str(uuid.uuid4())
+        error = None
+        for attempt in range(self.multicast_attempts):
+            try:
+                self.line_bot_api.multicast(user_ids, messages, retry_key=retry_key)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if attempt and getattr(e, 'status_code', None) == 409:
+                    # An earlier try under this retry key was accepted after all
+                    error = None
+                    break
+                if not is_transient_error(e) or attempt + 1 == self.multicast_attempts:
+                    break
+                time.sleep(self.retry_backoff * (2 ** attempt))
+        return error, int((time.monotonic() - start) * 1000)
+
+    def _send_push(self, messages: Any, user_id: str) -> Tuple[Optional[Exception], int]:
+        start = time.monotonic()
+        try:
+            self.line_bot_api.push_message(user_id, messages)
+            error = None
+        except Exception as e:
+            error = e
+        return error, int((time.monotonic() - start) * 1000)
+
+    def _start_tracking(self, groups: List[Tuple[Any, List[str]]], category: str, timezone_name: str,
+                        content_title: Optional[str], delivery_id: Optional[str],
+                        attempt_id: Optional[str]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """Create a record and start an attempt per recipient (tracker calls stay on this thread)."""
+        tracking = {}
+        if self.delivery_tracker is None:
+            return tracking
+        scheduled_time = datetime.now(timezone.utc)
+        for _, user_ids in groups:
+            for user_id in user_ids:
+                if delivery_id:
+                    tracking[user_id] = (delivery_id, attempt_id)
+                    continue
+                record = self.delivery_tracker.create_delivery_record(
+                    user_id=user_id,
+                    content_category=category,
+                    timezone_name=timezone_name,
+                    scheduled_time=scheduled_time,
+                    content_title=content_title
+                )
+                tracking[user_id] = (record.delivery_id,
+                                     self.delivery_tracker.start_delivery_attempt(record.delivery_id))
+        return tracking
+
+    def _finish(self, outcomes: Dict[str, Tuple[Optional[Exception], int]],
+                tracking: Dict[str, Tuple[Optional[str], Optional[str]]],
+                stats: Dict[str, int], started: float) -> Dict[str, Any]:
+        """Record every recipient's outcome and summarize the delivery."""
+        successful = 0
+        delivery_errors = []
+        for user_id, (error, elapsed_ms) in outcomes.items():
+            record_id, record_attempt = tracking.get(user_id, (None, None))
+            if error is None:
+                successful += 1
+                if record_id and record_attempt:
+                    self.delivery_tracker.record_delivery_success(record_id, record_attempt, elapsed_ms)
+                continue
+
+            error_msg = str(error)
+            if record_id and record_attempt:
+                self.delivery_tracker.record_delivery_failure(
+                    record_id, record_attempt, error_msg, classify_delivery_error(error), elapsed_ms
+                )
+            delivery_errors.append(f"User {user_id[:8]}...: {error_msg}")
+
+        users_count = len(outcomes)
+        return {
+            'success': successful > 0,
+            'users_count': users_count,
+            'successful_deliveries': successful,
+            'failed_deliveries': users_count - successful,
+            'success_rate': successful / users_count if users_count else 0,
+            'delivery_errors': delivery_errors[:5],  # Limit error list
+            'multicast_calls': stats['multicast_calls'],
+            'push_calls': stats['push_calls'],
+            'failed_chunks': stats['failed_chunks'],
+            'total_processing_time_ms': int((time.monotonic() - started) * 1000)
+        }
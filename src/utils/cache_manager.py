@@ -18,6 +18,7 @@ from enum import Enum
 import logging
 
 from ..exceptions import BaseBotException, ErrorSeverity, ErrorCategory
+from .semantic_cache import SemanticResponseCache
 
 
 class CacheType(Enum):
@@ -434,6 +435,9 @@ class CacheManager:
         self._cache_configs: Dict[str, Dict[str, Any]] = {}
         self._lock = threading.Lock()
         
+        # Opt-in cross-user cache for stateless intents (see enable_semantic_cache)
+        self.semantic_cache: Optional[SemanticResponseCache] = None
+        
         # Initialize default caches
         self._setup_default_caches()
     
@@ -560,6 +564,44 @@ class CacheManager:
         
         return cache.get(key)
     
+    def enable_semantic_cache(
+        self,
+        similarity_threshold: float = 0.8,
+        default_ttl: float = 86400,
+        max_entries: int = 1000
+    ) -> SemanticResponseCache:
+        """Enable the cross-user semantic OpenAI response cache (idempotent)."""
+        with self._lock:
+            if self.semantic_cache is None:
+                self.semantic_cache = SemanticResponseCache(
+                    similarity_threshold=similarity_threshold,
+                    default_ttl=default_ttl,
+                    max_entries=max_entries
+                )
+            return self.semantic_cache
+    
+    def is_semantic_cacheable(self, message: str) -> bool:
+        """Check whether a query is a stateless intent whose answer may be shared."""
+        return self.semantic_cache is not None and self.semantic_cache.prepare(message) is not None
+    
+    def cache_semantic_response(
+        self,
+        message: str,
+        response: str,
+        model: str = "gpt-4",
+        ttl: Optional[float] = None
+    ) -> bool:
+        """Cache an answer for reuse across users if the query is a stateless intent."""
+        if self.semantic_cache is None:
+            return False
+        return self.semantic_cache.set(message, response, model=model, ttl=ttl)
+    
+    def get_semantic_response(self, message: str, model: str = "gpt-4") -> Optional[str]:
+        """Get a cached answer to a similar stateless query from any user."""
+        if self.semantic_cache is None:
+            return None
+        return self.semantic_cache.get(message, model=model)
+    
     def cache_template_image(
         self,
         template_id: str,
@@ -668,12 +710,16 @@ class CacheManager:
         for name, cache in self._caches.items():
             stats[name] = cache.get_stats()
             stats[name]['config'] = self._cache_configs[name]
+        if self.semantic_cache is not None:
+            stats['openai_semantic'] = self.semantic_cache.get_stats()
         return stats
     
     def clear_all_caches(self):
         """Clear all cache instances."""
         for cache in self._caches.values():
             cache.clear()
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
     
     def shutdown(self):
         """Shutdown all cache instances."""
@@ -0,0 +1,114 @@
+"""
+Compact in-memory representation of conversation messages.
+
+A message dict with a ``datetime`` and its own empty metadata dict costs
+several hundred bytes before its content. ``StoredMessage`` keeps the same
+fields in ``__slots__``, with the timestamp as an epoch float (turned into a
+``datetime`` only when read), role and message type interned so every
+message shares one string object, and a single shared read-only mapping for
+the common case of no metadata.
+
+It still reads like the dict it replaces (``msg["role"]``, ``msg.get(...)``,
+``"tokens" in msg``), so history, token and context code is unchanged, and
+``to_dict()`` gives the plain dict for serialization.
+"""
+
+import sys
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+# Shared by every message without metadata; read-only so one message cannot change it for all
+EMPTY_METADATA: Mapping[str, Any] = MappingProxyType({})
+
+_FIELDS = ('role', 'content', 'message_type', 'metadata', 'timestamp', 'tokens')
+
+
+def _epoch(value) -> float:
+    """Epoch seconds from a datetime, ISO string or number."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+class StoredMessage:
+    """One conversation message in ``__slots__``, readable like the message dict."""
+
+    __slots__ = ('role', 'content', 'message_type', 'metadata', 'created', 'tokens')
+
+    def __init__(self, role: str, content: Any, message_type: str = "text",
+                 metadata: Optional[Dict[str, Any]] = None, created: Optional[float] = None,
+                 tokens: Optional[int] = None):
+        """
+        Initialize the message.
+
+        Args:
+            role: "user", "assistant" or "system"
+            content: Message text (or multimodal parts)
+            message_type: "text", "image", "file" or "mixed"
+            metadata: Optional metadata; empty metadata uses the shared sentinel
+            created: Epoch seconds (defaults to now)
+            tokens: Stored token count, if already counted
+        """
+        self.role = sys.intern(role)
+        self.content = content
+        self.message_type = sys.intern(message_type or "text")
+        self.metadata = metadata if metadata else EMPTY_METADATA
+        self.created = datetime.now().timestamp() if created is None else created
+        self.tokens = tokens
+
+    @classmethod
+    def from_dict(cls, message: Mapping[str, Any]) -> 'StoredMessage':
+        """Build from a message dict (timestamps as datetime, ISO string or epoch)."""
+        timestamp = message.get('timestamp')
+        return cls(
+            role=message['role'],
+            content=message.get('content'),
+            message_type=message.get('message_type', "text"),
+            metadata=message.get('metadata'),
+            created=_epoch(timestamp) if timestamp else None,
+            tokens=message.get('tokens')
+        )
+
+    @property
+    def timestamp(self) -> datetime:
+        """Creation time as a local datetime (converted on read)."""
+        return datetime.fromtimestamp(self.created)
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'timestamp':
+            return self.timestamp
+        if key in _FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Dict-style read; ``tokens`` is None for messages stored before it was counted."""
+        if key not in _FIELDS:
+            return default
+        value = self[key]
+        return default if value is None else value
+
+    def __contains__(self, key: object) -> bool:
+        return key in _FIELDS and (key != 'tokens' or self.tokens is not None)
+
+    def keys(self):
+        return [key for key in _FIELDS if key in self]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain message dict (own metadata copy, datetime timestamp)."""
+        return {key: dict(self.metadata) if key == 'metadata' else self[key] for key in self.keys()}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, StoredMessage):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"StoredMessage(role={self.role!r}, content={self.content!r}, created={self.created})"
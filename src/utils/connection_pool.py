@@ -258,8 +258,12 @@ class HealthMonitor:
         return metrics.state in [ConnectionState.HEALTHY, ConnectionState.DEGRADED]
     
     def execute_with_retry(self, name: str, func: Callable, max_attempts: int = 3,
-                          backoff: Optional[ExponentialBackoff] = None) -> Any:
-        """Execute function with automatic retry logic and health monitoring."""
+                          backoff: Optional[ExponentialBackoff] = None,
+                          non_retryable: tuple = ()) -> Any:
+        """Execute function with automatic retry logic and health monitoring.
+        
+        Exceptions of the ``non_retryable`` types are raised immediately.
+        """
         if not backoff:
             backoff = ExponentialBackoff()
         
@@ -276,6 +280,8 @@ class HealthMonitor:
                 else:
                     return func()
                     
+            except non_retryable:
+                raise
             except Exception as e:
                 last_exception = e
                 attempt_num = int(attempt) + 1  # Ensure both are integers
@@ -791,10 +797,13 @@ class ConnectionPoolManager:
         self.stop_monitoring()
     
     def execute_with_retry(self, connection_name: str, func: Callable, 
-                          max_attempts: int = 3, backoff: Optional[ExponentialBackoff] = None) -> Any:
+                          max_attempts: int = 3, backoff: Optional[ExponentialBackoff] = None,
+                          non_retryable: tuple = ()) -> Any:
         """Execute function with automatic retry logic, health monitoring, and usage tracking."""
         try:
-            result = self.health_monitor.execute_with_retry(connection_name, func, max_attempts, backoff)
+            result = self.health_monitor.execute_with_retry(
+                connection_name, func, max_attempts, backoff, non_retryable
+            )
             # Update usage tracking on successful execution
             self.update_connection_usage(connection_name)
             return result
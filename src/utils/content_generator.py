@@ -8,7 +8,8 @@ for creating themed inspirational and motivational content.
 import json
 import logging
 import random
-from typing import Dict, List, Optional, Any, Tuple
+import time as time_module
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from datetime import datetime, time
 from dataclasses import dataclass
 import hashlib
@@ -45,6 +46,19 @@ class GeneratedContent:
     generation_time: datetime
 
 
+@dataclass
+class BatchGenerationResult:
+    """Result of a batched content generation run, aligned with the requests"""
+    contents: List[Optional[GeneratedContent]]
+    validations: List[Optional[Any]]
+    item_latency: List[float]
+    upstream_calls: int
+    cache_hits: int
+    regenerated_items: int
+    failed_items: int
+    elapsed_seconds: float
+
+
 class ContentGenerator:
     """
     Generates themed inspirational and motivational content using Azure OpenAI.
@@ -53,6 +67,14 @@ class ContentGenerator:
     length control, and thematic consistency for Rich Message automation.
     """
     
+    # Conversation batched calls are recorded under; they are sent stateless so batches stay independent
+    BATCH_USER_ID = "content_generator_batch"
+    
+    # Items per batched call, and the output tokens reserved for each so the JSON is never cut short
+    DEFAULT_BATCH_ITEMS = 6
+    BATCH_ITEM_OUTPUT_TOKENS = 600
+    BATCH_ENVELOPE_OUTPUT_TOKENS = 200
+    
     def __init__(self, openai_service: Optional[OpenAIService] = None, config=None):
         """
         Initialize the ContentGenerator.
@@ -141,7 +163,8 @@ class ContentGenerator:
                 "style_guidelines": "Use positive, encouraging language."
             }
     
-    def _build_generation_prompt(self, request: ContentRequest, template: Dict[str, Any]) -> Tuple[str, str]:
+    def _build_generation_prompt(self, request: ContentRequest, template: Dict[str, Any],
+                                 response_format: bool = True) -> Tuple[str, str]:
         """Build system and user prompts for content generation."""
         # Base system prompt
         system_prompt = template["system_prompt"]
@@ -210,11 +233,37 @@ class ContentGenerator:
             base_user_prompt += f" Additional context: {request.custom_context}"
         
         # Add response format instruction
-        base_user_prompt += "\n\nPlease provide your response in this exact JSON format:\n"
-        base_user_prompt += '{"title": "Short catchy title", "content": "Main inspirational content"}'
+        if response_format:
+            base_user_prompt += "\n\nPlease provide your response in this exact JSON format:\n"
+            base_user_prompt += '{"title": "Short catchy title", "content": "Main inspirational content"}'
         
         return system_prompt, base_user_prompt
     
+    def _build_batch_prompt(self, items: List[Tuple[str, ContentRequest, Dict[str, Any]]]) -> str:
+        """Build one prompt asking for several items; identical guidelines are listed once."""
+        guidelines: Dict[str, str] = {}
+        item_lines = []
+        
+        for item_id, request, template in items:
+            system_prompt, user_prompt = self._build_generation_prompt(request, template, response_format=False)
+            label = guidelines.setdefault(system_prompt, f"G{len(guidelines) + 1}")
+            item_lines.append(f'Item "{item_id}" (follow guidelines {label}): {user_prompt}')
+        
+        prompt = "Write one Rich Message for each item below, following the guidelines named by the item.\n\n"
+        prompt += "\n\n".join(f"Guidelines {label}:\n{text}" for text, label in guidelines.items())
+        prompt += "\n\nItems:\n" + "\n".join(item_lines)
+        prompt += "\n\nRespond with only JSON in this exact format, one entry per item:\n"
+        prompt += '{"items": [{"id": "item id", "title": "Short catchy title", "content": "Main inspirational content"}]}'
+        return prompt
+    
+    def _strip_json_markers(self, ai_content: str) -> str:
+        """Remove Markdown code fences around a JSON response."""
+        if ai_content.startswith('```json'):
+            return ai_content.split('```json')[1].split('```')[0].strip()
+        if ai_content.startswith('```'):
+            return ai_content.split('```')[1].split('```')[0].strip()
+        return ai_content
+    
     def _validate_generated_content(self, content_dict: Dict[str, str], request: ContentRequest) -> bool:
         """Validate generated content meets requirements."""
         try:
@@ -308,11 +357,7 @@ class ContentGenerator:
             
             # Try to parse as JSON
             try:
-                if ai_content.startswith('```json'):
-                    ai_content = ai_content.split('```json')[1].split('```')[0].strip()
-                elif ai_content.startswith('```'):
-                    ai_content = ai_content.split('```')[1].split('```')[0].strip()
-                
+                ai_content = self._strip_json_markers(ai_content)
                 content_dict = json.loads(ai_content)
             except json.JSONDecodeError:
                 logger.warning("Failed to parse JSON response, attempting text extraction")
@@ -329,24 +374,8 @@ class ContentGenerator:
                 return None
             
             # Create content object
-            generated_content = GeneratedContent(
-                title=content_dict["title"].strip(),
-                content=content_dict["content"].strip(),
-                language=request.language,
-                category=request.category,
-                theme=request.theme,
-                metadata={
-                    "generation_model": self.config.content_generation.ai_model,
-                    "prompt_template": template,
-                    "generation_params": {
-                        "length": request.length,
-                        "tone": request.tone,
-                        "energy_level": request.energy_level,
-                        "time_context": request.time_context.strftime("%H:%M") if request.time_context else None
-                    },
-                    "tokens_used": ai_response.get('tokens_used', 0)
-                },
-                generation_time=datetime.now()
+            generated_content = self._create_generated_content(
+                content_dict, request, template, ai_response.get('tokens_used', 0)
             )
             
             # Cache the content
@@ -360,19 +389,211 @@ class ContentGenerator:
             logger.error(f"Content generation error: {str(e)}")
             return None
     
-    def generate_daily_content(self, category: ContentCategory, 
-                             current_time: Optional[time] = None,
-                             language: str = "en") -> Optional[GeneratedContent]:
+    def _create_generated_content(self, content_dict: Dict[str, str], request: ContentRequest,
+                                  template: Dict[str, Any], tokens_used: int) -> GeneratedContent:
+        """Build a GeneratedContent from a validated title/content pair."""
+        return GeneratedContent(
+            title=content_dict["title"].strip(),
+            content=content_dict["content"].strip(),
+            language=request.language,
+            category=request.category,
+            theme=request.theme,
+            metadata={
+                "generation_model": self.config.content_generation.ai_model,
+                "prompt_template": template,
+                "generation_params": {
+                    "length": request.length,
+                    "tone": request.tone,
+                    "energy_level": request.energy_level,
+                    "time_context": request.time_context.strftime("%H:%M") if request.time_context else None
+                },
+                "tokens_used": tokens_used
+            },
+            generation_time=datetime.now()
+        )
+    
+    def generate_content_batch(self, requests: List[ContentRequest],
+                               validator=None,
+                               use_cache: bool = True,
+                               items_per_call: Optional[int] = None,
+                               max_regeneration_rounds: int = 2,
+                               progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+                               ) -> BatchGenerationResult:
         """
-        Generate content optimized for daily delivery.
+        Generate content for many requests with one structured call per group of items.
+        
+        Each item is validated on its own (and with ``validator``, a ContentValidator,
+        when given); only items that fail are sent again, in up to
+        ``max_regeneration_rounds`` further batched calls. Cached items are run
+        through ``validator`` too, so every served item has a validation.
+        Generated items are added to the content cache in one update.
+        
+        Args:
+            requests: Content requests, one per item
+            validator: Optional ContentValidator; rejected items are regenerated
+            use_cache: Serve valid cached items and cache new ones
+            items_per_call: Items requested per upstream call
+            max_regeneration_rounds: Extra attempts for items that fail
+            progress_callback: Called after each upstream call with progress counters
+            
+        Returns:
+            BatchGenerationResult with contents and validations aligned to ``requests``
+            (None for items that could not be generated; validations are None
+            only without ``validator``)
+        """
+        started = time_module.perf_counter()
+        total = len(requests)
+        items_per_call = max(1, items_per_call or self.DEFAULT_BATCH_ITEMS)
+        contents: List[Optional[GeneratedContent]] = [None] * total
+        validations: List[Optional[Any]] = [None] * total
+        item_latency = [0.0] * total
+        upstream_calls = cache_hits = regenerated_items = 0
+        
+        cache_keys = [self._get_cache_key(request) for request in requests]
+        pending = []
+        for index, request in enumerate(requests):
+            cached = self.content_cache.get(cache_keys[index]) if use_cache else None
+            if cached is not None and self._is_cache_valid(cached):
+                validation = validator.validate_content(cached) if validator else None
+                if validation is None or validation.result.value != 'rejected':
+                    contents[index] = cached
+                    validations[index] = validation
+                    cache_hits += 1
+                    continue
+            pending.append(index)
+        
+        if pending and not self.openai_service:
+            logger.error("OpenAI service not available for content generation")
+            pending = []
+        
+        templates = {index: self._select_prompt_template(requests[index]) for index in pending}
+        
+        for round_number in range(max_regeneration_rounds + 1):
+            if not pending:
+                break
+            if round_number:
+                regenerated_items += len(pending)
+                logger.info(f"Regenerating {len(pending)} items that failed validation (round {round_number})")
+            
+            failed = []
+            for offset in range(0, len(pending), items_per_call):
+                group = pending[offset:offset + items_per_call]
+                items, latency = self._generate_batch_items(
+                    [(str(index), requests[index], templates[index]) for index in group]
+                )
+                upstream_calls += 1
+                
+                for index in group:
+                    item_latency[index] += latency / len(group)
+                    content = items.get(str(index))
+                    validation = validator.validate_content(content) if content and validator else None
+                    if content is None or (validation is not None and validation.result.value == 'rejected'):
+                        failed.append(index)
+                        continue
+                    contents[index] = content
+                    validations[index] = validation
+                
+                if progress_callback:
+                    progress_callback({
+                        'total_items': total,
+                        'completed_items': sum(1 for content in contents if content is not None),
+                        'pending_items': len(pending) - offset - len(group) + len(failed),
+                        'round': round_number,
+                        'upstream_calls': upstream_calls,
+                        'last_call_seconds': latency,
+                        'last_call_items': len(group)
+                    })
+            pending = failed
+        
+        # Fill the cache in one update
+        if use_cache:
+            self.content_cache.update({
+                cache_keys[index]: content for index, content in enumerate(contents)
+                if content is not None
+            })
+        
+        elapsed = time_module.perf_counter() - started
+        failed_items = sum(1 for content in contents if content is None)
+        logger.info(
+            f"Batch generated {total - failed_items}/{total} items with {upstream_calls} upstream calls "
+            f"({cache_hits} cached, {regenerated_items} regenerated) in {elapsed:.2f}s"
+        )
+        
+        return BatchGenerationResult(
+            contents=contents,
+            validations=validations,
+            item_latency=item_latency,
+            upstream_calls=upstream_calls,
+            cache_hits=cache_hits,
+            regenerated_items=regenerated_items,
+            failed_items=failed_items,
+            elapsed_seconds=elapsed
+        )
+    
+    def _generate_batch_items(self, items: List[Tuple[str, ContentRequest, Dict[str, Any]]]
+                              ) -> Tuple[Dict[str, GeneratedContent], float]:
+        """
+        Request several items in one call.
+        
+        Returns:
+            Tuple of (valid items by id, call latency in seconds); invalid or
+            missing items are left out
+        """
+        started = time_module.perf_counter()
+        try:
+            # Each batch stands alone: no earlier batch is sent as context, and concurrent
+            # batches on other workers cannot chain or clear each other's conversation
+            ai_response = self.openai_service.get_response(
+                user_id=self.BATCH_USER_ID,
+                user_message=self._build_batch_prompt(items),
+                use_streaming=False,
+                priority="batch",
+                stateless=True,
+                max_output_tokens=len(items) * self.BATCH_ITEM_OUTPUT_TOKENS + self.BATCH_ENVELOPE_OUTPUT_TOKENS
+            )
+        except Exception as e:
+            logger.error(f"Batch content generation error: {str(e)}")
+            return {}, time_module.perf_counter() - started
+        latency = time_module.perf_counter() - started
+        
+        if not ai_response.get('success'):
+            logger.error(f"AI batch content generation failed: {ai_response.get('error')}")
+            return {}, latency
+        
+        try:
+            parsed = json.loads(self._strip_json_markers(ai_response.get('message', '').strip()))
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse batch JSON response for {len(items)} items")
+            return {}, latency
+        entries = parsed.get('items', []) if isinstance(parsed, dict) else parsed
+        
+        # Spread the call's tokens over its items
+        tokens_per_item = ai_response.get('tokens_used', 0) // max(1, len(items))
+        by_id = {str(entry.get('id')): entry for entry in entries if isinstance(entry, dict)}
+        
+        generated = {}
+        for item_id, request, template in items:
+            content_dict = by_id.get(item_id)
+            if content_dict is None or not self._validate_generated_content(content_dict, request):
+                continue
+            generated[item_id] = self._create_generated_content(content_dict, request, template, tokens_per_item)
+        return generated, latency
+    
+    def build_daily_request(self, category: ContentCategory,
+                            current_time: Optional[time] = None,
+                            language: str = "en",
+                            custom_context: Optional[str] = None) -> ContentRequest:
+        """
+        Build a content request tuned to the time of day.
         
         Args:
             category: Content category
             current_time: Current time for context
             language: Target language
+            custom_context: Optional extra context (e.g. a variation marker)
             
         Returns:
-            Generated content optimized for the time of day
+            Content request for daily delivery
         """
         if current_time is None:
             current_time = datetime.now().time()
@@ -397,17 +618,32 @@ class ContentGenerator:
             energy_level = "low"
             tone = "calm"
         
-        request = ContentRequest(
+        return ContentRequest(
             category=category,
             theme=theme,
             length="medium",
             tone=tone,
             language=language,
             time_context=current_time,
-            energy_level=energy_level
+            energy_level=energy_level,
+            custom_context=custom_context
         )
+    
+    def generate_daily_content(self, category: ContentCategory, 
+                             current_time: Optional[time] = None,
+                             language: str = "en") -> Optional[GeneratedContent]:
+        """
+        Generate content optimized for daily delivery.
         
-        return self.generate_content(request)
+        Args:
+            category: Content category
+            current_time: Current time for context
+            language: Target language
+            
+        Returns:
+            Generated content optimized for the time of day
+        """
+        return self.generate_content(self.build_daily_request(category, current_time, language))
     
     def generate_content_variations(self, base_request: ContentRequest, 
                                    count: int = 3) -> List[GeneratedContent]:
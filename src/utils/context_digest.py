@@ -0,0 +1,42 @@
+"""
+Rolling conversation context digest for cache keys.
+
+The digest is the sum, modulo 2^52, of per-message terms: a hash of the
+message's role and content weighted by its absolute position, so it is
+order-sensitive and can be advanced in O(1) on every added message without
+reading earlier history. Every term and partial sum stays below 2^53, so the
+Redis backends advance it exactly inside their append script (Lua numbers
+are doubles) with the same result as this module.
+"""
+
+import hashlib
+from typing import Any
+
+# Content hash width and position period keep hash * weight below 2^53
+CONTENT_HASH_BITS = 32
+POSITION_PERIOD = 1 << 21
+DIGEST_MODULUS = 1 << 52
+
+EMPTY_CONTEXT_DIGEST = 0
+
+
+def content_hash(role: str, content: Any) -> int:
+    """Position-independent hash of one message's role and content."""
+    payload = f"{role}\x1f{content}".encode('utf-8', 'surrogatepass')
+    digest = hashlib.blake2b(payload, digest_size=8).digest()
+    return int.from_bytes(digest, 'big') >> (64 - CONTENT_HASH_BITS)
+
+
+def message_digest(index: int, role: str, content: Any) -> int:
+    """Term of one message at absolute position ``index`` in a conversation."""
+    return content_hash(role, content) * (index % POSITION_PERIOD + 1) % DIGEST_MODULUS
+
+
+def advance_context_digest(digest: int, index: int, role: str, content: Any) -> int:
+    """Digest after appending a message at absolute position ``index``."""
+    return (digest + message_digest(index, role, content)) % DIGEST_MODULUS
+
+
+def format_context_digest(value: int) -> str:
+    """Fixed-width text form of a digest, as used in cache keys."""
+    return f"{value:016x}"
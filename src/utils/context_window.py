@@ -0,0 +1,138 @@
+"""
+Token-budgeted sliding context window with an incremental rolling summary.
+
+Recent turns are sent verbatim; once they no longer fit the deployment's
+prompt budget the oldest turns are folded into a rolling summary. The window
+start only moves forward, so each message is summarized exactly once and the
+summary is extended incrementally rather than regenerated.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+from src.utils.error_handler import StructuredLogger
+from src.utils.token_counter import count_message_tokens, count_tokens
+
+logger = StructuredLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+# Characters of each folded message kept by the extractive summarizer
+SUMMARY_SNIPPET_CHARS = 160
+
+
+def fold_into_summary(previous: str, messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """
+    Extend an extractive summary with newly evicted messages.
+
+    Each message contributes one ``role: snippet`` line; the oldest lines are
+    dropped once the summary exceeds ``max_tokens``.
+    """
+    lines = previous.splitlines() if previous else []
+    for message in messages:
+        content = " ".join(str(message.get('content') or "").split())
+        if not content:
+            continue
+        if len(content) > SUMMARY_SNIPPET_CHARS:
+            content = content[:SUMMARY_SNIPPET_CHARS].rstrip() + "…"
+        lines.append(f"{message.get('role', 'user')}: {content}")
+
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+
+    return "\n".join(lines)
+
+
+class ContextWindowBuilder:
+    """
+    Build chat messages that fit a prompt token budget.
+
+    The rolling summary state is a dict ``{'text', 'covered_through'}`` where
+    ``covered_through`` is the absolute index of the first message that has
+    not been folded into the summary.
+    """
+
+    def __init__(self,
+                 token_budget: int = 4000,
+                 summary_max_tokens: int = 300,
+                 low_water_ratio: float = 0.75,
+                 summarizer: Optional[Callable[[str, List[Dict[str, Any]], int], str]] = None):
+        """
+        Initialize the builder.
+
+        Args:
+            token_budget: Maximum prompt tokens (system prompt, summary, history and new message)
+            summary_max_tokens: Maximum tokens of the rolling summary
+            low_water_ratio: Fraction of the history allowance kept after an
+                eviction, so the summary is updated every few turns, not every turn
+            summarizer: Callable(previous_text, evicted_messages, max_tokens) -> text;
+                defaults to the extractive :func:`fold_into_summary`
+        """
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.low_water_ratio = low_water_ratio
+        self.summarizer = summarizer or fold_into_summary
+
+    def build(self,
+              system_prompt: str,
+              history: List[Dict[str, Any]],
+              current_message: Dict[str, Any],
+              first_index: int = 0,
+              summary: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Assemble the prompt for one request.
+
+        Args:
+            system_prompt: System instructions
+            history: Stored messages (role/content) preceding the current message
+            current_message: The chat message for the new user turn
+            first_index: Absolute index of ``history[0]`` in the conversation
+            summary: Rolling summary state from the previous request, if any
+
+        Returns:
+            Dict with ``messages``, the (possibly updated) ``summary`` state,
+            ``summary_updated``, ``prompt_tokens``, ``baseline_tokens`` and ``tokens_saved``
+        """
+        system_tokens = count_tokens(system_prompt) + count_message_tokens({'content': SUMMARY_PREFIX})
+        current_tokens = count_message_tokens(current_message)
+        history_tokens = [count_message_tokens(message) for message in history]
+
+        summary_text = (summary or {}).get('text', "")
+        # Messages trimmed from storage before being summarized are gone for good
+        covered = max((summary or {}).get('covered_through', first_index), first_index)
+        start = min(covered - first_index, len(history))
+
+        available = self.token_budget - system_tokens - current_tokens - self.summary_max_tokens
+        window_tokens = sum(history_tokens[start:])
+        summary_updated = False
+
+        if window_tokens > available:
+            target = max(0, int(available * self.low_water_ratio))
+            drop_until = start
+            while drop_until < len(history) and window_tokens > target:
+                window_tokens -= history_tokens[drop_until]
+                drop_until += 1
+
+            summary_text = self.summarizer(summary_text, history[start:drop_until], self.summary_max_tokens)
+            covered = first_index + drop_until
+            start = drop_until
+            summary_updated = True
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary_text:
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + summary_text})
+        messages.extend({"role": m["role"], "content": m["content"]} for m in history[start:])
+        messages.append(current_message)
+
+        prompt_tokens = (system_tokens + window_tokens + current_tokens
+                         + (count_tokens(summary_text) if summary_text else 0))
+        # Previously the full history was sent with the new message appended twice
+        baseline_tokens = system_tokens + sum(history_tokens) + 2 * current_tokens
+
+        return {
+            'messages': messages,
+            'summary': {'text': summary_text, 'covered_through': covered} if summary_updated else summary,
+            'summary_updated': summary_updated,
+            'prompt_tokens': prompt_tokens,
+            'baseline_tokens': baseline_tokens,
+            'tokens_saved': max(0, baseline_tokens - prompt_tokens)
+        }
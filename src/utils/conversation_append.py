@@ -0,0 +1,129 @@
+"""
+Single-round-trip message append for Redis conversation storage.
+
+Appending a message pushes it onto the user's message list, trims the list,
+and advances the metadata hash: message and token counters, the rolling
+context digest and the activity fields. It also records the message in the
+conversation statistics. The digest needs the message's absolute index and
+the token total needs the trimmed entries, both known only inside Redis, so
+a Lua script does everything in one atomic EVALSHA. The list and its
+counters can therefore never disagree after a crash.
+
+The script reads a dropped entry's token count from the binary header (see
+``conversation_codec``) or a JSON object's ``tokens`` field.
+Entries stored before either carried a count are returned to the caller,
+which counts them and corrects the token total. That takes one extra round
+trip, and only until such entries have been trimmed away.
+"""
+
+from typing import Any, Callable
+
+from src.utils.context_digest import DIGEST_MODULUS, POSITION_PERIOD, content_hash
+from src.utils.conversation_codec import FORMAT_VERSION, MAGIC, UNKNOWN_TOKENS
+from src.utils.conversation_stats import ConversationStatistics
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+# KEYS: message list, metadata hash, statistics message counter, user set, daily HyperLogLog
+# ARGV: encoded message, max messages, TTL, tokens, content hash, activity (ISO),
+#       user ID, activity (epoch), daily retention
+# Returns {total messages, dropped entries without a readable token count}
+APPEND_MESSAGE_SCRIPT = """
+local function stored_tokens(raw)
+    local magic, version = string.byte(raw, 1, 2)
+    if magic == %(magic)d and version == %(version)d then
+        local a, b, c, d = string.byte(raw, 4, 7)
+        local count = ((a * 256 + b) * 256 + c) * 256 + d
+        if count ~= %(unknown)d then
+            return count
+        end
+    elseif magic == 123 then
+        local ok, decoded = pcall(cjson.decode, raw)
+        if ok and type(decoded) == 'table' and type(decoded.tokens) == 'number' then
+            return decoded.tokens
+        end
+    end
+    return nil
+end
+
+local max_messages = tonumber(ARGV[2])
+local tokens = tonumber(ARGV[4])
+local length = redis.call('RPUSH', KEYS[1], ARGV[1])
+local dropped_tokens = 0
+local uncounted = {}
+if length > max_messages then
+    local dropped = redis.call('LRANGE', KEYS[1], 0, length - max_messages - 1)
+    redis.call('LTRIM', KEYS[1], -max_messages, -1)
+    for _, raw in ipairs(dropped) do
+        local count = stored_tokens(raw)
+        if count then
+            dropped_tokens = dropped_tokens + count
+        else
+            uncounted[#uncounted + 1] = raw
+        end
+    end
+end
+
+local total = redis.call('HINCRBY', KEYS[2], 'total_messages', 1)
+redis.call('HINCRBY', KEYS[2], 'lifetime_tokens', tokens)
+redis.call('HINCRBY', KEYS[2], 'token_total', tokens - dropped_tokens)
+local digest = (tonumber(redis.call('HGET', KEYS[2], 'context_digest')) or 0) %% %(modulus)d
+local term = tonumber(ARGV[5]) * ((total - 1) %% %(period)d + 1) %% %(modulus)d
+redis.call('HSET', KEYS[2], 'context_digest', string.format('%%.0f', (digest + term) %% %(modulus)d))
+redis.call('HSETNX', KEYS[2], 'created_at', ARGV[6])
+redis.call('HSET', KEYS[2], 'last_activity', ARGV[6], 'message_count', math.min(length, max_messages))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+
+redis.call('INCR', KEYS[3])
+redis.call('ZADD', KEYS[4], ARGV[8], ARGV[7])
+redis.call('PFADD', KEYS[5], ARGV[7])
+redis.call('EXPIRE', KEYS[5], ARGV[9])
+return {total, uncounted}
+""" % {
+    'magic': MAGIC, 'version': FORMAT_VERSION, 'unknown': UNKNOWN_TOKENS,
+    'modulus': DIGEST_MODULUS, 'period': POSITION_PERIOD
+}
+
+
+def append_message(client, statistics: ConversationStatistics, messages_key: str, meta_key: str,
+                   user_id: str, encoded: Any, role: str, content: Any, tokens: int,
+                   timestamp: float, activity: str, max_messages: int, ttl_seconds: int,
+                   count_tokens: Callable[[Any], int]) -> int:
+    """
+    Append one encoded message and update its counters in one script call.
+
+    Args:
+        client: Redis client
+        statistics: Conversation statistics the message is recorded in
+        messages_key: Key of the user's message list
+        meta_key: Key of the user's metadata hash
+        user_id: User the message belongs to
+        encoded: Stored form of the message
+        role: Message role (part of the digest)
+        content: Message content (part of the digest)
+        tokens: Token count of the message
+        timestamp: Message time in epoch seconds
+        activity: Message time as stored in ``last_activity``
+        max_messages: Messages kept in the list
+        ttl_seconds: Conversation TTL
+        count_tokens: Counts the tokens of a trimmed entry the script could not read
+
+    Returns:
+        Absolute number of messages the user has stored, this one included
+    """
+    script = client.register_script(APPEND_MESSAGE_SCRIPT)
+    keys = [messages_key, meta_key, statistics.messages_key, statistics.users_key,
+            statistics.daily_key_for(timestamp)]
+    total, uncounted = script(keys=keys, args=[
+        encoded, max_messages, ttl_seconds, tokens, content_hash(role, content), activity,
+        user_id, repr(timestamp), statistics.daily_retention_seconds
+    ])
+    if uncounted:
+        # The message is committed; a failed correction must not make the caller store it again
+        try:
+            client.hincrby(meta_key, "token_total", -sum(count_tokens(raw) for raw in uncounted))
+        except Exception as e:
+            logger.warning(f"Token total not corrected for trimmed messages of user {user_id}: {e}")
+    return int(total)
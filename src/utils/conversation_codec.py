@@ -0,0 +1,165 @@
+"""
+Pluggable codecs for conversation messages stored in Redis.
+
+Each stored message is a seven-byte header (magic byte, format version,
+codec id, big-endian token count) followed by the codec's encoding of a
+positional record ``[role, content, message_type, metadata, created,
+tokens]``. The token count in the header lets the Redis append script total
+trimmed messages without decoding them. The timestamp is epoch seconds, so
+nothing is parsed on read; ``StoredMessage`` turns it into a ``datetime``
+only when a caller asks for one.
+
+msgpack is used when installed, then orjson, then the standard library json.
+Decoding goes by the header rather than by the configured codec, so workers
+configured differently (or a changed setting) still read each other's
+entries. Format version 1 entries have the three-byte header without the
+token count, and entries without a header are the earlier JSON-object
+messages with ISO timestamps (format version 0); both are still read.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Union
+
+from src.utils.compact_message import StoredMessage
+from src.utils.error_handler import StructuredLogger
+
+# Optional faster codecs
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = StructuredLogger(__name__)
+
+MAGIC = 0xC7
+FORMAT_VERSION = 2
+
+# Header token count of a message whose tokens were not counted
+UNKNOWN_TOKENS = 0xFFFFFFFF
+
+# Payload offset by format version
+_PAYLOAD_OFFSETS = {1: 3, 2: 7}
+
+
+class JsonCodec:
+    """Standard library json (always available)."""
+
+    codec_id = 1
+    name = "json"
+
+    @staticmethod
+    def dumps(record) -> bytes:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+    @staticmethod
+    def loads(data: bytes):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """orjson: JSON, but several times faster in both directions."""
+
+    codec_id = 2
+    name = "orjson"
+
+    @staticmethod
+    def dumps(record) -> bytes:
+        return orjson.dumps(record)
+
+    @staticmethod
+    def loads(data: bytes):
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    """msgpack: binary and the most compact of the three."""
+
+    codec_id = 3
+    name = "msgpack"
+
+    @staticmethod
+    def dumps(record) -> bytes:
+        return msgpack.packb(record, use_bin_type=True)
+
+    @staticmethod
+    def loads(data: bytes):
+        return msgpack.unpackb(data, raw=False)
+
+
+_AVAILABLE = {
+    codec.name: codec
+    for codec, module in ((MsgpackCodec, msgpack), (OrjsonCodec, orjson), (JsonCodec, json))
+    if module is not None
+}
+_BY_ID = {codec.codec_id: codec for codec in _AVAILABLE.values()}
+
+Codec = Union[JsonCodec, OrjsonCodec, MsgpackCodec]
+
+
+def available_codecs() -> List[str]:
+    """Names of the installed codecs, fastest first."""
+    return list(_AVAILABLE)
+
+
+def get_codec(name: Optional[str] = "auto") -> Codec:
+    """
+    Codec by name ("msgpack", "orjson", "json"), or the fastest installed for "auto".
+
+    A requested codec that is not installed falls back to "auto" with a warning.
+    """
+    if name and name != "auto":
+        codec = _AVAILABLE.get(name)
+        if codec is not None:
+            return codec
+        logger.warning(f"Conversation codec {name} is not available, choosing automatically")
+    return next(iter(_AVAILABLE.values()))
+
+
+def encode_message(message: Union[StoredMessage, Dict[str, Any]], codec: Optional[Codec] = None) -> bytes:
+    """Encode one message with a version header."""
+    codec = codec or get_codec()
+    if not isinstance(message, StoredMessage):
+        message = StoredMessage.from_dict(message)
+    record = [
+        message.role,
+        message.content,
+        message.message_type,
+        dict(message.metadata) if message.metadata else None,
+        message.created,
+        message.tokens
+    ]
+    tokens = message.tokens if message.tokens is not None and 0 <= message.tokens < UNKNOWN_TOKENS \
+        else UNKNOWN_TOKENS
+    return bytes((MAGIC, FORMAT_VERSION, codec.codec_id)) + tokens.to_bytes(4, 'big') + codec.dumps(record)
+
+
+def decode_message(raw: Union[bytes, str]) -> StoredMessage:
+    """
+    Decode one stored message, whichever codec and format version wrote it.
+
+    Raises:
+        ValueError: Unknown header, or a codec that is not installed here
+    """
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8')
+    if raw[:1] == b"{":
+        # Version 0: JSON object with an ISO timestamp
+        return StoredMessage.from_dict(json.loads(raw))
+
+    if len(raw) < 3 or raw[0] != MAGIC:
+        raise ValueError("Unrecognized conversation message encoding")
+    version, codec_id = raw[1], raw[2]
+    codec = _BY_ID.get(codec_id)
+    if codec is None:
+        raise ValueError(f"Conversation message codec {codec_id} is not available")
+    offset = _PAYLOAD_OFFSETS.get(version)
+    if offset is None:
+        raise ValueError(f"Unsupported conversation message format version {version}")
+
+    role, content, message_type, metadata, created, tokens = codec.loads(raw[offset:])
+    return StoredMessage(role, content, message_type, metadata, created, tokens)
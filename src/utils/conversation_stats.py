@@ -0,0 +1,222 @@
+"""
+Incrementally maintained conversation statistics.
+
+Every stored message also queues, in the same pipeline as the write, an
+``INCR`` of the message total, a ``ZADD`` of the user's last activity into a
+sorted set (total and recently active users are then ZCARD/ZCOUNT away) and
+a ``PFADD`` into a per-day HyperLogLog of active users. Statistics are read
+back in one pipelined round trip into a snapshot that is cached for a few
+seconds, so dashboards and health checks never walk the keyspace.
+
+Conversations stored before the counters existed are counted by
+:meth:`ConversationStatistics.rebuild`, a SCAN over the per-user metadata
+hashes run as an explicit management step (``rebuild_statistics`` on the
+conversation services, or ``scripts/rebuild_conversation_stats.py``), never
+on startup.
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+
+def _decode(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def _activity_timestamp(value) -> float:
+    """Epoch seconds of an ISO ``last_activity`` field (now if missing or unreadable)."""
+    try:
+        return datetime.fromisoformat(_decode(value)).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+def scan_page(client, match: str, cursor: int = 0, count: int = 100) -> Tuple[int, List[str]]:
+    """
+    One SCAN step over keys matching ``match``.
+
+    ``count`` is a hint, so pages may be smaller or larger than asked for;
+    a returned cursor of 0 means the iteration is complete.
+
+    Returns:
+        Tuple of (next cursor, decoded keys)
+    """
+    next_cursor, keys = client.scan(cursor=cursor, match=match, count=count)
+    return int(next_cursor), [_decode(key) for key in keys]
+
+
+class ConversationStatistics:
+    """Redis counters for users and messages plus a cached snapshot of them."""
+
+    def __init__(self,
+                 key_prefix: str = "conversation_stats:",
+                 user_ttl_seconds: int = 7 * 86400,
+                 snapshot_ttl_seconds: float = 30.0,
+                 active_window_seconds: int = 3600,
+                 daily_retention_days: int = 30):
+        """
+        Initialize the statistics.
+
+        Args:
+            key_prefix: Redis key prefix
+            user_ttl_seconds: Users idle this long are dropped from the user count (conversation TTL)
+            snapshot_ttl_seconds: How long a snapshot is served before it is refreshed
+            active_window_seconds: Window for the recently active user count
+            daily_retention_days: How long per-day active user counts are kept
+        """
+        self.users_key = f"{key_prefix}users"
+        self.messages_key = f"{key_prefix}messages"
+        self.daily_prefix = f"{key_prefix}daily:"
+        self.rebuild_lock_key = f"{key_prefix}rebuild_lock"
+        self.user_ttl_seconds = user_ttl_seconds
+        self.snapshot_ttl_seconds = snapshot_ttl_seconds
+        self.active_window_seconds = active_window_seconds
+        self.daily_retention_seconds = daily_retention_days * 86400
+
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_time = 0.0
+        self._lock = threading.Lock()
+
+    def daily_key(self, day: Optional[str] = None) -> str:
+        """Key of the HyperLogLog of users active on ``day`` (YYYY-MM-DD, UTC; default today)."""
+        return f"{self.daily_prefix}{day or datetime.utcnow().strftime('%Y-%m-%d')}"
+
+    def daily_key_for(self, timestamp: float) -> str:
+        """Key of the HyperLogLog of users active on the UTC day of ``timestamp``."""
+        return self.daily_key(datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d'))
+
+    def record_message(self, pipe, user_id: str, timestamp: Optional[float] = None):
+        """Queue the counter updates for one stored message on a pipeline."""
+        now = timestamp or time.time()
+        daily_key = self.daily_key_for(now)
+        pipe.incr(self.messages_key)
+        pipe.zadd(self.users_key, {user_id: now})
+        pipe.pfadd(daily_key, user_id)
+        pipe.expire(daily_key, self.daily_retention_seconds)
+
+    def record_user(self, pipe, user_id: str, last_activity: float, message_count: int):
+        """Queue counting a conversation stored without the counters (e.g. a migrated one) on a pipeline."""
+        pipe.incrby(self.messages_key, message_count)
+        pipe.zadd(self.users_key, {user_id: last_activity}, gt=True)
+
+    def record_removal(self, pipe, user_id: str):
+        """Queue removal of a cleared conversation's user on a pipeline."""
+        pipe.zrem(self.users_key, user_id)
+
+    def read(self, client) -> Dict[str, Any]:
+        """Read all counters in one pipelined round trip, pruning users whose conversations expired."""
+        now = time.time()
+        pipe = client.pipeline(transaction=False)
+        pipe.zremrangebyscore(self.users_key, "-inf", now - self.user_ttl_seconds)
+        pipe.zcard(self.users_key)
+        pipe.zcount(self.users_key, now - self.active_window_seconds, "+inf")
+        pipe.get(self.messages_key)
+        pipe.pfcount(self.daily_key())
+        _, total_users, active_users, total_messages, active_today = pipe.execute()
+        return {
+            'total_users': int(total_users),
+            'active_users': int(active_users),
+            'active_users_today': int(active_today),
+            'total_messages': int(total_messages or 0)
+        }
+
+    def rebuild(self, client, match: str, batch_size: int = 500,
+                lock_seconds: int = 600) -> Optional[int]:
+        """
+        Recount users and messages from the metadata hashes matching ``match``.
+
+        Each hash is ``<prefix>:<user_id>`` with ``total_messages`` and
+        ``last_activity`` fields. Keys are walked with SCAN, one pipelined
+        HMGET and ZADD per page; users keep the later of their stored and
+        counted activity. The message total is corrected by the difference
+        between the sum and the counter as it was before the scan, so
+        increments made while the rebuild ran are kept.
+
+        Only one process rebuilds at a time (``SET NX EX`` lock).
+
+        Returns:
+            Number of users counted, or None if another rebuild holds the lock
+        """
+        token = uuid.uuid4().hex
+        if not client.set(self.rebuild_lock_key, token, nx=True, ex=lock_seconds):
+            logger.info("Conversation statistics rebuild already running, skipping")
+            return None
+
+        try:
+            return self._rebuild(client, match, batch_size)
+        finally:
+            if _decode(client.get(self.rebuild_lock_key)) == token:
+                client.delete(self.rebuild_lock_key)
+
+    def _rebuild(self, client, match: str, batch_size: int) -> int:
+        counted_before = int(client.get(self.messages_key) or 0)
+        cursor, users, total_messages = 0, 0, 0
+        while True:
+            cursor, keys = scan_page(client, match, cursor, batch_size)
+            if keys:
+                pipe = client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.hmget(key, "total_messages", "last_activity")
+                rows = pipe.execute()
+
+                pipe = client.pipeline(transaction=False)
+                for key, (message_count, last_activity) in zip(keys, rows):
+                    pipe.zadd(self.users_key, {key.split(":", 1)[1]: _activity_timestamp(last_activity)}, gt=True)
+                    total_messages += int(message_count or 0)
+                    users += 1
+                pipe.execute()
+            if cursor == 0:
+                break
+
+        client.incrby(self.messages_key, total_messages - counted_before)
+        logger.info(f"Rebuilt conversation statistics: {users} users, {total_messages} messages")
+        return users
+
+    def snapshot(self, loader: Callable[[], Dict[str, Any]], max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Cached statistics, refreshed through ``loader`` once they are older than ``max_age``.
+
+        Only one caller refreshes at a time; the others keep getting the
+        previous snapshot. A failed refresh serves the previous snapshot
+        marked ``stale``.
+        """
+        max_age = self.snapshot_ttl_seconds if max_age is None else max_age
+        now = time.time()
+        snapshot = self._snapshot
+        if snapshot is not None and now - self._snapshot_time < max_age:
+            return snapshot
+        if snapshot is not None and not self._lock.acquire(blocking=False):
+            return snapshot
+        if snapshot is None:
+            self._lock.acquire()
+
+        try:
+            # Another caller may have refreshed it while this one waited
+            if self._snapshot is not None and self._snapshot is not snapshot:
+                return self._snapshot
+            try:
+                fresh = dict(loader())
+                fresh.update({'stale': False, 'timestamp': datetime.utcnow().isoformat()})
+            except Exception as e:
+                logger.error(f"Failed to refresh conversation statistics: {e}")
+                if snapshot is not None:
+                    return dict(snapshot, stale=True)
+                raise
+            self._snapshot = fresh
+            self._snapshot_time = time.time()
+            return fresh
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        """Drop the cached snapshot so the next read refreshes it."""
+        with self._lock:
+            self._snapshot = None
+            self._snapshot_time = 0.0
@@ -0,0 +1,190 @@
+"""
+Idempotency layer for LINE webhook events.
+
+LINE redelivers webhook events when the bot is slow to acknowledge them and
+``connection_pool_manager.execute_with_retry`` can re-run a whole webhook on
+its own. This module remembers the ``webhookEventId`` of every event that has
+been claimed for processing so duplicates are short-circuited before any
+downstream work (OpenAI calls, replies) happens.
+
+Event IDs are kept in a bounded in-memory TTL set and, optionally, in Redis
+(``SET NX EX``) so that duplicates are also detected across workers.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from src.utils.error_handler import StructuredLogger
+from src.utils.redis_manager import RedisConnectionManager
+
+logger = StructuredLogger(__name__)
+
+
+class WebhookEventDeduplicator:
+    """
+    Bounded TTL set of processed webhook event IDs with optional Redis backing.
+
+    Thread-safe; lookups against the local set are O(1) and only first-seen
+    events cost a Redis round trip when Redis backing is enabled.
+    """
+
+    def __init__(self,
+                 ttl_seconds: int = 86400,
+                 max_entries: int = 50000,
+                 redis_manager: Optional[RedisConnectionManager] = None,
+                 key_prefix: str = "line_webhook_event:"):
+        """
+        Initialize the event deduplicator.
+
+        Args:
+            ttl_seconds: How long an event ID is remembered
+            max_entries: Maximum number of event IDs kept in memory
+            redis_manager: Optional Redis manager for cross-worker deduplication
+            key_prefix: Prefix of the Redis keys holding claimed event IDs
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.redis_manager = redis_manager
+        self.key_prefix = key_prefix
+
+        # event_id -> expiry (monotonic seconds), oldest first
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'untracked': 0,
+            'redeliveries': 0,
+            'redelivery_hits': 0,
+            'redis_hits': 0,
+            'redis_fallbacks': 0,
+            'evictions': 0
+        }
+
+    def claim_event(self, event: Any) -> bool:
+        """
+        Claim a parsed webhook event for processing.
+
+        Args:
+            event: LINE SDK event object
+
+        Returns:
+            True if the event should be processed, False if it is a duplicate
+        """
+        event_id = getattr(event, 'webhook_event_id', None)
+        delivery_context = getattr(event, 'delivery_context', None)
+        is_redelivery = getattr(delivery_context, 'is_redelivery', False) is True
+
+        if is_redelivery:
+            with self._lock:
+                self.stats['redeliveries'] += 1
+
+        if not isinstance(event_id, str) or not event_id:
+            # Events without an ID cannot be deduplicated; always process them
+            with self._lock:
+                self.stats['untracked'] += 1
+            return True
+
+        is_new = self.claim(event_id)
+
+        if not is_new:
+            if is_redelivery:
+                with self._lock:
+                    self.stats['redelivery_hits'] += 1
+            logger.info(
+                f"Skipping duplicate webhook event {event_id}",
+                extra_context={'is_redelivery': is_redelivery}
+            )
+
+        return is_new
+
+    def claim(self, event_id: str) -> bool:
+        """
+        Record an event ID, returning True only the first time it is seen.
+
+        Args:
+            event_id: LINE ``webhookEventId``
+
+        Returns:
+            True if the ID had not been claimed before (within the TTL)
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            if event_id in self._seen:
+                self.stats['hits'] += 1
+                return False
+            # Reserve locally before the Redis round trip so concurrent
+            # duplicates within this worker are rejected immediately
+            self._remember(event_id, now)
+
+        if self.redis_manager is not None and not self._claim_in_redis(event_id):
+            with self._lock:
+                self.stats['hits'] += 1
+                self.stats['redis_hits'] += 1
+            return False
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and cache occupancy."""
+        with self._lock:
+            stats = self.stats.copy()
+            size = len(self._seen)
+
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'size': size,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+            'redis_enabled': self.redis_manager is not None
+        })
+        return stats
+
+    def clear(self):
+        """Forget all locally remembered event IDs."""
+        with self._lock:
+            self._seen.clear()
+
+    def _claim_in_redis(self, event_id: str) -> bool:
+        """Atomically claim the ID in Redis; falls back to the local decision."""
+        key = f"{self.key_prefix}{event_id}"
+
+        def redis_operation(client):
+            return bool(client.set(key, 1, nx=True, ex=self.ttl_seconds))
+
+        def fallback():
+            return None
+
+        claimed = self.redis_manager.execute_with_fallback(
+            redis_operation, fallback, "claim_webhook_event", use_retry=False
+        )
+
+        if claimed is None:
+            with self._lock:
+                self.stats['redis_fallbacks'] += 1
+            return True
+
+        return claimed
+
+    def _remember(self, event_id: str, now: float):
+        """Add an ID, evicting the oldest entries beyond max_entries (lock held)."""
+        self._seen[event_id] = now + self.ttl_seconds
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _expire(self, now: float):
+        """Drop expired IDs from the front of the insertion-ordered set (lock held)."""
+        while self._seen:
+            event_id, expires_at = next(iter(self._seen.items()))
+            if expires_at > now:
+                break
+            del self._seen[event_id]
@@ -0,0 +1,182 @@
+"""
+Pre-rendered Flex Message payloads.
+
+Building a Flex Message means constructing the SDK object tree and then
+converting it back to camelCase JSON, which takes far longer than the
+message is worth when the same content goes out batch after batch. A
+compiled template builds the message once, with a placeholder for each
+per-send field (the content ID in the interaction postback data), and
+keeps the serialized JSON split at those placeholders. Rendering joins the
+byte segments with the field values, so every later send of the same
+content is a bytes join. Templates live in a process-wide LRU cache shared
+by every ``RichMessageService`` in the worker.
+
+Field values are spliced in without JSON escaping, so only values made of
+letters, digits and ``_.:-`` can be rendered (UUIDs and the generated
+content IDs are). Anything else must be built normally.
+"""
+
+import hashlib
+import json
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from linebot.models import BubbleContainer, CarouselContainer, FlexSendMessage
+
+from src.utils.error_handler import StructuredLogger
+from src.utils.lru_cache_manager import CacheType, get_lru_cache
+
+logger = StructuredLogger(__name__)
+
+PLACEHOLDER_PREFIX = "__flex_"
+_PLACEHOLDER_PATTERN = re.compile(rb'__flex_([a-z_]+?)__')
+SAFE_FIELD_VALUE = re.compile(r'^[A-Za-z0-9_.:-]+$')
+
+
+def placeholder(field: str) -> str:
+    """Placeholder compiled into the template in place of a per-send field."""
+    return f"{PLACEHOLDER_PREFIX}{field}__"
+
+
+def can_render(*values: Optional[str]) -> bool:
+    """Whether the values can be spliced into a compiled template."""
+    return all(value is None or SAFE_FIELD_VALUE.match(value) for value in values)
+
+
+def template_key(*parts: Any) -> str:
+    """Cache key for the static inputs of a template."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class PrerenderedFlexMessage(FlexSendMessage):
+    """Flex Message whose JSON was rendered from a compiled template."""
+
+    def __init__(self, payload: bytes, alt_text: str):
+        super().__init__(alt_text=alt_text)
+        self.payload = payload
+        self._decoded_contents = None
+
+    @property
+    def contents(self):
+        """Flex container, decoded from the payload only when inspected."""
+        if self._decoded_contents is None and getattr(self, 'payload', None) is not None:
+            self._decoded_contents = self.get_or_new_from_json_dict_with_types(
+                json.loads(self.payload)['contents'],
+                {'bubble': BubbleContainer, 'carousel': CarouselContainer}
+            )
+        return self._decoded_contents
+
+    @contents.setter
+    def contents(self, value):
+        self._decoded_contents = value
+
+    def as_json_dict(self) -> Dict[str, Any]:
+        return json.loads(self.payload)
+
+
+class CompiledFlexTemplate:
+    """Serialized Flex Message split at its per-send fields."""
+
+    __slots__ = ('segments', 'fields', 'alt_text', 'context')
+
+    def __init__(self, message: FlexSendMessage, context: Optional[Dict[str, Any]] = None):
+        """
+        Compile a message built with placeholder() values for its per-send fields.
+
+        Args:
+            message: The built Flex Message
+            context: Data the caller needs again on every render (e.g. button context)
+        """
+        payload = json.dumps(message.as_json_dict(), ensure_ascii=False,
+                             separators=(',', ':')).encode('utf-8')
+        parts = _PLACEHOLDER_PATTERN.split(payload)
+        self.segments: List[bytes] = parts[0::2]
+        self.fields: Tuple[str, ...] = tuple(name.decode('ascii') for name in parts[1::2])
+        self.alt_text = message.alt_text
+        self.context = context
+
+    def render(self, **values: str) -> PrerenderedFlexMessage:
+        """Splice the field values into the payload."""
+        segments = self.segments
+        pieces = [segments[0]]
+        for field, segment in zip(self.fields, segments[1:]):
+            pieces.append(values[field].encode('ascii'))
+            pieces.append(segment)
+        return PrerenderedFlexMessage(b''.join(pieces), self.alt_text)
+
+    def __sizeof__(self) -> int:
+        return sum(len(segment) for segment in self.segments) + 256
+
+
+class FlexPayloadCache:
+    """LRU cache of compiled Flex templates with build and render timings."""
+
+    def __init__(self, max_templates: int = 256, max_memory_mb: float = 20.0, ttl_seconds: int = 6 * 3600):
+        """
+        Initialize the cache.
+
+        Args:
+            max_templates: Compiled templates kept before LRU eviction
+            max_memory_mb: Memory cap of the compiled payloads
+            ttl_seconds: Lifetime of a compiled template
+        """
+        self.templates = get_lru_cache(
+            name="flex_payloads",
+            max_size=max_templates,
+            max_memory_mb=max_memory_mb,
+            default_ttl=ttl_seconds,
+            enable_memory_monitoring=True
+        )
+        self._stats = {'compiles': 0, 'compile_seconds': 0.0, 'renders': 0, 'render_seconds': 0.0}
+
+    def get_or_compile(self, key: str,
+                       build: Callable[[], Tuple[FlexSendMessage, Optional[Dict[str, Any]]]]) -> CompiledFlexTemplate:
+        """
+        Return the compiled template for ``key``, building it on a miss.
+
+        Args:
+            key: template_key() of the static inputs
+            build: Returns the message built with placeholders, and its render context
+        """
+        template = self.templates.get(key)
+        if template is None:
+            start = time.perf_counter()
+            message, context = build()
+            template = CompiledFlexTemplate(message, context)
+            self._stats['compiles'] += 1
+            self._stats['compile_seconds'] += time.perf_counter() - start
+            self.templates.put(key, template, cache_type=CacheType.TEMPLATE)
+            logger.debug(f"Compiled Flex template {key[:12]} with fields {template.fields}")
+        return template
+
+    def render(self, template: CompiledFlexTemplate, **values: str) -> PrerenderedFlexMessage:
+        """Render a compiled template, timing it for the statistics."""
+        start = time.perf_counter()
+        message = template.render(**values)
+        self._stats['renders'] += 1
+        self._stats['render_seconds'] += time.perf_counter() - start
+        return message
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Compile and render counts and average times, with the LRU statistics."""
+        stats = self._stats
+        return {
+            'compiles': stats['compiles'],
+            'renders': stats['renders'],
+            'avg_compile_ms': round(stats['compile_seconds'] / stats['compiles'] * 1000, 3) if stats['compiles'] else None,
+            'avg_render_us': round(stats['render_seconds'] / stats['renders'] * 1e6, 3) if stats['renders'] else None,
+            'cache': self.templates.get_statistics()
+        }
+
+
+# Global payload cache for this process
+_flex_payload_cache: Optional[FlexPayloadCache] = None
+
+
+def get_flex_payload_cache() -> FlexPayloadCache:
+    """Get the process-wide Flex payload cache."""
+    global _flex_payload_cache
+    if _flex_payload_cache is None:
+        _flex_payload_cache = FlexPayloadCache()
+    return _flex_payload_cache
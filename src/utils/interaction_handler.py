@@ -649,7 +649,8 @@ class InteractionHandler:
                 response = self.openai_service.get_response(
                     user_id=f"conversation_trigger_{user_id[:8]}",
                     user_message=conversation_prompt,
-                    use_streaming=False
+                    use_streaming=False,
+                    shared_prompt=True  # Same button, same prompt: concurrent taps share one call
                 )
                 
                 # Handle both string and dictionary responses from OpenAI service
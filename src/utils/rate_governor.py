@@ -0,0 +1,403 @@
+"""
+Adaptive client-side rate governor for Azure OpenAI quotas.
+
+Requests are admitted against two token buckets, requests/minute and
+tokens/minute, before they are sent. Waiting callers are served strictly by
+priority (interactive replies before batch content generation), then in
+arrival order. The governor adapts from the service's responses: the
+``x-ratelimit-remaining-*`` headers clamp the buckets to what the server
+reports, and a 429 pauses every admission for ``retry-after`` and halves the
+effective rates, which then recover gradually on successful responses.
+Async callers wait for admission in a worker thread, off the event loop.
+"""
+
+import asyncio
+import email.utils
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, Iterator, Mapping, Optional
+
+from src.exceptions import RateLimitException
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+
+class RequestPriority(IntEnum):
+    """Admission priority; lower values are served first"""
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+_current_priority: ContextVar[RequestPriority] = ContextVar(
+    'openai_request_priority', default=RequestPriority.INTERACTIVE
+)
+
+
+@contextmanager
+def request_priority(priority) -> Iterator[RequestPriority]:
+    """Run the enclosed OpenAI calls at ``priority`` (a RequestPriority or its name)."""
+    if isinstance(priority, str):
+        priority = RequestPriority[priority.upper()]
+    token = _current_priority.set(RequestPriority(priority))
+    try:
+        yield RequestPriority(priority)
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> RequestPriority:
+    """Priority of OpenAI calls made in the current context."""
+    return _current_priority.get()
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait from ``retry-after-ms`` or ``retry-after`` (seconds or HTTP date)."""
+    if not headers:
+        return None
+
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    """Integer header value, or None if absent or malformed."""
+    value = headers.get(name)
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """
+    Per-minute token bucket with an adjustable effective rate.
+
+    The bucket holds ``burst_seconds`` worth of the effective rate. A cost
+    larger than the capacity is admitted once the bucket is full, leaving the
+    level negative, so oversized requests are delayed rather than starved.
+    A limit of 0 disables the bucket.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.limit = float(per_minute)
+        self.rate = float(per_minute)
+        self.burst_seconds = burst_seconds
+        self.capacity = self._capacity()
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    def _capacity(self) -> float:
+        return max(1.0, self.rate * self.burst_seconds / 60)
+
+    def refill(self, now: float):
+        """Add tokens for the time elapsed since the last refill."""
+        if self.enabled:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.rate / 60)
+        self._updated = now
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until ``cost`` can be taken (0 if it can be taken now)."""
+        if not self.enabled:
+            return 0.0
+        needed = min(cost, self.capacity) - self.level
+        return max(0.0, needed * 60 / self.rate) if needed > 0 else 0.0
+
+    def take(self, cost: float):
+        if self.enabled:
+            self.level -= cost
+
+    def credit(self, amount: float):
+        """Return (or, if negative, charge) tokens after the real cost is known."""
+        if self.enabled:
+            self.level = min(self.capacity, self.level + amount)
+
+    def clamp(self, remaining: float):
+        """Never hold more than the server reports as remaining."""
+        if self.enabled:
+            self.level = min(self.level, remaining)
+
+    def set_limit(self, per_minute: float):
+        """Adopt a limit reported by the server."""
+        if per_minute > 0 and per_minute != self.limit:
+            learned = not self.enabled
+            self.limit = float(per_minute)
+            self.rate = min(self.rate, self.limit) if self.rate > 0 else self.limit
+            self.capacity = self._capacity()
+            # A newly learned limit starts full; the remaining header clamps it next
+            self.level = self.capacity if learned else min(self.level, self.capacity)
+
+    def scale_rate(self, rate: float):
+        """Set the effective rate, bounded by the configured limit."""
+        if self.enabled:
+            self.rate = min(self.limit, rate)
+            self.capacity = self._capacity()
+            self.level = min(self.level, self.capacity)
+
+
+class GovernorPermit:
+    """Admission of one request; settles the token estimate once usage is known."""
+
+    def __init__(self, governor: 'RateLimitGovernor', estimated_tokens: int, priority: RequestPriority):
+        self.governor = governor
+        self.estimated_tokens = estimated_tokens
+        self.priority = priority
+        self.settled = False
+
+    def settle(self, actual_tokens: int):
+        """Correct the tokens bucket by the difference between estimate and usage."""
+        if not self.settled:
+            self.settled = True
+            self.governor._credit_tokens(self.estimated_tokens - actual_tokens)
+
+
+class RateLimitGovernor:
+    """Priority-queued, adaptive requests/min and tokens/min admission control."""
+
+    def __init__(self,
+                 requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0,
+                 max_wait: float = 30.0,
+                 decrease_factor: float = 0.5,
+                 recovery_step: float = 0.05,
+                 min_rate_ratio: float = 0.1,
+                 default_retry_after: float = 2.0,
+                 name: str = "azure_openai"):
+        """
+        Initialize the governor.
+
+        Args:
+            requests_per_minute: Request quota (0 disables the requests bucket)
+            tokens_per_minute: Token quota (0 disables the tokens bucket)
+            max_wait: Seconds a caller may queue before RateLimitException
+            decrease_factor: Effective rate multiplier applied on a 429
+            recovery_step: Fraction of the limit restored per successful response
+            min_rate_ratio: Lowest effective rate as a fraction of the limit
+            default_retry_after: Pause after a 429 without a retry-after header
+            name: Service name used in errors and logs
+        """
+        self.name = name
+        self.max_wait = max_wait
+        self.decrease_factor = decrease_factor
+        self.recovery_step = recovery_step
+        self.min_rate_ratio = min_rate_ratio
+        self.default_retry_after = default_retry_after
+
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+
+        self.stats = {
+            'admitted': 0,
+            'queue_timeouts': 0,
+            'throttled_responses': 0,
+            'rate_decreases': 0,
+            'pauses': 0,
+            'header_updates': 0
+        }
+        self.queue_stats = {
+            priority.name.lower(): {'admitted': 0, 'total_wait': 0.0, 'avg_wait': 0.0, 'max_wait': 0.0}
+            for priority in RequestPriority
+        }
+
+    @contextmanager
+    def acquire(self, estimated_tokens: int = 0,
+                priority: Optional[RequestPriority] = None) -> Iterator[GovernorPermit]:
+        """
+        Wait for admission, then run the enclosed request.
+
+        A 429 raised by the request is fed back into the governor before it
+        propagates.
+
+        Raises:
+            RateLimitException: If admission takes longer than ``max_wait``
+        """
+        permit = self._admit(estimated_tokens, current_priority() if priority is None else priority)
+        try:
+            yield permit
+        except Exception as e:
+            self._observe_error(e)
+            raise
+
+    @asynccontextmanager
+    async def acquire_async(self, estimated_tokens: int = 0,
+                            priority: Optional[RequestPriority] = None) -> AsyncIterator[GovernorPermit]:
+        """
+        Async counterpart of :meth:`acquire`; the admission wait does not block the event loop.
+
+        Raises:
+            RateLimitException: If admission takes longer than ``max_wait``
+        """
+        permit = await asyncio.to_thread(
+            self._admit, estimated_tokens, current_priority() if priority is None else priority
+        )
+        try:
+            yield permit
+        except Exception as e:
+            self._observe_error(e)
+            raise
+
+    def _observe_error(self, error: Exception):
+        """Feed a 429 raised by an admitted request back into the governor."""
+        if getattr(error, 'status_code', None) == 429:
+            response = getattr(error, 'response', None)
+            self._on_throttled(parse_retry_after(getattr(response, 'headers', None) or {}))
+
+    def _admit(self, estimated_tokens: int, priority: RequestPriority) -> GovernorPermit:
+        """Queue by priority until both buckets (and any pause) allow the request."""
+        entry = (int(priority), next(self._sequence))
+        started = time.monotonic()
+        deadline = started + self.max_wait
+
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._admission_delay(estimated_tokens, now) if self._waiters[0] == entry else None
+                    if delay == 0:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.stats['queue_timeouts'] += 1
+                        raise RateLimitException(
+                            message=f"{self.name} admission not granted within {self.max_wait}s",
+                            retry_after=max(1, int(self.retry_after_remaining() or delay or 1)),
+                            service=self.name
+                        )
+                    self._cond.wait(min(remaining, delay) if delay else remaining)
+
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+            self._record_admission(priority, time.monotonic() - started)
+
+        return GovernorPermit(self, estimated_tokens, priority)
+
+    def _admission_delay(self, estimated_tokens: int, now: float) -> float:
+        """Seconds until the head of the queue may go (lock held)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+
+    def _record_admission(self, priority: RequestPriority, waited: float):
+        """Update admission and queue wait statistics (lock held)."""
+        self.stats['admitted'] += 1
+        queue = self.queue_stats[priority.name.lower()]
+        queue['admitted'] += 1
+        queue['total_wait'] += waited
+        queue['avg_wait'] = queue['total_wait'] / queue['admitted']
+        queue['max_wait'] = max(queue['max_wait'], waited)
+
+    def _credit_tokens(self, amount: float):
+        with self._cond:
+            self.tokens.credit(amount)
+            self._cond.notify_all()
+
+    def observe_response(self, response: Any):
+        """httpx response hook: adapt to rate limit headers and 429s."""
+        self.observe_headers(response.headers, response.status_code)
+
+    def observe_headers(self, headers: Mapping[str, str], status_code: int = 200):
+        """Adapt limits from a response's rate limit headers and status."""
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+
+            for bucket, kind in ((self.requests, 'requests'), (self.tokens, 'tokens')):
+                limit = _header_int(headers, f'x-ratelimit-limit-{kind}')
+                if limit:
+                    bucket.set_limit(limit)
+                remaining = _header_int(headers, f'x-ratelimit-remaining-{kind}')
+                if remaining is not None:
+                    bucket.clamp(remaining)
+                    self.stats['header_updates'] += 1
+
+            if status_code == 429:
+                self._on_throttled(parse_retry_after(headers), locked=True)
+            elif 200 <= status_code < 300:
+                # Additive recovery towards the configured limits
+                for bucket in (self.requests, self.tokens):
+                    if bucket.enabled and bucket.rate < bucket.limit:
+                        bucket.scale_rate(bucket.rate + bucket.limit * self.recovery_step)
+
+            self._cond.notify_all()
+
+    def _on_throttled(self, retry_after: Optional[float], locked: bool = False):
+        """Pause admissions and cut the effective rates once per throttling episode."""
+        if not locked:
+            with self._cond:
+                return self._on_throttled(retry_after, locked=True)
+
+        now = time.monotonic()
+        self.stats['throttled_responses'] += 1
+        already_paused = now < self.paused_until
+        pause = self.default_retry_after if retry_after is None else retry_after
+        if now + pause > self.paused_until:
+            self.paused_until = now + pause
+            self.stats['pauses'] += 1
+
+        # The same 429 can be seen by the HTTP hook and the raised error
+        if not already_paused:
+            self.stats['rate_decreases'] += 1
+            for bucket in (self.requests, self.tokens):
+                bucket.scale_rate(max(bucket.limit * self.min_rate_ratio, bucket.rate * self.decrease_factor))
+            logger.warning(f"{self.name} throttled, pausing admissions for {pause:.1f}s")
+
+        self._cond.notify_all()
+
+    def retry_after_remaining(self) -> float:
+        """Seconds left in the current throttling pause."""
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get admission, adaptation and per-priority queue wait statistics."""
+        with self._cond:
+            return {
+                **self.stats,
+                'queue_depth': len(self._waiters),
+                'paused_for': self.retry_after_remaining(),
+                'requests_per_minute': {'limit': self.requests.limit, 'effective': self.requests.rate,
+                                        'available': self.requests.level},
+                'tokens_per_minute': {'limit': self.tokens.limit, 'effective': self.tokens.rate,
+                                      'available': self.tokens.level},
+                'queue_wait': {name: dict(values) for name, values in self.queue_stats.items()},
+                'timestamp': datetime.utcnow().isoformat()
+            }
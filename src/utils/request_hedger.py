@@ -0,0 +1,285 @@
+"""
+Hedged requests for tail latency.
+
+The primary attempt starts immediately. If it has not produced its first
+token (or its result) within a deadline taken from a percentile of recent
+primary latencies, a duplicate attempt is sent down the hedge path. The first
+attempt to claim the race wins; the loser sees ``cancelled`` and abandons its
+stream at its next read. Hedges are paid for from a per-deployment budget, so
+they add at most a fixed fraction of extra requests.
+"""
+
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from src.exceptions import RateLimitException
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+PRIMARY = "primary"
+HEDGE = "hedge"
+
+
+class HedgeCancelled(Exception):
+    """Raised inside an attempt that lost the race."""
+
+
+class HedgeAttempt:
+    """Handle an attempt uses to claim the race and to notice it lost."""
+
+    def __init__(self, race: '_Race', name: str):
+        self._race = race
+        self.name = name
+        self.started = time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        """True once the other attempt has won."""
+        winner = self._race.winner
+        return winner is not None and winner != self.name
+
+    def claim(self) -> bool:
+        """
+        Claim the race; call before emitting the first chunk or committing a result.
+
+        Returns:
+            True if this attempt is (or already was) the winner
+        """
+        with self._race.cond:
+            if self._race.winner is None:
+                self._race.winner = self.name
+                self._race.claimed_at = time.monotonic()
+                self._race.cond.notify_all()
+            return self._race.winner == self.name
+
+
+class _Race:
+    """Shared state of one hedged request."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.winner: Optional[str] = None
+        self.claimed_at: Optional[float] = None
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.attempts: Dict[str, HedgeAttempt] = {}
+
+    def finished(self, name: str) -> bool:
+        return name in self.results or name in self.errors
+
+
+class _DeploymentState:
+    """Latency window, hedge budget and counters for one deployment."""
+
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.budget = 0.0
+        self.stats = {
+            'requests': 0,
+            'hedged_requests': 0,
+            'hedge_wins': 0,
+            'primary_wins_after_hedge': 0,
+            'fallbacks': 0,
+            'budget_exhausted': 0,
+            'hedge_rate': 0.0,
+            'hedge_win_rate': 0.0
+        }
+
+
+class RequestHedger:
+    """Race a primary attempt against a delayed hedge within a per-deployment budget."""
+
+    def __init__(self,
+                 percentile: float = 95.0,
+                 budget_percent: float = 10.0,
+                 min_samples: int = 20,
+                 window: int = 200,
+                 min_delay: float = 0.05,
+                 max_budget: float = 10.0,
+                 max_workers: int = 32):
+        """
+        Initialize the hedger.
+
+        Args:
+            percentile: Percentile of recent primary latencies used as the hedge deadline
+            budget_percent: Maximum extra requests, as a percentage of primary requests
+            min_samples: Latencies needed before hedging starts
+            window: Recent latencies kept per deployment
+            min_delay: Lower bound on the hedge deadline in seconds
+            max_budget: Hedges that can be saved up for a burst
+            max_workers: Threads running attempts
+        """
+        self.percentile = percentile
+        self.budget_ratio = budget_percent / 100.0
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self.max_budget = max_budget
+        self._deployments: Dict[str, _DeploymentState] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="openai-hedge")
+
+    def _state(self, deployment: str) -> _DeploymentState:
+        state = self._deployments.get(deployment)
+        if state is None:
+            with self._lock:
+                state = self._deployments.setdefault(deployment, _DeploymentState(self.window))
+        return state
+
+    def observe(self, deployment: str, latency: float):
+        """Record a primary first-token (or response) latency."""
+        state = self._state(deployment)
+        with self._lock:
+            state.latencies.append(latency)
+
+    def hedge_delay(self, deployment: str) -> Optional[float]:
+        """Current hedge deadline in seconds, or None until enough latencies are known."""
+        state = self._state(deployment)
+        with self._lock:
+            if len(state.latencies) < self.min_samples:
+                return None
+            ordered = sorted(state.latencies)
+        index = min(len(ordered) - 1, max(0, math.ceil(self.percentile / 100 * len(ordered)) - 1))
+        return max(self.min_delay, ordered[index])
+
+    def _spend_budget(self, state: _DeploymentState) -> bool:
+        with self._lock:
+            if state.budget >= 1:
+                state.budget -= 1
+                return True
+            state.stats['budget_exhausted'] += 1
+            return False
+
+    def run(self, deployment: str,
+            primary: Callable[[HedgeAttempt], Any],
+            hedge: Callable[[HedgeAttempt], Any]) -> Tuple[Any, str]:
+        """
+        Run ``primary``, hedging with ``hedge`` if it is slow; both receive a HedgeAttempt.
+
+        An attempt that fails before anyone has won hands over to the other
+        attempt (started as a plain fallback if needed, outside the budget);
+        throttling errors are not handed over since both paths share the quota.
+
+        Returns:
+            Tuple of (winning result, PRIMARY or HEDGE)
+
+        Raises:
+            The winner's error, or the primary's error when no attempt succeeds
+        """
+        state = self._state(deployment)
+        with self._lock:
+            state.stats['requests'] += 1
+            state.budget = min(self.max_budget, state.budget + self.budget_ratio)
+
+        race = _Race()
+        delay = self.hedge_delay(deployment)
+        started = time.monotonic()
+        deadline = None if delay is None else started + delay
+        hedged = False
+        self._launch(race, PRIMARY, primary)
+
+        with race.cond:
+            while True:
+                winner = race.winner
+                if winner is not None:
+                    deadline = None
+                    if race.finished(winner):
+                        break
+                if winner is None and all(race.finished(name) for name in race.attempts):
+                    error = race.errors.get(PRIMARY)
+                    if HEDGE in race.attempts or isinstance(error, RateLimitException):
+                        break
+                    # Primary failed before anyone won: fall back to the hedge path
+                    with self._lock:
+                        state.stats['fallbacks'] += 1
+                    self._launch(race, HEDGE, hedge)
+                    deadline = None
+                    continue
+
+                now = time.monotonic()
+                if winner is None and deadline is not None and now >= deadline:
+                    deadline = None
+                    if self._spend_budget(state):
+                        hedged = True
+                        with self._lock:
+                            state.stats['hedged_requests'] += 1
+                        logger.info(f"Hedging request to {deployment} after {now - started:.3f}s")
+                        self._launch(race, HEDGE, hedge)
+                race.cond.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+            winner = race.winner
+            primary_failed = PRIMARY in race.errors and not isinstance(race.errors[PRIMARY], HedgeCancelled)
+
+        self._record_outcome(deployment, state, winner, race.claimed_at, started, hedged, primary_failed)
+
+        if winner is not None and winner in race.results:
+            return race.results[winner], winner
+        if winner is not None:
+            raise race.errors[winner]
+        raise race.errors.get(PRIMARY) or race.errors[HEDGE]
+
+    def _launch(self, race: _Race, name: str, fn: Callable[[HedgeAttempt], Any]):
+        """Start an attempt in a worker thread, carrying over the caller's context (lock may be held)."""
+        attempt = HedgeAttempt(race, name)
+        race.attempts[name] = attempt
+        context = contextvars.copy_context()
+
+        def run_attempt():
+            try:
+                result = context.run(fn, attempt)
+                # An attempt that produced no chunks claims on completion
+                if attempt.claim():
+                    outcome = ('result', result)
+                else:
+                    outcome = ('error', HedgeCancelled())
+            except BaseException as e:
+                outcome = ('error', e)
+            with race.cond:
+                if outcome[0] == 'result':
+                    race.results[name] = outcome[1]
+                else:
+                    race.errors[name] = outcome[1]
+                race.cond.notify_all()
+
+        self._executor.submit(run_attempt)
+
+    def _record_outcome(self, deployment: str, state: _DeploymentState, winner: Optional[str],
+                        claimed_at: Optional[float], started: float, hedged: bool, primary_failed: bool):
+        """Update counters and the primary latency window."""
+        with self._lock:
+            stats = state.stats
+            if hedged and winner == HEDGE and not primary_failed:
+                stats['hedge_wins'] += 1
+            elif hedged and winner == PRIMARY:
+                stats['primary_wins_after_hedge'] += 1
+            stats['hedge_rate'] = stats['hedged_requests'] / stats['requests']
+            if stats['hedged_requests']:
+                stats['hedge_win_rate'] = stats['hedge_wins'] / stats['hedged_requests']
+
+        if winner == PRIMARY or (winner == HEDGE and not primary_failed):
+            # A losing primary was at least this slow; counting it keeps the window from drifting low
+            self.observe(deployment, claimed_at - started)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hedge rate, wins and current deadline per deployment."""
+        deployments = {}
+        for name, state in list(self._deployments.items()):
+            with self._lock:
+                stats = dict(state.stats)
+                stats['budget_available'] = state.budget
+                stats['latency_samples'] = len(state.latencies)
+            stats['hedge_delay'] = self.hedge_delay(name)
+            deployments[name] = stats
+        return {
+            'percentile': self.percentile,
+            'budget_percent': self.budget_ratio * 100,
+            'deployments': deployments,
+            'timestamp': datetime.utcnow().isoformat()
+        }
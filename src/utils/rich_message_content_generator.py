@@ -87,7 +87,9 @@ class RichMessageContentGenerator:
                 response = self.openai_service.get_response(
                     user_id="rich_message_generator",
                     user_message=prompt,
-                    use_streaming=False
+                    use_streaming=False,
+                    shared_prompt=True,
+                    priority="batch"  # Queued behind interactive replies under quota pressure
                 )
                 
                 if response and response.get('success') and response.get('message'):
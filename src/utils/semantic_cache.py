@@ -0,0 +1,395 @@
+"""
+Cross-user semantic cache for answers to stateless, FAQ-style queries.
+
+Queries are normalized (case, whitespace, Thai/Latin punctuation, emoji) and
+indexed by a MinHash signature over character n-grams. Locality-sensitive
+hashing buckets the signatures so a lookup only compares against a handful
+of candidates, and a candidate is accepted when its n-gram Jaccard similarity
+reaches the configured threshold. No embedding service is needed.
+
+Only queries classified into a stateless intent (greetings, thanks, "what
+can you do", ...) are cached; anything else is never stored or served.
+"""
+
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+# Mersenne prime for the universal hash family used by MinHash
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Keyword patterns (on normalized text) for intents whose answers do not depend
+# on the user or the conversation
+STATELESS_INTENTS: Dict[str, Tuple[str, ...]] = {
+    'greeting': ('hello', 'hi', 'hey', 'good morning', 'good evening', 'สวัสดี', 'หวัดดี'),
+    'thanks': ('thank', 'thanks', 'thx', 'ขอบคุณ', 'ขอบใจ'),
+    'capabilities': ('what can you do', 'how can you help', 'what do you do',
+                     'ทำอะไรได้', 'ช่วยอะไรได้'),
+    'identity': ('who are you', 'what are you', 'your name', 'คุณคือใคร', 'คุณชื่ออะไร', 'เป็นใคร'),
+}
+
+
+# Residual words that carry no user-specific content
+_FILLER_WORDS = frozenset((
+    'there', 'you', 'so', 'very', 'much', 'a', 'lot', 'again', 'all', 'everyone',
+    'guys', 'bot', 'for', 'the', 'your', 'help', 'ok', 'okay', 'oh', 'what', 'is',
+))
+
+# Thai polite particles and intensifiers, possibly run together ("ค่ะมากๆ")
+_THAI_PARTICLES = re.compile(
+    r'(?:ครับผม|ครับ|คับ|ค่ะ|คะ|ค่า|นะ|จ้า|จ้ะ|จ๊ะ|ฮะ|มาก|ๆ|เลย|จริงๆ)+'
+)
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a query for matching.
+
+    Applies NFKC and case folding, drops emoji, symbols and punctuation (Thai
+    ``๏``/``๚``/``๛`` included) and collapses whitespace. Thai vowels and
+    tone marks are kept.
+    """
+    text = unicodedata.normalize('NFKC', text or "").casefold()
+    kept = []
+    for char in text:
+        category = unicodedata.category(char)
+        if category[0] in ('P', 'S') or category in ('Cf', 'Co', 'Cs'):
+            kept.append(' ')
+        else:
+            kept.append(char)
+    return " ".join("".join(kept).split())
+
+
+def classify_intent(normalized: str) -> Optional[str]:
+    """
+    Return the stateless intent of a normalized query, or None.
+
+    Apart from intent phrases the query may only contain filler words and
+    polite particles ("hi there", "thank you so much ครับ" qualify; "hi, my
+    name is Somchai" and "thanks, my order is 12346" do not), so nothing
+    personal can end up in an answer shared across users.
+    """
+    padded = f" {normalized} "
+    for intent, patterns in STATELESS_INTENTS.items():
+        for pattern in patterns:
+            if _pattern_needle(pattern) in padded:
+                return intent if _is_filler(padded) else None
+    return None
+
+
+def _pattern_needle(pattern: str) -> str:
+    """Latin keywords must match whole words; Thai has no word spacing."""
+    return f" {pattern} " if pattern.isascii() else pattern
+
+
+def _is_filler(padded: str) -> bool:
+    """Check that nothing but intent phrases, filler words and particles remains."""
+    for patterns in STATELESS_INTENTS.values():
+        for pattern in patterns:
+            needle = _pattern_needle(pattern)
+            # Adjacent repeats share a space, so replace until none is left
+            while needle in padded:
+                padded = padded.replace(needle, " ")
+    return all(
+        token in _FILLER_WORDS or _THAI_PARTICLES.fullmatch(token)
+        for token in padded.split()
+    )
+
+
+def char_ngrams(text: str, n: int = 3) -> FrozenSet[str]:
+    """Character n-gram shingles of a normalized query."""
+    if len(text) <= n:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two shingle sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class SemanticCacheEntry:
+    """A cached answer with its normalized query and index data."""
+    entry_id: int
+    normalized: str
+    shingles: FrozenSet[str]
+    bands: Tuple[Tuple[int, ...], ...]
+    response: str
+    intent: str
+    model: str
+    created_at: float
+    ttl: float
+
+    @property
+    def is_expired(self) -> bool:
+        """Check if the entry has outlived its TTL."""
+        return time.time() - self.created_at > self.ttl
+
+
+class MinHashLSH:
+    """MinHash signatures banded for locality-sensitive bucketing."""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        """
+        Initialize the hash family.
+
+        Args:
+            num_perm: Number of MinHash permutations (signature length)
+            bands: Number of LSH bands; ``num_perm`` must be divisible by it
+            seed: Seed for the deterministic permutation parameters
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        params = []
+        for i in range(num_perm):
+            digest = hashlib.blake2b(f"{seed}:{i}".encode(), digest_size=16).digest()
+            a = int.from_bytes(digest[:8], 'big') % (_MERSENNE_PRIME - 1) + 1
+            b = int.from_bytes(digest[8:], 'big') % _MERSENNE_PRIME
+            params.append((a, b))
+        self._params = params
+
+    def signature(self, shingles: FrozenSet[str]) -> List[int]:
+        """MinHash signature of a shingle set."""
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+            for s in shingles
+        ]
+        if not hashes:
+            return [_MAX_HASH] * self.num_perm
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._params
+        ]
+
+    def band_keys(self, signature: List[int]) -> Tuple[Tuple[int, ...], ...]:
+        """Split a signature into per-band bucket keys."""
+        return tuple(
+            (band,) + tuple(signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        )
+
+
+class SemanticResponseCache:
+    """
+    Thread-safe, TTL + LRU bounded semantic cache of OpenAI answers.
+
+    Lookups normalize the query, find LSH candidates sharing at least one
+    band bucket and return the most similar unexpired answer for the same
+    model if it meets ``similarity_threshold``.
+    """
+
+    def __init__(self,
+                 similarity_threshold: float = 0.8,
+                 default_ttl: float = 86400,
+                 max_entries: int = 1000,
+                 max_query_chars: int = 120,
+                 ngram_size: int = 3,
+                 num_perm: int = 64,
+                 bands: int = 16):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            similarity_threshold: Minimum n-gram Jaccard similarity for a hit
+            default_ttl: Seconds an answer stays valid
+            max_entries: Maximum cached answers (least recently used evicted)
+            max_query_chars: Longer queries are not cached (unlikely to be FAQ-style)
+            ngram_size: Character n-gram length
+            num_perm: MinHash signature length
+            bands: LSH bands
+        """
+        self.similarity_threshold = similarity_threshold
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_query_chars = max_query_chars
+        self.ngram_size = ngram_size
+        self._lsh = MinHashLSH(num_perm=num_perm, bands=bands)
+
+        self._entries: "OrderedDict[int, SemanticCacheEntry]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, ...], set] = {}
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            'misses': 0,
+            'ineligible': 0,
+            'sets': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+        self.intent_stats: Dict[str, Dict[str, int]] = {}
+
+    def prepare(self, query: str) -> Optional[Tuple[str, str]]:
+        """Normalize a query and return (normalized, intent) if it is cacheable."""
+        normalized = normalize_query(query)
+        if not normalized or len(normalized) > self.max_query_chars:
+            return None
+        intent = classify_intent(normalized)
+        if intent is None:
+            return None
+        return normalized, intent
+
+    def get(self, query: str, model: str = "") -> Optional[str]:
+        """
+        Look up a cached answer for a similar query.
+
+        Args:
+            query: Raw user message
+            model: Deployment the answer must have been generated by
+
+        Returns:
+            Cached answer text, or None
+        """
+        prepared = self.prepare(query)
+        with self._lock:
+            self.stats['lookups'] += 1
+            if prepared is None:
+                self.stats['ineligible'] += 1
+                return None
+
+            normalized, intent = prepared
+            intent_stats = self._intent_stats(intent)
+            intent_stats['lookups'] += 1
+
+            shingles = char_ngrams(normalized, self.ngram_size)
+            bands = self._lsh.band_keys(self._lsh.signature(shingles))
+
+            best, best_score = None, 0.0
+            for entry_id in self._candidates(bands):
+                entry = self._entries.get(entry_id)
+                if entry is None or entry.model != model:
+                    continue
+                if entry.is_expired:
+                    self._remove(entry_id)
+                    self.stats['expirations'] += 1
+                    continue
+                score = 1.0 if entry.normalized == normalized else jaccard(shingles, entry.shingles)
+                if score > best_score:
+                    best, best_score = entry, score
+
+            if best is None or best_score < self.similarity_threshold:
+                self.stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(best.entry_id)
+            self.stats['hits'] += 1
+            intent_stats['hits'] += 1
+            logger.debug(f"Semantic cache hit ({intent}, similarity {best_score:.2f})")
+            return best.response
+
+    def set(self, query: str, response: str, model: str = "", ttl: Optional[float] = None) -> bool:
+        """
+        Cache an answer if the query belongs to a stateless intent.
+
+        Returns:
+            True if the answer was stored
+        """
+        prepared = self.prepare(query)
+        if prepared is None or not response:
+            return False
+
+        normalized, intent = prepared
+        shingles = char_ngrams(normalized, self.ngram_size)
+        bands = self._lsh.band_keys(self._lsh.signature(shingles))
+
+        with self._lock:
+            # Replace an existing answer for the identical normalized query
+            for entry_id in list(self._candidates(bands)):
+                entry = self._entries.get(entry_id)
+                if entry is not None and entry.normalized == normalized and entry.model == model:
+                    self._remove(entry_id)
+
+            entry = SemanticCacheEntry(
+                entry_id=self._next_id,
+                normalized=normalized,
+                shingles=shingles,
+                bands=bands,
+                response=response,
+                intent=intent,
+                model=model,
+                created_at=time.time(),
+                ttl=ttl or self.default_ttl
+            )
+            self._next_id += 1
+
+            self._entries[entry.entry_id] = entry
+            for band in bands:
+                self._buckets.setdefault(band, set()).add(entry.entry_id)
+
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.stats['evictions'] += 1
+
+            self.stats['sets'] += 1
+            self._intent_stats(intent)['sets'] += 1
+            return True
+
+    def clear(self):
+        """Remove every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get overall and per-intent hit statistics."""
+        with self._lock:
+            stats = self.stats.copy()
+            eligible = stats['hits'] + stats['misses']
+            stats.update({
+                'current_size': len(self._entries),
+                'max_entries': self.max_entries,
+                'similarity_threshold': self.similarity_threshold,
+                'hit_rate': stats['hits'] / eligible if eligible else 0.0,
+                'intents': {
+                    intent: {
+                        **counts,
+                        'hit_rate': counts['hits'] / counts['lookups'] if counts['lookups'] else 0.0
+                    }
+                    for intent, counts in self.intent_stats.items()
+                },
+                'timestamp': datetime.utcnow().isoformat()
+            })
+            return stats
+
+    def _candidates(self, bands: Tuple[Tuple[int, ...], ...]) -> set:
+        """Entry IDs sharing at least one band bucket (lock held)."""
+        candidates = set()
+        for band in bands:
+            candidates.update(self._buckets.get(band, ()))
+        return candidates
+
+    def _remove(self, entry_id: int):
+        """Remove an entry and its bucket memberships (lock held)."""
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _intent_stats(self, intent: str) -> Dict[str, int]:
+        """Per-intent counters, created on first use (lock held)."""
+        return self.intent_stats.setdefault(intent, {'lookups': 0, 'hits': 0, 'sets': 0})
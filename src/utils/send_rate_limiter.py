@@ -0,0 +1,208 @@
+"""
+Atomic per-user send limits for Rich Messages.
+
+Each user may receive one Rich Message per cooldown period and a fixed
+number per day: a token bucket holding one token that refills after the
+cooldown, capped by a daily quota. With Redis, a Lua script checks both
+limits and records the send in one atomic round trip, so concurrent
+workers cannot both pass the check before either records (the over-send
+the separate GET/SETEX calls allowed). The script takes any number of
+users, so a recipient list is evaluated in one call before a multicast.
+Without Redis, the same rules run in memory under a lock.
+
+Keys are the ones the service used before: ``rate_limit_history:{user}``
+holds the last send time and ``rate_limit_daily:{user}:{date}`` the day's
+count.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+CHECK = "check"      # Evaluate only
+ACQUIRE = "acquire"  # Evaluate and record the send if allowed
+RECORD = "record"    # Record the send unconditionally
+
+# Users per script call, so one call never holds Redis for long
+SCRIPT_BATCH_USERS = 500
+
+# KEYS: history and daily key per user, in pairs
+# ARGV: now, cooldown, max daily, daily TTL, mode
+# Returns {code, remaining seconds, daily count} per user; code 0 cooldown, 1 daily limit, 2 allowed
+SEND_LIMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cooldown = tonumber(ARGV[2])
+local max_daily = tonumber(ARGV[3])
+local daily_ttl = tonumber(ARGV[4])
+local mode = ARGV[5]
+local results = {}
+for i = 1, #KEYS, 2 do
+    local last = tonumber(redis.call('GET', KEYS[i]))
+    local count = tonumber(redis.call('GET', KEYS[i + 1])) or 0
+    local code = 2
+    local remaining = 0
+    if mode ~= 'record' then
+        if last and now - last < cooldown then
+            code = 0
+            remaining = cooldown - (now - last)
+        elseif count >= max_daily then
+            code = 1
+        end
+    end
+    if code == 2 and mode ~= 'check' then
+        redis.call('SET', KEYS[i], ARGV[1], 'EX', math.ceil(cooldown) + 60)
+        count = redis.call('INCR', KEYS[i + 1])
+        redis.call('EXPIRE', KEYS[i + 1], daily_ttl)
+    end
+    results[#results + 1] = {code, tostring(remaining), count}
+end
+return results
+"""
+
+# KEYS: history key, daily key; ARGV: the reserved send time
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+if (tonumber(redis.call('GET', KEYS[2])) or 0) > 0 then
+    redis.call('DECR', KEYS[2])
+end
+return 1
+"""
+
+_REASONS = {0: "cooldown", 1: "daily_limit", 2: "within_limits"}
+
+
+class SendRateLimiter:
+    """Cooldown and daily quota per user, evaluated atomically in Redis or in memory."""
+
+    def __init__(self, cooldown_seconds: float = 300, max_daily: int = 10,
+                 daily_ttl_seconds: int = 25 * 3600):
+        """
+        Initialize the limiter.
+
+        Args:
+            cooldown_seconds: Minimum time between two sends to the same user
+            max_daily: Sends allowed per user per day
+            daily_ttl_seconds: Lifetime of a daily counter in Redis (over a day, for timezone differences)
+        """
+        self.cooldown_seconds = cooldown_seconds
+        self.max_daily = max_daily
+        self.daily_ttl_seconds = daily_ttl_seconds
+
+        # In-memory fallback state
+        self.send_history: Dict[str, float] = {}
+        self.daily_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._pruned_date: Optional[str] = None
+
+    @staticmethod
+    def history_key(user_id: str) -> str:
+        return f"rate_limit_history:{user_id}"
+
+    @staticmethod
+    def daily_key(user_id: str, date_key: str) -> str:
+        return f"rate_limit_daily:{user_id}:{date_key}"
+
+    def evaluate(self, client, user_ids: Sequence[str], mode: str = CHECK,
+                 now: Optional[float] = None, date_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Evaluate, and depending on ``mode`` record, a send to each user.
+
+        A user listed twice is evaluated twice in order, so with ACQUIRE only
+        the first occurrence can pass.
+
+        Args:
+            client: Redis client, or None for the in-memory fallback
+            user_ids: Recipients
+            mode: CHECK, ACQUIRE or RECORD
+            now: Send time (epoch seconds); defaults to the current time
+            date_key: Day of the quota (YYYY-MM-DD); defaults to today
+
+        Returns:
+            One decision per user: 'allowed', 'reason', 'remaining_seconds',
+            'daily_count' and 'sent_at' (the recorded send time)
+        """
+        now = time.time() if now is None else now
+        date_key = date_key or datetime.fromtimestamp(now).strftime('%Y-%m-%d')
+        if client is None:
+            codes = self._evaluate_memory(user_ids, mode, now, date_key)
+        else:
+            codes = self._evaluate_redis(client, user_ids, mode, now, date_key)
+        return [
+            {
+                "allowed": code == 2,
+                "reason": _REASONS[code],
+                "remaining_seconds": remaining,
+                "daily_count": count,
+                "sent_at": now if code == 2 and mode != CHECK else None
+            }
+            for code, remaining, count in codes
+        ]
+
+    def release(self, client, user_id: str, sent_at: float, date_key: Optional[str] = None) -> None:
+        """Give back a send recorded at ``sent_at`` that was not delivered."""
+        date_key = date_key or datetime.fromtimestamp(sent_at).strftime('%Y-%m-%d')
+        if client is not None:
+            client.register_script(RELEASE_SCRIPT)(
+                keys=[self.history_key(user_id), self.daily_key(user_id, date_key)],
+                args=[repr(sent_at)]
+            )
+            return
+        with self._lock:
+            if self.send_history.get(user_id) == sent_at:
+                del self.send_history[user_id]
+            daily = f"{user_id}:{date_key}"
+            if self.daily_counts.get(daily, 0) > 0:
+                self.daily_counts[daily] -= 1
+
+    def _evaluate_redis(self, client, user_ids: Sequence[str], mode: str, now: float, date_key: str) -> List[tuple]:
+        script = client.register_script(SEND_LIMIT_SCRIPT)
+        codes = []
+        for i in range(0, len(user_ids), SCRIPT_BATCH_USERS):
+            keys = []
+            for user_id in user_ids[i:i + SCRIPT_BATCH_USERS]:
+                keys.append(self.history_key(user_id))
+                keys.append(self.daily_key(user_id, date_key))
+            rows = script(keys=keys, args=[repr(now), self.cooldown_seconds, self.max_daily,
+                                           self.daily_ttl_seconds, mode])
+            codes.extend((int(code), float(remaining), int(count)) for code, remaining, count in rows)
+        return codes
+
+    def _evaluate_memory(self, user_ids: Sequence[str], mode: str, now: float, date_key: str) -> List[tuple]:
+        codes = []
+        with self._lock:
+            self._prune(date_key)
+            for user_id in user_ids:
+                daily = f"{user_id}:{date_key}"
+                last = self.send_history.get(user_id)
+                count = self.daily_counts.get(daily, 0)
+                code, remaining = 2, 0.0
+                if mode != RECORD:
+                    if last is not None and now - last < self.cooldown_seconds:
+                        code, remaining = 0, self.cooldown_seconds - (now - last)
+                    elif count >= self.max_daily:
+                        code = 1
+                if code == 2 and mode != CHECK:
+                    self.send_history[user_id] = now
+                    count += 1
+                    self.daily_counts[daily] = count
+                codes.append((code, remaining, count))
+        return codes
+
+    def _prune(self, date_key: str) -> None:
+        """Drop in-memory counters older than a week, once per day (Redis expires its own)."""
+        if self._pruned_date == date_key:
+            return
+        self._pruned_date = date_key
+        cutoff = (datetime.strptime(date_key, '%Y-%m-%d') - timedelta(days=7)).strftime('%Y-%m-%d')
+        stale = [key for key in self.daily_counts if key.rsplit(':', 1)[-1] < cutoff]
+        for key in stale:
+            del self.daily_counts[key]
+        if stale:
+            logger.debug(f"Cleaned {len(stale)} old daily limit records from memory")
@@ -0,0 +1,188 @@
+"""
+Single-flight coalescing of identical concurrent requests.
+
+The first caller for a key (the leader) performs the call; callers arriving
+with the same key while it is in flight (followers) wait for and share its
+result or error instead of issuing their own. Streamed chunks are relayed to
+followers as the leader receives them, including chunks produced before a
+follower joined.
+"""
+
+import hashlib
+import threading
+import time
+import unicodedata
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.exceptions import TimeoutException
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+
+def prompt_fingerprint(prompt: str, *context: str) -> str:
+    """
+    Fingerprint of a prompt plus the context it is answered in.
+
+    The prompt is NFKC-normalized and whitespace-collapsed, so formatting
+    differences of otherwise identical prompts map to the same key.
+    """
+    normalized = " ".join(unicodedata.normalize('NFKC', prompt or "").split())
+    payload = "\x1f".join((*context, normalized))
+    return hashlib.sha256(payload.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class _Flight:
+    """State of one in-flight call shared by its leader and followers."""
+
+    __slots__ = ('condition', 'chunks', 'done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.chunks: List[str] = []
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Thread-safe single-flight group keyed by request fingerprint."""
+
+    def __init__(self, timeout: float = 30.0):
+        """
+        Initialize the group.
+
+        Args:
+            timeout: Seconds a follower waits for the leader before giving up
+        """
+        self.timeout = timeout
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'flights': 0,
+            'coalesced_requests': 0,
+            'max_fan_in': 0,
+            'avg_fan_in': 0.0,
+            'shared_errors': 0,
+            'timeouts': 0
+        }
+
+    def do(self,
+           key: str,
+           fn: Callable[[Callable[[str], None]], Any],
+           chunk_callback: Optional[Callable[[str], None]] = None,
+           timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Run ``fn`` once among concurrent callers with the same key.
+
+        Args:
+            key: Request fingerprint
+            fn: Performs the call; receives an ``emit(chunk)`` function to publish streamed chunks
+            chunk_callback: Receives this caller's streamed chunks (leader or follower)
+            timeout: Follower wait limit in seconds (defaults to the group timeout)
+
+        Returns:
+            Tuple of (result, shared) where ``shared`` is True for followers
+
+        Raises:
+            The leader's exception, for the leader and every follower;
+            TimeoutException if a follower waits longer than ``timeout``
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.followers += 1
+
+        if leader:
+            return self._lead(key, flight, fn, chunk_callback), False
+        return self._follow(flight, chunk_callback, self.timeout if timeout is None else timeout), True
+
+    def _lead(self, key: str, flight: _Flight, fn: Callable, chunk_callback: Optional[Callable]) -> Any:
+        """Perform the call and publish its chunks and outcome."""
+        def emit(chunk: str):
+            with flight.condition:
+                flight.chunks.append(chunk)
+                flight.condition.notify_all()
+            if chunk_callback is not None:
+                chunk_callback(chunk)
+
+        try:
+            flight.result = fn(emit)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # New callers start a fresh flight from here on
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                self._record_flight(flight)
+            with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+    def _follow(self, flight: _Flight, chunk_callback: Optional[Callable], timeout: float) -> Any:
+        """Wait for the leader, relaying chunks as they arrive."""
+        deadline = time.monotonic() + timeout
+        relayed = 0
+
+        while True:
+            with flight.condition:
+                while not flight.done and (chunk_callback is None or relayed == len(flight.chunks)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        with self._lock:
+                            self.stats['timeouts'] += 1
+                        raise TimeoutException(
+                            message=f"Coalesced request not completed within {timeout}s",
+                            operation="single_flight_wait",
+                            timeout_seconds=timeout
+                        )
+                    flight.condition.wait(remaining)
+                pending = flight.chunks[relayed:] if chunk_callback is not None else []
+                relayed += len(pending)
+                done = flight.done
+
+            for chunk in pending:
+                chunk_callback(chunk)
+
+            if done:
+                break
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _record_flight(self, flight: _Flight):
+        """Update fan-in statistics for a finished flight (lock held)."""
+        stats = self.stats
+        fan_in = flight.followers + 1
+        stats['flights'] += 1
+        stats['coalesced_requests'] += flight.followers
+        stats['max_fan_in'] = max(stats['max_fan_in'], fan_in)
+        stats['avg_fan_in'] = (stats['flights'] + stats['coalesced_requests']) / stats['flights']
+        if flight.error is not None and flight.followers:
+            stats['shared_errors'] += 1
+        if flight.followers:
+            logger.info(f"Coalesced {fan_in} identical requests into one upstream call")
+
+    def in_flight(self) -> int:
+        """Number of keys currently in flight."""
+        with self._lock:
+            return len(self._flights)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescing statistics."""
+        with self._lock:
+            return {
+                **self.stats,
+                'in_flight': len(self._flights),
+                'timeout': self.timeout,
+                'timestamp': datetime.utcnow().isoformat()
+            }
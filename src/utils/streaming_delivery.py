@@ -0,0 +1,230 @@
+"""
+Progressive delivery of streamed OpenAI responses to LINE.
+
+Instead of waiting for the full completion, the first sentence-sized chunk
+is sent with the event's reply token as soon as it is ready. Later text is
+coalesced and pushed in a bounded number of push calls (each carrying up to
+LINE's 5 message bubbles) so users see text early without flooding the chat
+or the monthly push quota.
+"""
+
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from linebot.models import TextSendMessage
+
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+# LINE limits: 5000 characters per text message, 5 messages per API call
+LINE_MAX_TEXT_LENGTH = 5000
+LINE_MAX_MESSAGES_PER_CALL = 5
+TRUNCATION_NOTICE = "\n\n[訊息過長已截斷 / Message truncated]"
+
+# End of a sentence (Latin, CJK and ellipsis punctuation) or a line break
+SENTENCE_BOUNDARY = re.compile(r'(?:[.!?。！？…]+["\')\]」』]*\s+)|\n+')
+
+
+def find_sentence_cut(text: str, min_chars: int, max_chars: int) -> Optional[int]:
+    """
+    Find where to cut a chunk off the front of ``text``.
+
+    Prefers the last sentence boundary between ``min_chars`` and ``max_chars``.
+    Once the text is at least ``max_chars`` long without such a boundary (e.g.
+    Thai, which does not punctuate sentences) it falls back to the last
+    whitespace, then to a hard cut.
+
+    Returns:
+        Cut position, or None if no chunk is ready yet
+    """
+    cut = None
+    for match in SENTENCE_BOUNDARY.finditer(text, 0, max_chars):
+        if match.end() >= min_chars:
+            cut = match.end()
+    if cut is not None:
+        return cut
+
+    if len(text) < max_chars:
+        return None
+
+    space = text.rfind(' ', min_chars, max_chars)
+    return space + 1 if space > 0 else max_chars
+
+
+def split_message_bubbles(text: str, max_chars: int,
+                          max_bubbles: int = LINE_MAX_MESSAGES_PER_CALL) -> List[str]:
+    """Split text into at most ``max_bubbles`` chunks of ``max_chars``, truncating the rest."""
+    bubbles = []
+    remaining = text.strip()
+    while remaining and len(bubbles) < max_bubbles:
+        if len(remaining) <= max_chars:
+            bubbles.append(remaining)
+            remaining = ""
+            break
+        cut = find_sentence_cut(remaining, max_chars // 2, max_chars)
+        bubbles.append(remaining[:cut].strip())
+        remaining = remaining[cut:].strip()
+
+    if remaining and bubbles:
+        limit = max_chars - len(TRUNCATION_NOTICE)
+        bubbles[-1] = bubbles[-1][:limit] + TRUNCATION_NOTICE
+        logger.warning(f"Streamed response truncated ({len(remaining)} chars dropped)")
+
+    return [bubble for bubble in bubbles if bubble]
+
+
+class StreamingReplyDelivery:
+    """
+    Deliver one streamed response to a LINE user progressively.
+
+    Feed text deltas to :meth:`on_delta` (usable directly as the OpenAI
+    service ``chunk_callback``) and call :meth:`finish` with the final text.
+    """
+
+    def __init__(self,
+                 line_bot_api,
+                 user_id: str,
+                 reply_token: str,
+                 first_chunk_min_chars: int = 40,
+                 first_chunk_max_chars: int = 200,
+                 max_chunk_chars: int = 1000,
+                 push_interval: float = 1.5,
+                 max_push_calls: int = 3):
+        """
+        Initialize a delivery.
+
+        Args:
+            line_bot_api: LINE Bot API client used for reply and push calls
+            user_id: Recipient of push messages
+            reply_token: Reply token of the triggering event
+            first_chunk_min_chars: Minimum length of the replied first chunk
+            first_chunk_max_chars: Length at which the first chunk is cut even
+                without a sentence boundary
+            max_chunk_chars: Maximum characters per message bubble
+            push_interval: Minimum seconds between push calls (coalescing window)
+            max_push_calls: Maximum push calls, including the final one
+        """
+        self.line_bot_api = line_bot_api
+        self.user_id = user_id
+        self.reply_token = reply_token
+        self.first_chunk_min_chars = first_chunk_min_chars
+        self.first_chunk_max_chars = max(first_chunk_max_chars, first_chunk_min_chars + 1)
+        self.max_chunk_chars = min(max_chunk_chars, LINE_MAX_TEXT_LENGTH)
+        self.push_interval = push_interval
+        self.max_push_calls = max(1, max_push_calls)
+
+        self._lock = threading.Lock()
+        self._received = ""
+        self._delivered_len = 0
+        self._replied = False
+        self._finished = False
+        self._last_send_time = 0.0
+
+        self.start_time = time.time()
+        self.stats = {
+            'time_to_first_text': None,
+            'reply_used': False,
+            'push_calls': 0,
+            'messages_sent': 0,
+            'chars_delivered': 0,
+            'send_failures': 0
+        }
+
+    def on_delta(self, delta: str):
+        """Accept a streamed text delta and send whatever chunk is ready."""
+        if not delta:
+            return
+
+        with self._lock:
+            if self._finished:
+                return
+            self._received += delta
+            pending = self._received[self._delivered_len:]
+
+            if not self._replied:
+                cut = find_sentence_cut(pending, self.first_chunk_min_chars, self.first_chunk_max_chars)
+                if cut is not None:
+                    self._deliver(pending[:cut])
+                    self._delivered_len += cut
+                return
+
+            # Keep the last push call in reserve for finish()
+            if self.stats['push_calls'] >= self.max_push_calls - 1:
+                return
+            if time.time() - self._last_send_time < self.push_interval:
+                return
+
+            batch_limit = self.max_chunk_chars * LINE_MAX_MESSAGES_PER_CALL
+            cut = find_sentence_cut(pending, self.first_chunk_min_chars, batch_limit)
+            if cut is not None:
+                self._deliver(pending[:cut])
+                self._delivered_len += cut
+
+    def finish(self, final_text: str) -> Dict[str, Any]:
+        """
+        Deliver everything not yet sent and return the delivery stats.
+
+        ``final_text`` is authoritative: if it does not continue what has been
+        delivered (an error message after a partial answer) it is sent in full.
+        """
+        with self._lock:
+            if self._finished:
+                return self.get_stats()
+            self._finished = True
+
+            delivered = self._received[:self._delivered_len].strip()
+            final_text = (final_text or "").strip()
+            if delivered and final_text.startswith(delivered):
+                remaining = final_text[len(delivered):]
+            else:
+                remaining = final_text
+
+            if remaining.strip():
+                self._deliver(remaining)
+
+            return self.get_stats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-delivery timing and message counters."""
+        stats = self.stats.copy()
+        stats['duration'] = time.time() - self.start_time
+        return stats
+
+    def _deliver(self, text: str):
+        """Send text with the reply token first, by push afterwards (lock held)."""
+        bubbles = split_message_bubbles(text, self.max_chunk_chars)
+        if not bubbles:
+            return
+        messages = [TextSendMessage(text=bubble) for bubble in bubbles]
+
+        if not self._replied:
+            self._replied = True
+            try:
+                self.line_bot_api.reply_message(self.reply_token, messages)
+                self.stats['reply_used'] = True
+                self._record_sent(bubbles)
+                return
+            except Exception as e:
+                # Expired or used reply token; the chunk goes out by push instead
+                self.stats['send_failures'] += 1
+                logger.warning(f"Streaming reply failed, falling back to push: {e}")
+
+        try:
+            self.line_bot_api.push_message(self.user_id, messages)
+            self.stats['push_calls'] += 1
+            self._record_sent(bubbles)
+        except Exception as e:
+            self.stats['send_failures'] += 1
+            logger.error(f"Streaming push to user {self.user_id[:8]}... failed: {e}")
+
+    def _record_sent(self, bubbles: List[str]):
+        """Update counters after a successful send (lock held)."""
+        now = time.time()
+        if self.stats['time_to_first_text'] is None:
+            self.stats['time_to_first_text'] = now - self.start_time
+        self._last_send_time = now
+        self.stats['messages_sent'] += len(bubbles)
+        self.stats['chars_delivered'] += sum(len(bubble) for bubble in bubbles)
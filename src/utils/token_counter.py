@@ -0,0 +1,104 @@
+"""
+Offline token counting for prompt budgeting and token accounting.
+
+By default a deterministic approximation of GPT tokenization is used that
+needs no network or model files: runs of ASCII text cost roughly one token
+per four characters, while Thai, CJK and other non-ASCII characters cost
+more per character. Setting ``TOKEN_COUNTER_ENCODING`` (e.g. ``o200k_base``)
+switches to an exact tiktoken encoding when the optional ``tiktoken``
+package and its encoding file are available locally.
+"""
+
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from src.utils.error_handler import StructuredLogger
+
+# Optional exact tokenizer
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = StructuredLogger(__name__)
+
+# Per-message framing overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_ASCII_RUN = re.compile(r'[\x00-\x7f]+')
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding() -> Optional[Any]:
+    """Load the configured tiktoken encoding once; None means use the approximation."""
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+
+    with _encoding_lock:
+        if not _encoding_loaded:
+            name = os.environ.get("TOKEN_COUNTER_ENCODING", "")
+            if name and tiktoken is not None:
+                try:
+                    _encoding = tiktoken.get_encoding(name)
+                    logger.info(f"Token counting with tiktoken encoding {name}")
+                except Exception as e:
+                    logger.warning(f"Tiktoken encoding {name} unavailable, using approximation: {e}")
+            elif name:
+                logger.warning("TOKEN_COUNTER_ENCODING set but tiktoken is not installed, using approximation")
+            _encoding_loaded = True
+
+    return _encoding
+
+
+def get_backend() -> str:
+    """Name of the active counting backend."""
+    encoding = _get_encoding()
+    return f"tiktoken:{encoding.name}" if encoding is not None else "approximate"
+
+
+def approximate_tokens(text: str) -> int:
+    """Deterministic, dependency-free token estimate."""
+    if not text:
+        return 0
+
+    ascii_chars = sum(len(run) for run in _ASCII_RUN.findall(text))
+    other_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / 4) + math.ceil(other_chars * 0.6)
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens in ``text`` with the active backend."""
+    if not text:
+        return 0
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return approximate_tokens(text)
+
+
+def count_message_tokens(message: Dict[str, Any]) -> int:
+    """
+    Tokens of a chat message including its framing overhead.
+
+    A count stored on the message at write time (``tokens``) is reused instead
+    of tokenizing the content again.
+    """
+    stored = message.get('tokens')
+    if isinstance(stored, int):
+        return stored
+
+    content = message.get('content')
+    if isinstance(content, list):
+        # Multimodal content: only text parts are counted
+        text = " ".join(part['text'] for part in content if isinstance(part, dict) and part.get('text'))
+    else:
+        text = content or ""
+    return count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
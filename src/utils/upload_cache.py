@@ -0,0 +1,230 @@
+"""
+Content-addressed cache for media sent to OpenAI.
+
+Files and images are keyed by the SHA-256 of their bytes, so a PDF or
+screenshot that is resent, or forwarded into a group chat, maps to the
+``file_id`` it was already uploaded as, or to the preprocessed base64 payload
+already built for it. LINE message IDs are remembered against their digest,
+so a redelivered message is served without downloading it again.
+
+Entries live in a byte-budget LRU cache with per-kind TTLs; with a Redis
+manager they are also shared across workers.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from src.utils.error_handler import StructuredLogger
+from src.utils.redis_manager import RedisConnectionManager
+
+logger = StructuredLogger(__name__)
+
+FILE = "file"
+IMAGE = "image"
+MESSAGE = "message"
+
+
+def content_digest(data: bytes) -> str:
+    """SHA-256 hex digest of media bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class _ByteBudgetLRU:
+    """
+    LRU mapping of strings bounded by entry count and total bytes, with per-entry TTLs.
+
+    Entries are kept in recency order and a running byte total (UTF-8 size of
+    key and value) is maintained, so eviction always drops the least recently
+    used entries until both limits hold.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value: str, ttl: float):
+        size = len(key.encode('utf-8')) + len(value.encode('utf-8'))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                # Would evict everything else and still not fit
+                return
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        self._bytes -= self._entries.pop(key)[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+
+class UploadCache:
+    """Cache of uploaded file IDs and prepared image payloads keyed by content digest."""
+
+    def __init__(self,
+                 namespace: str = "default",
+                 file_ttl_seconds: int = 30 * 86400,
+                 payload_ttl_seconds: int = 3600,
+                 max_memory_mb: float = 64.0,
+                 max_entries: int = 5000,
+                 redis_manager: Optional[RedisConnectionManager] = None,
+                 max_shared_payload_bytes: int = 1024 * 1024,
+                 key_prefix: str = "openai_upload:"):
+        """
+        Initialize the cache.
+
+        Args:
+            namespace: Separates caches of different OpenAI resources (file IDs are per resource)
+            file_ttl_seconds: How long a file ID is reused; keep within the provider's file retention
+            payload_ttl_seconds: How long image payloads and message digests are kept
+            max_memory_mb: Local memory budget; entries are evicted beyond it
+            max_entries: Maximum local entries
+            redis_manager: Optional Redis manager for sharing entries across workers
+            max_shared_payload_bytes: Larger image payloads are kept locally only
+            key_prefix: Redis key prefix
+        """
+        self.namespace = namespace
+        self.ttl = {FILE: file_ttl_seconds, IMAGE: payload_ttl_seconds, MESSAGE: payload_ttl_seconds}
+        self.redis_manager = redis_manager
+        self.max_shared_payload_bytes = max_shared_payload_bytes
+        self.key_prefix = f"{key_prefix}{namespace}:"
+
+        self._local = _ByteBudgetLRU(int(max_memory_mb * 1024 * 1024), max_entries)
+        self._lock = threading.Lock()
+        self.stats = {
+            'file_hits': 0,
+            'file_misses': 0,
+            'image_hits': 0,
+            'image_misses': 0,
+            'message_hits': 0,
+            'message_misses': 0,
+            'redis_hits': 0,
+            'redis_fallbacks': 0,
+            'upload_bytes_saved': 0
+        }
+
+    def _key(self, kind: str, key: str) -> str:
+        return f"{kind}:{key}"
+
+    def _get(self, kind: str, key: str) -> Optional[str]:
+        """Local lookup, then Redis (refilling the local cache on a shared hit)."""
+        cache_key = self._key(kind, key)
+        value = self._local.get(cache_key)
+        if value is None and self.redis_manager is not None:
+            value = self._get_shared(cache_key)
+            if value is not None:
+                self._local.put(cache_key, value, self.ttl[kind])
+                self._count('redis_hits')
+        self._count(f"{kind}_{'misses' if value is None else 'hits'}")
+        return value
+
+    def _put(self, kind: str, key: str, value: str):
+        cache_key = self._key(kind, key)
+        self._local.put(cache_key, value, self.ttl[kind])
+        if self.redis_manager is not None and len(value) <= self.max_shared_payload_bytes:
+            self._set_shared(cache_key, value, self.ttl[kind])
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._lock:
+            self.stats[stat] += amount
+
+    def _get_shared(self, cache_key: str) -> Optional[str]:
+        redis_key = f"{self.key_prefix}{cache_key}"
+
+        def redis_operation(client):
+            value = client.get(redis_key)
+            return value.decode('utf-8') if isinstance(value, bytes) else value
+
+        def fallback():
+            self._count('redis_fallbacks')
+            return None
+
+        return self.redis_manager.execute_with_fallback(
+            redis_operation, fallback, "get_upload_cache", use_retry=False
+        )
+
+    def _set_shared(self, cache_key: str, value: str, ttl: int):
+        redis_key = f"{self.key_prefix}{cache_key}"
+
+        def redis_operation(client):
+            return client.set(redis_key, value, ex=ttl)
+
+        def fallback():
+            self._count('redis_fallbacks')
+            return None
+
+        self.redis_manager.execute_with_fallback(
+            redis_operation, fallback, "set_upload_cache", use_retry=False
+        )
+
+    def get_file_id(self, digest: str, purpose: str = "assistants", size: int = 0) -> Optional[str]:
+        """File ID the content was uploaded as, or None."""
+        file_id = self._get(FILE, f"{purpose}:{digest}")
+        if file_id is not None and size:
+            self._count('upload_bytes_saved', size)
+        return file_id
+
+    def put_file_id(self, digest: str, file_id: str, purpose: str = "assistants"):
+        """Remember the file ID the content was uploaded as."""
+        self._put(FILE, f"{purpose}:{digest}", file_id)
+
+    def get_image_payload(self, digest: str) -> Optional[str]:
+        """Prepared (preprocessed, base64) payload for the image, or None."""
+        return self._get(IMAGE, digest)
+
+    def put_image_payload(self, digest: str, payload: str):
+        """Remember the prepared payload for an image."""
+        self._put(IMAGE, digest, payload)
+
+    def digest_for_message(self, message_id: str) -> Optional[str]:
+        """Digest of a LINE message's content if it was seen before."""
+        return self._get(MESSAGE, message_id)
+
+    def remember_message(self, message_id: str, digest: str):
+        """Map a LINE message ID to the digest of its content."""
+        self._put(MESSAGE, message_id, digest)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit rates, bytes saved and local memory usage."""
+        with self._lock:
+            stats = dict(self.stats)
+        for kind in (FILE, IMAGE, MESSAGE):
+            lookups = stats[f'{kind}_hits'] + stats[f'{kind}_misses']
+            stats[f'{kind}_hit_rate'] = stats[f'{kind}_hits'] / lookups if lookups else 0.0
+        stats.update({
+            'entries': len(self._local),
+            'memory_usage_mb': self._local.size_bytes / (1024 * 1024),
+            'max_memory_mb': self._local.max_bytes / (1024 * 1024),
+            'evictions': self._local.evictions,
+            'redis_enabled': self.redis_manager is not None,
+            'timestamp': datetime.utcnow().isoformat()
+        })
+        return stats
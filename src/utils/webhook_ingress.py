@@ -0,0 +1,314 @@
+"""
+Asynchronous webhook ingress for LINE events.
+
+This module decouples webhook acknowledgement from event processing. The
+Flask route verifies the signature, parses the events and places them on a
+bounded in-process queue, then returns immediately. A pool of asyncio
+consumers running on a dedicated background event loop drains the queue and
+drives the (blocking) LINE event handlers on a worker thread pool.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+
+class AsyncWebhookIngress:
+    """
+    Bounded in-process queue with a pool of async consumers for webhook events.
+
+    The queue and consumers live on a background event loop thread so that the
+    WSGI worker handling the request only pays for an enqueue. Handlers are
+    regular synchronous callables (e.g. ``LineService.dispatch_event``) and are
+    executed on a thread pool sized to the number of consumers.
+    """
+
+    def __init__(self,
+                 event_handler: Callable[..., Any],
+                 max_queue_size: int = 1000,
+                 consumer_count: int = 8,
+                 shutdown_timeout: float = 10.0,
+                 age_sample_size: int = 1000,
+                 sequencer: Optional[Callable[[Any], Any]] = None):
+        """
+        Initialize the webhook ingress.
+
+        Args:
+            event_handler: Callable invoked with each parsed webhook event
+            max_queue_size: Maximum number of events waiting to be processed
+            consumer_count: Number of concurrent consumers
+            shutdown_timeout: Seconds to wait for in-flight events on stop
+            age_sample_size: Number of recent event ages kept for percentiles
+            sequencer: Optional callable invoked with each accepted item, in
+                queue order; its result is passed to the handler after the item
+        """
+        self.event_handler = event_handler
+        self.sequencer = sequencer
+        self.max_queue_size = max_queue_size
+        self.consumer_count = max(1, consumer_count)
+        self.shutdown_timeout = shutdown_timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._consumers = []
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self._event_ages = deque(maxlen=age_sample_size)
+        self.stats = {
+            'events_enqueued': 0,
+            'events_processed': 0,
+            'events_failed': 0,
+            'events_rejected': 0,
+            'batches_enqueued': 0,
+            'max_queue_depth': 0,
+            'in_flight': 0,
+            'avg_processing_time': 0.0
+        }
+
+        logger.info(
+            f"Initialized AsyncWebhookIngress with queue_size={max_queue_size}, "
+            f"consumers={self.consumer_count}"
+        )
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the background loop and consumers are running."""
+        return self._running
+
+    def start(self):
+        """Start the background event loop and the consumer pool."""
+        with self._lock:
+            if self._running:
+                return
+
+            self._started.clear()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.consumer_count,
+                thread_name_prefix="webhook-consumer"
+            )
+            self._thread = threading.Thread(
+                target=self._run_loop,
+                name="WebhookIngressLoop",
+                daemon=True
+            )
+            self._thread.start()
+            self._started.wait(timeout=5.0)
+            self._running = True
+
+        logger.info("Started async webhook ingress")
+
+    def stop(self):
+        """Drain outstanding events (bounded by shutdown_timeout) and stop."""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+
+            loop = self._loop
+            if loop is not None and loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(self._shutdown(), loop)
+                try:
+                    future.result(timeout=self.shutdown_timeout + 1.0)
+                except Exception as e:
+                    logger.warning(f"Webhook ingress shutdown did not complete cleanly: {e}")
+                loop.call_soon_threadsafe(loop.stop)
+
+            if self._thread is not None:
+                self._thread.join(timeout=5.0)
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+
+            self._thread = None
+            self._executor = None
+
+        logger.info("Stopped async webhook ingress")
+
+    def submit(self, events: Iterable[Any]) -> bool:
+        """
+        Enqueue a batch of parsed events without waiting for processing.
+
+        The whole batch is either accepted or rejected so that a partially
+        enqueued webhook is never acknowledged.
+
+        Args:
+            events: Parsed webhook events
+
+        Returns:
+            True if the batch was accepted, False if the queue is full or the
+            ingress is not running
+        """
+        events = list(events)
+        if not events:
+            return True
+
+        if not self._running or self._loop is None:
+            self._record_rejection(len(events))
+            return False
+
+        future = asyncio.run_coroutine_threadsafe(self._enqueue(events), self._loop)
+        try:
+            accepted = future.result(timeout=1.0)
+        except Exception as e:
+            logger.error(f"Failed to enqueue webhook events: {e}")
+            accepted = False
+
+        if not accepted:
+            self._record_rejection(len(events))
+            logger.warning(
+                f"Webhook queue full, rejected batch of {len(events)} events",
+                extra_context={'queue_depth': self.queue_depth}
+            )
+        return accepted
+
+    @property
+    def queue_depth(self) -> int:
+        """Current number of events waiting in the queue."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get queue depth, event age and throughput metrics."""
+        with self._stats_lock:
+            stats = self.stats.copy()
+            ages = sorted(self._event_ages)
+
+        if ages:
+            event_age = {
+                'avg_ms': sum(ages) / len(ages) * 1000,
+                'p50_ms': ages[len(ages) // 2] * 1000,
+                'p95_ms': ages[min(len(ages) - 1, int(len(ages) * 0.95))] * 1000,
+                'max_ms': ages[-1] * 1000
+            }
+        else:
+            event_age = {'avg_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+
+        return {
+            'running': self._running,
+            'queue_depth': self.queue_depth,
+            'max_queue_size': self.max_queue_size,
+            'consumer_count': self.consumer_count,
+            'event_age': event_age,
+            'stats': stats,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+
+    def _run_loop(self):
+        """Body of the background thread hosting the event loop."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._consumers = [
+            loop.create_task(self._consume(i)) for i in range(self.consumer_count)
+        ]
+        self._started.set()
+
+        try:
+            loop.run_forever()
+        finally:
+            for task in self._consumers:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*self._consumers, return_exceptions=True))
+            loop.close()
+            self._loop = None
+            self._queue = None
+            self._consumers = []
+
+    async def _enqueue(self, events) -> bool:
+        """Put a whole batch on the queue if there is room for it."""
+        if self._queue.maxsize and self._queue.qsize() + len(events) > self._queue.maxsize:
+            return False
+
+        enqueued_at = time.monotonic()
+        for event in events:
+            args = (event, self.sequencer(event)) if self.sequencer else (event,)
+            self._queue.put_nowait((enqueued_at, args))
+
+        with self._stats_lock:
+            self.stats['events_enqueued'] += len(events)
+            self.stats['batches_enqueued'] += 1
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self._queue.qsize())
+        return True
+
+    async def _consume(self, consumer_id: int):
+        """Consumer coroutine: pull events and run the handler off-loop."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            enqueued_at, args = await self._queue.get()
+            started = time.monotonic()
+
+            with self._stats_lock:
+                self._event_ages.append(started - enqueued_at)
+                self.stats['in_flight'] += 1
+
+            try:
+                await loop.run_in_executor(self._executor, self.event_handler, *args)
+                succeeded = True
+            except Exception as e:
+                succeeded = False
+                logger.error(f"Webhook consumer {consumer_id} failed to process event: {e}")
+
+            self._record_processed(time.monotonic() - started, succeeded)
+            self._queue.task_done()
+
+    async def _shutdown(self):
+        """Wait for queued events to be processed, bounded by the timeout."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Discarding {self._queue.qsize()} unprocessed webhook events on shutdown")
+
+    def _record_processed(self, processing_time: float, succeeded: bool):
+        """Update processing counters and the running average."""
+        with self._stats_lock:
+            self.stats['in_flight'] -= 1
+            if succeeded:
+                self.stats['events_processed'] += 1
+            else:
+                self.stats['events_failed'] += 1
+
+            completed = self.stats['events_processed'] + self.stats['events_failed']
+            self.stats['avg_processing_time'] = (
+                (self.stats['avg_processing_time'] * (completed - 1) + processing_time) / completed
+            )
+
+    def _record_rejection(self, count: int):
+        """Count events that could not be enqueued."""
+        with self._stats_lock:
+            self.stats['events_rejected'] += count
+
+
+# Global ingress instance
+_ingress_instance: Optional[AsyncWebhookIngress] = None
+
+
+def get_webhook_ingress(event_handler: Optional[Callable[..., Any]] = None,
+                        max_queue_size: int = 1000,
+                        consumer_count: int = 8,
+                        sequencer: Optional[Callable[[Any], Any]] = None) -> Optional[AsyncWebhookIngress]:
+    """Get or create the global webhook ingress (requires a handler on first use)."""
+    global _ingress_instance
+
+    if _ingress_instance is None and event_handler is not None:
+        _ingress_instance = AsyncWebhookIngress(
+            event_handler=event_handler,
+            max_queue_size=max_queue_size,
+            consumer_count=consumer_count,
+            sequencer=sequencer
+        )
+
+    return _ingress_instance
@@ -0,0 +1,230 @@
+"""
+Per-worker service container for Celery tasks.
+
+Building the services a task needs (settings, the OpenAI and LINE clients
+with their connection pools, the conversation store, Rich Message
+templates) costs far more than most tasks' actual work. The container
+builds each service once per worker process, on first use, and every task
+in that process shares it. ``worker_process_init`` resets the container in
+each freshly forked child, so no pool or Redis connection is inherited from
+the parent, and warms up the core services before the first task arrives.
+
+``task_setup`` times how long each task spends acquiring its services, and
+``get_stats`` reports it per task, split into cold starts (something had
+to be built) and warm ones (everything was already there).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from celery.signals import worker_process_init
+
+from src.utils.error_handler import StructuredLogger
+
+logger = StructuredLogger(__name__)
+
+# Services built by the worker_process_init hook; the rest are built on first use
+WARM_UP_SERVICES = ('settings', 'conversation_service', 'openai_service', 'line_service')
+
+
+class WorkerServices:
+    """Lazily built services shared by every task in a worker process."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._services: Dict[str, Any] = {}
+        self._build_times: Dict[str, float] = {}
+        self._setup_stats: Dict[str, Dict[str, float]] = {}
+        self._local = threading.local()
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """Return a service, building it once under the lock."""
+        service = self._services.get(name)
+        if service is not None:
+            return service
+        with self._lock:
+            service = self._services.get(name)
+            if service is None:
+                start = time.perf_counter()
+                service = factory()
+                self._build_times[name] = time.perf_counter() - start
+                self._services[name] = service
+                self._local.built = getattr(self._local, 'built', 0) + 1
+                logger.debug(f"Built worker service {name} in {self._build_times[name] * 1000:.1f}ms")
+            return service
+
+    @property
+    def settings(self):
+        from src.config.settings import Settings
+        return self._get('settings', Settings)
+
+    @property
+    def conversation_service(self):
+        from src.services.conversation_factory import create_conversation_service
+        return self._get('conversation_service', create_conversation_service)
+
+    @property
+    def openai_service(self):
+        from src.services.openai_service import OpenAIService
+        return self._get('openai_service', lambda: OpenAIService(self.settings, self.conversation_service))
+
+    @property
+    def line_service(self):
+        from src.services.line_service import LineService
+        return self._get('line_service', lambda: LineService(
+            self.settings, self.openai_service, self.conversation_service
+        ))
+
+    @property
+    def line_bot_api(self):
+        return self.line_service.line_bot_api
+
+    @property
+    def rich_message_config(self):
+        from src.config.rich_message_config import get_rich_message_config
+        return self._get('rich_message_config', get_rich_message_config)
+
+    @property
+    def template_manager(self):
+        from src.utils.template_manager import TemplateManager
+        return self._get('template_manager', lambda: TemplateManager(self.rich_message_config))
+
+    @property
+    def content_generator(self):
+        from src.utils.content_generator import ContentGenerator
+        return self._get('content_generator', lambda: ContentGenerator(
+            self.openai_service, self.rich_message_config
+        ))
+
+    @property
+    def content_validator(self):
+        from src.utils.content_validator import ContentValidator, ValidationLevel
+        return self._get('content_validator', lambda: ContentValidator(ValidationLevel.MODERATE))
+
+    @property
+    def image_composer(self):
+        from src.utils.image_composer import ImageComposer
+        return self._get('image_composer', lambda: ImageComposer(self.rich_message_config))
+
+    @property
+    def template_selector(self):
+        from src.utils.template_selector import TemplateSelector
+        return self._get('template_selector', lambda: TemplateSelector(
+            self.template_manager, self.rich_message_config
+        ))
+
+    @property
+    def rich_message_service(self):
+        from src.services.rich_message_service import RichMessageService
+        return self._get('rich_message_service', lambda: RichMessageService(
+            line_bot_api=self.line_bot_api,
+            template_manager=self.template_manager,
+            content_generator=self.content_generator
+        ))
+
+    def warm_up(self, names: Iterable[str] = WARM_UP_SERVICES) -> Dict[str, bool]:
+        """
+        Build the named services now rather than in the first task.
+
+        A service that fails to build is logged and left to be retried lazily,
+        so a missing credential does not stop the worker from starting.
+
+        Returns:
+            Dictionary of service name to whether it was built
+        """
+        built = {}
+        for name in names:
+            try:
+                getattr(self, name)
+                built[name] = True
+            except Exception as e:
+                logger.warning(f"Worker service {name} not warmed up: {e}")
+                built[name] = False
+        return built
+
+    def reset(self) -> None:
+        """Drop every service so the next access rebuilds it (after fork, in tests)."""
+        with self._lock:
+            self._services.clear()
+            self._build_times.clear()
+            self._setup_stats.clear()
+
+    @contextmanager
+    def task_setup(self, task_name: str):
+        """
+        Time the service acquisition of one task run.
+
+        Usage:
+            with services.task_setup('webhook.process_text_message'):
+                line_service = services.line_service
+        """
+        self._local.built = 0
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._record_setup(task_name, elapsed_ms, cold=self._local.built > 0)
+
+    def _record_setup(self, task_name: str, elapsed_ms: float, cold: bool) -> None:
+        with self._lock:
+            stats = self._setup_stats.setdefault(task_name, {
+                'runs': 0, 'cold_runs': 0, 'total_ms': 0.0, 'warm_total_ms': 0.0,
+                'max_ms': 0.0, 'last_ms': 0.0
+            })
+            stats['runs'] += 1
+            stats['total_ms'] += elapsed_ms
+            if cold:
+                stats['cold_runs'] += 1
+            else:
+                stats['warm_total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['last_ms'] = elapsed_ms
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Built services with their build times, and per-task setup times."""
+        with self._lock:
+            tasks = {}
+            for task_name, stats in self._setup_stats.items():
+                warm_runs = stats['runs'] - stats['cold_runs']
+                tasks[task_name] = {
+                    'runs': stats['runs'],
+                    'cold_runs': stats['cold_runs'],
+                    'avg_setup_ms': round(stats['total_ms'] / stats['runs'], 3),
+                    'avg_warm_setup_ms': round(stats['warm_total_ms'] / warm_runs, 3) if warm_runs else None,
+                    'max_setup_ms': round(stats['max_ms'], 3),
+                    'last_setup_ms': round(stats['last_ms'], 3)
+                }
+            return {
+                'services': {name: round(seconds * 1000, 3) for name, seconds in self._build_times.items()},
+                'tasks': tasks,
+                'timestamp': datetime.utcnow().isoformat()
+            }
+
+
+# Global container for this worker process
+_worker_services: Optional[WorkerServices] = None
+_worker_services_lock = threading.Lock()
+
+
+def get_worker_services() -> WorkerServices:
+    """Get the service container of this worker process."""
+    global _worker_services
+    if _worker_services is None:
+        with _worker_services_lock:
+            if _worker_services is None:
+                _worker_services = WorkerServices()
+    return _worker_services
+
+
+@worker_process_init.connect
+def init_worker_services(**kwargs) -> None:
+    """Start each worker process with its own, warmed-up services."""
+    services = get_worker_services()
+    services.reset()
+    built = services.warm_up()
+    logger.info(f"Worker services ready: {sum(built.values())}/{len(built)} built",
+                extra_context={'services': services.get_stats()['services']})
@@ -0,0 +1,82 @@
+"""
+Load test for per-user ordered, cross-user parallel webhook batch execution
+
+Simulates multi-event LINE webhook batches and checks how many partitions
+overlap as the number of distinct users in a batch grows. Overlap is
+counted with barriers rather than inferred from wall-clock throughput, so
+the result does not depend on how busy the machine is.
+"""
+
+import logging
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from src.utils.partitioned_event_executor import PartitionedEventExecutor
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PER_BATCH = 32
+MAX_CONCURRENCY = 8
+BARRIER_TIMEOUT_SECONDS = 10
+
+
+def build_batch(distinct_users: int, batch_index: int):
+    """Build a batch of EVENTS_PER_BATCH events spread round-robin over users"""
+    events = []
+    for offset in range(EVENTS_PER_BATCH):
+        event = Mock()
+        event.source.user_id = f"U{offset % distinct_users:032d}"
+        event.seq = batch_index * EVENTS_PER_BATCH + offset
+        events.append(event)
+    return events
+
+
+def run_batches(distinct_users: int, batches: int = 3):
+    """Return (peak overlapping handlers, per-user handled sequences) for a user count"""
+    # Every handler waits until as many handlers as can overlap have arrived,
+    # so each round runs fully in parallel or the barrier times out
+    barrier = threading.Barrier(min(distinct_users, MAX_CONCURRENCY), timeout=BARRIER_TIMEOUT_SECONDS)
+    handled = {}
+    active = [0]
+    peak = [0]
+    lock = threading.Lock()
+
+    def handler(event):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        barrier.wait()
+        with lock:
+            active[0] -= 1
+            handled.setdefault(event.source.user_id, []).append(event.seq)
+
+    executor = PartitionedEventExecutor(event_handler=handler, max_concurrency=MAX_CONCURRENCY)
+    try:
+        for batch_index in range(batches):
+            executor.execute_batch(build_batch(distinct_users, batch_index))
+    finally:
+        executor.shutdown()
+
+    return peak[0], handled
+
+
+@pytest.mark.performance
+@pytest.mark.slow
+class TestPartitionedEventLoad:
+    """Partition overlap of webhook batches with distinct users per batch"""
+
+    @pytest.mark.parametrize('users', [1, 2, 4, 8, 16])
+    def test_overlap_scales_with_distinct_users(self, users):
+        """Distinct users run side by side up to the concurrency limit, each in order"""
+        peak, handled = run_batches(users)
+        logger.info(f"{users:>2} distinct users/batch: {peak} overlapping partitions")
+
+        # One handler per user at a time, capped by max_concurrency
+        assert peak == min(users, MAX_CONCURRENCY)
+
+        # Ordering must hold at every concurrency level
+        assert len(handled) == users
+        for seqs in handled.values():
+            assert seqs == sorted(seqs)
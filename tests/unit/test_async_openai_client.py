@@ -0,0 +1,308 @@
+"""
+Unit tests for the async Azure OpenAI client path, run against a local stub HTTP server
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.utils.async_openai_client import ConcurrencyLimiter
+
+RESPONSES_TEXT = "Hello from the Responses API"
+CHAT_TEXT = "Hello from Chat Completions"
+
+
+def responses_body(text):
+    """Minimal Responses API response object"""
+    return {
+        "id": "resp_stub_1",
+        "object": "response",
+        "created_at": 0,
+        "model": "gpt-4.1-nano",
+        "status": "completed",
+        "output": [{
+            "type": "message",
+            "id": "msg_1",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}]
+        }],
+        "usage": {"input_tokens": 5, "output_tokens": 5, "total_tokens": 10},
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": []
+    }
+
+
+def chat_body(text):
+    """Minimal Chat Completions response object"""
+    return {
+        "id": "chatcmpl_stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4.1-nano",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 5, "total_tokens": 10}
+    }
+
+
+def chat_chunk(content):
+    """One Chat Completions stream chunk"""
+    return {
+        "id": "chatcmpl_stub",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4.1-nano",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]
+    }
+
+
+class StubOpenAIServer:
+    """Local HTTP server answering Responses API and Chat Completions requests"""
+
+    def __init__(self):
+        self.responses_status = 200
+        self.delay = 0.0
+        self.requests = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])) or b"{}")
+                with stub._lock:
+                    stub.requests.append((self.path, body))
+                    stub.in_flight += 1
+                    stub.peak_in_flight = max(stub.peak_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.delay)
+                    if "/responses" in self.path:
+                        self._responses(body)
+                    else:
+                        self._chat(body)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def _responses(self, body):
+                if stub.responses_status == 429:
+                    return self._json(429, {"error": {"message": "Rate limit reached", "code": "429"}},
+                                      {"retry-after-ms": "10"})
+                if stub.responses_status != 200:
+                    return self._json(stub.responses_status, {"error": {"message": "Resource not found", "code": "404"}})
+                if not body.get("stream"):
+                    return self._json(200, responses_body(RESPONSES_TEXT))
+                events = [{"type": "response.created", "sequence_number": 0,
+                           "response": {**responses_body(""), "status": "in_progress", "output": []}}]
+                for i, word in enumerate(RESPONSES_TEXT.split(" ")):
+                    events.append({"type": "response.output_text.delta", "item_id": "msg_1", "output_index": 0,
+                                   "content_index": 0, "sequence_number": i + 1,
+                                   "delta": word if i == 0 else " " + word})
+                events.append({"type": "response.completed", "sequence_number": 99,
+                               "response": responses_body(RESPONSES_TEXT)})
+                self._sse([f"event: {e['type']}\ndata: {json.dumps(e)}\n\n" for e in events])
+
+            def _chat(self, body):
+                if not body.get("stream"):
+                    return self._json(200, chat_body(CHAT_TEXT))
+                words = CHAT_TEXT.split(" ")
+                self._sse([f"data: {json.dumps(chat_chunk(w if i == 0 else ' ' + w))}\n\n"
+                           for i, w in enumerate(words)] + ["data: [DONE]\n\n"])
+
+            def _json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _sse(self, events):
+                data = "".join(events).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def paths(self):
+        return [path.split("?")[0] for path, _ in self.requests]
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    """Running stub Azure OpenAI server"""
+    server = StubOpenAIServer()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def async_openai_service(openai_service, stub_server):
+    """OpenAIService whose async path points at the stub server"""
+    openai_service.settings.AZURE_OPENAI_ENDPOINT = stub_server.url
+    openai_service.enable_caching = False
+    return openai_service
+
+
+@pytest.mark.unit
+class TestConcurrencyLimiter:
+    """Test global and per-deployment in-flight limits"""
+
+    @pytest.mark.asyncio
+    async def test_per_deployment_limit(self):
+        """No more than max_per_deployment requests run at once for one deployment"""
+        limiter = ConcurrencyLimiter(max_in_flight=10, max_per_deployment=2)
+        active = []
+
+        async def request():
+            async with limiter.acquire("gpt-4.1-nano"):
+                active.append(1)
+                assert len(active) <= 2
+                await asyncio.sleep(0.01)
+                active.pop()
+
+        await asyncio.gather(*(request() for _ in range(6)))
+
+        stats = limiter.get_stats()
+        assert stats['requests'] == 6
+        assert stats['peak_in_flight'] == 2
+        assert stats['queued_requests'] >= 4
+        assert stats['in_flight'] == 0
+
+    @pytest.mark.asyncio
+    async def test_global_limit_across_deployments(self):
+        """The global limit bounds requests across deployments"""
+        limiter = ConcurrencyLimiter(max_in_flight=3, max_per_deployment=3)
+
+        async def request(deployment):
+            async with limiter.acquire(deployment):
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(request(f"deployment-{i % 3}") for i in range(9)))
+
+        assert limiter.get_stats()['peak_in_flight'] == 3
+
+
+@pytest.mark.unit
+class TestAsyncOpenAIService:
+    """Test get_response_async and stream_response_async against the stub server"""
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_responses_api(self, async_openai_service, stub_server):
+        """The Responses API answers and the conversation is stored"""
+        result = await async_openai_service.get_response_async("async_user", "Hello")
+
+        assert result['success'] is True
+        assert result['message'] == RESPONSES_TEXT
+        assert result['api_used'] == 'responses'
+        assert result['response_id'] == "resp_stub_1"
+        assert stub_server.paths() == ["/openai/v1/responses"]
+        history = async_openai_service.conversation_service.get_conversation_history("async_user")
+        assert [m['role'] for m in history] == ["user", "assistant"]
+        await async_openai_service.close_async_clients()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_chat_completions(self, async_openai_service, stub_server):
+        """A Responses API 404 falls back to Chat Completions and opens the circuit breaker"""
+        stub_server.responses_status = 404
+
+        result = await async_openai_service.get_response_async("async_user", "Hello")
+
+        assert result['success'] is True
+        assert result['message'] == CHAT_TEXT
+        assert result['api_used'] == 'chat_completions'
+        assert stub_server.paths()[-1] == "/openai/deployments/gpt-4.1-nano/chat/completions"
+        assert async_openai_service.responses_api_available is False
+        # The user turn is stored once despite the fallback
+        history = async_openai_service.conversation_service.get_conversation_history("async_user")
+        assert [m['role'] for m in history] == ["user", "assistant"]
+        await async_openai_service.close_async_clients()
+
+    @pytest.mark.asyncio
+    async def test_throttled_request_is_governed(self, async_openai_service, stub_server):
+        """Async requests take a governor permit; a 429 pauses it and is not sent to Chat Completions"""
+        stub_server.responses_status = 429
+
+        result = await async_openai_service.get_response_async("async_user", "Hello")
+
+        assert result['success'] is False
+        assert result['retry_after'] >= 1
+        assert set(stub_server.paths()) == {"/openai/v1/responses"}
+        stats = async_openai_service.rate_governor.get_stats()
+        assert stats['admitted'] == 1
+        assert stats['throttled_responses'] >= 1
+        await async_openai_service.close_async_clients()
+
+    @pytest.mark.asyncio
+    async def test_stream_response_async(self, async_openai_service, stub_server):
+        """Deltas are yielded as they arrive and the final result is recorded"""
+        stream = async_openai_service.stream_response_async("async_user", "Hello")
+        deltas = [delta async for delta in stream]
+
+        assert len(deltas) > 1
+        assert "".join(deltas) == RESPONSES_TEXT
+        assert stream.result['message'] == RESPONSES_TEXT
+        assert stream.result['tokens_used'] == 10
+        assert stream.result['streaming'] is True
+        await async_openai_service.close_async_clients()
+
+    @pytest.mark.asyncio
+    async def test_stream_falls_back_before_first_delta(self, async_openai_service, stub_server):
+        """Chat Completions streaming is used when the Responses API is unavailable"""
+        async_openai_service.responses_api_available = False
+        async_openai_service.api_check_timestamp = time.time()
+
+        stream = async_openai_service.stream_response_async("async_user", "Hello")
+        deltas = [delta async for delta in stream]
+
+        assert "".join(deltas) == CHAT_TEXT
+        assert stream.result['api_used'] == 'chat_completions'
+        assert stub_server.paths() == ["/openai/deployments/gpt-4.1-nano/chat/completions"]
+        await async_openai_service.close_async_clients()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_pool_within_limits(self, async_openai_service, stub_server):
+        """Concurrent requests reuse one client pool and respect the per-deployment limit"""
+        async_openai_service.settings.OPENAI_ASYNC_MAX_PER_DEPLOYMENT = 3
+        stub_server.delay = 0.05
+
+        results = await asyncio.gather(*(
+            async_openai_service.get_response_async(f"user_{i}", "Hello") for i in range(8)
+        ))
+
+        assert all(result['success'] for result in results)
+        assert stub_server.peak_in_flight <= 3
+        metrics = async_openai_service.get_connection_metrics()['async_client']
+        assert metrics['concurrency']['requests'] == 8
+        assert metrics['concurrency']['peak_in_flight'] == 3
+        await async_openai_service.close_async_clients()
+
+    @pytest.mark.asyncio
+    async def test_validation_error_returns_failure(self, async_openai_service, stub_server):
+        """Invalid input fails without contacting the API"""
+        result = await async_openai_service.get_response_async("", "Hello")
+
+        assert result['success'] is False
+        assert stub_server.requests == []
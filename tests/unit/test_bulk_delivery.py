@@ -0,0 +1,185 @@
+"""
+Unit tests for the multicast bulk delivery engine
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+import pytest
+from linebot.exceptions import LineBotApiError
+from linebot.models import TextSendMessage
+from linebot.models.error import Error
+
+from src.utils.bulk_delivery import BulkDeliveryEngine, classify_delivery_error
+from src.utils.delivery_tracker import DeliveryStatus, DeliveryTracker, ErrorType
+
+
+def api_error(status_code, message):
+    return LineBotApiError(status_code, {}, error=Error(message=message))
+
+
+def user_ids(count, prefix="U"):
+    return [f"{prefix}{i:032d}" for i in range(count)]
+
+
+def statuses(tracker):
+    return {record.user_id: record for record in tracker.delivery_records.values()}
+
+
+@pytest.mark.unit
+class TestBulkDeliveryEngine:
+    """Test chunking, concurrency, fallback and per-user tracking"""
+
+    @pytest.fixture
+    def line_bot_api(self):
+        return Mock()
+
+    @pytest.fixture
+    def tracker(self):
+        return DeliveryTracker()
+
+    def test_recipients_are_multicast_in_chunks_of_500(self, line_bot_api, tracker):
+        """1200 users take three multicast calls and get a delivered record each"""
+        users = user_ids(1200)
+        engine = BulkDeliveryEngine(line_bot_api, tracker)
+
+        result = engine.deliver(users, TextSendMessage(text="Hi"), "motivation", "Asia/Bangkok")
+
+        sizes = sorted(len(c.args[0]) for c in line_bot_api.multicast.call_args_list)
+        assert sizes == [200, 500, 500]
+        assert len({c.kwargs['retry_key'] for c in line_bot_api.multicast.call_args_list}) == 3
+        line_bot_api.push_message.assert_not_called()
+        assert result['successful_deliveries'] == 1200
+        assert result['multicast_calls'] == 3 and result['push_calls'] == 0
+        records = statuses(tracker)
+        assert len(records) == 1200
+        assert all(r.status == DeliveryStatus.DELIVERED for r in records.values())
+
+    def test_chunks_are_sent_concurrently(self, line_bot_api, tracker):
+        """Several multicast calls are in flight at the same time"""
+        in_flight, peak, lock = [0], [0], threading.Lock()
+
+        def slow_multicast(*args, **kwargs):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+
+        line_bot_api.multicast.side_effect = slow_multicast
+        engine = BulkDeliveryEngine(line_bot_api, tracker, chunk_size=100, max_concurrency=4)
+
+        engine.deliver(user_ids(800), TextSendMessage(text="Hi"), "motivation", "UTC")
+
+        assert peak[0] == 4
+
+    def test_rejected_chunk_falls_back_to_push_for_its_users_only(self, line_bot_api, tracker):
+        """Only the rejected chunk's users are pushed, and push failures are tracked per user"""
+        users = user_ids(10)
+        failing_chunk = set(users[5:])
+        bad_user = users[7]
+
+        def multicast(to, messages, retry_key=None):
+            if set(to) == failing_chunk:
+                raise api_error(400, "The request body has 1 error(s)")
+
+        def push(user_id, messages):
+            if user_id == bad_user:
+                raise api_error(400, "The user not found")
+
+        line_bot_api.multicast.side_effect = multicast
+        line_bot_api.push_message.side_effect = push
+        engine = BulkDeliveryEngine(line_bot_api, tracker, chunk_size=5)
+
+        result = engine.deliver(users, TextSendMessage(text="Hi"), "motivation", "UTC")
+
+        pushed = {c.args[0] for c in line_bot_api.push_message.call_args_list}
+        assert pushed == failing_chunk
+        assert result['successful_deliveries'] == 9
+        assert result['failed_deliveries'] == 1
+        assert result['failed_chunks'] == 1 and result['push_calls'] == 5
+        records = statuses(tracker)
+        assert records[bad_user].current_error_type == ErrorType.INVALID_USER
+        assert all(records[u].status == DeliveryStatus.DELIVERED for u in users if u != bad_user)
+
+    def test_transient_failure_is_retried_with_the_same_retry_key(self, line_bot_api, tracker):
+        """A timeout or 5xx retries the multicast under the chunk's key instead of pushing"""
+        line_bot_api.multicast.side_effect = [api_error(500, "Internal server error"), Exception("Read timeout"), None]
+        engine = BulkDeliveryEngine(line_bot_api, tracker, retry_backoff=0)
+
+        result = engine.deliver(user_ids(3), TextSendMessage(text="Hi"), "motivation", "UTC")
+
+        assert line_bot_api.multicast.call_count == 3
+        assert len({c.kwargs['retry_key'] for c in line_bot_api.multicast.call_args_list}) == 1
+        line_bot_api.push_message.assert_not_called()
+        assert result['successful_deliveries'] == 3 and result['failed_chunks'] == 0
+
+    def test_conflict_on_retry_means_already_delivered(self, line_bot_api, tracker):
+        """A 409 for a retried key means LINE accepted an earlier try"""
+        line_bot_api.multicast.side_effect = [Exception("Read timeout"), api_error(409, "The retry key is already accepted")]
+        engine = BulkDeliveryEngine(line_bot_api, tracker, retry_backoff=0)
+
+        result = engine.deliver(user_ids(2), TextSendMessage(text="Hi"), "motivation", "UTC")
+
+        assert result['successful_deliveries'] == 2
+        line_bot_api.push_message.assert_not_called()
+
+    def test_exhausted_transient_failure_is_not_fanned_out(self, line_bot_api, tracker):
+        """A chunk that may have been delivered is recorded as failed, never pushed individually"""
+        line_bot_api.multicast.side_effect = api_error(503, "Service unavailable")
+        engine = BulkDeliveryEngine(line_bot_api, tracker, multicast_attempts=2, retry_backoff=0)
+
+        result = engine.deliver(user_ids(3), TextSendMessage(text="Hi"), "motivation", "UTC")
+
+        assert line_bot_api.multicast.call_count == 2
+        line_bot_api.push_message.assert_not_called()
+        assert result['failed_deliveries'] == 3 and result['push_calls'] == 0
+        assert all(r.status != DeliveryStatus.DELIVERED for r in statuses(tracker).values())
+
+    def test_rate_limited_chunk_is_not_fanned_out(self, line_bot_api, tracker):
+        """A 429 is recorded for the chunk's users without sending them individual pushes"""
+        line_bot_api.multicast.side_effect = api_error(429, "Too many requests")
+        engine = BulkDeliveryEngine(line_bot_api, tracker)
+
+        result = engine.deliver(user_ids(3), TextSendMessage(text="Hi"), "motivation", "UTC")
+
+        line_bot_api.push_message.assert_not_called()
+        assert result['failed_deliveries'] == 3 and not result['success']
+        assert all(r.current_error_type == ErrorType.RATE_LIMIT for r in statuses(tracker).values())
+        assert all(r.next_retry_at is not None for r in statuses(tracker).values())
+
+    def test_existing_delivery_is_recorded_instead_of_new_records(self, line_bot_api, tracker):
+        """Retries pass their delivery and attempt, which receive the outcome"""
+        record = tracker.create_delivery_record("U1", "motivation", "UTC", datetime.now(timezone.utc))
+        attempt_id = tracker.start_delivery_attempt(record.delivery_id)
+        engine = BulkDeliveryEngine(line_bot_api, tracker)
+
+        engine.deliver(["U1"], TextSendMessage(text="Hi"), "motivation", "UTC",
+                       delivery_id=record.delivery_id, attempt_id=attempt_id)
+
+        assert len(tracker.delivery_records) == 1
+        assert record.status == DeliveryStatus.DELIVERED
+
+    def test_identical_personalized_payloads_share_a_multicast(self, line_bot_api):
+        """Users are grouped by payload content, not by message object identity"""
+        engine = BulkDeliveryEngine(line_bot_api)
+        messages = {
+            "U1": TextSendMessage(text="Hello"),
+            "U2": TextSendMessage(text="Hello"),
+            "U3": TextSendMessage(text="สวัสดี")
+        }
+
+        result = engine.deliver_personalized(messages, "motivation", "UTC")
+
+        recipients = sorted(sorted(c.args[0]) for c in line_bot_api.multicast.call_args_list)
+        assert recipients == [["U1", "U2"], ["U3"]]
+        assert result['successful_deliveries'] == 3
+
+    def test_error_classification(self):
+        """Status codes and messages map to tracker error types"""
+        assert classify_delivery_error(api_error(429, "Too many requests")) == ErrorType.RATE_LIMIT
+        assert classify_delivery_error(Exception("403 Forbidden")) == ErrorType.INVALID_USER
+        assert classify_delivery_error(Exception("Read timeout")) == ErrorType.TIMEOUT_ERROR
+        assert classify_delivery_error(Exception("Connection reset")) == ErrorType.NETWORK_ERROR
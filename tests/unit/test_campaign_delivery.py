@@ -0,0 +1,102 @@
+"""
+Unit tests for the Rich Message delivery campaign canvas
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock, PropertyMock, patch
+
+import pytest
+from celery.backends.cache import CacheBackend
+from linebot.models import TextSendMessage
+
+from src.tasks import rich_message_automation as automation
+from src.utils.delivery_tracker import DeliveryTracker
+
+
+@pytest.mark.unit
+class TestDeliveryCampaign:
+    """Run the campaign canvas eagerly with the LINE API mocked"""
+
+    @pytest.fixture
+    def eager(self):
+        """Run tasks in-process with an in-memory result backend for the chord"""
+        app = automation.celery_app
+        backend = CacheBackend(app=app, backend='memory')
+        previous = app.conf.task_always_eager, app.conf.task_eager_propagates
+        app.conf.task_always_eager, app.conf.task_eager_propagates = True, True
+        with patch.object(type(app), 'backend', new_callable=PropertyMock, return_value=backend):
+            yield
+        app.conf.task_always_eager, app.conf.task_eager_propagates = previous
+
+    @pytest.fixture
+    def line_bot_api(self, eager):
+        services = MagicMock()
+        services.settings = SimpleNamespace()
+        services.rich_message_service.render_flex_message.return_value = TextSendMessage(text="Hi")
+        tracker = DeliveryTracker()
+        with patch.object(automation, 'get_worker_services', return_value=services), \
+             patch.object(automation, 'get_delivery_tracker', return_value=tracker), \
+             patch.object(automation, 'generate_content_for_delivery', return_value={
+                 'success': True, 'content_data': {'title': 'Morning', 'content': 'Go'},
+                 'content_metadata': {}}) as generate, \
+             patch.object(automation, 'select_template_for_content',
+                          return_value={'success': True, 'template_id': 'tpl'}), \
+             patch.object(automation, 'compose_rich_message_image',
+                          return_value={'success': True, 'image_path': '/tmp/image.png'}):
+            services.generate = generate
+            yield services
+
+    def test_campaign_generates_once_and_aggregates_all_batches(self, line_bot_api):
+        """Two timezones share one generated message; the chord totals every batch"""
+        deliveries = [
+            {'timezone': 'Asia/Bangkok', 'target_users': [f"UB{i}" for i in range(7000)]},
+            {'timezone': 'Asia/Tokyo', 'target_users': [f"UT{i}" for i in range(5000)]}
+        ]
+        workflow = automation.chain(
+            automation.prepare_campaign_message.si('motivation', '09:00'),
+            automation.dispatch_campaign_batches.s({
+                'campaign_id': 'c1', 'category': 'motivation', 'local_delivery_time': '09:00',
+                'started_at': automation.datetime.now(automation.timezone.utc).timestamp(),
+                'deliveries': deliveries
+            })
+        )
+
+        result = workflow.apply().get()
+
+        line_bot_api.generate.assert_called_once()
+        assert result['success'] is True
+        assert result['batches'] == 3
+        assert result['successful_deliveries'] == 12000
+        assert result['multicast_calls'] == 24
+        assert result['timezones']['Asia/Bangkok']['batches'] == 2
+        assert result['timezones']['Asia/Tokyo']['successful_deliveries'] == 5000
+        assert result['campaign_latency_seconds'] >= result['delivery_seconds'] >= 0
+
+    def test_failed_preparation_sends_nothing(self, line_bot_api):
+        """A campaign whose message cannot be generated reports the stage and latency"""
+        line_bot_api.generate.return_value = {'success': False, 'error': 'quota'}
+
+        result = automation.dispatch_campaign_batches(
+            automation.prepare_campaign_message('motivation', '09:00'),
+            {'campaign_id': 'c2', 'category': 'motivation', 'local_delivery_time': '09:00',
+             'started_at': 0.0, 'deliveries': [{'timezone': 'UTC', 'target_users': ['U1']}]}
+        )
+
+        line_bot_api.line_bot_api.multicast.assert_not_called()
+        assert result['success'] is False
+        assert result['stage'] == 'content_generation'
+        assert result['failed_deliveries'] == 1
+        assert result['campaign_latency_seconds'] > 0
+
+    def test_start_returns_without_waiting(self):
+        """Starting a campaign only enqueues the canvas"""
+        with patch.object(automation, 'chain') as workflow:
+            workflow.return_value.apply_async.return_value = Mock(id='task-1')
+            started = automation.start_delivery_campaign(
+                'motivation', '09:00', [{'timezone': 'UTC', 'target_users': ['U1', 'U2']}]
+            )
+
+        workflow.return_value.apply_async.assert_called_once_with()
+        workflow.return_value.get.assert_not_called()
+        assert started['task_id'] == 'task-1'
+        assert started['users_count'] == 2
+        assert started['timezones'] == ['UTC']
@@ -0,0 +1,60 @@
+"""
+Unit tests for the compact in-memory message representation
+"""
+import json
+from datetime import datetime
+import pytest
+from src.utils.compact_message import EMPTY_METADATA, StoredMessage
+from src.utils.token_counter import count_message_tokens
+
+
+@pytest.mark.unit
+class TestStoredMessage:
+    """Test dict compatibility and shared storage"""
+
+    def test_reads_like_a_message_dict(self):
+        """Fields are read with item access and get, timestamps as datetime"""
+        created = datetime(2025, 3, 1, 12, 30)
+        message = StoredMessage("user", "Hello", created=created.timestamp(), tokens=6)
+
+        assert message["role"] == "user"
+        assert message["content"] == "Hello"
+        assert message["message_type"] == "text"
+        assert message["timestamp"] == created
+        assert message.get("tokens") == 6
+        assert message.get("missing", "default") == "default"
+        assert count_message_tokens(message) == 6
+        with pytest.raises(KeyError):
+            message["missing"]
+
+    def test_uncounted_tokens_look_absent(self):
+        """Messages without a stored count are counted from their content"""
+        message = StoredMessage("assistant", "Hello there")
+
+        assert "tokens" not in message
+        assert message.get("tokens") is None
+        assert count_message_tokens(message) == count_message_tokens({"content": "Hello there"})
+
+    def test_shared_fields(self):
+        """Roles and types are interned and empty metadata is one shared read-only object"""
+        first = StoredMessage("".join(["us", "er"]), "a", "".join(["te", "xt"]))
+        second = StoredMessage("user", "b")
+
+        assert first.role is second.role
+        assert first.message_type is second.message_type
+        assert first.metadata is second.metadata is EMPTY_METADATA
+        with pytest.raises(TypeError):
+            first.metadata["key"] = "value"
+        assert not hasattr(first, "__dict__")
+
+    def test_round_trips_through_dict(self):
+        """to_dict/from_dict keep every field; JSON-encoded ISO timestamps are accepted"""
+        message = StoredMessage("user", "Look", "image", {"image_id": "img_1"}, tokens=9)
+        encoded = message.to_dict()
+        encoded["timestamp"] = encoded["timestamp"].isoformat()
+
+        decoded = StoredMessage.from_dict(json.loads(json.dumps(encoded)))
+
+        assert decoded == message
+        assert decoded.to_dict()["metadata"] == {"image_id": "img_1"}
+        assert abs(decoded.created - message.created) < 1e-3
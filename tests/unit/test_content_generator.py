@@ -464,4 +464,123 @@ class TestContentGenerator:
             generation_time=datetime(2020, 1, 1)  # Very old
         )
         
-        assert content_generator._is_cache_valid(old_content) is False
\ No newline at end of file
+        assert content_generator._is_cache_valid(old_content) is False
+
+    def _batch_reply(self, prompt, titles=None):
+        """Answer a batched prompt with one item per requested id"""
+        import re
+        item_ids = re.findall(r'Item "([^"]+)"', prompt)
+        items = [
+            {"id": item_id, "title": (titles or {}).get(item_id, f"Title {item_id}"),
+             "content": f"Every day brings new opportunities to grow. Message {item_id}."}
+            for item_id in item_ids
+        ]
+        return {'success': True, 'message': json.dumps({"items": items}), 'tokens_used': 60 * len(items)}
+    
+    def test_generate_content_batch_groups_items_per_call(self, content_generator):
+        """Batched generation makes one upstream call per group of items and fills the cache"""
+        content_generator.openai_service.get_response.side_effect = \
+            lambda **kwargs: self._batch_reply(kwargs['user_message'])
+        requests = [
+            ContentRequest(category=ContentCategory.MOTIVATION, custom_context=f"variation_{i}")
+            for i in range(10)
+        ]
+        progress = []
+        
+        result = content_generator.generate_content_batch(
+            requests, items_per_call=5, progress_callback=progress.append
+        )
+        
+        assert content_generator.openai_service.get_response.call_count == 2
+        assert result.upstream_calls == 2
+        assert result.failed_items == 0
+        assert [content.content.endswith(f"Message {i}.") for i, content in enumerate(result.contents)] == [True] * 10
+        assert all(latency >= 0 for latency in result.item_latency)
+        assert len(content_generator.content_cache) == 10
+        assert [p['completed_items'] for p in progress] == [5, 10]
+        call_kwargs = content_generator.openai_service.get_response.call_args.kwargs
+        assert call_kwargs['priority'] == "batch"
+        # Batches never share conversation state, and the output cap grows with the group
+        assert call_kwargs['stateless'] is True
+        assert call_kwargs['max_output_tokens'] == 5 * ContentGenerator.BATCH_ITEM_OUTPUT_TOKENS + \
+            ContentGenerator.BATCH_ENVELOPE_OUTPUT_TOKENS
+        content_generator.openai_service.conversation_service.clear_conversation.assert_not_called()
+        
+        # A second run is served from the cache
+        content_generator.openai_service.get_response.reset_mock()
+        cached = content_generator.generate_content_batch(requests, items_per_call=5)
+        assert cached.cache_hits == 10
+        content_generator.openai_service.get_response.assert_not_called()
+    
+    def test_generate_content_batch_regenerates_only_failed_items(self, content_generator):
+        """Items failing validation are requested again on their own"""
+        prompts = []
+        
+        def reply(**kwargs):
+            prompts.append(kwargs['user_message'])
+            # Item "1" comes back too long on the first call only
+            titles = {"1": "x" * 500} if len(prompts) == 1 else None
+            return self._batch_reply(kwargs['user_message'], titles)
+        content_generator.openai_service.get_response.side_effect = reply
+        requests = [ContentRequest(category=ContentCategory.MOTIVATION, custom_context=str(i)) for i in range(3)]
+        
+        result = content_generator.generate_content_batch(requests, items_per_call=5)
+        
+        assert result.upstream_calls == 2
+        assert result.regenerated_items == 1
+        assert result.failed_items == 0
+        assert 'Item "1"' in prompts[1]
+        assert 'Item "0"' not in prompts[1] and 'Item "2"' not in prompts[1]
+    
+    def test_generate_content_batch_applies_validator(self, content_generator):
+        """Items rejected by the validator are retried and reported as failed when they keep failing"""
+        content_generator.openai_service.get_response.side_effect = \
+            lambda **kwargs: self._batch_reply(kwargs['user_message'])
+        validator = Mock()
+        validator.validate_content.side_effect = lambda content: Mock(
+            result=Mock(value='rejected' if content.content.endswith("Message 0.") else 'approved'),
+            score=0.9
+        )
+        requests = [ContentRequest(category=ContentCategory.WELLNESS, custom_context=str(i)) for i in range(2)]
+        
+        result = content_generator.generate_content_batch(requests, validator=validator, max_regeneration_rounds=1)
+        
+        assert result.contents[0] is None
+        assert result.contents[1] is not None
+        assert result.validations[1].score == 0.9
+        assert result.failed_items == 1
+        assert result.upstream_calls == 2
+        assert len(content_generator.content_cache) == 1
+    
+    def test_generate_content_batch_validates_cache_hits(self, content_generator):
+        """Cached items are validated like generated ones; a rejected one is generated again"""
+        content_generator.openai_service.get_response.side_effect = \
+            lambda **kwargs: self._batch_reply(kwargs['user_message'])
+        requests = [ContentRequest(category=ContentCategory.WELLNESS, custom_context=str(i)) for i in range(2)]
+        content_generator.generate_content_batch(requests)
+        content_generator.openai_service.get_response.reset_mock()
+        validator = Mock()
+        verdicts = iter(['approved', 'rejected', 'approved'])
+        validator.validate_content.side_effect = lambda content: Mock(
+            result=Mock(value=next(verdicts)), score=0.8
+        )
+        
+        result = content_generator.generate_content_batch(requests, validator=validator)
+        
+        assert result.cache_hits == 1
+        assert result.upstream_calls == 1
+        assert 'Item "1"' in content_generator.openai_service.get_response.call_args.kwargs['user_message']
+        assert all(content is not None for content in result.contents)
+        assert [validation.score for validation in result.validations] == [0.8, 0.8]
+    
+    def test_generate_content_batch_handles_unparseable_reply(self, content_generator):
+        """A reply that is not JSON fails the items of that call"""
+        content_generator.openai_service.get_response.return_value = {
+            'success': True, 'message': 'Sorry, I cannot do that', 'tokens_used': 5
+        }
+        requests = [ContentRequest(category=ContentCategory.MOTIVATION)]
+        
+        result = content_generator.generate_content_batch(requests, max_regeneration_rounds=0)
+        
+        assert result.contents == [None]
+        assert result.failed_items == 1
@@ -0,0 +1,111 @@
+"""
+Unit tests for the token-budgeted context window
+"""
+import pytest
+
+from src.utils.context_window import ContextWindowBuilder, SUMMARY_PREFIX, fold_into_summary
+from src.utils.token_counter import count_message_tokens, count_tokens
+
+
+def make_history(count, words=30):
+    """Alternating user/assistant turns of roughly equal size"""
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "word " * words}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.unit
+class TestTokenCounter:
+    """Test the offline token approximation"""
+
+    def test_ascii_and_thai_estimates(self):
+        """Latin text is cheaper per character than Thai"""
+        assert count_tokens("") == 0
+        assert count_tokens("hello world!") == 3
+        assert count_tokens("สวัสดีครับ") > count_tokens("hello there")
+
+    def test_message_overhead_and_multimodal(self):
+        """Chat framing is counted and only text parts of multimodal content"""
+        message = {"role": "user", "content": [
+            {"type": "text", "text": "hello world!"},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}}
+        ]}
+        assert count_message_tokens(message) == count_tokens("hello world!") + 4
+
+
+    def test_stored_count_is_reused(self):
+        """A count stored on the message is used instead of re-tokenizing"""
+        assert count_message_tokens({"role": "user", "content": "hello world!", "tokens": 42}) == 42
+
+
+@pytest.mark.unit
+class TestContextWindowBuilder:
+    """Test budget enforcement and rolling summaries"""
+
+    def test_small_history_is_sent_verbatim(self):
+        """History within budget is sent in full with the new message once"""
+        builder = ContextWindowBuilder(token_budget=4000)
+        history = make_history(4)
+        current = {"role": "user", "content": "new question"}
+
+        context = builder.build("system", history, current)
+
+        assert [m["content"] for m in context['messages'][1:-1]] == [m["content"] for m in history]
+        assert context['messages'][-1] == current
+        assert context['summary_updated'] is False
+        assert context['tokens_saved'] == count_message_tokens(current)
+
+    def test_budget_is_enforced(self):
+        """Long histories are cut to the budget and older turns are summarized"""
+        builder = ContextWindowBuilder(token_budget=400, summary_max_tokens=100)
+        history = make_history(40)
+
+        context = builder.build("system", history, {"role": "user", "content": "next"})
+
+        assert context['prompt_tokens'] <= 400
+        assert context['summary_updated'] is True
+        assert context['messages'][1]['content'].startswith(SUMMARY_PREFIX)
+        assert context['messages'][-2]['content'] == history[-1]['content']
+        assert context['tokens_saved'] > 0
+
+    def test_summary_is_updated_incrementally(self):
+        """Later requests only fold newly evicted messages into the existing summary"""
+        folded = []
+
+        def summarizer(previous, messages, max_tokens):
+            folded.extend(m["content"] for m in messages)
+            return fold_into_summary(previous, messages, max_tokens)
+
+        builder = ContextWindowBuilder(token_budget=400, summary_max_tokens=100, summarizer=summarizer)
+        history = make_history(40)
+        summary = None
+        for turns in range(20, 41):
+            context = builder.build("system", history[:turns], {"role": "user", "content": "next"}, summary=summary)
+            summary = context['summary']
+
+        # Every evicted message was folded exactly once
+        assert len(folded) == len(set(folded))
+        assert folded == [m["content"] for m in history[:len(folded)]]
+        assert summary['covered_through'] == len(folded)
+
+    def test_low_water_mark_avoids_per_turn_summaries(self):
+        """After an eviction, the next turn fits without another summary update"""
+        builder = ContextWindowBuilder(token_budget=400, summary_max_tokens=100)
+        history = make_history(30)
+
+        first = builder.build("system", history[:20], {"role": "user", "content": "a"})
+        second = builder.build("system", history[:21], {"role": "user", "content": "b"}, summary=first['summary'])
+
+        assert first['summary_updated'] is True
+        assert second['summary_updated'] is False
+
+    def test_trimmed_messages_are_skipped(self):
+        """Messages trimmed from storage before summarization are not double counted"""
+        builder = ContextWindowBuilder(token_budget=4000)
+        summary = {'text': 'user: old', 'covered_through': 5}
+
+        context = builder.build("system", make_history(3), {"role": "user", "content": "x"},
+                                first_index=10, summary=summary)
+
+        assert len(context['messages']) == 1 + 1 + 3 + 1
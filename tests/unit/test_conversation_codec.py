@@ -0,0 +1,94 @@
+"""
+Unit tests for the conversation message codecs
+"""
+import json
+from datetime import datetime
+import pytest
+from src.utils.compact_message import StoredMessage
+from src.utils.conversation_codec import (
+    FORMAT_VERSION, JsonCodec, MAGIC, UNKNOWN_TOKENS, available_codecs, decode_message, encode_message,
+    get_codec
+)
+
+AVAILABLE_CODECS = available_codecs()
+
+
+def sample_message():
+    return StoredMessage("user", "สวัสดี, look at this", "image", {"image_id": "img_1"},
+                         datetime(2025, 3, 1, 12, 30, 15, 250000).timestamp(), 17)
+
+
+@pytest.mark.unit
+class TestConversationCodec:
+    """Test round trips, version headers and codec selection"""
+
+    @pytest.mark.parametrize("name", AVAILABLE_CODECS)
+    def test_round_trip(self, name):
+        """Every field survives encoding, with the timestamp kept numeric"""
+        message = sample_message()
+        raw = encode_message(message, get_codec(name))
+
+        assert raw[:3] == bytes((MAGIC, FORMAT_VERSION, get_codec(name).codec_id))
+        assert int.from_bytes(raw[3:7], 'big') == message.tokens
+        decoded = decode_message(raw)
+        assert decoded == message
+        assert decoded.created == message.created
+        assert decoded["timestamp"] == datetime(2025, 3, 1, 12, 30, 15, 250000)
+
+    def test_decoding_follows_the_header_not_the_configuration(self):
+        """Entries written with one codec are read whatever codec is configured"""
+        raw = encode_message(sample_message(), JsonCodec)
+
+        assert decode_message(raw)["content"] == "สวัสดี, look at this"
+        assert raw[7:].startswith(b"[")
+
+    def test_uncounted_tokens_are_marked_in_the_header(self):
+        """Messages without a token count carry the unknown marker and decode back to None"""
+        message = StoredMessage("user", "Hi")
+        raw = encode_message(message, JsonCodec)
+
+        assert raw[3:7] == UNKNOWN_TOKENS.to_bytes(4, 'big')
+        assert decode_message(raw).tokens is None
+
+    def test_version_one_entries_are_read(self):
+        """Entries written with the three-byte header, before the token count, still decode"""
+        raw = bytes((MAGIC, 1, JsonCodec.codec_id)) + JsonCodec.dumps(["user", "Hi", "text", None, 1.5, 4])
+
+        message = decode_message(raw)
+
+        assert message["content"] == "Hi"
+        assert message.tokens == 4
+
+    def test_version_zero_json_objects_are_read(self):
+        """Messages stored before the header (JSON objects, ISO timestamps) still decode"""
+        legacy = json.dumps({
+            "role": "assistant", "content": "Hello", "message_type": "text",
+            "metadata": {}, "timestamp": "2025-03-01T12:30:15"
+        })
+
+        message = decode_message(legacy.encode())
+
+        assert message["role"] == "assistant"
+        assert message["timestamp"] == datetime(2025, 3, 1, 12, 30, 15)
+        assert message.get("tokens") is None
+
+    def test_unknown_encodings_are_rejected(self):
+        """Unknown headers and format versions raise ValueError"""
+        with pytest.raises(ValueError):
+            decode_message(b"\x00garbage")
+        with pytest.raises(ValueError):
+            decode_message(bytes((MAGIC, FORMAT_VERSION + 1, JsonCodec.codec_id)) + b"[]")
+
+    def test_empty_metadata_is_not_stored(self):
+        """Messages without metadata decode to the shared empty mapping"""
+        message = StoredMessage("user", "Hi", tokens=5)
+
+        decoded = decode_message(encode_message(message, JsonCodec))
+
+        assert decoded.metadata is message.metadata
+        assert b"null" in encode_message(message, JsonCodec)
+
+    def test_unavailable_codec_falls_back(self):
+        """Asking for a codec that is not installed picks the best available one"""
+        assert get_codec("no-such-codec").name == AVAILABLE_CODECS[0]
+        assert get_codec("json") is JsonCodec
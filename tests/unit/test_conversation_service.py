@@ -1,10 +1,13 @@
 """
 Unit tests for Conversation service
 """
+import json
+import threading
 import pytest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 from datetime import datetime, timedelta
 from src.services.conversation_service import ConversationService
+from src.utils.token_counter import count_message_tokens
 
 
 @pytest.mark.unit
@@ -93,6 +96,87 @@ class TestConversationService:
         assert conv["messages"][-1]["content"] == f"Message {max_messages + 19}"
         assert conv["messages"][0]["content"] == f"Message 20"
     
+    def test_context_state_tracks_absolute_index(self, conversation_service):
+        """Context state reports the absolute index of the first stored message"""
+        user_id = "context_user"
+        max_messages = conversation_service.max_messages_per_user
+        
+        for i in range(max_messages + 5):
+            conversation_service.add_message(user_id, "user", f"Message {i}")
+        
+        state = conversation_service.get_context_state(user_id)
+        
+        assert len(state["messages"]) == max_messages
+        assert state["first_index"] == 5
+        assert state["summary"] is None
+    
+    def test_context_summary_is_cached_with_conversation(self, conversation_service):
+        """The rolling summary is stored alongside the conversation"""
+        user_id = "context_user"
+        conversation_service.add_message(user_id, "user", "Hello")
+        summary = {"text": "user: earlier topic", "covered_through": 1}
+        
+        conversation_service.set_context_summary(user_id, summary)
+        
+        assert conversation_service.get_context_state(user_id)["summary"] == summary
+        assert conversation_service.conversations[user_id]["context_summary"] == summary
+    
+    def test_token_counts_stored_with_messages(self, conversation_service):
+        """Tokens are counted once at add_message time and summed into running totals"""
+        user_id = "token_user"
+        conversation_service.add_message(user_id, "user", "hello world!")
+        conversation_service.add_message(user_id, "assistant", "สวัสดีครับ")
+        
+        messages = conversation_service.conversations[user_id]["messages"]
+        assert all(isinstance(msg["tokens"], int) and msg["tokens"] > 0 for msg in messages)
+        
+        usage = conversation_service.get_token_usage(user_id)
+        assert usage["stored_tokens"] == sum(msg["tokens"] for msg in messages)
+        assert usage["lifetime_tokens"] == usage["stored_tokens"]
+        assert [m["tokens"] for m in conversation_service.get_context_state(user_id)["messages"]] == \
+            [msg["tokens"] for msg in messages]
+    
+    def test_token_total_follows_trimming(self, conversation_service):
+        """Trimmed messages leave the stored total but stay in the lifetime total"""
+        user_id = "token_user"
+        max_messages = conversation_service.max_messages_per_user
+        
+        for i in range(max_messages + 10):
+            conversation_service.add_message(user_id, "user", f"Message number {i}")
+        
+        messages = conversation_service.conversations[user_id]["messages"]
+        usage = conversation_service.get_token_usage(user_id)
+        assert usage["stored_tokens"] == sum(msg["tokens"] for msg in messages)
+        assert usage["lifetime_tokens"] > usage["stored_tokens"]
+    
+    def test_context_digest_advances_with_messages(self, conversation_service):
+        """The rolling digest changes on every message and depends on order"""
+        empty = conversation_service.get_context_digest("digest_a")
+        
+        conversation_service.add_message("digest_a", "user", "Hello")
+        after_one = conversation_service.get_context_digest("digest_a")
+        conversation_service.add_message("digest_a", "assistant", "Hi there")
+        
+        conversation_service.add_message("digest_b", "assistant", "Hi there")
+        conversation_service.add_message("digest_b", "user", "Hello")
+        
+        assert len({empty, after_one, conversation_service.get_context_digest("digest_a")}) == 3
+        assert conversation_service.get_context_digest("digest_a") != \
+            conversation_service.get_context_digest("digest_b")
+    
+    def test_context_digest_matches_for_same_history(self, conversation_service):
+        """Identical histories share a digest, and clearing resets it"""
+        for user_id in ("digest_a", "digest_b"):
+            conversation_service.add_message(user_id, "user", "Hello")
+            conversation_service.add_message(user_id, "assistant", "Hi there")
+        
+        digest = conversation_service.get_context_digest("digest_a")
+        assert digest == conversation_service.get_context_digest("digest_b")
+        
+        conversation_service.clear_conversation("digest_a")
+        assert conversation_service.get_context_digest("digest_a") == \
+            conversation_service.get_context_digest("new_user")
+    
     def test_get_conversation_stats_existing_user(self, conversation_service, sample_conversation_history):
         """Test getting conversation statistics for existing user"""
         user_id = "test_user"
@@ -270,4 +354,337 @@ class TestConversationService:
         assert "Error adding message" in caplog.text
         
         # Restore conversations
-        conversation_service.conversations = original_conversations
\ No newline at end of file
+        conversation_service.conversations = original_conversations
+
+
+@pytest.fixture
+def redis_backed_service():
+    """ConversationService whose Redis manager runs operations against fakeredis"""
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    manager = Mock()
+    manager.health_check.return_value = {'is_healthy': True}
+    manager.execute_with_fallback.side_effect = lambda op, fallback=None, name="", use_retry=True: op(client)
+    
+    with patch('src.services.conversation_service.get_redis_manager', return_value=manager):
+        service = ConversationService(enable_memory_monitoring=False)
+    assert service._redis_available
+    return service, client
+
+
+def legacy_document(messages, response_id=None):
+    """Conversation serialized the way whole-document storage wrote it"""
+    now = datetime.now().isoformat()
+    return json.dumps({
+        "messages": [
+            {"role": role, "content": content, "message_type": "text", "metadata": {}, "timestamp": now}
+            for role, content in messages
+        ],
+        "created_at": now,
+        "last_activity": now,
+        "last_response_id": response_id
+    })
+
+
+@pytest.mark.unit
+class TestConversationServiceRedisStorage:
+    """Test append-only Redis storage, legacy migration and per-user locking"""
+    
+    def test_messages_are_appended_to_list_and_hash(self, redis_backed_service):
+        """Each message is one list entry; counters live in the metadata hash"""
+        service, client = redis_backed_service
+        service.add_message("user1", "user", "Hello")
+        service.add_message("user1", "assistant", "Hi there")
+        
+        assert client.llen("conversation_messages:user1") == 2
+        assert client.exists("conversation:user1") == 0
+        metadata = client.hgetall("conversation_state:user1")
+        assert int(metadata[b"total_messages"]) == 2
+        assert client.ttl("conversation_messages:user1") > 0
+        
+        history = service.get_conversation_history("user1")
+        assert history == [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Hi there"}]
+    
+    def test_each_write_serializes_only_the_new_message(self, redis_backed_service):
+        """Write cost does not grow with the stored history"""
+        service, client = redis_backed_service
+        for i in range(50):
+            service.add_message("user1", "user", f"Message {i}")
+        
+        with patch.object(ConversationService, '_encode_message', wraps=ConversationService._encode_message) as encode:
+            service.add_message("user1", "user", "One more")
+        
+        encode.assert_called_once()
+        assert client.llen("conversation_messages:user1") == 51
+    
+    def test_trim_keeps_counters_consistent(self, redis_backed_service):
+        """LTRIM bounds the list while token totals and indices stay exact"""
+        service, client = redis_backed_service
+        max_messages = service.max_messages_per_user
+        for i in range(max_messages + 10):
+            service.add_message("user1", "user", f"Message number {i}")
+        
+        assert client.llen("conversation_messages:user1") == max_messages
+        state = service.get_context_state("user1")
+        assert state["first_index"] == 10
+        assert state["messages"][0]["content"] == "Message number 10"
+        usage = service.get_token_usage("user1")
+        assert usage["stored_tokens"] == sum(m["tokens"] for m in state["messages"])
+        assert usage["lifetime_tokens"] > usage["stored_tokens"]
+    
+    def test_digest_matches_in_memory_storage(self, redis_backed_service):
+        """Redis and in-memory storage produce the same context digest"""
+        service, _ = redis_backed_service
+        in_memory = ConversationService(enable_redis=False, enable_memory_monitoring=False)
+        for target in (service, in_memory):
+            target.add_message("user1", "user", "Hello")
+            target.add_message("user1", "assistant", "Hi there")
+        
+        assert service.get_context_digest("user1") == in_memory.get_context_digest("user1")
+    
+    def test_per_request_reads_skip_the_history(self, redis_backed_service):
+        """Digest, token usage and response ID come from the metadata hash, not the message list"""
+        service, _ = redis_backed_service
+        in_memory = ConversationService(enable_redis=False, enable_memory_monitoring=False)
+        for target in (service, in_memory):
+            for i in range(20):
+                target.add_message("user1", "user", f"Message {i}")
+        service.set_last_response_id("user1", "resp_1")
+        
+        with patch.object(service, '_load_from_redis') as load, \
+             patch.object(ConversationService, '_decode_message') as decode:
+            assert service.get_context_digest("user1") == in_memory.get_context_digest("user1")
+            assert service.get_token_usage("user1") == in_memory.get_token_usage("user1")
+            assert service.get_last_response_id("user1") == "resp_1"
+            assert service.get_last_response_id("user2") is None
+        
+        load.assert_not_called()
+        decode.assert_not_called()
+    
+    def test_metadata_updates_do_not_touch_messages(self, redis_backed_service):
+        """Response IDs and summaries are single hash fields"""
+        service, client = redis_backed_service
+        service.add_message("user1", "user", "Hello")
+        service.set_last_response_id("user1", "resp_1")
+        service.set_context_summary("user1", {"text": "earlier", "covered_through": 1})
+        
+        assert client.hget("conversation_state:user1", "last_response_id") == b"resp_1"
+        service.conversations.clear()
+        assert service.get_last_response_id("user1") == "resp_1"
+        assert service.get_context_state("user1")["summary"] == {"text": "earlier", "covered_through": 1}
+    
+    def test_legacy_document_is_migrated_on_read(self, redis_backed_service):
+        """A whole-document conversation is converted once and then appended to"""
+        service, client = redis_backed_service
+        client.set("conversation:user1", legacy_document([("user", "Old question"), ("assistant", "Old answer")], "resp_0"))
+        
+        history = service.get_conversation_history("user1")
+        
+        assert [m["content"] for m in history] == ["Old question", "Old answer"]
+        assert client.exists("conversation:user1") == 0
+        assert client.llen("conversation_messages:user1") == 2
+        assert service.get_last_response_id("user1") == "resp_0"
+        
+        service.add_message("user1", "user", "New question")
+        state = service.get_context_state("user1")
+        assert [m["content"] for m in state["messages"]][-1] == "New question"
+        assert int(client.hget("conversation_state:user1", "total_messages")) == 3
+    
+    def test_bulk_migration_uses_scan(self, redis_backed_service):
+        """migrate_legacy_conversations converts every legacy document and skips other keys"""
+        service, client = redis_backed_service
+        client.set("conversation:user1", legacy_document([("user", "Hello")]))
+        client.set("conversation:user2", legacy_document([("user", "Hi"), ("assistant", "Hey")]))
+        client.rpush("conversation:user3", "not a legacy document")
+        
+        assert service.migrate_legacy_conversations(batch_size=1) == 2
+        assert client.llen("conversation_messages:user2") == 2
+        assert client.type("conversation:user3") == b"list"
+    
+    def test_redis_failure_falls_back_to_memory(self, redis_backed_service):
+        """A failed append is kept in memory"""
+        service, _ = redis_backed_service
+        service.redis_manager.execute_with_fallback.side_effect = \
+            lambda op, fallback=None, name="", use_retry=True: fallback()
+        
+        service.add_message("user1", "user", "Hello")
+        
+        assert service.get_conversation_history("user1") == [{"role": "user", "content": "Hello"}]
+    
+    def test_add_message_is_one_script_call(self, redis_backed_service):
+        """Push, trim, counters, digest and statistics go out as a single EVALSHA"""
+        service, client = redis_backed_service
+        service.add_message("user0", "user", "Load the script")
+        
+        with patch.object(client, 'execute_command', wraps=client.execute_command) as direct, \
+             patch.object(client, 'pipeline', wraps=client.pipeline) as pipeline:
+            service.add_message("user1", "user", "Hello")
+        
+        assert [call.args[0] for call in direct.call_args_list] == ['EVALSHA']
+        assert pipeline.call_count == 0
+    
+    def test_failed_token_correction_does_not_repeat_the_append(self, redis_backed_service):
+        """Trimming an entry without a stored count corrects the total afterwards; a failure there keeps the message once"""
+        service, client = redis_backed_service
+        service.max_messages_per_user = 1
+        client.rpush("conversation_messages:user1", json.dumps({
+            "role": "user", "content": "Earlier", "message_type": "text",
+            "metadata": {}, "timestamp": datetime.now().isoformat()
+        }))
+        
+        with patch.object(client, 'hincrby', side_effect=ConnectionError("connection reset")) as correction:
+            service.add_message("user1", "user", "Hello")
+        
+        correction.assert_called_once()
+        assert client.llen("conversation_messages:user1") == 1
+        assert int(client.hget("conversation_state:user1", "total_messages")) == 1
+        assert "user1" not in service.conversations
+        assert service._stats['fallback_operations'] == 0
+        assert service.get_conversation_history("user1") == [{"role": "user", "content": "Hello"}]
+    
+    def test_users_on_other_stripes_are_not_blocked(self):
+        """Holding one user's lock does not block writes for another user"""
+        service = ConversationService(enable_redis=False, enable_memory_monitoring=False, lock_stripes=8)
+        other = next(f"user_{i}" for i in range(100)
+                     if service._user_lock(f"user_{i}") is not service._user_lock("busy_user"))
+        done = threading.Event()
+        
+        def write():
+            service.add_message(other, "user", "Hello")
+            done.set()
+        
+        with service._user_lock("busy_user"):
+            threading.Thread(target=write).start()
+            assert done.wait(timeout=2)
+        
+        assert service.get_conversation_history(other) == [{"role": "user", "content": "Hello"}]
+    
+    def test_memory_cleanup_waits_for_the_user_lock(self):
+        """Trimming under memory pressure waits for a writer holding the user's lock"""
+        service = ConversationService(enable_redis=False, enable_memory_monitoring=False)
+        for i in range(30):
+            service.add_message("user1", "user", f"Message {i}")
+        done = threading.Event()
+        
+        def cleanup():
+            service._memory_cleanup_callback("emergency", Mock())
+            done.set()
+        
+        with service._user_lock("user1"):
+            threading.Thread(target=cleanup).start()
+            assert not done.wait(timeout=0.2)
+            assert len(service.conversations["user1"]["messages"]) == 30
+        
+        assert done.wait(timeout=2)
+        assert service.get_token_usage("user1")["message_count"] == 5
+    
+    def test_concurrent_writes_are_not_lost(self):
+        """Concurrent writers for many users keep every message"""
+        service = ConversationService(enable_redis=False, enable_memory_monitoring=False)
+        
+        def write(n):
+            for i in range(20):
+                service.add_message(f"user_{n % 5}", "user", f"Message {n}-{i}")
+        
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        for n in range(5):
+            assert service.get_token_usage(f"user_{n}")["message_count"] == 40
+    
+    def test_stats_snapshot_and_listing_from_redis(self, redis_backed_service):
+        """Totals come from the Redis counters and conversations are listed page by page"""
+        service, client = redis_backed_service
+        for i in range(7):
+            service.add_message(f"user_{i}", "user", "Hello")
+        service.clear_conversation("user_6")
+        
+        snapshot = service.get_stats_snapshot(max_age=0)
+        listed, cursor = [], 0
+        while True:
+            page = service.list_conversations(cursor, count=3)
+            listed.extend(page["conversations"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        
+        assert snapshot["storage_backend"] == "redis"
+        assert snapshot["total_users"] == 6
+        assert snapshot["total_messages"] == 7
+        assert sorted(conv["user_id"] for conv in listed) == [f"user_{i}" for i in range(6)]
+        assert all(conv["message_count"] == 1 for conv in listed)
+    
+    def test_existing_conversations_are_counted_by_rebuild(self):
+        """Conversations stored before the counters existed are counted on rebuild, legacy ones once migrated"""
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeRedis()
+        client.hset("conversation_state:user1", mapping={
+            "total_messages": 4, "last_activity": datetime.now().isoformat()
+        })
+        client.set("conversation:user2", legacy_document([("user", "Hello"), ("assistant", "Hi")]))
+        manager = Mock()
+        manager.health_check.return_value = {'is_healthy': True}
+        manager.execute_with_fallback.side_effect = lambda op, fallback=None, name="", use_retry=True: op(client)
+        
+        with patch('src.services.conversation_service.get_redis_manager', return_value=manager):
+            service = ConversationService(enable_memory_monitoring=False)
+        snapshot = service.get_stats_snapshot(max_age=0)
+        assert (snapshot["total_users"], snapshot["total_messages"]) == (0, 0)
+        
+        assert service.rebuild_statistics() == 1
+        snapshot = service.get_stats_snapshot(max_age=0)
+        assert (snapshot["total_users"], snapshot["total_messages"]) == (1, 4)
+        
+        assert service.migrate_legacy_conversations() == 1
+        snapshot = service.get_stats_snapshot(max_age=0)
+        assert (snapshot["total_users"], snapshot["total_messages"]) == (2, 6)
+    
+    def test_lazily_migrated_conversation_is_counted(self, redis_backed_service):
+        """A legacy document converted on read joins the user and message counters"""
+        service, client = redis_backed_service
+        client.set("conversation:user1", legacy_document([("user", "Hello"), ("assistant", "Hi")]))
+        
+        service.get_conversation_history("user1")
+        snapshot = service.get_stats_snapshot(max_age=0)
+        
+        assert (snapshot["total_users"], snapshot["total_messages"]) == (1, 2)
+    
+    def test_stats_snapshot_and_listing_in_memory(self):
+        """Without Redis the snapshot and listing use the local store"""
+        service = ConversationService(enable_redis=False, enable_memory_monitoring=False)
+        for i in range(5):
+            service.add_message(f"user_{i}", "user", "Hello")
+        service.add_message("user_0", "assistant", "Hi")
+        
+        snapshot = service.get_stats_snapshot(max_age=0)
+        first = service.list_conversations(0, count=3)
+        second = service.list_conversations(first["next_cursor"], count=3)
+        
+        assert snapshot["storage_backend"] == "in_memory"
+        assert (snapshot["total_users"], snapshot["active_users"], snapshot["active_users_today"]) == (5, 5, 5)
+        assert snapshot["total_messages"] == 6
+        assert second["next_cursor"] == 0
+        assert [conv["user_id"] for conv in first["conversations"] + second["conversations"]] == \
+            [f"user_{i}" for i in range(5)]
+        assert first["conversations"][0]["message_count"] == 2
+    
+    def test_messages_are_stored_with_codec_header(self, redis_backed_service):
+        """New entries carry a version header; JSON-object entries written earlier still load"""
+        service, client = redis_backed_service
+        client.rpush("conversation_messages:user1", json.dumps({
+            "role": "user", "content": "Earlier", "message_type": "text",
+            "metadata": {}, "timestamp": datetime.now().isoformat()
+        }))
+        client.hset("conversation_state:user1", "total_messages", 1)
+        
+        service.add_message("user1", "assistant", "Later")
+        service.conversations.clear()
+        
+        raw = client.lrange("conversation_messages:user1", 0, -1)
+        assert raw[1][:3] == bytes((0xC7, 2, service.codec.codec_id))
+        assert int.from_bytes(raw[1][3:7], 'big') == count_message_tokens({"content": "Later"})
+        assert [m["content"] for m in service.get_conversation_history("user1")] == ["Earlier", "Later"]
+        assert isinstance(service.conversations["user1"]["messages"][1]["timestamp"], datetime)
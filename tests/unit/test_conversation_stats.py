@@ -0,0 +1,164 @@
+"""
+Unit tests for incrementally maintained conversation statistics
+"""
+import time
+from datetime import datetime, timedelta
+import threading
+from unittest.mock import Mock
+import pytest
+from src.utils.conversation_stats import ConversationStatistics, scan_page
+
+
+@pytest.fixture
+def client():
+    """fakeredis client returning bytes, like the shared Redis manager's"""
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeRedis()
+
+
+def record(stats, client, user_id, timestamp=None):
+    pipe = client.pipeline()
+    stats.record_message(pipe, user_id, timestamp)
+    pipe.execute()
+
+
+@pytest.mark.unit
+class TestConversationStatistics:
+    """Test counters, the cached snapshot and SCAN pagination"""
+
+    def test_counters_track_users_and_messages(self, client):
+        """Messages, distinct users and daily actives are counted as they are stored"""
+        stats = ConversationStatistics()
+        for user_id in ["u1", "u2", "u1", "u3"]:
+            record(stats, client, user_id)
+
+        assert stats.read(client) == {
+            'total_users': 3,
+            'active_users': 3,
+            'active_users_today': 3,
+            'total_messages': 4
+        }
+
+    def test_expired_and_removed_users_leave_the_count(self, client):
+        """Users idle past the conversation TTL and cleared users are not counted"""
+        stats = ConversationStatistics(user_ttl_seconds=3600)
+        record(stats, client, "idle", time.time() - 7200)
+        record(stats, client, "recent", time.time() - 1800)
+        record(stats, client, "cleared")
+        pipe = client.pipeline()
+        stats.record_removal(pipe, "cleared")
+        pipe.execute()
+
+        counters = stats.read(client)
+
+        assert counters['total_users'] == 1
+        assert client.zscore(stats.users_key, "idle") is None
+
+    def test_snapshot_is_cached(self):
+        """The loader runs once per snapshot TTL"""
+        stats = ConversationStatistics(snapshot_ttl_seconds=60)
+        loader = Mock(return_value={'total_users': 5})
+
+        first = stats.snapshot(loader)
+        second = stats.snapshot(loader)
+
+        assert first is second
+        assert first['total_users'] == 5
+        assert loader.call_count == 1
+        stats.snapshot(loader, max_age=0)
+        assert loader.call_count == 2
+
+    def test_failed_refresh_serves_stale_snapshot(self):
+        """A refresh error keeps serving the previous snapshot, marked stale"""
+        stats = ConversationStatistics(snapshot_ttl_seconds=0)
+        stats.snapshot(lambda: {'total_users': 5})
+
+        def failing_loader():
+            raise ConnectionError("redis down")
+
+        snapshot = stats.snapshot(failing_loader)
+
+        assert snapshot['total_users'] == 5
+        assert snapshot['stale'] is True
+
+    def test_concurrent_readers_share_one_refresh(self):
+        """While one caller refreshes, others are served the previous snapshot"""
+        stats = ConversationStatistics(snapshot_ttl_seconds=0)
+        stats.snapshot(lambda: {'total_users': 1})
+        release = threading.Event()
+        calls = []
+
+        def slow_loader():
+            calls.append(1)
+            release.wait(2)
+            return {'total_users': 2}
+
+        refresher = threading.Thread(target=stats.snapshot, args=(slow_loader,))
+        refresher.start()
+        while not calls:
+            time.sleep(0.001)
+
+        assert stats.snapshot(slow_loader)['total_users'] == 1
+        release.set()
+        refresher.join()
+        assert len(calls) == 1
+
+    def test_scan_page_walks_all_keys(self, client):
+        """Following the cursor visits every matching key exactly once"""
+        for i in range(250):
+            client.set(f"conversation:user_{i}", "x")
+        client.set("other:key", "x")
+
+        keys, cursor = [], 0
+        while True:
+            cursor, page = scan_page(client, "conversation:*", cursor, count=50)
+            keys.extend(page)
+            if not cursor:
+                break
+
+        assert len(keys) == len(set(keys)) == 250
+        assert all(isinstance(key, str) for key in keys)
+
+    def test_rebuild_counts_conversations_stored_before_the_counters(self, client):
+        """A rebuild walks the metadata hashes, keeping later activity already counted"""
+        stats = ConversationStatistics()
+        recent = datetime.now()
+        for i in range(120):
+            client.hset(f"conversation_state:user_{i}", mapping={
+                "total_messages": 3, "last_activity": (recent - timedelta(minutes=90)).isoformat()
+            })
+        record(stats, client, "user_0", recent.timestamp())
+
+        assert stats.rebuild(client, "conversation_state:*", batch_size=25) == 120
+
+        assert not client.exists(stats.rebuild_lock_key)
+        assert client.zscore(stats.users_key, "user_0") == pytest.approx(recent.timestamp())
+        counters = stats.read(client)
+        assert counters['total_users'] == 120
+        assert counters['active_users'] == 1
+        assert counters['total_messages'] == 360
+
+    def test_rebuild_keeps_messages_counted_while_it_runs(self, client):
+        """Increments made during the scan survive the rebuild, which applies a delta"""
+        stats = ConversationStatistics()
+        client.hset("conversation_state:user_1", mapping={"total_messages": 5})
+        scan = client.scan
+
+        def scan_with_concurrent_write(*args, **kwargs):
+            client.incrby(stats.messages_key, 2)
+            return scan(*args, **kwargs)
+
+        client.scan = scan_with_concurrent_write
+        stats.rebuild(client, "conversation_state:*")
+
+        assert stats.read(client)['total_messages'] == 7
+
+    def test_rebuild_is_skipped_while_another_holds_the_lock(self, client):
+        """Only one process rebuilds at a time"""
+        stats = ConversationStatistics()
+        client.hset("conversation_state:user_1", mapping={"total_messages": 5})
+        client.set(stats.rebuild_lock_key, "other", nx=True, ex=60)
+
+        assert stats.rebuild(client, "conversation_state:*") is None
+        assert stats.read(client)['total_messages'] == 0
+        assert client.get(stats.rebuild_lock_key) in ("other", b"other")
@@ -0,0 +1,153 @@
+"""
+Unit tests for webhook event deduplication
+"""
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+from linebot.models import MessageEvent
+
+from src.utils.event_deduplicator import WebhookEventDeduplicator
+
+
+def make_event(event_id, is_redelivery=False):
+    """Build a LINE message event with a webhookEventId"""
+    return MessageEvent.new_from_json_dict({
+        'type': 'message',
+        'webhookEventId': event_id,
+        'deliveryContext': {'isRedelivery': is_redelivery},
+        'replyToken': 'reply_token',
+        'source': {'type': 'user', 'userId': 'user_123'},
+        'message': {'id': '1', 'type': 'text', 'text': 'hello'}
+    })
+
+
+def make_redis_manager(existing_keys):
+    """Mock Redis manager whose client implements SET NX over a set of keys"""
+    client = Mock()
+
+    def set_nx(key, value, nx=False, ex=None):
+        if key in existing_keys:
+            return None
+        existing_keys.add(key)
+        return True
+
+    client.set.side_effect = set_nx
+
+    manager = Mock()
+    manager.execute_with_fallback.side_effect = lambda op, fallback, name, use_retry=True: op(client)
+    return manager, client
+
+
+@pytest.mark.unit
+class TestWebhookEventDeduplicator:
+    """Test the bounded TTL set and Redis-backed claims"""
+
+    def test_first_claim_wins(self):
+        """Only the first claim of an event ID succeeds"""
+        dedup = WebhookEventDeduplicator()
+
+        assert dedup.claim('evt_1') is True
+        assert dedup.claim('evt_1') is False
+        assert dedup.claim('evt_2') is True
+
+        stats = dedup.get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 2
+        assert stats['size'] == 2
+
+    def test_claim_event_uses_webhook_event_id(self):
+        """Parsed SDK events are keyed on webhookEventId"""
+        dedup = WebhookEventDeduplicator()
+
+        assert dedup.claim_event(make_event('evt_1')) is True
+        assert dedup.claim_event(make_event('evt_1', is_redelivery=True)) is False
+
+        stats = dedup.get_stats()
+        assert stats['redeliveries'] == 1
+        assert stats['redelivery_hits'] == 1
+
+    def test_events_without_id_are_processed(self):
+        """Events lacking a webhookEventId are never suppressed"""
+        dedup = WebhookEventDeduplicator()
+        event = Mock(spec=[])
+
+        assert dedup.claim_event(event) is True
+        assert dedup.claim_event(event) is True
+        assert dedup.get_stats()['untracked'] == 2
+
+    def test_ttl_expiry(self):
+        """IDs are forgotten once their TTL elapses"""
+        dedup = WebhookEventDeduplicator(ttl_seconds=10)
+
+        with patch('src.utils.event_deduplicator.time.monotonic', return_value=100.0):
+            assert dedup.claim('evt_1') is True
+        with patch('src.utils.event_deduplicator.time.monotonic', return_value=105.0):
+            assert dedup.claim('evt_1') is False
+        with patch('src.utils.event_deduplicator.time.monotonic', return_value=111.0):
+            assert dedup.claim('evt_1') is True
+
+    def test_bounded_size(self):
+        """The oldest IDs are evicted beyond max_entries"""
+        dedup = WebhookEventDeduplicator(max_entries=2)
+
+        for event_id in ('a', 'b', 'c'):
+            dedup.claim(event_id)
+
+        stats = dedup.get_stats()
+        assert stats['size'] == 2
+        assert stats['evictions'] == 1
+        assert dedup.claim('a') is True
+        assert dedup.claim('c') is False
+
+    def test_redis_detects_cross_worker_duplicates(self):
+        """A claim made by another worker is seen through Redis SET NX"""
+        shared_keys = set()
+        manager_a, _ = make_redis_manager(shared_keys)
+        manager_b, client_b = make_redis_manager(shared_keys)
+
+        worker_a = WebhookEventDeduplicator(redis_manager=manager_a, ttl_seconds=60)
+        worker_b = WebhookEventDeduplicator(redis_manager=manager_b, ttl_seconds=60)
+
+        assert worker_a.claim('evt_1') is True
+        assert worker_b.claim('evt_1') is False
+        client_b.set.assert_called_once_with('line_webhook_event:evt_1', 1, nx=True, ex=60)
+        assert worker_b.get_stats()['redis_hits'] == 1
+
+    def test_local_hit_skips_redis(self):
+        """Duplicates already known locally cost no Redis round trip"""
+        manager, client = make_redis_manager(set())
+        dedup = WebhookEventDeduplicator(redis_manager=manager)
+
+        dedup.claim('evt_1')
+        dedup.claim('evt_1')
+
+        assert client.set.call_count == 1
+
+    def test_redis_unavailable_falls_back_to_local(self):
+        """When Redis is down the local set still deduplicates"""
+        manager = Mock()
+        manager.execute_with_fallback.side_effect = lambda op, fallback, name, use_retry=True: fallback()
+        dedup = WebhookEventDeduplicator(redis_manager=manager)
+
+        assert dedup.claim('evt_1') is True
+        assert dedup.claim('evt_1') is False
+        assert dedup.get_stats()['redis_fallbacks'] == 1
+
+    def test_concurrent_claims(self):
+        """Exactly one of many concurrent claims for the same ID succeeds"""
+        dedup = WebhookEventDeduplicator()
+        results = []
+        barrier = threading.Barrier(10)
+
+        def claim():
+            barrier.wait()
+            results.append(dedup.claim('evt_1'))
+
+        threads = [threading.Thread(target=claim) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results.count(True) == 1
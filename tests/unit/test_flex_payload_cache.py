@@ -0,0 +1,75 @@
+"""
+Unit tests for the pre-rendered Flex Message payload cache
+"""
+import json
+from unittest.mock import Mock
+
+import pytest
+from linebot.models import BubbleContainer, FlexSendMessage
+
+from src.services.rich_message_service import RichMessageService
+from src.utils.flex_payload_cache import FlexPayloadCache, PrerenderedFlexMessage
+
+
+@pytest.mark.unit
+class TestFlexPayloadCache:
+    """Test that rendered payloads match built messages and are served from the cache"""
+
+    @pytest.fixture
+    def service(self):
+        service = RichMessageService(line_bot_api=Mock(), enable_redis=False, base_url="https://bot.example.com")
+        service.flex_payload_cache = FlexPayloadCache()
+        service.flex_payload_cache.templates.clear()
+        return service
+
+    def test_rendered_payload_matches_built_message(self, service):
+        """Splicing the content ID gives the JSON create_flex_message would send"""
+        kwargs = dict(title="Morning", content="สวัสดี \"quoted\" text", image_path="/bg/coffee.png",
+                      theme="productivity")
+
+        built = service.create_flex_message(content_id="c-1", **kwargs)
+        rendered = service.render_flex_message(content_id="c-1", **kwargs)
+
+        assert isinstance(rendered, PrerenderedFlexMessage)
+        assert rendered.as_json_dict() == built.as_json_dict()
+        assert service.get_button_context("c-1")['theme'] == "productivity"
+
+    def test_content_compiles_once_and_renders_per_content_id(self, service):
+        """Later sends of the same content only splice in their content ID"""
+        first = service.render_flex_message(title="T", content="C", content_id="c-1")
+        second = service.render_flex_message(title="T", content="C", content_id="c-2")
+
+        stats = service.flex_payload_cache.get_statistics()
+        assert stats['compiles'] == 1
+        assert b'c-2' in second.payload and b'c-1' not in second.payload
+        assert first.payload.replace(b'c-1', b'c-2') == second.payload
+        postback = json.loads(second.as_json_dict()['contents']['body']['contents'][4]['contents'][0]['action']['data'])
+        assert postback['content_id'] == "c-2"
+
+    def test_unsafe_content_id_is_built_normally(self, service):
+        """A content ID that would need escaping bypasses the cache"""
+        message = service.render_flex_message(title="T", content="C", content_id='id "with" quotes')
+
+        assert not isinstance(message, PrerenderedFlexMessage)
+        assert service.flex_payload_cache.get_statistics()['compiles'] == 0
+
+    def test_prerendered_message_still_exposes_contents(self, service):
+        """Callers inspecting the message get the decoded bubble"""
+        message = service.render_flex_message(title="T", content="C", include_interactions=False,
+                                              image_url="https://example.com/a.png")
+
+        assert isinstance(message, FlexSendMessage)
+        assert isinstance(message.contents, BubbleContainer)
+        assert message.contents.hero.url == "https://example.com/a.png"
+
+    def test_least_recently_used_template_is_evicted(self):
+        """The cache keeps at most its configured number of templates"""
+        cache = FlexPayloadCache(max_templates=2)
+        cache.templates.clear()
+        cache.templates.max_size = 2
+        build = lambda: (FlexSendMessage(alt_text="a", contents=BubbleContainer()), None)
+
+        for key in ("a", "b", "a", "c"):
+            cache.get_or_compile(key, build)
+
+        assert set(cache.templates.keys()) == {"a", "c"}
@@ -67,17 +67,30 @@ class TestLineService:
     def test_handle_webhook_success(self, line_service):
         """Test successful webhook handling"""
         signature = "valid_signature"
-        body = "webhook_body"
+        body = b'{"events": [{"type": "postback", "replyToken": "r", "postback": {"data": "x"}}]}'
         
-        # Mock signature verification and handler
+        # Mock signature verification and event dispatch
         line_service._verify_signature = Mock(return_value=True)
-        line_service.handler.handle = Mock()
+        line_service.dispatch_event = Mock()
         
         result = line_service.handle_webhook(signature, body)
         
         assert result['success'] is True
         line_service._verify_signature.assert_called_once_with(signature, body)
-        line_service.handler.handle.assert_called_once_with(body, signature)
+        line_service.dispatch_event.assert_called_once()
+        assert isinstance(line_service.dispatch_event.call_args[0][0], PostbackEvent)
+    
+    def test_verify_signature_raw_bytes(self, line_service):
+        """Test signature verification over the raw (non-ASCII) request bytes"""
+        body = '{"events": [{"message": {"text": "สวัสดี"}}]}'.encode('utf-8')
+        secret = line_service.settings.LINE_CHANNEL_SECRET
+        signature = base64.b64encode(
+            hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest()
+        ).decode('utf-8')
+        
+        assert line_service._verify_signature(signature, body) is True
+        assert line_service._verify_signature(signature, body.decode('utf-8')) is True
+        assert line_service._verify_signature(signature, body + b' ') is False
     
     def test_handle_webhook_invalid_signature(self, line_service):
         """Test webhook handling with invalid signature"""
@@ -100,7 +113,8 @@ class TestLineService:
         
         # Mock signature verification to pass but handler to raise exception
         line_service._verify_signature = Mock(return_value=True)
-        line_service.handler.handle = Mock(side_effect=Exception("Handler error"))
+        line_service._parse_events = Mock(return_value=[Mock()])
+        line_service.dispatch_event = Mock(side_effect=Exception("Handler error"))
         
         result = line_service.handle_webhook(signature, body)
         
@@ -134,6 +148,37 @@ class TestLineService:
             mock_ai_response['message']
         )
     
+    def test_handle_text_message_streaming(self, line_service, sample_line_message_event):
+        """With streaming replies enabled the first sentence is replied before the stream ends"""
+        line_service.streaming_replies_enabled = True
+        line_service.line_bot_api = Mock()
+        replied_during_stream = []
+        
+        def streamed_response(user_id, user_message, use_streaming, chunk_callback):
+            chunk_callback("Hello! I can certainly help you with that question. ")
+            replied_during_stream.append(line_service.line_bot_api.reply_message.called)
+            chunk_callback("Here are the details.")
+            return {
+                'success': True,
+                'message': 'Hello! I can certainly help you with that question. Here are the details.',
+                'tokens_used': 30
+            }
+        
+        line_service.openai_service.get_response = Mock(side_effect=streamed_response)
+        
+        line_service._handle_text_message(sample_line_message_event)
+        
+        assert replied_during_stream == [True]
+        reply_args = line_service.line_bot_api.reply_message.call_args.args
+        assert reply_args[0] == sample_line_message_event.reply_token
+        assert reply_args[1][0].text == "Hello! I can certainly help you with that question."
+        push_args = line_service.line_bot_api.push_message.call_args.args
+        assert push_args[1][0].text == "Here are the details."
+        
+        metrics = line_service.get_connection_metrics()['streaming_delivery']
+        assert metrics['streamed_responses'] == 1
+        assert metrics['avg_messages_per_response'] == 2
+    
     def test_handle_text_message_ai_failure(self, line_service, sample_line_message_event):
         """Test text message handling when AI service fails"""
         # Mock OpenAI service failure
@@ -492,3 +537,93 @@ class TestLineService:
             calls = mock_handler_instance.add.call_args_list
             postback_calls = [call for call in calls if len(call[0]) > 0 and 'PostbackEvent' in str(call[0][0])]
             assert len(postback_calls) >= 1
+    
+    def _signed(self, line_service, payload):
+        """Build a webhook body and a valid signature for it"""
+        body = json.dumps(payload)
+        secret = line_service.settings.LINE_CHANNEL_SECRET
+        signature = base64.b64encode(
+            hmac.new(secret.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).digest()
+        ).decode('utf-8')
+        return signature, body
+    
+    def test_parse_webhook_events(self, line_service):
+        """Test parsing webhook events without dispatching them"""
+        signature, body = self._signed(line_service, {
+            'destination': 'bot_id',
+            'events': [
+                {
+                    'type': 'message',
+                    'replyToken': 'reply_1',
+                    'timestamp': 1700000000000,
+                    'source': {'type': 'user', 'userId': 'user_1'},
+                    'message': {'id': 'm1', 'type': 'text', 'text': 'hi'}
+                },
+                {
+                    'type': 'postback',
+                    'replyToken': 'reply_2',
+                    'timestamp': 1700000000000,
+                    'source': {'type': 'user', 'userId': 'user_2'},
+                    'postback': {'data': 'action=like'}
+                }
+            ]
+        })
+        
+        events = line_service.parse_webhook_events(signature, body)
+        
+        assert len(events) == 2
+        assert events[0].message.text == 'hi'
+        assert events[1].postback.data == 'action=like'
+    
+    def test_parse_webhook_events_invalid_signature(self, line_service):
+        """Test that parsing rejects bodies with a bad signature"""
+        from src.exceptions import AuthenticationException
+        
+        with pytest.raises(AuthenticationException):
+            line_service.parse_webhook_events("invalid_signature", '{"events": []}')
+    
+    def test_dispatch_event_routes_to_handlers(self, line_service):
+        """Test that dispatch_event routes events by type"""
+        from linebot.models import MessageEvent, TextMessage, ImageMessage, FollowEvent
+        
+        line_service._handle_text_message = Mock()
+        line_service._handle_image_message = Mock()
+        line_service._handle_postback_event = Mock()
+        
+        text_event = MessageEvent(message=TextMessage(text='hi'))
+        image_event = MessageEvent(message=ImageMessage(id='1'))
+        postback_event = PostbackEvent()
+        
+        assert line_service.dispatch_event(text_event) is True
+        assert line_service.dispatch_event(image_event) is True
+        assert line_service.dispatch_event(postback_event) is True
+        assert line_service.dispatch_event(FollowEvent()) is False
+        
+        line_service._handle_text_message.assert_called_once_with(text_event)
+        line_service._handle_image_message.assert_called_once_with(image_event)
+        line_service._handle_postback_event.assert_called_once_with(postback_event)
+    
+    def test_dispatch_event_skips_duplicate_events(self, line_service):
+        """Test that redelivered events are not processed twice"""
+        from linebot.models import MessageEvent
+        
+        line_service._handle_text_message = Mock()
+        event_data = {
+            'type': 'message',
+            'webhookEventId': '01HDUPLICATE',
+            'deliveryContext': {'isRedelivery': False},
+            'replyToken': 'reply_token',
+            'source': {'type': 'user', 'userId': 'user_1'},
+            'message': {'id': '1', 'type': 'text', 'text': 'hi'}
+        }
+        first = MessageEvent.new_from_json_dict(event_data)
+        event_data['deliveryContext'] = {'isRedelivery': True}
+        redelivered = MessageEvent.new_from_json_dict(event_data)
+        
+        assert line_service.dispatch_event(first) is True
+        assert line_service.dispatch_event(redelivered) is False
+        
+        line_service._handle_text_message.assert_called_once_with(first)
+        dedup_stats = line_service.get_connection_metrics()['event_deduplication']
+        assert dedup_stats['hits'] == 1
+        assert dedup_stats['redelivery_hits'] == 1
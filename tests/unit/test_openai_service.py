@@ -4,6 +4,16 @@ Unit tests for OpenAI service
 import pytest
 from unittest.mock import Mock, patch, call
 from src.services.openai_service import OpenAIService
+from src.exceptions import RateLimitException
+from src.utils.cache_manager import CacheManager
+
+
+def semantic_cache_manager():
+    """CacheManager with only the semantic cache, so no LRU cleanup threads are started"""
+    with patch.object(CacheManager, '_setup_default_caches'):
+        manager = CacheManager()
+    manager.enable_semantic_cache()
+    return manager
 
 
 @pytest.mark.unit
@@ -126,6 +136,203 @@ class TestOpenAIService:
         # System prompt + up to 500 recent messages + current message
         assert len(messages) <= 502
     
+    def test_chat_completions_context_within_budget(self, openai_service, sample_openai_response):
+        """Long histories are cut to the token budget and the new message is sent once"""
+        user_id = "test_user"
+        openai_service.context_builder.token_budget = 1500
+        for i in range(60):
+            openai_service.conversation_service.add_message(
+                user_id, "user" if i % 2 == 0 else "assistant", f"Message {i} " + "detail " * 40
+            )
+        
+        openai_service.responses_api_available = False
+        openai_service.fallback_client.chat.completions.create.return_value = sample_openai_response
+        
+        result = openai_service.get_response(user_id, "Latest question", use_streaming=False)
+        
+        assert result['success'] is True
+        messages = openai_service.fallback_client.chat.completions.create.call_args[1]['messages']
+        assert [m['content'] for m in messages].count("Latest question") == 1
+        assert messages[1]['content'].startswith("Summary of the earlier conversation")
+        
+        metrics = openai_service.get_connection_metrics()['context_window']
+        assert metrics['prompt_tokens_saved'] > 0
+        assert metrics['summary_updates'] == 1
+        assert openai_service.conversation_service.get_context_state(user_id)['summary'] is not None
+    
+    def test_estimate_prompt_tokens_uses_running_total(self, openai_service):
+        """Prompt size is estimated from stored counters without re-tokenizing history"""
+        user_id = "test_user"
+        empty_estimate = openai_service.estimate_prompt_tokens(user_id, "Hi")
+        for i in range(10):
+            openai_service.conversation_service.add_message(user_id, "user", f"Message {i} " + "detail " * 20)
+        
+        with patch('src.utils.token_counter.count_tokens') as count_stored:
+            estimate = openai_service.estimate_prompt_tokens(user_id, "Hi")
+        
+        count_stored.assert_not_called()
+        stored = openai_service.conversation_service.get_token_usage(user_id)['stored_tokens']
+        assert estimate == empty_estimate + stored
+    
+    def test_oversized_message_rejected(self, openai_service):
+        """Messages over the token limit never reach the API"""
+        openai_service.max_user_message_tokens = 10
+        
+        result = openai_service.get_response("test_user", "word " * 100, use_streaming=False)
+        
+        assert result['success'] is False
+        openai_service.client.responses.create.assert_not_called()
+        openai_service.fallback_client.chat.completions.create.assert_not_called()
+        assert openai_service.context_metrics['oversized_rejected'] == 1
+    
+    def test_semantic_cache_shared_across_users(self, openai_service, sample_openai_response):
+        """A stateless answer generated for one user is served to another without an API call"""
+        openai_service.cache_manager = semantic_cache_manager()
+        openai_service.semantic_cache_enabled = True
+        openai_service.responses_api_available = False
+        openai_service.fallback_client.chat.completions.create.return_value = sample_openai_response
+        openai_service.conversation_service.add_message("user_a", "user", "My name is Somchai")
+        
+        first = openai_service.get_response("user_a", "What can you do?", use_streaming=False)
+        second = openai_service.get_response("user_b", "what can you do", use_streaming=True)
+        
+        assert first['success'] is True and second['success'] is True
+        assert second['cache_type'] == 'semantic'
+        assert second['message'] == first['message']
+        assert openai_service.fallback_client.chat.completions.create.call_count == 1
+        # The shared answer was generated without user_a's history
+        sent = openai_service.fallback_client.chat.completions.create.call_args.kwargs['messages']
+        assert [message['role'] for message in sent] == ['system', 'user']
+        assert "Somchai" not in str(sent)
+        # The served exchange is still part of user_b's history
+        assert len(openai_service.conversation_service.get_conversation_history("user_b")) == 2
+    
+    def test_personal_message_not_shared(self, openai_service, sample_openai_response):
+        """Messages with personal details use the user's context and never reach the semantic cache"""
+        openai_service.cache_manager = semantic_cache_manager()
+        openai_service.semantic_cache_enabled = True
+        openai_service.responses_api_available = False
+        openai_service.fallback_client.chat.completions.create.return_value = sample_openai_response
+        
+        openai_service.get_response("user_a", "thanks my order is 12345", use_streaming=False)
+        result = openai_service.get_response("user_b", "thanks my order is 12346", use_streaming=False)
+        
+        assert result.get('cache_type') != 'semantic'
+        assert openai_service.fallback_client.chat.completions.create.call_count == 2
+        assert openai_service.cache_manager.get_all_stats()['openai_semantic']['sets'] == 0
+    
+    def test_response_cache_keyed_on_context_before_turn(self, openai_service, sample_openai_response):
+        """The context digest is read once and used for both cache lookup and store"""
+        openai_service.enable_caching = True
+        openai_service.responses_api_available = False
+        openai_service.fallback_client.chat.completions.create.return_value = sample_openai_response
+        openai_service.conversation_service.add_message("test_user", "user", "Earlier question")
+        digest_before = openai_service.conversation_service.get_context_digest("test_user")
+        openai_service.cache_manager = Mock()
+        openai_service.cache_manager.get_cached_openai_response.return_value = None
+        
+        with patch.object(openai_service.conversation_service, 'get_context_digest',
+                          wraps=openai_service.conversation_service.get_context_digest) as get_digest:
+            result = openai_service.get_response("test_user", "Hello", use_streaming=False)
+        
+        assert result['success'] is True
+        get_digest.assert_called_once_with("test_user")
+        lookup = openai_service.cache_manager.get_cached_openai_response.call_args
+        store = openai_service.cache_manager.cache_openai_response.call_args
+        assert lookup.kwargs['context_hash'] == digest_before
+        assert store.kwargs['context_hash'] == digest_before
+    
+    def test_identical_concurrent_prompts_share_one_call(self, openai_service, sample_openai_response):
+        """Concurrent identical shared prompts from different users make one API call"""
+        import threading
+        import time
+        openai_service.responses_api_available = False
+        openai_service.enable_caching = False
+        openai_service.conversation_service.add_message("user_b", "user", "Different history")
+        
+        def slow_create(**kwargs):
+            time.sleep(0.3)
+            return sample_openai_response
+        openai_service.fallback_client.chat.completions.create.side_effect = slow_create
+        
+        results = {}
+        def ask(user_id):
+            results[user_id] = openai_service.get_response(
+                user_id, "Tell me about Thai street food", use_streaming=False, shared_prompt=True
+            )
+        threads = [threading.Thread(target=ask, args=(user_id,)) for user_id in ("user_a", "user_b")]
+        threads[0].start()
+        time.sleep(0.1)
+        threads[1].start()
+        for thread in threads:
+            thread.join(5)
+        
+        assert openai_service.fallback_client.chat.completions.create.call_count == 1
+        assert results["user_a"]['message'] == results["user_b"]['message']
+        assert results["user_b"]['coalesced'] is True
+        assert openai_service.single_flight.get_stats()['max_fan_in'] == 2
+        # The follower's exchange is recorded in its own history
+        history = openai_service.conversation_service.get_conversation_history("user_b")
+        assert [m['role'] for m in history] == ["user", "user", "assistant"]
+    
+    def test_different_contexts_are_not_coalesced(self, openai_service):
+        """Without shared_prompt, the conversation context is part of the coalescing key"""
+        openai_service.conversation_service.add_message("user_b", "user", "Different history")
+        
+        key_a = openai_service._coalescing_key("user_a", "Hello", shared_prompt=False)
+        key_b = openai_service._coalescing_key("user_b", "Hello", shared_prompt=False)
+        
+        assert key_a != key_b
+        assert openai_service._coalescing_key("user_c", "Hello", shared_prompt=False) == key_a
+        assert openai_service._coalescing_key("user_b", "Hello", shared_prompt=True) == \
+            openai_service._coalescing_key("user_a", "Hello", shared_prompt=True)
+    
+    def test_stateless_and_output_limit_are_part_of_the_coalescing_key(self, openai_service):
+        """Requests differing only in statelessness or output token limit are not coalesced"""
+        key = openai_service._coalescing_key("user_a", "Hello", shared_prompt=True)
+        
+        assert openai_service._coalescing_key("user_a", "Hello", shared_prompt=True, stateless=True) != key
+        assert openai_service._coalescing_key("user_a", "Hello", shared_prompt=True, max_output_tokens=50) != key
+    
+    def test_stateless_coalesced_answer_keeps_the_follower_response_id(self, openai_service):
+        """A follower of a stateless leader does not continue the leader's server-side response"""
+        openai_service.conversation_service.set_last_response_id("user_b", "resp_own")
+        leader_response = {'success': True, 'message': "Hi", 'response_id': "resp_leader"}
+        
+        openai_service._record_coalesced_exchange("user_b", "Hello", leader_response, stateless=True)
+        
+        assert openai_service.conversation_service.get_last_response_id("user_b") == "resp_own"
+        openai_service._record_coalesced_exchange("user_b", "Hello", leader_response)
+        assert openai_service.conversation_service.get_last_response_id("user_b") == "resp_leader"
+    
+    def test_throttled_request_is_not_blind_retried(self, openai_service):
+        """A 429 pauses the rate governor and is not retried or sent to the other API"""
+        openai_service.responses_api_available = False
+        openai_service.enable_caching = False
+        throttled = Exception("Rate limit reached")
+        throttled.status_code = 429
+        throttled.response = Mock(headers={'retry-after': '5'})
+        openai_service.fallback_client.chat.completions.create.side_effect = throttled
+        
+        result = openai_service.get_response("test_user", "Hello", use_streaming=False)
+        
+        assert result['success'] is False
+        assert openai_service.fallback_client.chat.completions.create.call_count == 1
+        stats = openai_service.get_connection_metrics()['rate_governor']
+        assert stats['throttled_responses'] == 1
+        assert 4 < stats['paused_for'] <= 5
+    
+    def test_throttled_retry_after_defaults_without_header(self, openai_service):
+        """A 429 without a retry-after header asks callers to wait 60 seconds"""
+        throttled = Exception("Rate limit reached")
+        throttled.status_code = 429
+        throttled.response = Mock(headers={})
+        
+        with pytest.raises(RateLimitException) as exc_info:
+            openai_service._governed_create(Mock(side_effect=throttled), 100)
+        
+        assert exc_info.value.retry_after == 60
+    
     def test_get_response_api_error(self, openai_service):
         """Test handling of OpenAI API errors"""
         user_id = "test_user"
@@ -617,6 +824,51 @@ class TestOpenAIService:
         # Verify response ID was stored
         assert openai_service.conversation_service.get_last_response_id(user_id) == 'resp_stream_123'
     
+    def test_streaming_forwards_deltas_to_chunk_callback(self, openai_service, sample_responses_api_streaming_events):
+        """Streamed text deltas reach the chunk callback as they arrive"""
+        openai_service.responses_api_available = True
+        openai_service.client.responses.create.return_value = iter(sample_responses_api_streaming_events)
+        chunks = []
+        
+        result = openai_service.get_response("test_user", "Hello", use_streaming=True, chunk_callback=chunks.append)
+        
+        assert result['success'] is True
+        assert len(chunks) > 1
+        assert "".join(chunks).strip() == result['message']
+    
+    def test_interrupted_stream_is_not_restarted(self, openai_service, sample_responses_api_streaming_events,
+                                                 sample_openai_streaming_response):
+        """After a delta has been emitted, a mid-stream error is neither retried nor sent to the fallback API"""
+        def broken_stream():
+            yield from sample_responses_api_streaming_events[:2]
+            raise Exception("Connection reset mid-stream")
+        
+        openai_service.responses_api_available = True
+        openai_service.client.responses.create.side_effect = lambda **kwargs: broken_stream()
+        openai_service.fallback_client.chat.completions.create.return_value = iter(sample_openai_streaming_response)
+        chunks = []
+        
+        with patch('src.utils.connection_pool.time.sleep'):
+            result = openai_service.get_response("test_user", "Hello", use_streaming=True, chunk_callback=chunks.append)
+        
+        assert result['success'] is False
+        assert chunks == ["Hello! "]
+        assert openai_service.client.responses.create.call_count == 1
+        openai_service.fallback_client.chat.completions.create.assert_not_called()
+    
+    def test_chunk_callback_errors_do_not_break_stream(self, openai_service, sample_openai_streaming_response):
+        """A failing chunk callback does not abort the completion"""
+        openai_service.responses_api_available = False
+        openai_service.fallback_client.chat.completions.create.return_value = iter(sample_openai_streaming_response)
+        
+        result = openai_service.get_response(
+            "test_user", "Hello", use_streaming=True,
+            chunk_callback=Mock(side_effect=RuntimeError("send failed"))
+        )
+        
+        assert result['success'] is True
+        assert result['message'] == "Hello! How can I help you today?"
+    
     def test_responses_api_streaming_with_image(self, openai_service, sample_responses_api_streaming_events):
         """Test streaming response with image using Responses API"""
         user_id = "test_user"
@@ -862,7 +1114,26 @@ class TestOpenAIService:
             mock_processor.download_image_from_line.assert_called_once_with(mock_line_bot_api, message_id)
             mock_processor.preprocess_image_if_needed.assert_called_once()
             mock_processor.image_to_base64.assert_called_once()
-    
+
+            # A redelivered message reuses the prepared payload without downloading again
+            openai_service.get_response_with_image(user_id, message_id, mock_line_bot_api, use_streaming=False)
+            mock_processor.download_image_from_line.assert_called_once()
+            mock_processor.image_to_base64.assert_called_once()
+            assert "data:image/jpeg;base64,mockdata" in str(openai_service.client.responses.create.call_args)
+
+    def test_identical_file_is_uploaded_once(self, openai_service):
+        """Resending the same file bytes reuses the earlier file ID"""
+        openai_service.client.files.create.return_value = Mock(id="file-abc")
+
+        first = openai_service._upload_file(b"%PDF-1.7 report", "report.pdf")
+        second = openai_service._upload_file(b"%PDF-1.7 report", "copy.pdf")
+
+        assert first == second == "file-abc"
+        openai_service.client.files.create.assert_called_once()
+        stats = openai_service.get_connection_metrics()['upload_cache']
+        assert stats['file_hits'] == 1
+        assert stats['upload_bytes_saved'] == len(b"%PDF-1.7 report")
+
     def test_responses_api_streaming_fallback_on_error(self, openai_service, sample_openai_streaming_response):
         """Test streaming falls back to Chat Completions on Responses API error"""
         user_id = "test_user"
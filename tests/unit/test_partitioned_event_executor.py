@@ -0,0 +1,142 @@
+"""
+Unit tests for the per-user ordered event executor
+"""
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from src.utils.partitioned_event_executor import PartitionedEventExecutor, get_partition_key
+
+
+def make_event(user_id, seq):
+    """Build a minimal event with a source user and a sequence number"""
+    event = Mock()
+    event.source.user_id = user_id
+    event.seq = seq
+    return event
+
+
+@pytest.mark.unit
+class TestPartitionedEventExecutor:
+    """Test partitioning, ordering and concurrency of batch execution"""
+
+    def test_partition_key_fallbacks(self):
+        """Group and room sources are used when no user ID is present"""
+        group_event = Mock()
+        group_event.source.user_id = None
+        group_event.source.group_id = 'group_1'
+
+        assert get_partition_key(make_event('user_1', 0)) == 'user_1'
+        assert get_partition_key(group_event) == 'group_1'
+        assert get_partition_key(Mock(spec=[])) == 'unknown'
+
+    def test_partition_preserves_order(self):
+        """Events are grouped per user in arrival order"""
+        executor = PartitionedEventExecutor(event_handler=Mock())
+        events = [make_event('a', 0), make_event('b', 1), make_event('a', 2)]
+
+        partitions = executor.partition(events)
+
+        assert [[e.seq for e in p] for p in partitions] == [[0, 2], [1]]
+
+    def test_same_user_events_stay_ordered(self):
+        """Events for one user are handled strictly in order"""
+        handled = {}
+        lock = threading.Lock()
+
+        def handler(event):
+            time.sleep(0.001)
+            with lock:
+                handled.setdefault(event.source.user_id, []).append(event.seq)
+
+        executor = PartitionedEventExecutor(event_handler=handler, max_concurrency=4)
+        events = [make_event(f'user_{i % 4}', i) for i in range(40)]
+
+        result = executor.execute_batch(events)
+
+        assert result['events'] == 40
+        assert result['partitions'] == 4
+        for user_id, seqs in handled.items():
+            assert seqs == sorted(seqs)
+
+    def test_different_users_run_concurrently(self):
+        """Partitions for different users overlap in time"""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def handler(event):
+            with lock:
+                active.append(event)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(event)
+
+        executor = PartitionedEventExecutor(event_handler=handler, max_concurrency=4)
+        executor.execute_batch([make_event(f'user_{i}', i) for i in range(4)])
+
+        assert max(peak) > 1
+
+    def test_unrelated_users_never_wait_for_each_other(self):
+        """Every partition key takes its own turns, dropped once no batch needs them"""
+        barrier = threading.Barrier(16, timeout=5)
+
+        def handler(event):
+            # Passes only if all sixteen users are in their handlers at once
+            barrier.wait()
+
+        executor = PartitionedEventExecutor(event_handler=handler, max_concurrency=16)
+        executor.execute_batch([make_event(f'user_{i}', i) for i in range(16)])
+
+        assert executor._partition_turns == {}
+
+    def test_same_user_batches_run_in_turn_order(self):
+        """A later batch of a user waits for the earlier one even if its thread starts first"""
+        handled = []
+        executor = PartitionedEventExecutor(event_handler=lambda event: handled.append(event.seq))
+        first = [make_event('a', 0), make_event('a', 1)]
+        second = [make_event('a', 2)]
+        first_turn = executor.reserve(first)
+        second_turn = executor.reserve(second)
+
+        late = threading.Thread(target=executor.run_partition, args=(second, second_turn))
+        late.start()
+        time.sleep(0.05)
+        assert handled == []
+
+        executor.run_partition(first, first_turn)
+        late.join(timeout=5)
+
+        assert handled == [0, 1, 2]
+        assert executor._partition_turns == {}
+
+    def test_failure_does_not_stop_other_events(self):
+        """A failing event is reported after every partition has run"""
+        handled = []
+
+        def handler(event):
+            if event.seq == 0:
+                raise ValueError("boom")
+            handled.append(event.seq)
+
+        executor = PartitionedEventExecutor(event_handler=handler, max_concurrency=2)
+
+        with pytest.raises(ValueError):
+            executor.execute_batch([make_event('a', 0), make_event('a', 1), make_event('b', 2)])
+
+        assert sorted(handled) == [1, 2]
+        assert executor.get_metrics()['stats']['events_failed'] == 1
+
+    def test_metrics(self):
+        """Per-partition latency and batch counters are recorded"""
+        executor = PartitionedEventExecutor(event_handler=Mock(), max_concurrency=2)
+        executor.execute_batch([make_event('a', 0), make_event('b', 1)])
+
+        metrics = executor.get_metrics()
+        assert metrics['stats']['batches_executed'] == 1
+        assert metrics['stats']['partitions_executed'] == 2
+        assert metrics['avg_partitions_per_batch'] == 2
+        assert metrics['partition_latency']['max_ms'] >= metrics['partition_latency']['p50_ms']
@@ -0,0 +1,179 @@
+"""
+Unit tests for the adaptive Azure OpenAI rate governor
+"""
+import threading
+import time
+
+import pytest
+
+from src.exceptions import RateLimitException
+from src.utils.rate_governor import (
+    RateLimitGovernor, RequestPriority, TokenBucket, current_priority, parse_retry_after, request_priority
+)
+
+
+@pytest.mark.unit
+class TestTokenBucket:
+    """Test bucket pacing"""
+
+    def test_wait_time_after_burst(self):
+        """Once the burst is spent, requests are paced at the effective rate"""
+        bucket = TokenBucket(per_minute=600, burst_seconds=1)  # 10/s, capacity 10
+        for _ in range(10):
+            assert bucket.wait_time(1) == 0
+            bucket.take(1)
+
+        assert bucket.wait_time(1) == pytest.approx(0.1, abs=0.01)
+
+    def test_oversized_cost_goes_into_debt(self):
+        """A cost above capacity is admitted when full instead of waiting forever"""
+        bucket = TokenBucket(per_minute=60, burst_seconds=10)  # capacity 10
+        assert bucket.wait_time(50) == 0
+        bucket.take(50)
+
+        assert bucket.level == -40
+        assert bucket.wait_time(1) > 0
+
+    def test_disabled_bucket_never_waits(self):
+        """A zero limit disables the bucket"""
+        bucket = TokenBucket(per_minute=0)
+        bucket.take(1000)
+
+        assert bucket.wait_time(1000) == 0
+
+
+@pytest.mark.unit
+class TestRetryAfter:
+    """Test retry-after header parsing"""
+
+    def test_parse_retry_after_variants(self):
+        """Milliseconds take precedence over seconds; missing headers yield None"""
+        assert parse_retry_after({'retry-after-ms': '1500', 'retry-after': '9'}) == 1.5
+        assert parse_retry_after({'retry-after': '3'}) == 3.0
+        assert parse_retry_after({}) is None
+        assert parse_retry_after({'retry-after': 'not-a-date'}) is None
+
+
+@pytest.mark.unit
+class TestRateLimitGovernor:
+    """Test admission, prioritization and adaptation"""
+
+    def test_priority_context(self):
+        """request_priority sets the priority for enclosed calls only"""
+        assert current_priority() == RequestPriority.INTERACTIVE
+        with request_priority("batch"):
+            assert current_priority() == RequestPriority.BATCH
+        assert current_priority() == RequestPriority.INTERACTIVE
+
+    def test_interactive_admitted_before_earlier_batch(self):
+        """An interactive request overtakes batch requests queued before it"""
+        governor = RateLimitGovernor(requests_per_minute=600, max_wait=5)
+        governor.requests.level = 0
+        order = []
+
+        def request(name, priority):
+            with governor.acquire(priority=priority):
+                order.append(name)
+
+        batch = threading.Thread(target=request, args=("batch", RequestPriority.BATCH))
+        batch.start()
+        time.sleep(0.02)
+        interactive = threading.Thread(target=request, args=("interactive", RequestPriority.INTERACTIVE))
+        interactive.start()
+        batch.join(5)
+        interactive.join(5)
+
+        assert order == ["interactive", "batch"]
+        stats = governor.get_stats()
+        assert stats['queue_wait']['interactive']['admitted'] == 1
+        assert stats['queue_wait']['batch']['max_wait'] > 0
+
+    def test_queue_timeout_raises_rate_limit_exception(self):
+        """Callers give up after max_wait instead of queueing indefinitely"""
+        governor = RateLimitGovernor(requests_per_minute=6, max_wait=0.05)
+        governor.requests.level = 0
+
+        with pytest.raises(RateLimitException):
+            with governor.acquire():
+                pass
+        assert governor.get_stats()['queue_timeouts'] == 1
+
+    def test_headers_set_limits_and_clamp(self):
+        """Limits are learned from headers and buckets never exceed the reported remaining"""
+        governor = RateLimitGovernor()
+        governor.observe_headers({
+            'x-ratelimit-limit-requests': '120',
+            'x-ratelimit-remaining-requests': '2',
+            'x-ratelimit-limit-tokens': '60000',
+            'x-ratelimit-remaining-tokens': '500'
+        })
+
+        stats = governor.get_stats()
+        assert stats['requests_per_minute']['limit'] == 120
+        assert stats['requests_per_minute']['available'] == pytest.approx(2, abs=0.1)
+        assert stats['tokens_per_minute']['available'] == pytest.approx(500, abs=5)
+
+    def test_429_pauses_and_decreases_once(self):
+        """A 429 pauses admissions; repeated 429s in one pause cut the rate once"""
+        governor = RateLimitGovernor(requests_per_minute=600, tokens_per_minute=60000)
+        governor.observe_headers({'retry-after': '2'}, status_code=429)
+        governor.observe_headers({'retry-after': '1'}, status_code=429)
+
+        stats = governor.get_stats()
+        assert stats['throttled_responses'] == 2
+        assert stats['rate_decreases'] == 1
+        assert stats['requests_per_minute']['effective'] == 300
+        assert stats['tokens_per_minute']['effective'] == 30000
+        assert 1.5 < stats['paused_for'] <= 2
+        assert governor._admission_delay(0, time.monotonic()) > 1.5
+
+    def test_raised_429_feeds_governor(self):
+        """A 429 raised inside acquire() pauses the governor before propagating"""
+        governor = RateLimitGovernor()
+        error = Exception("Too Many Requests")
+        error.status_code = 429
+        error.response = type("Response", (), {"headers": {'retry-after-ms': '800'}})()
+
+        with pytest.raises(Exception):
+            with governor.acquire():
+                raise error
+
+        assert 0.5 < governor.retry_after_remaining() <= 0.8
+
+    @pytest.mark.asyncio
+    async def test_async_acquire_admits_and_feeds_429(self):
+        """acquire_async admits like acquire() and pauses the governor on a raised 429"""
+        governor = RateLimitGovernor(requests_per_minute=600)
+        error = Exception("Too Many Requests")
+        error.status_code = 429
+        error.response = type("Response", (), {"headers": {'retry-after-ms': '800'}})()
+
+        with pytest.raises(Exception):
+            async with governor.acquire_async(10):
+                raise error
+
+        assert governor.get_stats()['admitted'] == 1
+        assert 0.5 < governor.retry_after_remaining() <= 0.8
+
+    def test_successes_recover_rate(self):
+        """The effective rate recovers additively towards the limit on success"""
+        governor = RateLimitGovernor(requests_per_minute=100, recovery_step=0.1)
+        governor._on_throttled(0)
+        assert governor.requests.rate == 50
+
+        for _ in range(3):
+            governor.observe_headers({}, status_code=200)
+        assert governor.requests.rate == pytest.approx(80)
+
+        for _ in range(5):
+            governor.observe_headers({}, status_code=200)
+        assert governor.requests.rate == 100
+
+    def test_settle_returns_unused_tokens(self):
+        """Overestimated tokens are credited back once usage is known"""
+        governor = RateLimitGovernor(tokens_per_minute=6000)  # capacity 1000
+        with governor.acquire(estimated_tokens=900) as permit:
+            pass
+        permit.settle(100)
+
+        assert governor.tokens.level == pytest.approx(900, abs=5)
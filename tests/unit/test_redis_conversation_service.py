@@ -0,0 +1,128 @@
+"""
+Unit tests for the Redis conversation service
+"""
+import json
+import pytest
+from unittest.mock import patch
+from src.services.conversation_service import ConversationService
+from src.services.redis_conversation_service import RedisConversationService
+
+
+@pytest.fixture
+def redis_service(monkeypatch):
+    """RedisConversationService backed by fakeredis"""
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setenv("MAX_MESSAGES_PER_USER", "3")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    with patch('src.services.redis_conversation_service.redis.from_url', return_value=client):
+        service = RedisConversationService(redis_url="redis://fake")
+    return service
+
+
+@pytest.mark.unit
+class TestRedisConversationService:
+    """Test pipelined writes, bulk-decoded reads and statistics"""
+
+    def test_add_message_is_one_script_call(self, redis_service):
+        """add_message sends a single EVALSHA once the script is loaded"""
+        client = redis_service.redis_client
+        redis_service.add_message("user_0", "user", "Load the script")
+        with patch.object(client, 'execute_command', wraps=client.execute_command) as direct, \
+             patch.object(client, 'pipeline', wraps=client.pipeline) as pipeline:
+            redis_service.add_message("user_1", "user", "Hello")
+
+        assert [call.args[0] for call in direct.call_args_list] == ['EVALSHA']
+        assert pipeline.call_count == 0
+        assert redis_service.get_conversation_history("user_1")[0]["content"] == "Hello"
+
+    def test_trim_counts_legacy_entries_without_tokens(self, redis_service):
+        """Dropped entries stored without a token count are counted in Python"""
+        conv_key = redis_service._get_conversation_key("user_1")
+        legacy = {"role": "user", "content": "an old message without a count"}
+        redis_service.redis_client.rpush(conv_key, json.dumps(legacy))
+        redis_service.redis_client.hset(redis_service._get_metadata_key("user_1"), "token_total",
+                                        RedisConversationService._stored_tokens(json.dumps(legacy)))
+        for i in range(3):
+            redis_service.add_message("user_1", "user", f"message number {i}")
+
+        history = redis_service.get_conversation_history("user_1")
+        usage = redis_service.get_token_usage("user_1")
+        assert [msg["content"] for msg in history] == [f"message number {i}" for i in range(3)]
+        assert usage["stored_tokens"] == sum(msg["tokens"] for msg in history)
+
+    def test_trim_keeps_counters_exact(self, redis_service):
+        """Trimmed messages leave the token total and keep the lifetime counters"""
+        for i in range(5):
+            redis_service.add_message("user_1", "user", f"message number {i}")
+
+        history = redis_service.get_conversation_history("user_1")
+        usage = redis_service.get_token_usage("user_1")
+        metadata = redis_service.redis_client.hgetall(redis_service._get_metadata_key("user_1"))
+
+        assert [msg["content"] for msg in history] == [f"message number {i}" for i in range(2, 5)]
+        assert usage["message_count"] == 3
+        assert usage["stored_tokens"] == sum(msg["tokens"] for msg in history)
+        assert usage["lifetime_tokens"] > usage["stored_tokens"]
+        assert int(metadata["total_messages"]) == 5
+        assert redis_service.redis_client.ttl(redis_service._get_conversation_key("user_1")) > 0
+
+    def test_history_limit_and_corrupt_entry(self, redis_service):
+        """Bulk decode honours limit and skips a corrupt entry instead of failing"""
+        redis_service.add_message("user_1", "user", "first")
+        redis_service.redis_client.rpush(redis_service._get_conversation_key("user_1"), "{not json")
+        redis_service.add_message("user_1", "assistant", "second")
+
+        history = redis_service.get_conversation_history("user_1")
+
+        assert [msg["content"] for msg in history] == ["first", "second"]
+        assert redis_service.get_conversation_history("user_1", limit=1)[0]["content"] == "second"
+
+    def test_context_digest_matches_in_memory_service(self, redis_service):
+        """The rolling digest is the same whichever service stored the messages"""
+        memory_service = ConversationService(enable_redis=False, enable_memory_monitoring=False)
+        for role, content in [("user", "Hi"), ("assistant", "Hello!"), ("user", "Bye")]:
+            redis_service.add_message("user_1", role, content)
+            memory_service.add_message("user_1", role, content)
+
+        assert redis_service.get_context_digest("user_1") == memory_service.get_context_digest("user_1")
+
+    def test_context_state_and_metadata(self, redis_service):
+        """Context state reports the absolute first index and the cached summary"""
+        for i in range(4):
+            redis_service.add_message("user_1", "user", f"message {i}")
+        redis_service.set_context_summary("user_1", {"text": "summary", "covers": 1})
+        redis_service.set_last_response_id("user_1", "resp_1")
+
+        state = redis_service.get_context_state("user_1")
+
+        assert state["first_index"] == 1
+        assert [msg["content"] for msg in state["messages"]] == ["message 1", "message 2", "message 3"]
+        assert state["summary"] == {"text": "summary", "covers": 1}
+        assert redis_service.get_last_response_id("user_1") == "resp_1"
+        assert json.loads(redis_service.redis_client.hget(
+            redis_service._get_metadata_key("user_1"), "context_summary"))["covers"] == 1
+
+    def test_stats_snapshot_and_paginated_listing(self, redis_service):
+        """Totals come from counters and listings page through SCAN, never KEYS"""
+        for i in range(12):
+            redis_service.add_message(f"user_{i}", "user", "Hello")
+        redis_service.add_message("user_0", "assistant", "Hi")
+        redis_service.clear_conversation("user_11")
+        client = redis_service.redis_client
+
+        with patch.object(client, 'keys', side_effect=AssertionError("KEYS used")):
+            snapshot = redis_service.get_stats_snapshot(max_age=0)
+            listed, cursor = [], 0
+            while True:
+                page = redis_service.list_conversations(cursor, count=5)
+                listed.extend(page["conversations"])
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+            all_conversations = redis_service.conversations
+
+        assert snapshot["total_users"] == 11
+        assert snapshot["total_messages"] == 13
+        assert snapshot["active_users_today"] == 12
+        assert sorted(conv["user_id"] for conv in listed) == sorted(f"user_{i}" for i in range(11))
+        assert all_conversations["user_0"]["message_count"] == 2
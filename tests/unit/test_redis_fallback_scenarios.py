@@ -162,7 +162,7 @@ class TestConversationServiceRedisFallback:
         
         mock_manager.execute_with_fallback.side_effect = [
             mock_conversation_data,  # Successful Redis read
-            True,  # Successful Redis write
+            True,  # Successful Redis append
         ]
         
         mock_get_manager.return_value = mock_manager
@@ -170,12 +170,13 @@ class TestConversationServiceRedisFallback:
         service = ConversationService(enable_redis=True)
         assert service._redis_available
         
-        # Add message - should use Redis
+        # Read from Redis, then add message - appended to Redis and the in-memory copy
+        service.get_conversation_history("user1")
         service.add_message("user1", "user", "New message")
         
         # Verify the conversation was loaded from Redis and updated
         conv = service.conversations["user1"]
-        assert len(conv["messages"]) >= 1
+        assert len(conv["messages"]) == 2
         
         # Verify Redis operations were called
         assert mock_manager.execute_with_fallback.call_count >= 1
@@ -0,0 +1,246 @@
+"""
+Unit tests for hedged requests, using stub attempts and stub clients with injected latency
+"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.exceptions import RateLimitException
+from src.utils.request_hedger import HEDGE, PRIMARY, HedgeCancelled, RequestHedger
+
+DEPLOYMENT = "gpt-4.1-nano"
+
+
+def slow_attempt(delay, result, first_token_delay=None, log=None):
+    """Attempt that claims after ``first_token_delay`` and returns after ``delay``"""
+    def attempt_fn(attempt):
+        time.sleep(first_token_delay if first_token_delay is not None else delay)
+        if attempt.cancelled or not attempt.claim():
+            if log is not None:
+                log.append(attempt.name)
+            raise HedgeCancelled()
+        time.sleep(max(0.0, delay - (first_token_delay or delay)))
+        return result
+    return attempt_fn
+
+
+def primed_hedger(latency=0.02, samples=20, **kwargs):
+    """Hedger with enough latency history to hedge"""
+    hedger = RequestHedger(min_samples=samples, **kwargs)
+    for _ in range(samples):
+        hedger.observe(DEPLOYMENT, latency)
+    return hedger
+
+
+@pytest.mark.unit
+class TestRequestHedger:
+    """Test hedge deadlines, races, budgets and metrics"""
+
+    def test_no_hedge_without_latency_history(self):
+        """Until min_samples latencies are known the primary runs alone"""
+        hedger = RequestHedger(min_samples=5, budget_percent=100)
+        hedge_calls = []
+
+        result, winner = hedger.run(DEPLOYMENT, slow_attempt(0.1, "primary"),
+                                    lambda attempt: hedge_calls.append(1))
+
+        assert (result, winner) == ("primary", PRIMARY)
+        assert hedge_calls == []
+        assert hedger.hedge_delay(DEPLOYMENT) is None
+
+    def test_hedge_delay_is_percentile_of_recent_latencies(self):
+        """The deadline follows the configured percentile of the window"""
+        hedger = RequestHedger(percentile=90, min_samples=10, min_delay=0.0)
+        for i in range(1, 11):
+            hedger.observe(DEPLOYMENT, i / 10)
+
+        assert hedger.hedge_delay(DEPLOYMENT) == pytest.approx(0.9)
+
+    def test_slow_primary_loses_to_hedge_and_is_cancelled(self):
+        """A primary past the deadline is hedged; the faster hedge wins and the primary backs off"""
+        hedger = primed_hedger(budget_percent=100)
+        cancelled = []
+
+        started = time.monotonic()
+        result, winner = hedger.run(
+            DEPLOYMENT,
+            slow_attempt(0.5, "primary", log=cancelled),
+            slow_attempt(0.02, "hedge")
+        )
+
+        assert (result, winner) == ("hedge", HEDGE)
+        assert time.monotonic() - started < 0.3
+        time.sleep(0.6)
+        assert cancelled == [PRIMARY]
+        stats = hedger.get_stats()['deployments'][DEPLOYMENT]
+        assert stats['hedged_requests'] == 1
+        assert stats['hedge_wins'] == 1
+        assert stats['hedge_rate'] == 1.0
+
+    def test_fast_primary_is_not_hedged(self):
+        """A primary that answers before the deadline never triggers a hedge"""
+        hedger = primed_hedger(latency=0.2, budget_percent=100)
+        hedge_calls = []
+
+        result, winner = hedger.run(DEPLOYMENT, slow_attempt(0.01, "primary"),
+                                    lambda attempt: hedge_calls.append(1))
+
+        assert winner == PRIMARY
+        assert hedge_calls == []
+        assert hedger.get_stats()['deployments'][DEPLOYMENT]['hedged_requests'] == 0
+
+    def test_primary_claiming_first_token_wins_over_later_hedge(self):
+        """Once the primary streams its first token, the hedge cannot win"""
+        hedger = primed_hedger(budget_percent=100)
+
+        result, winner = hedger.run(
+            DEPLOYMENT,
+            slow_attempt(0.3, "primary", first_token_delay=0.05),
+            slow_attempt(0.1, "hedge")
+        )
+
+        assert (result, winner) == ("primary", PRIMARY)
+        assert hedger.get_stats()['deployments'][DEPLOYMENT]['primary_wins_after_hedge'] == 1
+
+    def test_budget_caps_hedge_rate(self):
+        """With a 25% budget at most one in four slow requests is hedged"""
+        # A full window, so these requests barely move the percentile
+        hedger = primed_hedger(samples=200, budget_percent=25)
+
+        for _ in range(8):
+            hedger.run(DEPLOYMENT, slow_attempt(0.06, "primary"), slow_attempt(0.01, "hedge"))
+
+        stats = hedger.get_stats()['deployments'][DEPLOYMENT]
+        assert stats['hedged_requests'] == 2
+        assert stats['budget_exhausted'] == 6
+        assert stats['hedge_rate'] == 0.25
+
+    def test_primary_failure_falls_back(self):
+        """A failing primary hands over to the hedge path even without history"""
+        hedger = RequestHedger(min_samples=5)
+
+        def failing(attempt):
+            raise ConnectionError("primary down")
+
+        result, winner = hedger.run(DEPLOYMENT, failing, slow_attempt(0.01, "fallback"))
+
+        assert (result, winner) == ("fallback", HEDGE)
+        assert hedger.get_stats()['deployments'][DEPLOYMENT]['fallbacks'] == 1
+
+    def test_throttled_primary_is_not_duplicated(self):
+        """Rate limit errors propagate without a second request on the shared quota"""
+        hedger = RequestHedger(min_samples=5)
+        hedge_calls = []
+
+        def throttled(attempt):
+            raise RateLimitException("throttled", retry_after=1, service="Azure_OpenAI")
+
+        with pytest.raises(RateLimitException):
+            hedger.run(DEPLOYMENT, throttled, lambda attempt: hedge_calls.append(1))
+        assert hedge_calls == []
+
+
+def split_words(text):
+    """Stream deltas that join back into ``text``"""
+    words = text.split(" ")
+    return [words[0]] + [" " + word for word in words[1:]]
+
+
+class StubStream:
+    """Iterable stream that records whether it was closed"""
+
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def close(self):
+        self.closed = True
+
+
+class StubResponsesClient:
+    """Responses API client whose stream starts after an injected delay"""
+
+    def __init__(self, delay, text):
+        self.delay = delay
+        self.text = text
+        self.streams = []
+        self.responses = SimpleNamespace(create=self.create)
+
+    def create(self, **kwargs):
+        time.sleep(self.delay)
+        response = SimpleNamespace(id="resp_stub", usage=SimpleNamespace(total_tokens=12))
+        events = [SimpleNamespace(type='response.output_text.delta', delta=word, response=None)
+                  for word in split_words(self.text)]
+        events.append(SimpleNamespace(type='response.completed', delta=None, response=response))
+        stream = StubStream(events)
+        self.streams.append(stream)
+        return stream
+
+
+class StubChatClient:
+    """Chat Completions client whose stream starts after an injected delay"""
+
+    def __init__(self, delay, text):
+        self.delay = delay
+        self.text = text
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        time.sleep(self.delay)
+        return StubStream([
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))], usage=None)
+            for word in split_words(self.text)
+        ])
+
+
+@pytest.mark.unit
+class TestOpenAIServiceHedging:
+    """Test hedged get_response against stub clients"""
+
+    @pytest.fixture
+    def hedged_service(self, openai_service):
+        openai_service.hedging_enabled = True
+        openai_service.enable_caching = False
+        openai_service.responses_api_available = True
+        openai_service.api_check_timestamp = time.time()
+        openai_service.request_hedger = primed_hedger(latency=0.05, budget_percent=100)
+        return openai_service
+
+    def test_slow_primary_hedged_to_chat_completions(self, hedged_service):
+        """The Chat Completions hedge answers first; its text and only its text is recorded"""
+        primary = StubResponsesClient(delay=0.6, text="slow primary answer")
+        hedged_service.client = primary
+        hedged_service.fallback_client = StubChatClient(delay=0.01, text="fast hedge answer")
+        chunks = []
+
+        result = hedged_service.get_response("hedge_user", "Hello", use_streaming=True,
+                                             chunk_callback=chunks.append)
+
+        assert result['success'] is True
+        assert result['api_used'] == 'chat_completions'
+        assert result['message'] == "fast hedge answer"
+        assert "".join(chunks) == "fast hedge answer"
+        history = hedged_service.conversation_service.get_conversation_history("hedge_user")
+        assert [(m['role'], m['content']) for m in history] == [("user", "Hello"), ("assistant", "fast hedge answer")]
+
+        # The losing primary stream is closed as soon as it starts
+        time.sleep(0.8)
+        assert primary.streams and primary.streams[0].closed
+        stats = hedged_service.get_connection_metrics()['hedging']['deployments']["gpt-4.1-nano"]
+        assert stats['hedge_wins'] == 1
+
+    def test_fast_primary_keeps_response_chain(self, hedged_service):
+        """A primary that wins records its response ID for the next turn"""
+        hedged_service.client = StubResponsesClient(delay=0.0, text="primary answer")
+        hedged_service.fallback_client = StubChatClient(delay=0.0, text="unused")
+
+        result = hedged_service.get_response("hedge_user", "Hello", use_streaming=False)
+
+        assert result['api_used'] == 'responses'
+        assert result['message'] == "primary answer"
+        assert result['tokens_used'] == 12
+        assert hedged_service.conversation_service.get_last_response_id("hedge_user") == "resp_stub"
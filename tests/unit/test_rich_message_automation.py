@@ -12,7 +12,7 @@ with patch('celery.Celery'):
         coordinate_timezone_deliveries, execute_timezone_delivery,
         send_rich_message_to_user_batch, process_delivery_retries,
         retry_failed_delivery, update_user_timezone_from_activity,
-        cleanup_timezone_data, health_check_task
+        cleanup_timezone_data, health_check_task, _generate_delivery_contents
     )
 
 
@@ -31,21 +31,16 @@ class TestRichMessageAutomation:
     @pytest.fixture
     def mock_services(self):
         """Create mock services for testing"""
-        with patch('src.tasks.rich_message_automation.Settings') as mock_settings, \
-             patch('src.tasks.rich_message_automation.OpenAIService') as mock_openai, \
-             patch('src.tasks.rich_message_automation.LineService') as mock_line, \
-             patch('src.tasks.rich_message_automation.ConversationService') as mock_conversation, \
+        with patch('src.tasks.rich_message_automation.get_worker_services') as mock_worker_services, \
              patch('src.tasks.rich_message_automation.get_rich_message_config') as mock_config, \
              patch('src.tasks.rich_message_automation.get_timezone_manager') as mock_tz_manager, \
              patch('src.tasks.rich_message_automation.get_delivery_tracker') as mock_delivery_tracker, \
              patch('src.tasks.rich_message_automation.get_analytics_tracker') as mock_analytics:
             
             # Configure mocks
-            mock_settings_instance = Mock()
-            mock_settings.return_value = mock_settings_instance
-            
             mock_config_instance = Mock()
             mock_config.return_value = mock_config_instance
+            mock_worker_services.return_value.rich_message_config = mock_config_instance
             mock_config_instance.get_enabled_categories.return_value = []
             
             mock_tz_manager_instance = Mock()
@@ -89,10 +84,7 @@ class TestRichMessageAutomation:
             }
             
             yield {
-                'settings': mock_settings,
-                'openai': mock_openai,
-                'line': mock_line,
-                'conversation': mock_conversation,
+                'worker_services': mock_worker_services,
                 'config': mock_config,
                 'timezone_manager': mock_tz_manager,
                 'delivery_tracker': mock_delivery_tracker,
@@ -106,7 +98,7 @@ class TestRichMessageAutomation:
         assert result['success'] is True
         assert result['total_categories'] == 0
         assert result['timezone_deliveries_scheduled'] == 0
-        assert result['timezone_deliveries_executed'] == 0
+        assert result['timezone_deliveries_dispatched'] == 0
         assert 'execution_time_seconds' in result
         assert 'success_rate' in result
     
@@ -122,7 +114,7 @@ class TestRichMessageAutomation:
         assert result['success'] is True
         assert result['total_categories'] == 1
         assert result['timezone_deliveries_scheduled'] == 0
-        assert result['timezone_deliveries_executed'] == 0
+        assert result['timezone_deliveries_dispatched'] == 0
     
     def test_process_delivery_retries_no_retries(self, mock_services):
         """Test processing delivery retries with no pending retries"""
@@ -188,13 +180,12 @@ class TestRichMessageAutomation:
         assert 'current_stats' in result
         assert result['current_stats']['total_users'] == 100
     
-    @patch('src.tasks.rich_message_automation.TemplateManager')
-    def test_health_check_task_healthy(self, mock_template_manager, mock_services):
+    def test_health_check_task_healthy(self, mock_services):
         """Test health check task with healthy system"""
         # Mock template manager
         mock_template_instance = Mock()
         mock_template_instance.templates = ['template1', 'template2', 'template3']
-        mock_template_manager.return_value = mock_template_instance
+        mock_services['worker_services'].return_value.template_manager = mock_template_instance
         
         result = health_check_task()
         
@@ -209,8 +200,7 @@ class TestRichMessageAutomation:
         assert len(result['issues']) == 0
         assert 'health_check_execution_time_ms' in result
     
-    @patch('src.tasks.rich_message_automation.TemplateManager')
-    def test_health_check_task_with_issues(self, mock_template_manager, mock_services):
+    def test_health_check_task_with_issues(self, mock_services):
         """Test health check task with system issues"""
         # Mock delivery health with issues
         mock_services['delivery_tracker'].return_value.get_delivery_health_status.return_value = {
@@ -238,7 +228,7 @@ class TestRichMessageAutomation:
         # Mock template manager with templates
         mock_template_instance = Mock()
         mock_template_instance.templates = ['template1']
-        mock_template_manager.return_value = mock_template_instance
+        mock_services['worker_services'].return_value.template_manager = mock_template_instance
         
         result = health_check_task()
         
@@ -248,13 +238,12 @@ class TestRichMessageAutomation:
         assert any('Low open rate' in issue for issue in result['issues'])
         assert any('Low retention rate' in issue for issue in result['issues'])
     
-    @patch('src.tasks.rich_message_automation.TemplateManager')
-    def test_health_check_task_critical(self, mock_template_manager, mock_services):
+    def test_health_check_task_critical(self, mock_services):
         """Test health check task with critical issues"""
         # Mock template manager with no templates
         mock_template_instance = Mock()
         mock_template_instance.templates = []
-        mock_template_manager.return_value = mock_template_instance
+        mock_services['worker_services'].return_value.template_manager = mock_template_instance
         
         result = health_check_task()
         
@@ -264,27 +253,25 @@ class TestRichMessageAutomation:
     
     def test_send_rich_message_to_user_batch_empty_users(self, mock_services):
         """Test sending rich message to empty user batch"""
-        with patch('src.tasks.rich_message_automation.RichMessageService') as mock_rich_service:
-            result = send_rich_message_to_user_batch(
-                user_ids=[],
-                image_path="/path/to/image.jpg",
-                content_data={"title": "Test", "content": "Test content"},
-                category="motivation",
-                timezone_name="Asia/Bangkok"
-            )
-            
-            assert result['success'] is False
-            assert result['users_count'] == 0
-            assert result['successful_deliveries'] == 0
-            assert result['failed_deliveries'] == 0
+        result = send_rich_message_to_user_batch(
+            user_ids=[],
+            image_path="/path/to/image.jpg",
+            content_data={"title": "Test", "content": "Test content"},
+            category="motivation",
+            timezone_name="Asia/Bangkok"
+        )
+        
+        assert result['success'] is False
+        assert result['users_count'] == 0
+        assert result['successful_deliveries'] == 0
+        assert result['failed_deliveries'] == 0
     
-    @patch('src.tasks.rich_message_automation.RichMessageService')
-    def test_send_rich_message_to_user_batch_flex_message_creation_fails(self, mock_rich_service, mock_services):
+    def test_send_rich_message_to_user_batch_flex_message_creation_fails(self, mock_services):
         """Test batch sending when Flex message creation fails"""
         # Mock RichMessageService to return None for flex message
         mock_service_instance = Mock()
-        mock_service_instance.create_flex_message.return_value = None
-        mock_rich_service.return_value = mock_service_instance
+        mock_service_instance.render_flex_message.return_value = None
+        mock_services['worker_services'].return_value.rich_message_service = mock_service_instance
         
         result = send_rich_message_to_user_batch(
             user_ids=["user1", "user2"],
@@ -314,6 +301,30 @@ class TestRichMessageAutomation:
         assert result['users_count'] == 0
         assert result['message'] == 'No users to deliver to'
     
+    def test_delivery_contents_from_cached_items(self):
+        """Items served without a validation (cache hits) still produce delivery content"""
+        content_generator = Mock()
+        content = Mock(title="Title", content="Body", language="en",
+                       generation_time=datetime(2026, 1, 1, 9, 0), theme=None)
+        content.category.value = "motivation"
+        validation = Mock(score=0.7)
+        validation.result.value = "approved"
+        content_generator.generate_content_batch.return_value = Mock(
+            contents=[content, content, None],
+            validations=[None, validation, None],
+            item_latency=[0.0, 0.0, 0.0],
+            upstream_calls=0, cache_hits=2, regenerated_items=0, failed_items=1, elapsed_seconds=0.0
+        )
+        
+        result = _generate_delivery_contents(
+            content_generator, Mock(), ["motivation", "wellness"], "09:00", variations=2
+        )
+        
+        assert result['success'] is True
+        assert result['missing_categories'] == ["wellness"]
+        assert result['contents']['motivation']['content_metadata']['validation_score'] == 0.7
+        assert result['batch_stats']['cache_hits'] == 2
+    
     def test_task_parameter_validation(self):
         """Test that tasks have proper parameter validation"""
         # Test coordinate_timezone_deliveries with categories parameter
@@ -0,0 +1,130 @@
+"""
+Unit tests for the cross-user semantic response cache
+"""
+from unittest.mock import patch
+
+import pytest
+
+from src.utils.cache_manager import CacheManager
+from src.utils.semantic_cache import (
+    SemanticResponseCache, classify_intent, normalize_query
+)
+
+
+@pytest.mark.unit
+class TestQueryNormalization:
+    """Test normalization and intent eligibility"""
+
+    def test_normalizes_case_punctuation_and_emoji(self):
+        """Case, punctuation, emoji and extra whitespace are removed"""
+        assert normalize_query("  What CAN you do?!  😀 ") == "what can you do"
+        assert normalize_query("สวัสดีครับ!! 🙏") == "สวัสดีครับ"
+        assert normalize_query("ขอบคุณ๚") == "ขอบคุณ"
+
+    def test_stateless_intents(self):
+        """Short greetings, thanks and capability questions are cacheable"""
+        assert classify_intent(normalize_query("Hello there!")) == 'greeting'
+        assert classify_intent(normalize_query("สวัสดีค่ะ")) == 'greeting'
+        assert classify_intent(normalize_query("Thanks a lot")) == 'thanks'
+        assert classify_intent(normalize_query("What can you do?")) == 'capabilities'
+        assert classify_intent(normalize_query("คุณคือใคร")) == 'identity'
+
+    def test_specific_questions_are_not_cacheable(self):
+        """Queries with real content beyond the intent phrase are never cached"""
+        assert classify_intent(normalize_query("Hi, what is the weather in Bangkok tomorrow?")) is None
+        assert classify_intent(normalize_query("hire a car")) is None
+        assert classify_intent(normalize_query("Explain quantum physics")) is None
+
+    def test_personal_details_are_not_cacheable(self):
+        """Anything beyond filler words and particles keeps a query out of the shared cache"""
+        assert classify_intent(normalize_query("Thank you so much ครับ")) == 'thanks'
+        assert classify_intent(normalize_query("ขอบคุณมากๆครับ")) == 'thanks'
+        assert classify_intent(normalize_query("hi, my name is Somchai")) is None
+        assert classify_intent(normalize_query("thanks my order is 12346")) is None
+        assert classify_intent(normalize_query("สวัสดีครับผมชื่อสมชาย")) is None
+
+        cache = SemanticResponseCache()
+        assert cache.set("hi, my name is Somchai", "Hello Somchai!", model="m") is False
+        assert cache.get("hi my name is Somchat", model="m") is None
+
+
+@pytest.mark.unit
+class TestSemanticResponseCache:
+    """Test similarity lookup, eviction and statistics"""
+
+    def test_hit_across_phrasings(self):
+        """Differently punctuated and cased queries hit the same answer"""
+        cache = SemanticResponseCache()
+        assert cache.set("What can you do?", "I can chat about food.", model="m") is True
+
+        assert cache.get("what can you do", model="m") == "I can chat about food."
+        assert cache.get("WHAT CAN YOU DO??? 🤔", model="m") == "I can chat about food."
+
+    def test_similarity_threshold(self):
+        """Near matches hit above the threshold and miss below it"""
+        cache = SemanticResponseCache(similarity_threshold=0.6)
+        cache.set("hello there", "Hi!", model="m")
+
+        assert cache.get("hello there ครับ", model="m") == "Hi!"
+        assert cache.get("hey", model="m") is None
+
+    def test_model_and_eligibility(self):
+        """Answers are scoped to a model and ineligible queries are never stored"""
+        cache = SemanticResponseCache()
+        cache.set("hello", "Hi!", model="m1")
+
+        assert cache.get("hello", model="m2") is None
+        assert cache.set("Tell me about my order 1234", "...", model="m1") is False
+        assert cache.get_stats()['current_size'] == 1
+
+    def test_ttl_expiry(self):
+        """Expired answers are not served"""
+        cache = SemanticResponseCache(default_ttl=10)
+        with patch('src.utils.semantic_cache.time.time', return_value=1000.0):
+            cache.set("hello", "Hi!", model="m")
+        with patch('src.utils.semantic_cache.time.time', return_value=1005.0):
+            assert cache.get("hello", model="m") == "Hi!"
+        with patch('src.utils.semantic_cache.time.time', return_value=1011.0):
+            assert cache.get("hello", model="m") is None
+
+    def test_lru_eviction(self):
+        """The least recently used answer is evicted beyond max_entries"""
+        cache = SemanticResponseCache(max_entries=2)
+        cache.set("hello", "greeting", model="m")
+        cache.set("thank you", "thanks", model="m")
+        cache.get("hello", model="m")
+        cache.set("who are you", "identity", model="m")
+
+        assert cache.get("hello", model="m") == "greeting"
+        assert cache.get("thank you", model="m") is None
+        assert cache.get_stats()['evictions'] == 1
+
+    def test_per_intent_stats(self):
+        """Hit rates are tracked per intent"""
+        cache = SemanticResponseCache()
+        cache.set("hello", "Hi!", model="m")
+        cache.get("hello", model="m")
+        cache.get("thanks", model="m")
+        cache.get("order status for 1234", model="m")
+
+        stats = cache.get_stats()
+        assert stats['intents']['greeting']['hit_rate'] == 1.0
+        assert stats['intents']['thanks']['hits'] == 0
+        assert stats['ineligible'] == 1
+
+    def test_cache_manager_integration(self):
+        """The semantic cache is opt-in and reported next to the other caches"""
+        # Without the default LRU caches there are no cleanup threads for shutdown() to join
+        with patch.object(CacheManager, '_setup_default_caches'):
+            manager = CacheManager()
+        try:
+            assert manager.get_semantic_response("hello") is None
+            assert 'openai_semantic' not in manager.get_all_stats()
+
+            manager.enable_semantic_cache()
+            manager.cache_semantic_response("hello", "Hi!")
+
+            assert manager.get_semantic_response("Hello!") == "Hi!"
+            assert manager.get_all_stats()['openai_semantic']['hits'] == 1
+        finally:
+            manager.shutdown()
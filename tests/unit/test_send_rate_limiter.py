@@ -0,0 +1,148 @@
+"""
+Unit tests for the atomic Rich Message send limiter
+"""
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.services.rich_message_service import RichMessageService
+from src.utils.send_rate_limiter import ACQUIRE, CHECK, RECORD, SCRIPT_BATCH_USERS, SendRateLimiter
+
+
+@pytest.fixture
+def lua_redis():
+    """fakeredis client with Lua scripting (needs lupa)"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeRedis()
+
+
+def acquire_concurrently(limiter, client, user_ids, threads=20):
+    """Acquire the same recipients from many threads at once; return the allowed decisions"""
+    barrier = threading.Barrier(threads)
+    allowed = []
+
+    def worker():
+        barrier.wait()
+        decisions = limiter.evaluate(client, user_ids, ACQUIRE, now=1000.0, date_key='2026-01-01')
+        allowed.extend(d for d in decisions if d['allowed'])
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return allowed
+
+
+@pytest.mark.unit
+class TestSendRateLimiter:
+    """Test cooldown and daily quota semantics, in memory and in Redis"""
+
+    def test_cooldown_then_daily_limit(self):
+        """A send blocks the next one for the cooldown; the quota caps the day"""
+        limiter = SendRateLimiter(cooldown_seconds=300, max_daily=2)
+        day = '2026-01-01'
+
+        assert limiter.evaluate(None, ['U1'], ACQUIRE, now=0.0, date_key=day)[0]['allowed'] is True
+        blocked = limiter.evaluate(None, ['U1'], CHECK, now=100.0, date_key=day)[0]
+        assert blocked['reason'] == 'cooldown'
+        assert blocked['remaining_seconds'] == 200.0
+
+        assert limiter.evaluate(None, ['U1'], ACQUIRE, now=400.0, date_key=day)[0]['daily_count'] == 2
+        assert limiter.evaluate(None, ['U1'], ACQUIRE, now=800.0, date_key=day)[0]['reason'] == 'daily_limit'
+        assert limiter.evaluate(None, ['U1'], CHECK, now=800.0, date_key='2026-01-02')[0]['allowed'] is True
+
+    def test_check_does_not_record_and_record_ignores_limits(self):
+        """CHECK leaves no trace; RECORD always counts the send"""
+        limiter = SendRateLimiter(cooldown_seconds=300, max_daily=1)
+        limiter.evaluate(None, ['U1'], CHECK, now=0.0, date_key='2026-01-01')
+        assert limiter.send_history == {}
+
+        for now in (0.0, 1.0):
+            decision = limiter.evaluate(None, ['U1'], RECORD, now=now, date_key='2026-01-01')[0]
+        assert decision['allowed'] is True
+        assert limiter.daily_counts['U1:2026-01-01'] == 2
+
+    def test_concurrent_acquires_never_over_send(self):
+        """Racing workers get exactly one send per cooldown and no more than the quota"""
+        limiter = SendRateLimiter(cooldown_seconds=300, max_daily=10)
+        assert len(acquire_concurrently(limiter, None, ['U1'])) == 1
+
+        limiter = SendRateLimiter(cooldown_seconds=0, max_daily=10)
+        assert len(acquire_concurrently(limiter, None, ['U1'])) == 10
+        assert limiter.daily_counts['U1:2026-01-01'] == 10
+
+    def test_release_returns_the_slot(self):
+        """A released send clears its cooldown and its daily count"""
+        limiter = SendRateLimiter(cooldown_seconds=300, max_daily=10)
+        sent_at = limiter.evaluate(None, ['U1'], ACQUIRE, now=0.0, date_key='2026-01-01')[0]['sent_at']
+
+        limiter.release(None, 'U1', sent_at, date_key='2026-01-01')
+
+        assert limiter.evaluate(None, ['U1'], CHECK, now=1.0, date_key='2026-01-01')[0]['daily_count'] == 0
+
+    def test_redis_evaluates_recipients_in_batched_script_calls(self):
+        """A recipient list costs one script call per batch, with the key pairs in order"""
+        client = Mock()
+        script = client.register_script.return_value
+        script.side_effect = lambda keys, args: [[2, b'0', 1]] * (len(keys) // 2)
+        limiter = SendRateLimiter()
+        user_ids = [f"U{i}" for i in range(SCRIPT_BATCH_USERS + 1)]
+
+        decisions = limiter.evaluate(client, user_ids, ACQUIRE, now=5.0, date_key='2026-01-01')
+
+        assert len(decisions) == len(user_ids)
+        assert all(d['allowed'] and d['sent_at'] == 5.0 for d in decisions)
+        assert script.call_count == 2
+        first_keys = script.call_args_list[0].kwargs['keys']
+        assert first_keys[:2] == ['rate_limit_history:U0', 'rate_limit_daily:U0:2026-01-01']
+        assert script.call_args_list[0].kwargs['args'][-1] == ACQUIRE
+
+    def test_redis_script_matches_memory_semantics(self, lua_redis):
+        """The Lua script blocks racing sends exactly like the in-memory limiter"""
+        limiter = SendRateLimiter(cooldown_seconds=300, max_daily=10)
+        assert len(acquire_concurrently(limiter, lua_redis, ['U1', 'U2'])) == 2
+
+        decision = limiter.evaluate(lua_redis, ['U1'], CHECK, now=1100.0, date_key='2026-01-01')[0]
+        assert decision['reason'] == 'cooldown'
+        assert decision['daily_count'] == 1
+
+
+@pytest.mark.unit
+class TestRichMessageServiceSendSlots:
+    """Test the service's use of the limiter"""
+
+    @pytest.fixture
+    def service(self):
+        return RichMessageService(line_bot_api=Mock(), enable_redis=False)
+
+    def test_bulk_acquire_splits_allowed_and_blocked(self, service):
+        """Recipients in cooldown are blocked; duplicates get one slot"""
+        service.record_message_sent('U2')
+
+        slots = service.acquire_send_slots(['U1', 'U2', 'U3', 'U1'])
+
+        assert slots['allowed'] == ['U1', 'U3']
+        assert slots['blocked'] == {'U2': 'cooldown'}
+        assert service.check_send_rate_limit('U3')['reason'] == 'cooldown'
+
+    def test_failed_push_releases_the_slot(self, service):
+        """A send that does not go out does not count against the user"""
+        service.line_bot_api.push_message.side_effect = RuntimeError("network down")
+
+        result = service.send_rich_message(Mock(), 'U1')
+
+        assert result['success'] is False
+        assert service.check_send_rate_limit('U1')['allowed'] is True
+
+    def test_redis_failure_falls_back_to_memory(self):
+        """A Redis round trip that yields nothing is evaluated in memory"""
+        with patch('src.services.rich_message_service.get_redis_manager') as get_manager:
+            get_manager.return_value.health_check.return_value = {'is_healthy': True}
+            get_manager.return_value.execute_with_fallback.return_value = None
+            service = RichMessageService(line_bot_api=Mock(), enable_redis=True)
+
+        assert service.acquire_send_slot('U1')['allowed'] is True
+        assert service.acquire_send_slot('U1')['reason'] == 'cooldown'
@@ -0,0 +1,158 @@
+"""
+Unit tests for single-flight request coalescing
+"""
+import threading
+import time
+
+import pytest
+
+from src.exceptions import TimeoutException
+from src.utils.single_flight import SingleFlight, prompt_fingerprint
+
+
+def run_concurrently(count, target):
+    """Run target(index) in threads and return the results in index order"""
+    results = [None] * count
+    errors = [None] * count
+    
+    def worker(index):
+        try:
+            results[index] = target(index)
+        except Exception as e:
+            errors[index] = e
+    
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+@pytest.mark.unit
+class TestPromptFingerprint:
+    """Test prompt normalization for coalescing keys"""
+    
+    def test_whitespace_and_width_are_normalized(self):
+        """Formatting differences map to the same fingerprint"""
+        assert prompt_fingerprint("Tell me  a\nstory", "ctx") == prompt_fingerprint(" Tell me a story ", "ctx")
+        assert prompt_fingerprint("ＡＢＣ", "ctx") == prompt_fingerprint("ABC", "ctx")
+    
+    def test_context_is_part_of_the_key(self):
+        """The same prompt in a different context is a different request"""
+        assert prompt_fingerprint("Hello", "model", "ctx1") != prompt_fingerprint("Hello", "model", "ctx2")
+
+
+@pytest.mark.unit
+class TestSingleFlight:
+    """Test leader/follower coalescing"""
+    
+    def test_concurrent_calls_share_one_execution(self):
+        """Identical concurrent calls run once and all receive the result"""
+        group = SingleFlight()
+        calls = []
+        started = threading.Event()
+        
+        def fn(emit):
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return {'message': 'shared answer'}
+        
+        def call(index):
+            if index:
+                started.wait(1)
+            return group.do("key", fn)
+        
+        results, errors = run_concurrently(5, call)
+        
+        assert errors == [None] * 5
+        assert len(calls) == 1
+        assert all(result[0] == {'message': 'shared answer'} for result in results)
+        assert sorted(result[1] for result in results) == [False, True, True, True, True]
+        
+        stats = group.get_stats()
+        assert stats['flights'] == 1
+        assert stats['coalesced_requests'] == 4
+        assert stats['max_fan_in'] == 5
+        assert stats['in_flight'] == 0
+    
+    def test_sequential_calls_are_not_coalesced(self):
+        """A finished flight is not reused by later callers"""
+        group = SingleFlight()
+        calls = []
+        
+        group.do("key", lambda emit: calls.append(1))
+        group.do("key", lambda emit: calls.append(1))
+        
+        assert len(calls) == 2
+        assert group.get_stats()['coalesced_requests'] == 0
+    
+    def test_followers_receive_streamed_chunks(self):
+        """Chunks emitted before and after a follower joins are relayed to it"""
+        group = SingleFlight()
+        first_chunk_sent = threading.Event()
+        follower_joined = threading.Event()
+        received = {0: [], 1: []}
+        
+        def fn(emit):
+            emit("Hello")
+            first_chunk_sent.set()
+            follower_joined.wait(1)
+            time.sleep(0.05)
+            emit(" world")
+            return "Hello world"
+        
+        def call(index):
+            if index:
+                first_chunk_sent.wait(1)
+                follower_joined.set()
+            return group.do("key", fn, chunk_callback=received[index].append)
+        
+        results, errors = run_concurrently(2, call)
+        
+        assert errors == [None, None]
+        assert received[0] == ["Hello", " world"]
+        assert received[1] == ["Hello", " world"]
+        assert results[1] == ("Hello world", True)
+    
+    def test_leader_error_is_shared(self):
+        """Followers receive the leader's exception instead of retrying upstream"""
+        group = SingleFlight()
+        started = threading.Event()
+        
+        def fn(emit):
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError("429 Too Many Requests")
+        
+        def call(index):
+            if index:
+                started.wait(1)
+            return group.do("key", fn)
+        
+        results, errors = run_concurrently(3, call)
+        
+        assert all(isinstance(error, RuntimeError) for error in errors)
+        assert group.get_stats()['shared_errors'] == 1
+    
+    def test_follower_times_out(self):
+        """A follower stops waiting after the timeout without affecting the leader"""
+        group = SingleFlight(timeout=0.05)
+        started = threading.Event()
+        
+        def fn(emit):
+            started.set()
+            time.sleep(0.3)
+            return "late"
+        
+        def call(index):
+            if index:
+                started.wait(1)
+            return group.do("key", fn)
+        
+        results, errors = run_concurrently(2, call)
+        
+        assert results[0] == ("late", False)
+        assert isinstance(errors[1], TimeoutException)
+        assert group.get_stats()['timeouts'] == 1
@@ -0,0 +1,128 @@
+"""
+Unit tests for progressive delivery of streamed responses to LINE
+"""
+from unittest.mock import Mock
+
+import pytest
+
+from src.utils.streaming_delivery import (
+    StreamingReplyDelivery, find_sentence_cut, split_message_bubbles
+)
+
+
+def sent_texts(call):
+    """Texts of the TextSendMessage list passed to a reply/push call"""
+    return [message.text for message in call.args[1]]
+
+
+def make_delivery(**kwargs):
+    """Delivery with a mock LINE API and no coalescing delay"""
+    options = {'first_chunk_min_chars': 10, 'push_interval': 0.0}
+    options.update(kwargs)
+    return StreamingReplyDelivery(Mock(), 'user_123456789', 'reply_token', **options)
+
+
+@pytest.mark.unit
+class TestSentenceCut:
+    """Test chunk boundary detection"""
+
+    def test_cuts_at_sentence_end(self):
+        """The last sentence boundary past the minimum length is chosen"""
+        text = "Hi. This is the first answer. And more"
+        assert text[:find_sentence_cut(text, 10, 200)] == "Hi. This is the first answer. "
+
+    def test_waits_for_boundary(self):
+        """Short text without a boundary is not cut yet"""
+        assert find_sentence_cut("Hello there my friend", 5, 200) is None
+
+    def test_falls_back_to_whitespace(self):
+        """Unpunctuated text (e.g. Thai) is cut at a space once it is long enough"""
+        text = "สวัสดีครับ ยินดีต้อนรับ ขอบคุณที่ติดต่อเรา"
+        cut = find_sentence_cut(text, 5, 30)
+        assert text[cut - 1] == ' '
+        assert cut <= 30
+
+    def test_split_bubbles_truncates(self):
+        """Text beyond five bubbles is truncated with a notice"""
+        bubbles = split_message_bubbles("word " * 400, max_chars=100)
+        assert len(bubbles) == 5
+        assert all(len(bubble) <= 100 for bubble in bubbles)
+        assert bubbles[-1].endswith("Message truncated]")
+
+
+@pytest.mark.unit
+class TestStreamingReplyDelivery:
+    """Test reply-first, push-after delivery"""
+
+    def test_first_sentence_is_replied_before_stream_ends(self):
+        """The first sentence goes out by reply token while streaming continues"""
+        delivery = make_delivery()
+
+        delivery.on_delta("Hello there, friend! ")
+        delivery.on_delta("Here is")
+
+        delivery.line_bot_api.reply_message.assert_called_once()
+        assert sent_texts(delivery.line_bot_api.reply_message.call_args) == ["Hello there, friend!"]
+        assert delivery.stats['time_to_first_text'] is not None
+        delivery.line_bot_api.push_message.assert_not_called()
+
+    def test_remainder_is_pushed_on_finish(self):
+        """Text after the replied chunk is pushed, without duplicating it"""
+        delivery = make_delivery(push_interval=60.0)
+        final = "Hello there, friend! Here is the rest of the answer."
+
+        delivery.on_delta("Hello there, friend! ")
+        delivery.on_delta("Here is the rest of the answer.")
+        stats = delivery.finish(final)
+
+        push_call = delivery.line_bot_api.push_message.call_args
+        assert push_call.args[0] == 'user_123456789'
+        assert sent_texts(push_call) == ["Here is the rest of the answer."]
+        assert stats['push_calls'] == 1
+        assert stats['messages_sent'] == 2
+
+    def test_short_answer_uses_reply_only(self):
+        """An answer with no early boundary is sent once by reply"""
+        delivery = make_delivery()
+
+        delivery.on_delta("Hi")
+        stats = delivery.finish("Hi")
+
+        assert sent_texts(delivery.line_bot_api.reply_message.call_args) == ["Hi"]
+        delivery.line_bot_api.push_message.assert_not_called()
+        assert stats['push_calls'] == 0
+
+    def test_push_calls_are_bounded(self):
+        """Many sentences are coalesced into at most max_push_calls pushes"""
+        delivery = make_delivery(max_push_calls=2)
+        sentences = [f"Sentence number {i} is here. " for i in range(20)]
+
+        for sentence in sentences:
+            delivery.on_delta(sentence)
+        stats = delivery.finish("".join(sentences))
+
+        assert stats['push_calls'] == 2
+        delivered = sent_texts(delivery.line_bot_api.reply_message.call_args)
+        for call in delivery.line_bot_api.push_message.call_args_list:
+            delivered += sent_texts(call)
+        assert " ".join(delivered) == "".join(sentences).strip()
+
+    def test_restarted_stream_sends_final_text(self):
+        """If the final text does not continue what was sent, it is sent in full"""
+        delivery = make_delivery()
+
+        delivery.on_delta("First attempt sentence. ")
+        delivery.finish("Completely different answer.")
+
+        assert sent_texts(delivery.line_bot_api.push_message.call_args) == ["Completely different answer."]
+
+    def test_failed_reply_falls_back_to_push(self):
+        """An expired reply token does not lose the first chunk"""
+        delivery = make_delivery()
+        delivery.line_bot_api.reply_message.side_effect = Exception("Invalid reply token")
+
+        delivery.on_delta("Hello there, friend! ")
+
+        assert sent_texts(delivery.line_bot_api.push_message.call_args) == ["Hello there, friend!"]
+        assert delivery.stats['send_failures'] == 1
+        assert delivery.stats['reply_used'] is False
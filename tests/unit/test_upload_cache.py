@@ -0,0 +1,132 @@
+"""
+Unit tests for the content-addressed upload cache
+"""
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.utils.upload_cache import UploadCache, content_digest
+
+
+def make_redis_manager(store):
+    """Mock Redis manager whose client implements GET/SET over a shared dict"""
+    client = Mock()
+    client.get.side_effect = lambda key: store.get(key)
+    client.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value.encode())
+
+    manager = Mock()
+    manager.execute_with_fallback.side_effect = lambda op, fallback, name, use_retry=True: op(client)
+    return manager, client
+
+
+@pytest.mark.unit
+class TestUploadCache:
+    """Test file ID and image payload reuse"""
+
+    def test_file_id_hit_and_miss(self):
+        """Identical bytes map to the file ID they were uploaded as"""
+        cache = UploadCache()
+        digest = content_digest(b"%PDF-1.7 report")
+
+        assert cache.get_file_id(digest) is None
+        cache.put_file_id(digest, "file-abc")
+
+        assert cache.get_file_id(digest, size=15) == "file-abc"
+        assert cache.get_file_id(content_digest(b"%PDF-1.7 other")) is None
+        stats = cache.get_stats()
+        assert stats['file_hits'] == 1
+        assert stats['file_misses'] == 2
+        assert stats['upload_bytes_saved'] == 15
+
+    def test_file_ids_are_scoped_by_purpose(self):
+        """A file uploaded for one purpose is not reused for another"""
+        cache = UploadCache()
+        digest = content_digest(b"data")
+        cache.put_file_id(digest, "file-abc", purpose="assistants")
+
+        assert cache.get_file_id(digest, purpose="vision") is None
+
+    def test_entries_expire_after_ttl(self):
+        """File IDs are not reused past their TTL"""
+        cache = UploadCache(file_ttl_seconds=60)
+        digest = content_digest(b"data")
+        with patch('src.utils.upload_cache.time.monotonic', return_value=1000.0) as monotonic:
+            cache.put_file_id(digest, "file-abc")
+
+            monotonic.return_value = 1061.0
+            assert cache.get_file_id(digest) is None
+
+    def test_memory_budget_evicts_least_recently_used(self):
+        """Payloads beyond the memory budget evict the least recently used ones"""
+        cache = UploadCache(max_memory_mb=0.5)
+        payload = "x" * 200 * 1024
+        cache.put_image_payload("a", payload)
+        cache.put_image_payload("b", payload)
+        assert cache.get_image_payload("a") == payload
+        cache.put_image_payload("c", payload)
+
+        stats = cache.get_stats()
+        assert stats['evictions'] == 1
+        assert stats['entries'] == 2
+        assert stats['memory_usage_mb'] <= 0.5
+        assert cache.get_image_payload("b") is None
+        assert cache.get_image_payload("a") == payload
+        assert cache.get_image_payload("c") == payload
+
+    def test_entry_limit_and_oversized_payloads(self):
+        """The entry limit also evicts in LRU order; a payload over the whole budget is not kept"""
+        cache = UploadCache(max_memory_mb=0.01, max_entries=2)
+        for name in ("a", "b", "c"):
+            cache.remember_message(name, "digest")
+        cache.put_image_payload("huge", "x" * 20 * 1024)
+
+        assert cache.digest_for_message("a") is None
+        assert cache.digest_for_message("b") == cache.digest_for_message("c") == "digest"
+        assert cache.get_image_payload("huge") is None
+
+    def test_message_id_maps_to_payload(self):
+        """A redelivered message finds the payload of its content"""
+        cache = UploadCache()
+        digest = content_digest(b"image bytes")
+        cache.put_image_payload(digest, "data:image/jpeg;base64,AAAA")
+        cache.remember_message("msg_1", digest)
+
+        assert cache.get_image_payload(cache.digest_for_message("msg_1")) == "data:image/jpeg;base64,AAAA"
+        assert cache.digest_for_message("msg_2") is None
+
+    def test_redis_shares_entries_across_workers(self):
+        """An upload made by another worker is reused through Redis"""
+        store = {}
+        manager_a, _ = make_redis_manager(store)
+        manager_b, _ = make_redis_manager(store)
+        worker_a = UploadCache(redis_manager=manager_a)
+        worker_b = UploadCache(redis_manager=manager_b)
+        digest = content_digest(b"data")
+
+        worker_a.put_file_id(digest, "file-abc")
+
+        assert worker_b.get_file_id(digest) == "file-abc"
+        assert worker_b.get_stats()['redis_hits'] == 1
+
+    def test_large_payloads_stay_local(self):
+        """Payloads above the shared size limit are not written to Redis"""
+        store = {}
+        manager, client = make_redis_manager(store)
+        cache = UploadCache(redis_manager=manager, max_shared_payload_bytes=10)
+
+        cache.put_image_payload("digest", "x" * 11)
+
+        client.set.assert_not_called()
+        assert cache.get_image_payload("digest") == "x" * 11
+
+    def test_redis_unavailable_uses_local_cache(self):
+        """When Redis is down entries are still cached locally"""
+        manager = Mock()
+        manager.execute_with_fallback.side_effect = lambda op, fallback, name, use_retry=True: fallback()
+        cache = UploadCache(redis_manager=manager)
+
+        cache.put_file_id("digest", "file-abc")
+
+        assert cache.get_file_id("digest") == "file-abc"
+        assert cache.get_file_id("other") is None
+        assert cache.get_stats()['redis_fallbacks'] >= 2
@@ -0,0 +1,177 @@
+"""
+Unit tests for the async webhook ingress
+"""
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from src.utils.partitioned_event_executor import PartitionedEventExecutor
+from src.utils.webhook_ingress import AsyncWebhookIngress
+
+
+def wait_until(predicate, timeout=5.0):
+    """Poll until predicate is true or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.unit
+class TestAsyncWebhookIngress:
+    """Test queueing, consumption and metrics of the webhook ingress"""
+
+    @pytest.fixture
+    def processed(self):
+        return []
+
+    @pytest.fixture
+    def ingress(self, processed):
+        ingress = AsyncWebhookIngress(
+            event_handler=processed.append,
+            max_queue_size=10,
+            consumer_count=2
+        )
+        ingress.start()
+        yield ingress
+        ingress.stop()
+
+    def test_submit_processes_events(self, ingress, processed):
+        """Submitted events are handed to the handler"""
+        assert ingress.submit(['event_1', 'event_2', 'event_3']) is True
+
+        assert wait_until(lambda: ingress.get_metrics()['stats']['events_processed'] == 3)
+        assert sorted(processed) == ['event_1', 'event_2', 'event_3']
+
+        metrics = ingress.get_metrics()
+        assert metrics['stats']['events_enqueued'] == 3
+        assert metrics['stats']['events_processed'] == 3
+        assert metrics['stats']['batches_enqueued'] == 1
+
+    def test_sequencer_keeps_user_order_across_batches(self):
+        """Partitions of one user from separate batches run in enqueue order"""
+        handled = []
+        lock = threading.Lock()
+
+        def handler(event):
+            time.sleep(0.002 * (event.seq % 3))
+            with lock:
+                handled.append(event.seq)
+
+        executor = PartitionedEventExecutor(event_handler=handler)
+        ingress = AsyncWebhookIngress(
+            event_handler=executor.run_partition,
+            max_queue_size=50,
+            consumer_count=4,
+            sequencer=executor.reserve
+        )
+        ingress.start()
+        try:
+            for seq in range(20):
+                event = Mock(seq=seq)
+                event.source.user_id = 'user_1'
+                assert ingress.submit([[event]]) is True
+            assert wait_until(lambda: ingress.get_metrics()['stats']['events_processed'] == 20)
+        finally:
+            ingress.stop()
+
+        assert handled == list(range(20))
+
+    def test_submit_returns_quickly_with_slow_handler(self):
+        """Enqueueing does not wait for a slow handler"""
+        release = threading.Event()
+        ingress = AsyncWebhookIngress(
+            event_handler=lambda event: release.wait(5),
+            max_queue_size=10,
+            consumer_count=1
+        )
+        ingress.start()
+        try:
+            start = time.time()
+            assert ingress.submit(['slow_event']) is True
+            assert time.time() - start < 0.5
+        finally:
+            release.set()
+            ingress.stop()
+
+    def test_rejects_batch_when_queue_full(self):
+        """A batch that does not fit is rejected as a whole"""
+        release = threading.Event()
+        ingress = AsyncWebhookIngress(
+            event_handler=lambda event: release.wait(5),
+            max_queue_size=2,
+            consumer_count=1
+        )
+        ingress.start()
+        try:
+            assert ingress.submit(['a']) is True
+            assert wait_until(lambda: ingress.get_metrics()['stats']['in_flight'] == 1)
+            assert ingress.submit(['b', 'c']) is True
+            assert ingress.submit(['d']) is False
+
+            metrics = ingress.get_metrics()
+            assert metrics['queue_depth'] == 2
+            assert metrics['stats']['events_rejected'] == 1
+        finally:
+            release.set()
+            ingress.stop()
+
+    def test_submit_when_not_running(self, processed):
+        """Events are rejected when the ingress has not been started"""
+        ingress = AsyncWebhookIngress(event_handler=processed.append)
+
+        assert ingress.submit(['event']) is False
+        assert ingress.get_metrics()['stats']['events_rejected'] == 1
+
+    def test_empty_batch_is_accepted(self, ingress):
+        """Webhooks without events (e.g. LINE verification) are acknowledged"""
+        assert ingress.submit([]) is True
+        assert ingress.get_metrics()['stats']['events_enqueued'] == 0
+
+    def test_handler_failure_is_counted(self):
+        """Handler exceptions are counted and do not stop the consumer"""
+        processed = []
+
+        def handler(event):
+            if event == 'bad':
+                raise ValueError("boom")
+            processed.append(event)
+
+        ingress = AsyncWebhookIngress(event_handler=handler, consumer_count=1)
+        ingress.start()
+        try:
+            ingress.submit(['bad', 'good'])
+            assert wait_until(lambda: ingress.get_metrics()['stats']['events_processed'] == 1)
+            assert processed == ['good']
+
+            stats = ingress.get_metrics()['stats']
+            assert stats['events_failed'] == 1
+            assert stats['events_processed'] == 1
+        finally:
+            ingress.stop()
+
+    def test_event_age_metrics(self, ingress, processed):
+        """Event age percentiles are reported once events are consumed"""
+        ingress.submit(['event'])
+        assert wait_until(lambda: len(processed) == 1)
+
+        event_age = ingress.get_metrics()['event_age']
+        assert event_age['max_ms'] >= 0.0
+        assert event_age['p95_ms'] <= event_age['max_ms']
+
+    def test_stop_drains_queue(self, processed):
+        """Stopping waits for queued events to be processed"""
+        ingress = AsyncWebhookIngress(
+            event_handler=lambda event: (time.sleep(0.01), processed.append(event)),
+            consumer_count=1
+        )
+        ingress.start()
+        ingress.submit(['a', 'b', 'c'])
+        ingress.stop()
+
+        assert processed == ['a', 'b', 'c']
+        assert ingress.is_running is False
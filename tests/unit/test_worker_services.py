@@ -0,0 +1,82 @@
+"""
+Unit tests for the per-worker service container
+"""
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.utils.worker_services import WorkerServices, get_worker_services, init_worker_services
+
+
+@pytest.mark.unit
+class TestWorkerServices:
+    """Test lazy construction, sharing, warm-up and setup instrumentation"""
+
+    @pytest.fixture
+    def services(self):
+        return WorkerServices()
+
+    def test_services_are_built_once_and_shared(self, services):
+        """Every access after the first returns the same instance"""
+        with patch('src.config.settings.Settings') as settings_cls, \
+             patch('src.services.conversation_factory.create_conversation_service') as create_conversation, \
+             patch('src.services.openai_service.OpenAIService') as openai_cls, \
+             patch('src.services.line_service.LineService') as line_cls:
+            first = services.line_service
+            second = services.line_service
+
+        assert first is second
+        settings_cls.assert_called_once_with()
+        create_conversation.assert_called_once_with()
+        openai_cls.assert_called_once_with(settings_cls.return_value, create_conversation.return_value)
+        line_cls.assert_called_once_with(
+            settings_cls.return_value, openai_cls.return_value, create_conversation.return_value
+        )
+        assert services.line_bot_api is line_cls.return_value.line_bot_api
+
+    def test_concurrent_first_access_builds_once(self, services):
+        """Threads racing for a service get a single instance"""
+        factory = Mock(side_effect=lambda: object())
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(services._get('svc', factory)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert factory.call_count == 1
+        assert len({id(result) for result in results}) == 1
+
+    def test_warm_up_tolerates_failures(self, services):
+        """A service that cannot be built is reported and retried on next access"""
+        with patch('src.config.settings.Settings', side_effect=ValueError("missing token")):
+            built = services.warm_up(['settings'])
+        assert built == {'settings': False}
+
+        with patch('src.config.settings.Settings') as settings_cls:
+            assert services.settings is settings_cls.return_value
+
+    def test_task_setup_separates_cold_and_warm_runs(self, services):
+        """The first run pays for construction; later runs only read the cache"""
+        for _ in range(3):
+            with services.task_setup('send_batch'):
+                services._get('svc', object)
+
+        stats = services.get_stats()
+        assert stats['tasks']['send_batch']['runs'] == 3
+        assert stats['tasks']['send_batch']['cold_runs'] == 1
+        assert stats['tasks']['send_batch']['avg_warm_setup_ms'] is not None
+        assert 'svc' in stats['services']
+
+    def test_worker_process_init_resets_and_warms(self):
+        """The hook drops inherited services and builds the core ones again"""
+        services = get_worker_services()
+        services._services['settings'] = inherited = object()
+
+        with patch.object(services, 'warm_up', return_value={'settings': True}) as warm_up:
+            init_worker_services()
+
+        warm_up.assert_called_once_with()
+        assert services._services.get('settings') is not inherited